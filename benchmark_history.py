@@ -0,0 +1,741 @@
+"""ollama-benchmark.py 的歷史結果索引與跨執行效能回歸偵測。
+
+每次評測都寫在獨立的 chats/benchmark_<timestamp>/ 目錄中；本模組把各目錄的
+benchmark_report.json 收錄到 SQLite 索引（chats/benchmark_history.sqlite3），保存每次量測的
+生成速度、prompt 處理速度、TTFT 與延遲樣本，以及當時的 Ollama 版本與模型 digest，
+並以依測試項目分層的 Mann-Whitney U 檢定（van Elteren）比較兩次執行中同一 (伺服器, 模型)
+的樣本分佈，找出統計上顯著的退步。
+
+ollama-benchmark.py 每次執行結束時會自動收錄（含既有的舊目錄）並與前次比較；也可單獨執行：
+  python benchmark_history.py ingest                      # 收錄 chats/ 下所有執行目錄
+  python benchmark_history.py compare                     # 最新一次與各模型的前次執行比較
+  python benchmark_history.py compare --base benchmark_20260101_120000 --target benchmark_20260201_120000
+  python benchmark_history.py trend                       # 產生 chats/benchmark_trend.html 趨勢圖
+"""
+
+import argparse
+import html
+import itertools
+import json
+import math
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Iterator, TextIO
+from urllib.parse import urlparse
+
+import ollama_client
+
+BASE_DIR = Path(__file__).resolve().parent
+CHATS_DIR = BASE_DIR / "chats"
+HISTORY_FILE = CHATS_DIR / "benchmark_history.sqlite3"
+TREND_FILE = CHATS_DIR / "benchmark_trend.html"
+REPORT_FILE = "benchmark_report.json"
+
+# 比較的指標：名稱 → (顯示名稱, 單位, 數值越大越好)
+METRICS = {
+    "eval_tps": ("生成速度", "tok/s", True),
+    "prompt_tps": ("prompt 處理速度", "tok/s", True),
+    "ttft": ("TTFT", "s", False),
+    "latency": ("延遲", "s", False),
+}
+
+# 回歸判定：p 值低於 DEFAULT_ALPHA 且中位數變差超過 DEFAULT_MIN_CHANGE（比例）才算回歸，
+# 避免樣本很多時把微小但顯著的差異也列出
+DEFAULT_ALPHA = 0.05
+DEFAULT_MIN_CHANGE = 0.05
+# 分組方式不超過此數時以排列檢定計算精確 p 值，否則使用常態近似
+EXACT_PERMUTATIONS = 20000
+
+# HTML 報告：未以 --chartjs 指定時從 CDN 載入 Chart.js
+CHARTJS_CDN = "https://cdn.jsdelivr.net/npm/chart.js@4"
+
+
+# ---------------------------------------------------------------------------
+# 統計檢定
+# ---------------------------------------------------------------------------
+
+def _ranks(values: list[float]) -> list[float]:
+    """由小到大的排名（從 1 起算），同值取平均排名"""
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def _stratum_deviation(rank_sum: float, n1: int, n: int) -> float:
+    """分層內 a 組（n1 筆）的秩和與期望值之差，以 1 / (該層樣本數 n + 1) 加權（van Elteren）"""
+    return (rank_sum - n1 * (n + 1) / 2) / (n + 1)
+
+
+def stratified_mann_whitney(strata: list[tuple[list[float], list[float]]]) -> tuple[float, float]:
+    """分層 Mann-Whitney U 檢定（van Elteren，雙尾），回傳 (加權秩和偏差, p 值)。
+
+    每個分層（測試項目）的 a、b 兩組各自排名，秩和偏差以 1 / (n + 1) 加權後加總：只比較同一個
+    prompt 的量測，長短與成本不同的 prompt 不會混在同一個排名中，樣本多的測試項目也不會獨佔結果。
+    不假設常態分佈，適合偏態且常有離群值的延遲與 tokens/秒。每層的分組方式與合併後的分佈大小
+    都不超過 EXACT_PERMUTATIONS 時以各層分佈的摺積求精確 p 值（小樣本時常態近似過於樂觀），
+    否則使用含同值校正的常態近似。只有一層時即為一般的 Mann-Whitney U 檢定。
+    """
+    strata = [(a, b) for a, b in strata if a and b]
+    if not strata:
+        return 0.0, 1.0
+    ranked = [(_ranks(list(a) + list(b)), len(a)) for a, b in strata]
+    statistic = sum(_stratum_deviation(sum(ranks[:n1]), n1, len(ranks)) for ranks, n1 in ranked)
+
+    # 精確分佈：各層所有分組方式的偏差分佈逐層摺積（以四捨五入後的值為鍵合併）
+    distribution: dict[float, int] | None = {0.0: 1}
+    for ranks, n1 in ranked:
+        if math.comb(len(ranks), n1) > EXACT_PERMUTATIONS:
+            distribution = None
+            break
+        layer = Counter(
+            round(_stratum_deviation(sum(group), n1, len(ranks)), 9) for group in itertools.combinations(ranks, n1)
+        )
+        merged: dict[float, int] = {}
+        for value, count in distribution.items():
+            for delta, ways in layer.items():
+                key = round(value + delta, 9)
+                merged[key] = merged.get(key, 0) + count * ways
+        if len(merged) > EXACT_PERMUTATIONS:
+            distribution = None
+            break
+        distribution = merged
+    if distribution is not None:
+        total = sum(distribution.values())
+        extreme = sum(count for value, count in distribution.items() if abs(value) >= abs(statistic) - 1e-9)
+        return statistic, extreme / total
+
+    variance = 0.0
+    for ranks, n1 in ranked:
+        n = len(ranks)
+        n2 = n - n1
+        if n < 2:
+            continue
+        tie_term = sum(t ** 3 - t for t in Counter(ranks).values())
+        variance += n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))) / (n + 1) ** 2
+    if variance <= 0:
+        return statistic, 1.0
+    z = abs(statistic) / math.sqrt(variance)
+    return statistic, min(1.0, math.erfc(z / math.sqrt(2)))
+
+
+# ---------------------------------------------------------------------------
+# 歷史索引
+# ---------------------------------------------------------------------------
+
+def run_name(run: str | Path) -> str:
+    """執行目錄路徑或名稱 → 索引中的執行名稱（目錄名稱）"""
+    return Path(run).name
+
+
+def default_server() -> str:
+    """呼叫當下 OLLAMA_BASE_URL 的第一台伺服器（呼叫端需先載入 .env，因此不在匯入時讀取）"""
+    return os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").split(",")[0].strip().rstrip("/")
+
+
+class HistoryStore:
+    """以 SQLite 保存的歷史評測索引。
+
+    - runs：每個執行目錄一筆（generated_at、量測設定、報告檔案的修改時間）
+    - entries：每次執行中的 (伺服器, 模型)，含當時的 Ollama 版本、模型 digest 與成功 / 失敗項數
+    - samples：每次成功量測的指標值（沿用快取的結果不收錄，避免舊數據重複計入）
+
+    報告檔案的修改時間未變時略過，已收錄的執行以 --resume 續跑後會重新收錄。
+    沒有 servers 欄位的早期報告歸屬 default_server（未指定時為收錄當下的 default_server()）。
+    """
+
+    def __init__(self, path: Path = HISTORY_FILE, *, default_server: str | None = None):
+        self._default_server = default_server
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS runs (
+                run TEXT PRIMARY KEY,
+                generated_at TEXT NOT NULL,
+                path TEXT NOT NULL,
+                mtime REAL NOT NULL,
+                warmup INTEGER,
+                repeat INTEGER,
+                suite TEXT
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                run TEXT NOT NULL,
+                server TEXT NOT NULL,
+                model TEXT NOT NULL,
+                version TEXT,
+                digest TEXT,
+                tests INTEGER NOT NULL,
+                failed INTEGER NOT NULL,
+                PRIMARY KEY (run, server, model)
+            );
+            CREATE TABLE IF NOT EXISTS samples (
+                run TEXT NOT NULL,
+                server TEXT NOT NULL,
+                model TEXT NOT NULL,
+                test TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                value REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS samples_series ON samples (server, model, metric, run);"""
+        )
+
+    def __enter__(self) -> "HistoryStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # ---- 收錄 ----
+
+    def ingest(self, run_dir: Path) -> bool:
+        """收錄單一執行目錄，回傳是否有新增或更新（報告不存在或未變更時為 False）"""
+        report_file = run_dir / REPORT_FILE
+        if not report_file.exists():
+            return False
+        mtime = report_file.stat().st_mtime
+        run = run_name(run_dir)
+        row = self._conn.execute("SELECT mtime FROM runs WHERE run = ?", (run,)).fetchone()
+        if row and row[0] == mtime:
+            return False
+        with open(report_file, encoding="utf-8") as f:
+            report = json.load(f)
+
+        # 早期的報告沒有伺服器欄位，當時只支援單一伺服器，視為 OLLAMA_BASE_URL（的第一台）
+        servers = report.get("servers") or [self._default_server or default_server()]
+        server_info = report.get("server_info") or {}
+        entries = []
+        samples = []
+        for label, entry in report.get("models", {}).items():
+            server = entry.get("server") or servers[0]
+            model = entry.get("model") or label
+            info = server_info.get(server) or {}
+            benchmarks = entry.get("benchmark", [])
+            entries.append((
+                run, server, model, info.get("version"), (info.get("digests") or {}).get(model),
+                len(benchmarks), sum(1 for b in benchmarks if not b.get("success")),
+            ))
+            for b in benchmarks:
+                if b.get("cached"):
+                    continue
+                for r in b.get("runs") or [b]:
+                    if not r.get("success"):
+                        continue
+                    for metric in METRICS:
+                        if r.get(metric) is not None:
+                            samples.append((run, server, model, b["test"], metric, float(r[metric])))
+
+        with self._conn:
+            for table in ("runs", "entries", "samples"):
+                self._conn.execute(f"DELETE FROM {table} WHERE run = ?", (run,))
+            self._conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run, report.get("generated_at") or run.removeprefix("benchmark_"), str(run_dir.resolve()), mtime,
+                 report.get("warmup"), report.get("repeat"), (report.get("suite") or {}).get("path")),
+            )
+            self._conn.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", entries)
+            self._conn.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)", samples)
+        return True
+
+    def ingest_all(self, chats_dir: Path = CHATS_DIR) -> tuple[int, int]:
+        """收錄 chats_dir 下所有執行目錄（含先前的舊目錄），回傳 (新增或更新數, 執行總數)"""
+        changed = sum(self.ingest(run_dir) for run_dir in sorted(chats_dir.glob("benchmark_2*")) if run_dir.is_dir())
+        total = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        return changed, total
+
+    # ---- 查詢 ----
+
+    def runs(self) -> list[dict]:
+        """所有執行，依時間排序"""
+        rows = self._conn.execute(
+            "SELECT run, generated_at, path, warmup, repeat, suite FROM runs ORDER BY generated_at, run"
+        ).fetchall()
+        return [dict(zip(("run", "generated_at", "path", "warmup", "repeat", "suite"), row)) for row in rows]
+
+    def entries(self, run: str | None = None) -> list[dict]:
+        """各次執行的 (伺服器, 模型) 項目，依時間排序；指定 run 時只取該次執行"""
+        query = """SELECT e.run, r.generated_at, e.server, e.model, e.version, e.digest, e.tests, e.failed
+                   FROM entries e JOIN runs r USING (run)"""
+        params: tuple = ()
+        if run:
+            query += " WHERE e.run = ?"
+            params = (run,)
+        rows = self._conn.execute(query + " ORDER BY r.generated_at, e.run, e.server, e.model", params).fetchall()
+        keys = ("run", "generated_at", "server", "model", "version", "digest", "tests", "failed")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def samples(self, run: str, server: str, model: str, metric: str) -> dict[str, list[float]]:
+        """單一 (執行, 伺服器, 模型) 的指標樣本，依測試項目分組"""
+        grouped: dict[str, list[float]] = {}
+        for test, value in self._conn.execute(
+            "SELECT test, value FROM samples WHERE run = ? AND server = ? AND model = ? AND metric = ?",
+            (run, server, model, metric),
+        ):
+            grouped.setdefault(test, []).append(value)
+        return grouped
+
+    def latest_run(self) -> str | None:
+        row = self._conn.execute("SELECT run FROM runs ORDER BY generated_at DESC, run DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+
+# ---------------------------------------------------------------------------
+# 比較與回歸偵測
+# ---------------------------------------------------------------------------
+
+def compare_entries(
+    store: HistoryStore, base: dict, target: dict,
+    alpha: float = DEFAULT_ALPHA, min_change: float = DEFAULT_MIN_CHANGE,
+) -> list[dict]:
+    """比較同一 (伺服器, 模型) 在兩次執行中的各項指標。
+
+    只使用兩次都有成功結果的測試項目，避免測試組合不同造成假性差異；檢定以測試項目分層
+    （stratified_mann_whitney），change 為各測試項目中位數變化比例的中位數，不同 prompt 的樣本
+    不會混在一起比較。base_median / target_median 為所有樣本的中位數，僅供參考。
+    status 為 regression（顯著變差）、improvement（顯著變好）、unchanged 或 insufficient（樣本不足）。
+    """
+    rows = []
+    for metric, (_, _, higher_is_better) in METRICS.items():
+        before = store.samples(base["run"], base["server"], base["model"], metric)
+        after = store.samples(target["run"], target["server"], target["model"], metric)
+        tests = sorted(before.keys() & after.keys())
+        a = [v for t in tests for v in before[t]]
+        b = [v for t in tests for v in after[t]]
+        row = {
+            "metric": metric, "tests": tests, "n_base": len(a), "n_target": len(b),
+            "base_median": round(statistics.median(a), 3) if a else None,
+            "target_median": round(statistics.median(b), 3) if b else None,
+            "change": None, "p_value": None, "status": "insufficient",
+        }
+        if a and b:
+            _, p_value = stratified_mann_whitney([(before[t], after[t]) for t in tests])
+            ratios = [
+                statistics.median(after[t]) / statistics.median(before[t]) - 1
+                for t in tests if statistics.median(before[t])
+            ]
+            change = statistics.median(ratios) if ratios else 0.0
+            worse = -change if higher_is_better else change
+            row["change"] = round(change, 4)
+            row["p_value"] = round(p_value, 4)
+            if len(a) < 2 or len(b) < 2:
+                row["status"] = "insufficient"
+            elif p_value < alpha and worse > min_change:
+                row["status"] = "regression"
+            elif p_value < alpha and -worse > min_change:
+                row["status"] = "improvement"
+            else:
+                row["status"] = "unchanged"
+        rows.append(row)
+    return rows
+
+
+def compare_runs(
+    store: HistoryStore, target: str | None = None, base: str | None = None,
+    alpha: float = DEFAULT_ALPHA, min_change: float = DEFAULT_MIN_CHANGE,
+) -> list[dict]:
+    """比較目標執行（預設最新一次）中每個 (伺服器, 模型) 與基準執行。
+
+    未指定 base 時，每個 (伺服器, 模型) 各自以之前最近一次含該模型的執行為基準。
+    每筆結果含兩次執行的 Ollama 版本與 digest，方便判斷退步是否發生在升級之後。
+    """
+    target = target or store.latest_run()
+    if not target:
+        return []
+    history = store.entries()
+    results = []
+    for entry in store.entries(target):
+        previous = [
+            e for e in history
+            if (e["server"], e["model"]) == (entry["server"], entry["model"])
+            and (e["run"] == base if base else (e["generated_at"], e["run"]) < (entry["generated_at"], entry["run"]))
+        ]
+        if not previous:
+            continue
+        before = previous[-1]
+        results.append({
+            "server": entry["server"], "model": entry["model"],
+            "base": before, "target": entry,
+            "metrics": compare_entries(store, before, entry, alpha=alpha, min_change=min_change),
+        })
+    return results
+
+
+def regressions(comparisons: list[dict]) -> Iterator[tuple[dict, dict]]:
+    """逐一產生 (比較結果, 回歸的指標)"""
+    for comparison in comparisons:
+        for row in comparison["metrics"]:
+            if row["status"] == "regression":
+                yield comparison, row
+
+
+def _changes(before: dict, after: dict) -> list[str]:
+    """兩次執行之間的環境變更（Ollama 版本、模型 digest）"""
+    notes = []
+    if before.get("version") and after.get("version") and before["version"] != after["version"]:
+        notes.append(f"Ollama {before['version']} → {after['version']}")
+    if before.get("digest") and after.get("digest") and before["digest"] != after["digest"]:
+        notes.append(f"模型 digest {before['digest'][:12]} → {after['digest'][:12]}")
+    return notes
+
+
+def format_regression(comparison: dict, row: dict) -> str:
+    """單項回歸的一行摘要（ollama-benchmark.py 執行結束時印出）"""
+    label, unit, _ = METRICS[row["metric"]]
+    changes = _changes(comparison["base"], comparison["target"])
+    return (
+        f"{comparison['model']} @ {ollama_client.server_name(comparison['server'])}｜{label} "
+        f"{row['base_median']} → {row['target_median']} {unit}（{row['change']:+.1%}，p={row['p_value']}）"
+        f"｜基準 {comparison['base']['run']}" + (f"｜{'、'.join(changes)}" if changes else "")
+    )
+
+
+STATUS_LABELS = {
+    "regression": "📉 回歸",
+    "improvement": "📈 改善",
+    "unchanged": "—",
+    "insufficient": "樣本不足",
+}
+
+
+def _ljust(text: str, width: int) -> str:
+    """靠左對齊（全形字元以兩格計算）"""
+    shown = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+    return text + " " * max(0, width - shown)
+
+
+def print_comparison(comparisons: list[dict]) -> None:
+    for comparison in comparisons:
+        base, target = comparison["base"], comparison["target"]
+        changes = _changes(base, target)
+        print(f"\n🖥  {comparison['model']} @ {ollama_client.server_name(comparison['server'])}")
+        print(f"   {base['run']} → {target['run']}" + (f"（{'、'.join(changes)}）" if changes else ""))
+        for row in comparison["metrics"]:
+            label, unit, _ = METRICS[row["metric"]]
+            if row["change"] is None:
+                print(f"   {_ljust(label, 16)}{STATUS_LABELS['insufficient']}")
+                continue
+            print(
+                f"   {_ljust(label, 16)}{row['base_median']:>9} → {row['target_median']:<9} {unit:<6}"
+                f"{row['change']:>+8.1%}  p={row['p_value']:<7} n={row['n_base']}/{row['n_target']}  "
+                f"{STATUS_LABELS[row['status']]}"
+            )
+
+
+# ---------------------------------------------------------------------------
+# 趨勢
+# ---------------------------------------------------------------------------
+
+def trend(store: HistoryStore, model: str | None = None, server: str | None = None, last: int | None = None) -> list[dict]:
+    """每個 (伺服器, 模型) 的歷次中位數與相鄰兩次的比較結果，依時間排序"""
+    series: dict[tuple[str, str], list[dict]] = {}
+    for entry in store.entries():
+        if (model and entry["model"] != model) or (server and entry["server"] != server):
+            continue
+        series.setdefault((entry["server"], entry["model"]), []).append(entry)
+    results = []
+    for (srv, mdl), entries in sorted(series.items()):
+        entries = entries[-last:] if last else entries
+        points = []
+        for i, entry in enumerate(entries):
+            medians = {}
+            for metric in METRICS:
+                values = [v for vs in store.samples(entry["run"], srv, mdl, metric).values() for v in vs]
+                medians[metric] = round(statistics.median(values), 3) if values else None
+            point = {**entry, "medians": medians, "changes": [], "regressions": []}
+            if i:
+                point["changes"] = _changes(entries[i - 1], entry)
+                point["regressions"] = [
+                    row["metric"] for row in compare_entries(store, entries[i - 1], entry)
+                    if row["status"] == "regression"
+                ]
+            points.append(point)
+        results.append({"server": srv, "model": mdl, "points": points})
+    return results
+
+
+def chartjs_tag(source: str | None) -> str:
+    """Chart.js 的 <script> 標籤：未指定時使用 CDN，URL 直接引用，本機檔案則內嵌至報告（離線可用）"""
+    if not source:
+        return f'<script src="{CHARTJS_CDN}"></script>'
+    if urlparse(source).scheme in ("http", "https"):
+        return f'<script src="{html.escape(source)}"></script>'
+    code = Path(source).read_text(encoding="utf-8")
+    # 避免腳本內容中的 </script> 提前結束標籤
+    return "<script>\n" + re.sub(r"</(script)", r"<\\/\1", code, flags=re.IGNORECASE) + "\n</script>"
+
+
+def _timestamp(generated_at: str) -> str:
+    """20260206_114947 → 2026-02-06 11:49"""
+    m = re.fullmatch(r"(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})\d{2}", generated_at or "")
+    return f"{m[1]}-{m[2]}-{m[3]} {m[4]}:{m[5]}" if m else generated_at
+
+
+def write_trend_html(f: TextIO, series: list[dict], latest: list[dict], *, chartjs: str) -> None:
+    """將趨勢儀表板寫入 f：最新一次執行的回歸摘要，以及每個 (伺服器, 模型) 的歷次中位數折線圖。
+
+    發生回歸的點以紅色標示，Ollama 版本或模型 digest 改變的點以三角形標示。
+    """
+    f.write(f"""<!DOCTYPE html>
+<html lang="zh-Hant">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Ollama Benchmark 效能趨勢</title>
+{chartjs}
+<style>
+  :root {{
+    --bg: #0f1117; --surface: #1a1d27; --border: #2a2d3a;
+    --text: #e4e6eb; --muted: #8b8fa3; --accent: #3b82f6;
+  }}
+  * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+  body {{
+    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', system-ui, sans-serif;
+    background: var(--bg); color: var(--text); padding: 2rem; line-height: 1.6;
+  }}
+  h1 {{ text-align: center; margin-bottom: .3rem; font-size: 1.8rem; }}
+  .subtitle {{ text-align: center; color: var(--muted); margin-bottom: 2rem; }}
+  .grid {{ display: grid; grid-template-columns: 1fr 1fr; gap: 1.5rem; margin-bottom: 2rem; }}
+  @media (max-width: 900px) {{ .grid {{ grid-template-columns: 1fr; }} }}
+  .card {{
+    background: var(--surface); border: 1px solid var(--border);
+    border-radius: 12px; padding: 1.5rem;
+  }}
+  .card h2 {{ font-size: 1.1rem; margin-bottom: 1rem; color: var(--accent); }}
+  .card-full {{ grid-column: 1 / -1; margin-bottom: 2rem; }}
+  table {{ width: 100%; border-collapse: collapse; }}
+  th, td {{ padding: .6rem .8rem; text-align: left; border-bottom: 1px solid var(--border); }}
+  th {{ color: var(--muted); font-weight: 600; font-size: .85rem; text-transform: uppercase; }}
+  td {{ font-size: .95rem; }}
+  canvas {{ width: 100% !important; max-height: 320px; }}
+  .warn {{ color: #f59e0b; font-weight: 600; }}
+  .bad {{ color: #ef4444; font-weight: 600; }}
+  .note {{ color: var(--muted); font-size: 0.9rem; margin-bottom: 1rem; }}
+</style>
+</head>
+<body>
+<h1>📈 Ollama Benchmark 效能趨勢</h1>
+<p class="subtitle">共 {len(series)} 組（伺服器, 模型）</p>
+<p id="chartjsMissing" class="warn" style="text-align:center;margin-bottom:2rem;" hidden>⚠️ 無法載入 Chart.js，圖表不會顯示；離線環境請以 --chartjs 指定本機的 Chart.js 檔案內嵌至報告</p>
+
+<div class="card card-full">
+  <h2>🚨 最新一次執行的回歸</h2>
+""")
+    found = list(regressions(latest))
+    if not latest:
+        f.write('  <p class="note">沒有可比較的前次執行</p>\n')
+    elif not found:
+        f.write('  <p class="note">✅ 最新一次執行與各模型的前次執行相比沒有顯著退步</p>\n')
+    else:
+        f.write("""  <table>
+    <thead><tr><th>模型</th><th>伺服器</th><th>指標</th><th>前次</th><th>本次</th><th>變化</th><th>p 值</th><th>環境變更</th></tr></thead>
+    <tbody>
+""")
+        for comparison, row in found:
+            label, unit, _ = METRICS[row["metric"]]
+            changes = "、".join(_changes(comparison["base"], comparison["target"])) or "—"
+            f.write(f"""      <tr>
+        <td>{html.escape(comparison["model"])}</td>
+        <td>{html.escape(ollama_client.server_name(comparison["server"]))}</td>
+        <td>{label}</td>
+        <td>{row["base_median"]} {unit}</td>
+        <td>{row["target_median"]} {unit}</td>
+        <td class="bad">{row["change"]:+.1%}</td>
+        <td>{row["p_value"]}</td>
+        <td>{html.escape(changes)}</td>
+      </tr>
+""")
+        f.write("    </tbody>\n  </table>\n")
+    f.write("</div>\n\n<div class=\"grid\">\n")
+
+    chart_data = []
+    for i, s in enumerate(series):
+        chart_data.append({
+            "labels": [_timestamp(p["generated_at"]) for p in s["points"]],
+            "runs": [p["run"] for p in s["points"]],
+            "versions": [p["version"] or "unknown" for p in s["points"]],
+            "changes": [p["changes"] for p in s["points"]],
+            "regressions": [p["regressions"] for p in s["points"]],
+            "medians": {m: [p["medians"][m] for p in s["points"]] for m in METRICS},
+        })
+        f.write(f"""  <div class="card">
+    <h2>{html.escape(s["model"])} <span class="note">@ {html.escape(ollama_client.server_name(s["server"]))}（{len(s["points"])} 次執行）</span></h2>
+    <canvas id="trend{i}"></canvas>
+  </div>
+""")
+    f.write(f"""</div>
+
+<script>
+if (typeof Chart === 'undefined') {{
+  document.getElementById('chartjsMissing').hidden = false;
+  throw new Error('Chart.js 未載入');
+}}
+const SERIES = {json.dumps(chart_data, ensure_ascii=False)};
+const METRICS = {json.dumps({m: [label, unit] for m, (label, unit, _) in METRICS.items()}, ensure_ascii=False)};
+const LINES = [
+  ['eval_tps', 'y', 'rgba(54, 162, 235, 1)'],
+  ['prompt_tps', 'y', 'rgba(75, 192, 192, 1)'],
+  ['ttft', 'ySec', 'rgba(255, 206, 86, 1)'],
+  ['latency', 'ySec', 'rgba(153, 102, 255, 1)']
+];
+Chart.defaults.color = '#8b8fa3';
+Chart.defaults.borderColor = '#2a2d3a';
+
+SERIES.forEach((s, i) => {{
+  const datasets = LINES.filter(([m]) => s.medians[m].some(v => v !== null)).map(([m, axis, color]) => ({{
+    label: `${{METRICS[m][0]}}（${{METRICS[m][1]}}）`,
+    data: s.medians[m], yAxisID: axis, borderColor: color, backgroundColor: color,
+    hidden: m === 'prompt_tps' || m === 'latency', tension: 0.2, spanGaps: true,
+    // 回歸的點為紅色，Ollama 版本或模型 digest 改變的點為三角形
+    pointBackgroundColor: s.regressions.map(r => r.includes(m) ? '#ef4444' : color),
+    pointRadius: s.regressions.map((r, j) => r.includes(m) ? 7 : (s.changes[j].length ? 6 : 3)),
+    pointStyle: s.changes.map(c => c.length ? 'triangle' : 'circle')
+  }}));
+  new Chart(document.getElementById(`trend${{i}}`), {{
+    type: 'line',
+    data: {{ labels: s.labels, datasets }},
+    options: {{
+      responsive: true,
+      interaction: {{ mode: 'index', intersect: false }},
+      plugins: {{
+        legend: {{ position: 'bottom' }},
+        tooltip: {{
+          callbacks: {{
+            title: items => `${{s.labels[items[0].dataIndex]}}（${{s.runs[items[0].dataIndex]}}）`,
+            footer: items => {{
+              const j = items[0].dataIndex;
+              const lines = [`Ollama ${{s.versions[j]}}`, ...s.changes[j]];
+              if (s.regressions[j].length) lines.push('📉 回歸：' + s.regressions[j].map(m => METRICS[m][0]).join('、'));
+              return lines;
+            }}
+          }}
+        }}
+      }},
+      scales: {{
+        y: {{ beginAtZero: true, title: {{ display: true, text: 'tokens/秒' }} }},
+        ySec: {{ beginAtZero: true, position: 'right', title: {{ display: true, text: '秒' }}, grid: {{ drawOnChartArea: false }} }}
+      }}
+    }}
+  }});
+}});
+</script>
+
+</body>
+</html>
+""")
+
+
+# ---------------------------------------------------------------------------
+# 命令列
+# ---------------------------------------------------------------------------
+
+def main() -> int:
+    # 先載入 .env，讓 BENCHMARK_CHARTJS 與舊報告的預設伺服器都與 ollama-benchmark.py 一致
+    ollama_client.load_env()
+    parser = argparse.ArgumentParser(
+        description="ollama-benchmark.py 的歷史結果索引與跨執行效能回歸偵測",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+範例：
+  python benchmark_history.py ingest                 # 收錄 chats/ 下所有執行目錄
+  python benchmark_history.py compare                # 最新一次與各模型的前次執行比較，有回歸時結束碼為 1
+  python benchmark_history.py compare --base benchmark_20260101_120000
+  python benchmark_history.py trend --model llama3.1:8b --last 20
+        """,
+    )
+    parser.add_argument("--db", type=Path, default=HISTORY_FILE, help=f"歷史索引檔案，預設 {HISTORY_FILE.relative_to(BASE_DIR)}")
+    parser.add_argument("--chats", type=Path, default=CHATS_DIR, help="執行目錄所在的資料夾，預設 chats/")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="收錄執行目錄（未指定時為 chats/ 下全部）")
+    ingest.add_argument("runs", nargs="*", type=Path, metavar="RUN_DIR")
+
+    compare = commands.add_parser("compare", help="比較兩次執行，列出統計上顯著的退步")
+    compare.add_argument("--target", metavar="RUN", help="目標執行（目錄名稱或路徑），預設最新一次")
+    compare.add_argument("--base", metavar="RUN", help="基準執行，預設為每個模型在目標之前最近一次的執行")
+    compare.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help=f"顯著水準，預設 {DEFAULT_ALPHA}")
+    compare.add_argument(
+        "--min-change", type=float, default=DEFAULT_MIN_CHANGE, metavar="RATIO",
+        help=f"中位數至少變差此比例才列為回歸，預設 {DEFAULT_MIN_CHANGE}（5%%）",
+    )
+
+    trend_cmd = commands.add_parser("trend", help="產生效能趨勢 HTML 儀表板")
+    trend_cmd.add_argument("--model", help="只顯示此模型")
+    trend_cmd.add_argument("--server", help="只顯示此伺服器（URL）")
+    trend_cmd.add_argument("--last", type=int, metavar="N", help="每組只顯示最近 N 次執行")
+    trend_cmd.add_argument("--output", type=Path, default=TREND_FILE, help=f"輸出檔案，預設 {TREND_FILE.relative_to(BASE_DIR)}")
+    trend_cmd.add_argument(
+        "--chartjs", default=os.getenv("BENCHMARK_CHARTJS"), metavar="PATH|URL",
+        help="Chart.js 來源：本機檔案會內嵌供離線檢視，URL 則直接引用；預設取自 BENCHMARK_CHARTJS，未設定時使用 CDN",
+    )
+    args = parser.parse_args()
+
+    with HistoryStore(args.db, default_server=default_server()) as store:
+        if args.command == "ingest" and args.runs:
+            changed = sum(store.ingest(run) for run in args.runs)
+            total = len(store.runs())
+        else:
+            # compare / trend 前一律先收錄，讓新的執行目錄與舊目錄都納入比較
+            changed, total = store.ingest_all(args.chats)
+        print(f"🗃  歷史索引：{total} 次執行（本次新增或更新 {changed} 次）")
+        if args.command == "ingest":
+            return 0
+
+        if args.command == "compare":
+            target = run_name(args.target) if args.target else None
+            base = run_name(args.base) if args.base else None
+            known = {r["run"] for r in store.runs()}
+            for run in (target, base):
+                if run and run not in known:
+                    parser.error(f"索引中沒有此執行：{run}")
+            comparisons = compare_runs(store, target=target, base=base, alpha=args.alpha, min_change=args.min_change)
+            if not comparisons:
+                print("ℹ️  沒有可比較的執行（同一伺服器與模型至少需要兩次執行）")
+                return 0
+            print_comparison(comparisons)
+            found = list(regressions(comparisons))
+            print()
+            if found:
+                print(f"📉 偵測到 {len(found)} 項顯著退步（p < {args.alpha}，變差超過 {args.min_change:.0%}）")
+                return 1
+            print("✅ 沒有顯著退步")
+            return 0
+
+        try:
+            chartjs = chartjs_tag(args.chartjs)
+        except (OSError, UnicodeDecodeError) as e:
+            parser.error(f"無法讀取 --chartjs 指定的檔案：{e}")
+        series = trend(store, model=args.model, server=args.server, last=args.last)
+        if not series:
+            print("ℹ️  沒有符合條件的歷史結果")
+            return 0
+        latest = compare_runs(store)
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            write_trend_html(f, series, latest, chartjs=chartjs)
+        for s in series:
+            flagged = [p for p in s["points"] if p["regressions"]]
+            print(
+                f"   {s['model']} @ {ollama_client.server_name(s['server'])}：{len(s['points'])} 次執行"
+                + (f"，{len(flagged)} 次出現回歸（最近一次 {flagged[-1]['run']}）" if flagged else "")
+            )
+        print(f"📊 趨勢圖：{args.output}")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,65 +1,67 @@
 import argparse
+import csv
 import json
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
 import requests
 
+import model_scheduler
+import ollama_client
+import perf_trace
+import resource_monitor
+
 # 載入 .env 設定
-def _load_env():
-    """載入 .env 檔案的環境變數"""
-    env_file = Path(__file__).resolve().parent / ".env"
-    if env_file.exists():
-        with open(env_file, encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#") and "=" in line:
-                    key, value = line.split("=", 1)
-                    os.environ.setdefault(key.strip(), value.strip())
-
-_load_env()
+ollama_client.load_env()
 
 # 從環境變數讀取設定，提供預設值
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 GREETING_PROMPT = os.getenv("GREETING_PROMPT", "你是誰")
 GREETING_TIMEOUT_SECONDS = int(os.getenv("GREETING_TIMEOUT_SECONDS", "30"))
+CHATS_DIR = Path(__file__).resolve().parent / "chats"
+
+# 多輪對話重播（--replay）：內建腳本、每輪的生成選項（固定 seed 讓各模型的對話可重現）與 CSV 欄位
+CHAT_REPLAY_SYSTEM = "你是一位樂於助人的助理，請以繁體中文回答。"
+CHAT_REPLAY_TURNS = [
+    "你好，請簡單介紹你自己。",
+    "我想規劃一趟三天兩夜的台南旅行，可以給我建議嗎？",
+    "第二天想以美食為主，請推薦早餐到宵夜的行程。",
+    "如果遇到下雨，有哪些室內景點可以替代？",
+    "請把前面討論的內容整理成一份精簡的行程表。",
+]
+CHAT_REPLAY_OPTIONS = {"num_predict": 128, "seed": 42}
+REPLAY_FIELDS = [
+    "model", "turn", "messages", "status", "prompt_eval_count", "prompt_eval_ms", "context_tokens",
+    "uncached_prompt_eval_ms", "cached_tokens", "saved_ms", "ttft", "latency", "eval_count", "eval_tps", "detail",
+]
 
-# 用於比對 Ollama 回傳的 OOM / 記憶體相關錯誤訊息
-OOM_KEYWORDS = [
-    "out of memory", "oom", "not enough memory",
-    "failed to load", "insufficient memory",
-    "cuda out of memory", "memory", "alloc",
+# 平行打招呼（--parallel）摘要的 CSV 欄位（JSON 另含完整回覆）
+SWEEP_FIELDS = [
+    "model", "status", "ttft", "load_time", "latency", "eval_tps",
+    "footprint", "size", "size_vram", "started", "finished", "detail",
 ]
 
 
 def get_available_models() -> list[str]:
     """從 Ollama 伺服器取得目前有提供服務的模型列表"""
-    resp = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=GREETING_TIMEOUT_SECONDS)
-    resp.raise_for_status()
-    data = resp.json()
-    return [m["name"] for m in data.get("models", [])]
+    models = ollama_client.list_models(OLLAMA_BASE_URL, timeout=GREETING_TIMEOUT_SECONDS)
+    return [m["name"] for m in models]
 
 
 def get_running_models() -> list[dict]:
     """取得目前已載入記憶體的模型清單（透過 /api/ps）"""
-    resp = requests.get(f"{OLLAMA_BASE_URL}/api/ps", timeout=10)
-    resp.raise_for_status()
-    return resp.json().get("models", [])
+    return ollama_client.list_running(OLLAMA_BASE_URL)
 
 
 def unload_model(model_name: str) -> bool:
     """卸載指定模型，釋放其佔用的記憶體。回傳是否成功。"""
     try:
-        resp = requests.post(
-            f"{OLLAMA_BASE_URL}/api/chat",
-            json={
-                "model": model_name,
-                "messages": [],
-                "keep_alive": 0,
-            },
-            timeout=GREETING_TIMEOUT_SECONDS,
-        )
-        resp.raise_for_status()
+        ollama_client.unload(OLLAMA_BASE_URL, model_name, timeout=GREETING_TIMEOUT_SECONDS)
         return True
     except requests.RequestException as e:
         print(f"   ⚠️  卸載 {model_name} 失敗：{e}", flush=True)
@@ -80,33 +82,18 @@ def unload_all_models() -> None:
     total_size = sum(m.get("size", 0) for m in running)
     print(
         f"🧹 正在卸載 {len(running)} 個已載入的模型以釋放記憶體"
-        f"（共 {_format_bytes(total_size)}）…",
+        f"（共 {ollama_client.format_bytes(total_size)}）…",
         flush=True,
     )
     for m in running:
         name = m.get("name", "")
         size = m.get("size", 0)
         if name:
-            print(f"   卸載 {name} ({_format_bytes(size)})…", end="", flush=True)
+            print(f"   卸載 {name} ({ollama_client.format_bytes(size)})…", end="", flush=True)
             ok = unload_model(name)
             print(" ✅" if ok else " ❌", flush=True)
 
 
-def _is_oom_error(error_msg: str) -> bool:
-    """判斷錯誤訊息是否與 OOM / 記憶體不足相關"""
-    lower = error_msg.lower()
-    return any(kw in lower for kw in OOM_KEYWORDS)
-
-
-def _format_bytes(n: int) -> str:
-    """將位元組數格式化為人類可讀的字串"""
-    for unit in ("B", "KB", "MB", "GB", "TB"):
-        if abs(n) < 1024:
-            return f"{n:.1f} {unit}"
-        n /= 1024
-    return f"{n:.1f} PB"
-
-
 def show_model_resource_usage(model: str) -> None:
     """顯示指定模型的資源佔用情形（透過 /api/ps）"""
     try:
@@ -118,11 +105,11 @@ def show_model_resource_usage(model: str) -> None:
                 
                 if size > 0:
                     vram_pct = (size_vram / size) * 100 if size > 0 else 0
-                    print(f"📊 資源佔用：模型大小 {_format_bytes(size)}，VRAM {_format_bytes(size_vram)} ({vram_pct:.1f}%)", flush=True)
+                    print(f"📊 資源佔用：模型大小 {ollama_client.format_bytes(size)}，VRAM {ollama_client.format_bytes(size_vram)} ({vram_pct:.1f}%)", flush=True)
                     
                     if size_vram < size * 0.95:  # 未達 95% 表示部分在系統記憶體
                         system_mem = size - size_vram
-                        print(f"   ⚠️  系統記憶體 {_format_bytes(system_mem)}（效能可能下降）", flush=True)
+                        print(f"   ⚠️  系統記憶體 {ollama_client.format_bytes(system_mem)}（效能可能下降）", flush=True)
                 else:
                     print(f"📊 資源佔用：模型已載入", flush=True)
                 return
@@ -134,9 +121,10 @@ def show_model_resource_usage(model: str) -> None:
         pass
 
 
-def diagnose_timeout(model: str, got_any_token: bool) -> str:
+def diagnose_timeout(model: str, got_any_token: bool, resources: dict | None = None) -> str:
     """在逾時後，透過 /api/ps 診斷可能原因並回傳描述字串。
     got_any_token：在逾時前是否已收到任何生成 token。
+    resources：請求期間背景取樣的資源時間序列（resource_monitor），會附上變化摘要。
     """
     diagnosis_parts: list[str] = []
 
@@ -148,10 +136,7 @@ def diagnose_timeout(model: str, got_any_token: bool) -> str:
 
     # 透過 /api/ps 查詢目前載入的模型與記憶體狀態
     try:
-        ps_resp = requests.get(f"{OLLAMA_BASE_URL}/api/ps", timeout=5)
-        ps_resp.raise_for_status()
-        ps_data = ps_resp.json()
-        running_models = ps_data.get("models", [])
+        running_models = ollama_client.list_running(OLLAMA_BASE_URL, timeout=5)
 
         target_found = False
         for m in running_models:
@@ -162,8 +147,8 @@ def diagnose_timeout(model: str, got_any_token: bool) -> str:
                 if size > 0:
                     vram_pct = (size_vram / size) * 100
                     diagnosis_parts.append(
-                        f"模型大小 {_format_bytes(size)}，"
-                        f"VRAM 使用 {_format_bytes(size_vram)} ({vram_pct:.0f}%)"
+                        f"模型大小 {ollama_client.format_bytes(size)}，"
+                        f"VRAM 使用 {ollama_client.format_bytes(size_vram)} ({vram_pct:.0f}%)"
                     )
                     if size_vram < size:
                         diagnosis_parts.append(
@@ -176,7 +161,7 @@ def diagnose_timeout(model: str, got_any_token: bool) -> str:
             # 列出其他佔用記憶體的模型
             if running_models:
                 others = [
-                    f"{m.get('name', 'unknown')} ({_format_bytes(m.get('size', 0))})"
+                    f"{m.get('name', 'unknown')} ({ollama_client.format_bytes(m.get('size', 0))})"
                     for m in running_models
                 ]
                 diagnosis_parts.append(f"目前已載入的模型：{', '.join(others)}")
@@ -184,6 +169,9 @@ def diagnose_timeout(model: str, got_any_token: bool) -> str:
     except requests.RequestException:
         diagnosis_parts.append("（無法連線 /api/ps 進行進一步診斷）")
 
+    if resources and resources.get("samples"):
+        diagnosis_parts.append(resource_monitor.describe(resources))
+
     return "；".join(diagnosis_parts)
 
 
@@ -194,81 +182,113 @@ class OllamaError(Exception):
 def llama_local(prompt: str, model: str, *, timeout: int = GREETING_TIMEOUT_SECONDS*60, show_resource: bool = True) -> str:
     """呼叫 Ollama 產生回應（使用 streaming 模式）。timeout：逾時秒數，預設 GREETING_TIMEOUT_SECONDS*60。
     show_resource：是否在收到第一個 token 後顯示資源佔用。"""
-    resp = requests.post(
-        f"{OLLAMA_BASE_URL}/api/generate",
-        json={
-            "model": model,
-            "prompt": prompt,
-            "stream": True,
-        },
-        stream=True,
-        timeout=(10, timeout),  # (連線逾時, 讀取逾時—兩次資料之間的最大等待)
-    )
-    resp.raise_for_status()
+    with perf_trace.request("POST /api/generate", OLLAMA_BASE_URL, model) as trace:
+        resp = ollama_client.post(
+            OLLAMA_BASE_URL,
+            "/api/generate",
+            json={
+                "model": model,
+                "prompt": prompt,
+                "stream": True,
+            },
+            stream=True,
+            timeout=(10, timeout),  # (連線逾時, 讀取逾時—兩次資料之間的最大等待)
+        )
+        with resp:  # 串流中途拋出例外時也關閉回應，連線不會佔住連線池
+            trace.headers()
+            resp.raise_for_status()
 
-    full_response: list[str] = []
-    first_token_received = False
+            full_response: list[str] = []
+            first_token_received = False
     
-    for line in resp.iter_lines():
-        if not line:
-            continue
-        chunk = json.loads(line)
-        # Ollama 串流中回傳錯誤
-        if "error" in chunk:
-            raise OllamaError(chunk["error"])
-        token = chunk.get("response", "")
-        if token:
-            # 收到第一個 token 時顯示資源佔用
-            if not first_token_received and show_resource:
-                first_token_received = True
-                show_model_resource_usage(model)
-            full_response.append(token)
-        if chunk.get("done"):
-            break
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                received = time.perf_counter()
+                chunk = json.loads(line)
+                # Ollama 串流中回傳錯誤
+                if "error" in chunk:
+                    raise OllamaError(chunk["error"])
+                token = chunk.get("response", "")
+                if token:
+                    # 收到第一個 token 時顯示資源佔用
+                    if not first_token_received and show_resource:
+                        first_token_received = True
+                        show_model_resource_usage(model)
+                    full_response.append(token)
+                trace.chunk(received, chunk, bool(token))
+                # 收到 done 後串流即結束；不提前 break，讀完整個串流連線才會歸還 keep-alive 連線池
 
     return "".join(full_response).strip() or "(無回覆)"
 
 
-def llama_local_greeting(prompt: str, model: str, *, timeout: int = GREETING_TIMEOUT_SECONDS) -> str:
-    """專為打招呼設計：使用 streaming 模式，追蹤是否收到 token 以便逾時診斷。"""
+def llama_local_greeting(
+    prompt: str, model: str, *, timeout: int = GREETING_TIMEOUT_SECONDS,
+    show_resource: bool = True, stats: dict | None = None,
+) -> str:
+    """專為打招呼設計：使用 streaming 模式，追蹤是否收到 token 以便逾時診斷。
+    stats：若提供，填入 ttft、latency（秒）與伺服器端的 load_time、eval_tps（失敗時只有已取得的部分）。"""
     got_any_token = False
     first_token_received = False
-    
-    try:
-        resp = requests.post(
-            f"{OLLAMA_BASE_URL}/api/generate",
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": True,
-            },
-            stream=True,
-            timeout=(10, timeout),
-        )
-        resp.raise_for_status()
-
-        full_response: list[str] = []
-        for line in resp.iter_lines():
-            if not line:
-                continue
-            chunk = json.loads(line)
-            if "error" in chunk:
-                raise OllamaError(chunk["error"])
-            token = chunk.get("response", "")
-            if token:
-                # 收到第一個 token 時顯示資源佔用
-                if not first_token_received:
-                    first_token_received = True
-                    show_model_resource_usage(model)
-                got_any_token = True
-                full_response.append(token)
-            if chunk.get("done"):
-                break
+    token_times: list[float] = []
+    stats = {} if stats is None else stats
+    interval = resource_monitor.default_interval()
+    sampler = resource_monitor.ResourceSampler(OLLAMA_BASE_URL, model, interval) if interval > 0 else None
+    start = time.perf_counter()
+    if sampler:
+        # 背景取樣整個請求期間的資源使用量，逾時時可看出是否溢出至系統記憶體
+        sampler.start(start, token_times)
 
-        return "".join(full_response).strip() or "(無回覆)"
+    try:
+        with perf_trace.request("POST /api/generate", OLLAMA_BASE_URL, model, greeting=True) as trace:
+            resp = ollama_client.post(
+                OLLAMA_BASE_URL,
+                "/api/generate",
+                json={
+                    "model": model,
+                    "prompt": prompt,
+                    "stream": True,
+                },
+                stream=True,
+                timeout=(10, timeout),
+            )
+            trace.headers()
+            resp.raise_for_status()
+
+            with resp:  # 串流中途拋出例外時也關閉回應；錯誤狀態碼的回應留給 HTTPError 處理時讀取
+                full_response: list[str] = []
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    received = time.perf_counter()
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise OllamaError(chunk["error"])
+                    token = chunk.get("response", "")
+                    if token:
+                        # 收到第一個 token 時顯示資源佔用
+                        if not first_token_received:
+                            first_token_received = True
+                            stats["ttft"] = round(time.perf_counter() - start, 3)
+                            if show_resource:
+                                show_model_resource_usage(model)
+                        got_any_token = True
+                        token_times.append(time.perf_counter())
+                        full_response.append(token)
+                    if chunk.get("done"):
+                        # 伺服器端計時欄位（奈秒）
+                        stats["load_time"] = round(chunk.get("load_duration", 0) / 1e9, 3)
+                        if chunk.get("eval_duration"):
+                            stats["eval_tps"] = round(chunk.get("eval_count", 0) / (chunk["eval_duration"] / 1e9), 2)
+                    trace.chunk(received, chunk, bool(token))
+                    # 不提前 break：讀完整個串流，連線才會歸還 keep-alive 連線池
+
+            stats["latency"] = round(time.perf_counter() - start, 3)
+            return "".join(full_response).strip() or "(無回覆)"
 
     except requests.Timeout:
-        diag = diagnose_timeout(model, got_any_token)
+        resources = sampler.stop() if sampler else None
+        diag = diagnose_timeout(model, got_any_token, resources)
         raise TimeoutWithDiagnosis(diag) from None
 
     except requests.HTTPError as e:
@@ -279,10 +299,14 @@ def llama_local_greeting(prompt: str, model: str, *, timeout: int = GREETING_TIM
                 error_body = e.response.text
             except Exception:
                 pass
-        if error_body and _is_oom_error(error_body):
+        if error_body and ollama_client.is_oom_error(error_body):
             raise OllamaError(f"記憶體不足 (OOM)：{error_body}") from None
         raise
 
+    finally:
+        if sampler:
+            sampler.stop()
+
 
 class TimeoutWithDiagnosis(Exception):
     """逾時且附帶診斷資訊"""
@@ -303,7 +327,7 @@ def greeting_for_model(model: str) -> str | None:
 
     except OllamaError as e:
         error_msg = str(e)
-        if _is_oom_error(error_msg):
+        if ollama_client.is_oom_error(error_msg):
             print(f"💥 記憶體不足 (OOM)，無法載入或執行此模型：{error_msg}", flush=True)
         else:
             print(f"❌ Ollama 錯誤：{error_msg}", flush=True)
@@ -314,15 +338,27 @@ def greeting_for_model(model: str) -> str | None:
         return None
 
 
-def chat_with_model(model: str, auto_mode: bool = False) -> None:
+def chat_with_model(
+    model: str, auto_mode: bool = False, plan: dict | None = None, index: int = 0,
+    chat: bool = False, keep_alive=None,
+) -> None:
     """對單一模型：先打招呼，再詢問是否繼續交談；不繼續則結束此模型流程
-    auto_mode: 若為 True，打招呼後自動跳過交談環節，直接前往下一個模型"""
+    auto_mode: 若為 True，打招呼後自動跳過交談環節，直接前往下一個模型
+    plan / index: 記憶體感知排程與此模型在排程中的位置；未提供時先卸載所有模型
+    chat / keep_alive: 交談改用 /api/chat 保留對話歷史，並印出每輪的 prompt 評估量"""
     print("=" * 60, flush=True)
     print(f"🤖 使用模型：{model}", flush=True)
     print("=" * 60, flush=True)
 
-    # 先卸載所有已載入的模型，確保有足夠記憶體載入新模型
-    unload_all_models()
+    if plan is None:
+        # 先卸載所有已載入的模型，確保有足夠記憶體載入新模型
+        unload_all_models()
+    else:
+        # 依排程只在放不下時卸載已完成的模型，小模型可同時常駐
+        try:
+            model_scheduler.make_room(OLLAMA_BASE_URL, plan, index)
+        except requests.RequestException:
+            unload_all_models()
 
     # 執行打招呼測試
     reply = greeting_for_model(model)
@@ -352,6 +388,13 @@ def chat_with_model(model: str, auto_mode: bool = False) -> None:
             break
         print("請輸入 y 繼續、n 跳到下一個模型，或 q 離開程式。")
 
+    session = None
+    if chat:
+        # 打招呼的問答作為對話的開頭
+        session = ChatSession(model, keep_alive=keep_alive)
+        session.add_exchange(GREETING_PROMPT, reply)
+        print("💬 多輪對話模式：保留對話歷史，輸入 /reset 清除\n", flush=True)
+
     # 繼續交談迴圈
     while True:
         user_input = input("你： ").strip()
@@ -360,13 +403,359 @@ def chat_with_model(model: str, auto_mode: bool = False) -> None:
             return
         if not user_input:
             continue
+        if session and user_input == "/reset":
+            session.reset()
+            print("🧹 已清除對話歷史\n", flush=True)
+            continue
         try:
-            reply = llama_local(user_input, model)
-            print(f"{model}：\n{reply}\n", flush=True)
+            if session:
+                reply, stats = session.send(user_input)
+                print(f"{model}：\n{reply.strip() or '(無回覆)'}\n{_format_turn(stats)}\n", flush=True)
+            else:
+                reply = llama_local(user_input, model)
+                print(f"{model}：\n{reply}\n", flush=True)
+        except OllamaError as e:
+            print(f"❌ Ollama 錯誤：{e}\n", flush=True)
         except requests.RequestException as e:
             print(f"❌ 請求失敗：{e}\n", flush=True)
 
 
+# ---------------------------------------------------------------------------
+# 多輪對話（/api/chat）
+# ---------------------------------------------------------------------------
+
+def llama_chat(
+    messages: list[dict], model: str, *, keep_alive=None, options: dict | None = None,
+    timeout: int = GREETING_TIMEOUT_SECONDS * 60,
+) -> tuple[str, dict]:
+    """以 /api/chat（streaming）送出完整對話，回傳 (回覆, 計時)。
+
+    計時含客戶端量測的 ttft、latency（秒）與最後一個 chunk 的伺服器端欄位：prompt_eval_count 只計入
+    本輪實際評估的 token，與前一輪相同的前綴命中 KV cache 時不會重新評估。回覆保留原樣不 strip，
+    下一輪送回的歷史才會與伺服器快取的內容完全相同。"""
+    body = {"model": model, "messages": messages, "stream": True}
+    if keep_alive is not None:
+        body["keep_alive"] = keep_alive
+    if options:
+        body["options"] = options
+    start = time.perf_counter()
+    with perf_trace.request("POST /api/chat", OLLAMA_BASE_URL, model, messages=len(messages)) as trace:
+        resp = ollama_client.post(OLLAMA_BASE_URL, "/api/chat", json=body, stream=True, timeout=(10, timeout))
+        with resp:  # 串流中途拋出例外時也關閉回應，連線不會佔住連線池
+            trace.headers()
+            if resp.status_code >= 400:
+                # Ollama 的錯誤訊息（如 OOM、模型不支援 chat）在回應內容中
+                try:
+                    message = resp.json().get("error") or resp.text
+                except ValueError:
+                    message = resp.text
+                raise OllamaError(message)
+
+            pieces: list[str] = []
+            stats: dict = {}
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                received = time.perf_counter()
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise OllamaError(chunk["error"])
+                content = (chunk.get("message") or {}).get("content", "")
+                if content:
+                    if not pieces:
+                        stats["ttft"] = round(time.perf_counter() - start, 3)
+                    pieces.append(content)
+                if chunk.get("done"):
+                    stats.update(
+                        load_time=round(chunk.get("load_duration", 0) / 1e9, 3),
+                        prompt_eval_count=chunk.get("prompt_eval_count", 0),
+                        prompt_eval_ms=round(chunk.get("prompt_eval_duration", 0) / 1e6, 1),
+                        eval_count=chunk.get("eval_count", 0),
+                    )
+                    if chunk.get("eval_duration"):
+                        stats["eval_tps"] = round(chunk.get("eval_count", 0) / (chunk["eval_duration"] / 1e9), 2)
+                trace.chunk(received, chunk, bool(content))
+    stats["latency"] = round(time.perf_counter() - start, 3)
+    return "".join(pieces), stats
+
+
+class ChatSession:
+    """保留歷史的多輪對話：每輪送出完整歷史，記錄每輪的 prompt 評估量"""
+
+    def __init__(self, model: str, *, system: str | None = None, keep_alive=None, options: dict | None = None):
+        self.model = model
+        self.system = system
+        self.keep_alive = keep_alive
+        self.options = options
+        self.reset()
+
+    def reset(self) -> None:
+        self.messages: list[dict] = [{"role": "system", "content": self.system}] if self.system else []
+        self.turns: list[dict] = []
+
+    def add_exchange(self, user: str, assistant: str) -> None:
+        """加入一組已完成的問答（例如打招呼），不送出請求"""
+        self.messages += [{"role": "user", "content": user}, {"role": "assistant", "content": assistant}]
+
+    def send(self, text: str) -> tuple[str, dict]:
+        """送出一輪；失敗時歷史不變"""
+        messages = self.messages + [{"role": "user", "content": text}]
+        reply, stats = llama_chat(messages, self.model, keep_alive=self.keep_alive, options=self.options)
+        self.messages = messages + [{"role": "assistant", "content": reply}]
+        stats.update(turn=len(self.turns) + 1, messages=len(messages))
+        self.turns.append(stats)
+        return reply, stats
+
+
+def _format_turn(stats: dict) -> str:
+    return (
+        f"📈 第 {stats['turn']} 輪（歷史 {stats['messages']} 則訊息）：prompt 評估 {stats['prompt_eval_count']} tokens"
+        f" / {stats['prompt_eval_ms']} ms | ⚡ TTFT {stats.get('ttft')}s | 🔤 {stats.get('eval_tps') or 'N/A'} tok/s"
+    )
+
+
+def load_chat_script(path: Path | None) -> tuple[str | None, list[str]]:
+    """讀取重播腳本：JSON 字串陣列，或 {"system": ..., "turns": [...]}；未指定時使用內建腳本"""
+    if path is None:
+        return CHAT_REPLAY_SYSTEM, CHAT_REPLAY_TURNS
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    system, turns = (data.get("system"), data.get("turns")) if isinstance(data, dict) else (None, data)
+    if not isinstance(turns, list) or not turns or not all(isinstance(t, str) and t.strip() for t in turns):
+        raise ValueError("腳本需為非空的字串陣列，或含 turns 字串陣列的物件")
+    return system, turns
+
+
+def _with_markers(messages: list[dict], count: int = 1) -> list[dict]:
+    """在第一則訊息前加上 count 個隨機標記，讓前綴與 KV cache 不符。
+
+    標記為 8 位十進位數字：tokenizer 對數字逐位或固定每 3 位切分，每個標記的 token 數與內容無關。"""
+    messages = [dict(m) for m in messages]
+    markers = " ".join(f"{random.randrange(10 ** 8):08d}" for _ in range(count))
+    messages[0]["content"] = f"{markers} {messages[0]['content']}"
+    return messages
+
+
+def replay_conversation(model: str, system: str | None, turns: list[str], *, keep_alive=None) -> list[dict]:
+    """依腳本與模型進行多輪對話，並量測每輪不使用 KV cache 時的 prompt 評估成本。
+
+    第一趟正常對話（前綴命中快取）；第二趟以相同的歷史（沿用第一趟的回覆）逐輪重送，
+    但在第一則訊息前加上每輪不同的標記，讓前綴與快取不符、整段對話重新評估，只生成 1 個 token。
+    標記本身的 token 數由第一輪加送一個雙標記請求量出，從第二趟的評估量中扣除；
+    兩趟的 prompt_eval_count / duration 差距即為快取省下的評估量。"""
+    session = ChatSession(model, system=system, keep_alive=keep_alive, options=CHAT_REPLAY_OPTIONS)
+    rows = []
+    for text in turns:
+        try:
+            _, stats = session.send(text)
+            rows.append({"model": model, "status": "ok", **stats})
+        except (OllamaError, requests.RequestException, ValueError) as e:
+            status = "oom" if ollama_client.is_oom_error(str(e)) else "error"
+            rows.append({"model": model, "turn": len(rows) + 1, "status": status, "detail": str(e)})
+            break
+        print(f"   {_format_turn(stats)}", flush=True)
+
+    history = session.messages
+    cold_options = {**CHAT_REPLAY_OPTIONS, "num_predict": 1}
+    marker_tokens = None
+    for row in rows:
+        if row["status"] != "ok":
+            continue
+        # 第 n 輪送出的訊息：system（若有）+ 前 n-1 組問答 + 第 n 個問題
+        messages = history[:row["messages"]]
+        try:
+            _, cold = llama_chat(_with_markers(messages), model, keep_alive=keep_alive, options=cold_options)
+            if marker_tokens is None:
+                # 同一段訊息改加兩個標記（同樣與快取不符）再送一次，兩者的差即一個標記（含分隔空白）的 token 數
+                _, doubled = llama_chat(_with_markers(messages, 2), model, keep_alive=keep_alive, options=cold_options)
+                marker_tokens = max(0, doubled["prompt_eval_count"] - cold["prompt_eval_count"])
+        except (OllamaError, requests.RequestException, ValueError) as e:
+            row["detail"] = f"無快取量測失敗：{e}"
+            continue
+        context = max(1, cold["prompt_eval_count"] - marker_tokens)
+        # 評估時間依 token 比例扣除標記的部分
+        uncached_ms = round(cold["prompt_eval_ms"] * context / max(cold["prompt_eval_count"], 1), 1)
+        row.update(
+            context_tokens=context,
+            uncached_prompt_eval_ms=uncached_ms,
+            cached_tokens=max(0, context - row["prompt_eval_count"]),
+            saved_ms=round(uncached_ms - row["prompt_eval_ms"], 1),
+        )
+    return rows
+
+
+def chat_replay(models: list[str], plan: dict | None, system: str | None, turns: list[str], *, keep_alive=None) -> dict:
+    """對每個模型重播多輪對話腳本，回傳摘要"""
+    rows = []
+    for i, model in enumerate(models):
+        print(f"💬 {model}：重播 {len(turns)} 輪對話", flush=True)
+        if plan is None:
+            unload_all_models()
+        else:
+            try:
+                model_scheduler.make_room(OLLAMA_BASE_URL, plan, i)
+            except requests.RequestException:
+                unload_all_models()
+        model_rows = replay_conversation(model, system, turns, keep_alive=keep_alive)
+        rows += model_rows
+        ok = [r for r in model_rows if r["status"] == "ok" and "context_tokens" in r]
+        if not ok:
+            print(f"   ❌ 失敗：{model_rows[-1].get('detail') if model_rows else '無結果'}\n", flush=True)
+            continue
+        evaluated = sum(r["prompt_eval_count"] for r in ok)
+        context = sum(r["context_tokens"] for r in ok)
+        saved = sum(r["saved_ms"] for r in ok)
+        print(
+            f"   🧠 KV cache：{len(ok)} 輪共評估 {evaluated} / {context} tokens"
+            f"（{1 - evaluated / context if context else 0:.0%} 命中），prompt 評估省下 {saved:.0f} ms\n",
+            flush=True,
+        )
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "server": OLLAMA_BASE_URL,
+        "system": system,
+        "turns": turns,
+        "keep_alive": keep_alive,
+        "options": CHAT_REPLAY_OPTIONS,
+        "models": rows,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 平行打招呼（--parallel）
+# ---------------------------------------------------------------------------
+
+class _AdmissionGate:
+    """限制同時打招呼的模型：數量不超過 max_loaded，估算佔用合計不超過記憶體上限。
+
+    沒有其他模型進行中時一律放行，超過上限的模型也會單獨執行一次並記錄結果（通常為 OOM）。"""
+
+    def __init__(self, plan: dict):
+        self.plan = plan
+        self.busy: dict[str, int] = {}
+        self._cond = threading.Condition()
+
+    def _fits(self, footprint: int) -> bool:
+        if not self.busy:
+            return True
+        budget = self.plan["budget"]
+        return len(self.busy) < self.plan["max_loaded"] and (
+            budget is None or sum(self.busy.values()) + footprint <= budget
+        )
+
+    def acquire(self, index: int) -> None:
+        step = self.plan["steps"][index]
+        with self._cond:
+            self._cond.wait_for(lambda: self._fits(step["footprint"]))
+            # 在鎖內騰出記憶體，避免多個執行緒依同一份 /api/ps 狀態重複卸載
+            try:
+                model_scheduler.make_room(OLLAMA_BASE_URL, self.plan, index, busy=self.busy)
+            except requests.RequestException as e:
+                print(f"   ⚠️  無法確認常駐模型：{e}", flush=True)
+            self.busy[step["model"]] = step["footprint"]
+
+    def release(self, model: str) -> None:
+        with self._cond:
+            self.busy.pop(model, None)
+            self._cond.notify_all()
+
+
+def _greet_record(model: str, footprint: int, started: float) -> dict:
+    """對單一模型打招呼並回傳結果記錄（不印出回覆內容）"""
+    stats: dict = {}
+    record = {"model": model, "footprint": footprint, "started": round(time.perf_counter() - started, 3)}
+    try:
+        record["reply"] = llama_local_greeting(
+            GREETING_PROMPT, model, timeout=GREETING_TIMEOUT_SECONDS, show_resource=False, stats=stats
+        )
+        record["status"] = "ok"
+    except TimeoutWithDiagnosis as e:
+        record.update(status="timeout", detail=str(e))
+    except OllamaError as e:
+        oom = ollama_client.is_oom_error(str(e))
+        record.update(status="oom" if oom else "error", detail=str(e).removeprefix("記憶體不足 (OOM)："))
+    except requests.RequestException as e:
+        record.update(status="error", detail=str(e))
+    record["finished"] = round(time.perf_counter() - started, 3)
+    record.update(stats)
+    try:
+        running = get_running_models()
+    except requests.RequestException:
+        running = []
+    for m in running:
+        if m.get("name") == model or m.get("model") == model:
+            record.update(size=m.get("size", 0), size_vram=m.get("size_vram", 0))
+            break
+    return record
+
+
+def _format_record(record: dict) -> str:
+    status = record["status"]
+    if status == "ok":
+        parts = [f"⚡ TTFT {record.get('ttft')}s", f"📦 載入 {record.get('load_time')}s", f"⏱ {record.get('latency')}s"]
+        if record.get("size"):
+            parts.append(f"VRAM {record.get('size_vram', 0) / record['size'] * 100:.0f}%")
+        return "✅ " + " | ".join(parts)
+    icon = {"timeout": "⏱️  逾時", "oom": "💥 記憶體不足 (OOM)"}.get(status, "❌ 失敗")
+    return f"{icon}：{record.get('detail', '')}"
+
+
+def greeting_sweep(models: list[str], plan: dict, parallel: int) -> dict:
+    """以最多 parallel 個執行緒同時對模型打招呼，依排程順序與記憶體上限放行，回傳摘要"""
+    gate = _AdmissionGate(plan)
+    started = time.perf_counter()
+    lock = threading.Lock()
+
+    def run(index: int) -> dict:
+        model = plan["steps"][index]["model"]
+        gate.acquire(index)
+        try:
+            with lock:
+                print(f"⏳ {model}：開始打招呼", flush=True)
+            record = _greet_record(model, plan["steps"][index]["footprint"], started)
+        finally:
+            gate.release(model)
+        with lock:
+            print(f"   {model}：{_format_record(record)}", flush=True)
+        return record
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        records = list(pool.map(run, range(len(models))))
+    counts = {status: sum(1 for r in records if r["status"] == status) for status in ("ok", "timeout", "oom", "error")}
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "server": OLLAMA_BASE_URL,
+        "prompt": GREETING_PROMPT,
+        "timeout": GREETING_TIMEOUT_SECONDS,
+        "parallel": parallel,
+        "budget": plan["budget"],
+        "max_loaded": plan["max_loaded"],
+        "elapsed": round(time.perf_counter() - started, 3),
+        "serial_time": round(sum(r["finished"] - r["started"] for r in records), 3),
+        "counts": counts,
+        "models": records,
+    }
+
+
+def write_summary(summary: dict, fields: list[str], path: Path) -> tuple[Path, Path]:
+    """寫出 JSON（完整內容）與 CSV（summary["models"] 每筆一列）摘要，回傳兩個檔案路徑"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    json_path, csv_path = path.with_suffix(".json"), path.with_suffix(".csv")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(summary["models"])
+    return json_path, csv_path
+
+
+def _parse_keep_alive(value: str) -> int | str:
+    """keep_alive：純數字視為秒數（-1 為永久常駐），其餘（如 30m）原樣交給 Ollama 解析"""
+    value = value.strip()
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Ollama 互動式聊天工具",
@@ -375,6 +764,10 @@ def main():
 範例：
   python hi-ai.py           # 正常模式，每個模型打招呼後詢問是否繼續交談
   python hi-ai.py --auto    # 自動模式，跳過互動確認，僅對所有模型打招呼
+  python hi-ai.py --parallel 4   # 同時對最多 4 個模型打招呼，寫出 JSON/CSV 摘要
+  python hi-ai.py --chat --keep-alive 30m   # 交談保留對話歷史（/api/chat），顯示每輪 prompt 評估量
+  python hi-ai.py --replay script.json   # 以腳本重播多輪對話，量測 KV cache 省下的 prompt 評估
+  python hi-ai.py --auto --trace   # 記錄每個請求的階段，寫出可用 Perfetto 開啟的 Chrome trace JSON
         """,
     )
     parser.add_argument(
@@ -382,8 +775,72 @@ def main():
         action="store_true",
         help="自動模式：跳過互動確認，僅對所有模型打招呼後自動前往下一個模型",
     )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        metavar="N",
+        help="平行打招呼（隱含 --auto）：同時對最多 N 個模型打招呼，不超過記憶體上限，並寫出 JSON/CSV 摘要",
+    )
+    parser.add_argument(
+        "--summary",
+        type=Path,
+        metavar="PATH",
+        help="平行打招呼 / 對話重播摘要的路徑（副檔名會替換為 .json 與 .csv），預設 chats/greeting_sweep_<時間> 或 chats/chat_replay_<時間>",
+    )
+    parser.add_argument(
+        "--chat",
+        action="store_true",
+        help="多輪對話模式：交談改用 /api/chat 並保留對話歷史，每輪印出 prompt 評估的 token 數與時間",
+    )
+    parser.add_argument(
+        "--replay",
+        type=Path,
+        nargs="?",
+        const=False,
+        metavar="SCRIPT",
+        help="非互動重播多輪對話腳本（JSON 字串陣列或 {\"system\", \"turns\"}；未指定時使用內建腳本），"
+        "比較每輪命中與不使用 KV cache 的 prompt 評估成本並寫出摘要",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=_parse_keep_alive,
+        metavar="DURATION",
+        help="多輪對話 / 重播請求的 keep_alive（如 30m、3600、-1 為永久常駐，0 為每輪後卸載），預設沿用伺服器設定",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        nargs="?",
+        const=False,
+        metavar="PATH",
+        help="記錄每個請求的階段（連線、等待回應、伺服器載入 / prompt 評估 / 生成、客戶端解析）為 Chrome trace JSON，"
+        "預設 chats/hi_ai_trace_<時間>.json，可用 https://ui.perfetto.dev 開啟",
+    )
     args = parser.parse_args()
+    if args.parallel is not None and args.parallel < 1:
+        parser.error("--parallel 至少為 1")
+    if args.parallel and args.replay is not None:
+        parser.error("--parallel 不可與 --replay 同時使用")
+    script = None
+    if args.replay is not None:
+        try:
+            script = load_chat_script(args.replay or None)
+        except (OSError, ValueError) as e:
+            parser.error(f"無法讀取對話腳本：{e}")
 
+    if args.trace is not None:
+        path = args.trace or CHATS_DIR / f"hi_ai_trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        perf_trace.start(path, tool="hi-ai.py", server=OLLAMA_BASE_URL)
+    try:
+        run(args, script)
+    finally:
+        trace_path = perf_trace.stop()
+        if trace_path:
+            print(f"🔍 請求追蹤：{trace_path}（以 https://ui.perfetto.dev 開啟）", flush=True)
+
+
+def run(args: argparse.Namespace, script: tuple[str | None, list[str]] | None) -> None:
+    """依命令列參數執行打招呼、平行打招呼或對話重播"""
     models = get_available_models()
 
     if not models:
@@ -395,11 +852,52 @@ def main():
         print(f" - {m}", flush=True)
     print(flush=True)
 
+    # 記憶體感知排程：已載入的模型先執行，其餘由小到大，放不下時才卸載
+    try:
+        plan = model_scheduler.build_plan(OLLAMA_BASE_URL, models)
+        print(model_scheduler.format_plan(plan) + "\n", flush=True)
+        models = plan["order"]
+    except requests.RequestException as e:
+        print(f"⚠️  無法規劃記憶體排程，改為每個模型前卸載全部：{e}\n", flush=True)
+        plan = None
+
+    if args.parallel:
+        if plan is None:
+            # 無法估算佔用時退回一次一個模型的排程
+            plan = model_scheduler.plan_schedule(
+                models, {m: 0 for m in models}, budget=None, resident={}, max_loaded=1, load_bandwidth=1.0
+            )
+        if args.parallel > 1 and plan["max_loaded"] == 1:
+            print("⚠️  無法得知記憶體上限，一次只載入一個模型；可用 OLLAMA_MEMORY_BUDGET 指定\n", flush=True)
+        # 資源取樣每個請求另佔一條連線
+        ollama_client.ensure_pool_size(args.parallel * 2)
+        print(f"🚀 平行打招呼：最多同時 {min(args.parallel, plan['max_loaded'])} 個模型（逾時 {GREETING_TIMEOUT_SECONDS} 秒）\n", flush=True)
+        summary = greeting_sweep(models, plan, args.parallel)
+        path = args.summary or CHATS_DIR / f"greeting_sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        json_path, csv_path = write_summary(summary, SWEEP_FIELDS, path)
+        counts = summary["counts"]
+        print(
+            f"\n✅ 所有模型測試完成：成功 {counts['ok']}、逾時 {counts['timeout']}、OOM {counts['oom']}、其他錯誤 {counts['error']}",
+            flush=True,
+        )
+        print(f"⏱  總耗時 {summary['elapsed']:.1f} 秒（各模型耗時合計 {summary['serial_time']:.1f} 秒）", flush=True)
+        print(f"📄 摘要：{json_path}、{csv_path}", flush=True)
+        return
+
+    if script:
+        system, turns = script
+        summary = chat_replay(models, plan, system, turns, keep_alive=args.keep_alive)
+        path = args.summary or CHATS_DIR / f"chat_replay_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        json_path, csv_path = write_summary(summary, REPLAY_FIELDS, path)
+        print("✅ 所有模型測試完成", flush=True)
+        print(f"📄 摘要：{json_path}、{csv_path}", flush=True)
+        return
+
     if args.auto:
         print("🤖 自動模式：將跳過所有互動確認\n", flush=True)
 
-    for model in models:
-        chat_with_model(model, auto_mode=args.auto)
+    for i, model in enumerate(models):
+        chat_with_model(model, auto_mode=args.auto, plan=plan, index=i, chat=args.chat, keep_alive=args.keep_alive)
 
     print("✅ 所有模型測試完成", flush=True)
 
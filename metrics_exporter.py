@@ -0,0 +1,252 @@
+"""以標準函式庫實作的 Prometheus / OpenMetrics 指標匯出（ollama-benchmark.py --daemon 使用）。
+
+MetricsRegistry 保存 counter、gauge 與 histogram 指標族（依標籤值分組），render() 輸出
+OpenMetrics 1.0 文字格式，或 Prometheus 0.0.4 文字格式；MetricsServer 以背景執行緒提供 /metrics，
+依請求的 Accept 標頭決定格式。指標數量很少，手寫格式即可，不需要額外安裝 prometheus_client。
+"""
+
+import math
+import threading
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 常見單位後綴：指標名稱以此結尾時於 OpenMetrics 輸出 # UNIT
+UNITS = ("seconds", "bytes", "ratio")
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# ---------------------------------------------------------------------------
+# 指標族
+# ---------------------------------------------------------------------------
+
+class _Family(ABC):
+    """同名指標的集合，依標籤值分組；所有操作以 registry 的鎖保護，可由多個執行緒更新。
+    子類別以 samples() 產生各組標籤值的樣本行，render() 加上 TYPE / UNIT / HELP 標頭"""
+
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, labelnames: tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = registry.lock
+        self._values: dict[tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 的標籤應為 {', '.join(self.labelnames) or '（無）'}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def remove(self, **labels) -> None:
+        """移除一組標籤值（例如模型已從伺服器刪除）"""
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def _header(self, openmetrics: bool) -> list[str]:
+        # Prometheus 格式的 counter 名稱含 _total；OpenMetrics 的指標族名稱則不含
+        name = self.name + "_total" if self.kind == "counter" and not openmetrics else self.name
+        lines = [f"# TYPE {name} {self.kind}"]
+        unit = next((u for u in UNITS if self.name.endswith("_" + u)), None)
+        if openmetrics and unit:
+            lines.append(f"# UNIT {name} {unit}")
+        lines.append(f"# HELP {name} {_escape(self.help)}")
+        return lines
+
+    @abstractmethod
+    def samples(self) -> list[str]:
+        """各組標籤值的樣本行（呼叫端已持有鎖）"""
+
+    def render(self, openmetrics: bool) -> list[str]:
+        with self._lock:
+            return self._header(openmetrics) + self.samples()
+
+
+class Counter(_Family):
+    """只增不減的累計值（名稱不含 _total，輸出時自動加上）"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError("counter 不可減少")
+        with self._lock:
+            key = self._key(labels)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}_total{_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Family):
+    """可任意設定的目前值"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def get(self, **labels) -> float | None:
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Family):
+    """依固定分桶累計觀測值的分佈（輸出累積的 _bucket、_count 與 _sum）"""
+
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames, buckets: tuple[float, ...]):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        with self._lock:
+            key = self._key(labels)
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound) if math.isinf(bound) else repr(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {counts[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}")
+        return lines
+
+
+class MetricsRegistry:
+    """指標族的集合，依建立順序輸出"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._families: list[_Family] = []
+
+    def _add(self, family: _Family) -> _Family:
+        if any(f.name == family.name for f in self._families):
+            raise ValueError(f"指標 {family.name} 已存在")
+        self._families.append(family)
+        return family
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(self, name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(self, name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple[str, ...], buckets: tuple[float, ...]) -> Histogram:
+        return self._add(Histogram(self, name, help_text, labelnames, buckets))
+
+    def render(self, openmetrics: bool = True) -> str:
+        lines = [line for family in self._families for line in family.render(openmetrics)]
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# HTTP 端點
+# ---------------------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def log_message(self, format, *args):  # 不在主控台印出每次抓取
+        pass
+
+    def _send(self, status: int, body: str, content_type: str) -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            # Prometheus 2.x 以 Accept 標頭要求 OpenMetrics；未要求時回傳傳統文字格式
+            openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+            self._send(
+                200, self.server.registry.render(openmetrics),
+                OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE,
+            )
+        elif path == "/":
+            self._send(200, '<html><body><a href="/metrics">/metrics</a></body></html>\n', "text/html; charset=utf-8")
+        else:
+            self._send(404, "not found\n", "text/plain; charset=utf-8")
+
+    do_HEAD = do_GET
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    registry: MetricsRegistry
+
+
+class MetricsServer:
+    """以背景執行緒提供 /metrics 的 HTTP 伺服器"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9877):
+        self._server = _Server((host, port), _Handler)
+        self._server.registry = registry
+        self._thread: threading.Thread | None = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+def parse_listen(spec: str) -> tuple[str, int]:
+    """解析 HOST:PORT（HOST 可省略，如 :9877 表示所有介面）"""
+    host, sep, port = spec.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"格式應為 HOST:PORT：{spec}")
+    return host.strip("[]") or "0.0.0.0", int(port)
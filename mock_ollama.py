@@ -0,0 +1,1554 @@
+"""以標準函式庫實作的本機模擬 Ollama 伺服器，用於在沒有 GPU 伺服器時測試與量測兩個工具。
+
+實作 ollama-benchmark.py 與 hi-ai.py 會用到的 API：/api/tags、/api/ps、/api/version、/api/show、
+/api/generate 與 /api/chat（串流與非串流）、/api/embed。模型不實際推理，而是依設定的載入延遲、
+prompt 處理速度與 token 生成速度等待後回傳合成的回應，計時欄位（load_duration、eval_duration 等）
+與真實伺服器格式相同。另可注入錯誤 / OOM、限制並行數（超過時排隊，佇列滿時回傳 503），
+模型佔用以檔案大小加 KV cache 估算，超過記憶體上限即回傳 OOM 錯誤，超過 VRAM 時部分溢出並降速。
+
+抖動、錯誤注入與回應內容都由 --seed 與請求內容決定：同一組請求依相同順序送出時結果完全相同。
+
+用法：
+  python mock_ollama.py --port 11435 --token-rate 80      # 啟動模擬伺服器
+  OLLAMA_BASE_URL=http://127.0.0.1:11435 python ollama-benchmark.py --auto
+  python mock_ollama.py --selftest                        # 以模擬伺服器端到端測試兩個工具
+  python mock_ollama.py --bench-harness                   # 量測客戶端在高 token 速度下的開銷
+"""
+
+import argparse
+import base64
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+import benchmark_history
+import model_scheduler
+import ollama_client
+import resource_monitor
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_PORT = 11435  # 與真實 Ollama（11434）錯開，可同時執行
+
+# 預設提供的模型（名稱 → 檔案大小）；名稱含 embed 的模型只支援 /api/embed，含 vision / llava 的模型另具 vision 能力
+DEFAULT_MODELS = {
+    "mock-tiny:1b": 800_000_000,
+    "mock-small:3b": 2_000_000_000,
+    "mock-medium:8b": 4_900_000_000,
+}
+DEFAULT_NUM_CTX = 4096
+DEFAULT_KEEP_ALIVE = 300  # 秒，與 Ollama 預設的 5 分鐘相同
+# 每個 token 的 prompt 處理時間隨長度線性增加（注意力成本），長度達此值時為短 prompt 的兩倍
+ATTENTION_SCALE = 16384
+# 完全溢出到系統記憶體時的速度比例（部分溢出依 VRAM 佔比線性內插）
+SPILL_SPEED = 0.2
+EMBED_DIM = 384
+# /api/embed：每個請求的固定開銷（秒），同一批輸入中每 EMBED_BATCH_WIDTH 段平行計算，批次越大開銷攤得越薄
+EMBED_REQUEST_OVERHEAD = 0.01
+EMBED_BATCH_WIDTH = 8
+# 影像輸入（具 vision 能力的模型）：每個 image token 涵蓋 IMAGE_PATCH × IMAGE_PATCH 像素（同 Qwen2-VL 的 14 像素 patch
+# 再 2×2 合併），超過 IMAGE_MAX_PIXELS 的影像先等比縮小；解碼與縮放速度為 IMAGE_DECODE_RATE 像素/秒
+IMAGE_PATCH = 28
+IMAGE_MAX_PIXELS = 1792 * 1792
+IMAGE_DECODE_RATE = 50_000_000
+BUSY_MESSAGE = "server busy, please try again.  maximum pending requests exceeded"
+VOCAB = [
+    "模擬", "回應", "的", "是", "我", "一個", "語言", "模型", "，", "。",
+    "Ollama", " mock", " token", " benchmark", " test", " 1", " 2", " 3", "\n",
+]
+
+
+class MockError(Exception):
+    """以指定 HTTP 狀態碼回傳給客戶端的錯誤（回應體為 {"error": 訊息}）"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _gib(n: int) -> str:
+    return f"{n / 1024 ** 3:.1f} GiB"
+
+
+def _parse_keep_alive(value) -> float | None:
+    """keep_alive 轉為秒數：數字為秒、字串可為 "5m" / "30s" / "1h"，負值為永久常駐（回傳 None）"""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, str):
+        match = re.fullmatch(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)?", value.strip())
+        if not match:
+            raise MockError(400, f"invalid keep_alive: {value}")
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+        value = float(match.group(1)) * scale
+    return None if value < 0 else float(value)
+
+
+def _count_tokens(text: str) -> int:
+    """粗略估算 token 數：ASCII 約 4 個字元一個 token，其餘（如中文）每字一個 token"""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return max(1, ascii_chars // 4 + len(text) - ascii_chars)
+
+
+def _chat_turn(role: str, content) -> str:
+    return f"<|{role}|>{content}\n"
+
+
+def _image_size(data) -> tuple[int, int]:
+    """由 base64 編碼的 PNG 讀出寬高（只解析 IHDR，不解碼像素）"""
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except (ValueError, TypeError):
+        raise MockError(400, "illegal base64 data in images") from None
+    if raw[:8] != b"\x89PNG\r\n\x1a\n" or raw[12:16] != b"IHDR":
+        raise MockError(400, "image: unknown format")
+    return int.from_bytes(raw[16:20], "big"), int.from_bytes(raw[20:24], "big")
+
+
+def _image_tokens(width: int, height: int) -> int:
+    """影像佔用的 prompt token 數：超過 IMAGE_MAX_PIXELS 時等比縮小，再以 IMAGE_PATCH 像素為一格"""
+    if width * height > IMAGE_MAX_PIXELS:
+        scale = math.sqrt(IMAGE_MAX_PIXELS / (width * height))
+        width, height = max(1, int(width * scale)), max(1, int(height * scale))
+    return math.ceil(width / IMAGE_PATCH) * math.ceil(height / IMAGE_PATCH)
+
+
+def _image_placeholder(data: str, tokens: int) -> str:
+    """影像在 prompt 中的佔位字串：由影像內容決定的 tokens 個私用區字元（每字一個 token），
+    token 計數、前綴快取與亂數種子都沿用文字的邏輯，相同影像可命中 KV cache、不同影像則不會"""
+    digest = hashlib.sha256(data.encode()).digest()
+    return "".join(chr(0xE000 + digest[i % len(digest)]) for i in range(tokens))
+
+
+def _architecture(size: int) -> dict:
+    """依檔案大小給出類似 llama 架構的參數，讓 /api/show 與 KV cache 估算一致"""
+    if size < 1_500_000_000:
+        layers, embedding, heads = 16, 2048, 32
+    elif size < 3_000_000_000:
+        layers, embedding, heads = 28, 3072, 24
+    elif size < 10_000_000_000:
+        layers, embedding, heads = 32, 4096, 32
+    else:
+        layers, embedding, heads = 80, 8192, 64
+    return {"layers": layers, "embedding": embedding, "heads": heads, "kv_heads": 8}
+
+
+def _kv_bytes(size: int, num_ctx: int) -> int:
+    """f16 KV cache 大小（與 model_scheduler 的估算公式相同）"""
+    arch = _architecture(size)
+    return 2 * arch["layers"] * num_ctx * arch["kv_heads"] * (arch["embedding"] // arch["heads"]) * 2
+
+
+def _capabilities(name: str) -> list[str]:
+    if "embed" in name:
+        return ["embedding"]
+    if "vision" in name or "llava" in name:
+        return ["completion", "vision"]
+    return ["completion"]
+
+
+# ---------------------------------------------------------------------------
+# 模擬伺服器
+# ---------------------------------------------------------------------------
+
+class MockOllama:
+    """模擬伺服器的狀態與行為（已安裝 / 已載入的模型、並行控制、統計）。
+
+    可在同一行程中以 start() 於背景執行緒啟動（自我測試用），或以 serve_forever() 前景執行。
+    token_rate、prompt_rate 為 0 時不等待（盡可能快地輸出）；jitter 為每個 token 間隔的隨機變動比例。
+    """
+
+    def __init__(
+        self,
+        models: dict[str, int] | None = None,
+        *,
+        load_delay: float = 0.5,
+        token_rate: float = 50,
+        prompt_rate: float = 1000,
+        jitter: float = 0.1,
+        response_tokens: int = 128,
+        error_rate: float = 0.0,
+        stream_error_rate: float = 0.0,
+        oom_rate: float = 0.0,
+        num_parallel: int = 1,
+        max_queue: int = 512,
+        max_loaded: int = 3,
+        memory: int = 16 * 1024 ** 3,
+        vram: int | None = None,
+        seed: int = 0,
+        verbose: bool = False,
+    ):
+        self.models = dict(models or DEFAULT_MODELS)
+        self.load_delay = load_delay
+        self.token_rate = token_rate
+        self.prompt_rate = prompt_rate
+        self.jitter = jitter
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.stream_error_rate = stream_error_rate
+        self.oom_rate = oom_rate
+        self.num_parallel = num_parallel
+        self.max_queue = max_queue
+        self.max_loaded = max_loaded
+        self.memory = memory
+        self.vram = memory if vram is None else vram
+        self.seed = seed
+        self.verbose = verbose
+
+        self.loaded: dict[str, dict] = {}  # 依載入 / 使用先後排列，越前面越先被卸載
+        self.lock = threading.Lock()
+        self._slots = threading.Semaphore(num_parallel)
+        self._occurrences: dict[str, int] = {}
+        self.stats = {
+            "requests": 0, "completed": 0, "errors": 0, "rejected": 0, "loads": 0, "tokens": 0,
+            "active": 0, "peak_active": 0, "queued": 0, "peak_queued": 0,
+        }
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    # -- 啟動 / 停止 ----------------------------------------------------------
+
+    def _bind(self, host: str, port: int) -> ThreadingHTTPServer:
+        server = _Server((host, port), _Handler)
+        server.mock = self
+        self._server = server
+        return server
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """於背景執行緒啟動並回傳 base URL（port 為 0 時自動選擇可用埠號）"""
+        server = self._bind(host, port)
+        self._thread = threading.Thread(target=server.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return f"http://{host}:{server.server_address[1]}"
+
+    def serve_forever(self, host: str, port: int) -> None:
+        self._bind(host, port).serve_forever()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.stats)
+
+    # -- 共用邏輯 ------------------------------------------------------------
+
+    def _rng(self, *parts) -> random.Random:
+        """由 seed、請求內容與「相同內容第幾次出現」決定的亂數產生器，與執行緒排程無關"""
+        key = "\x00".join(map(str, parts))
+        with self.lock:
+            n = self._occurrences[key] = self._occurrences.get(key, 0) + 1
+        digest = hashlib.sha256(f"{self.seed}\x00{key}\x00{n}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _model(self, name) -> int:
+        if name not in self.models:
+            raise MockError(404, f"model '{name}' not found")
+        return self.models[name]
+
+    def _expire(self) -> None:
+        """卸載 keep_alive 已到期且沒有進行中請求的模型（需持有 lock）"""
+        now = time.monotonic()
+        for name, entry in list(self.loaded.items()):
+            if entry["expires"] is not None and entry["expires"] <= now and entry["active"] == 0:
+                del self.loaded[name]
+
+    def _admit(self) -> None:
+        """取得執行槽：num_parallel 個請求同時執行，其餘排隊，佇列已滿時回傳 503"""
+        if not self._slots.acquire(blocking=False):
+            with self.lock:
+                if self.stats["queued"] >= self.max_queue:
+                    self.stats["rejected"] += 1
+                    raise MockError(503, BUSY_MESSAGE)
+                self.stats["queued"] += 1
+                self.stats["peak_queued"] = max(self.stats["peak_queued"], self.stats["queued"])
+            self._slots.acquire()
+            with self.lock:
+                self.stats["queued"] -= 1
+        with self.lock:
+            self.stats["active"] += 1
+            self.stats["peak_active"] = max(self.stats["peak_active"], self.stats["active"])
+
+    def _release(self) -> None:
+        with self.lock:
+            self.stats["active"] -= 1
+        self._slots.release()
+
+    def _acquire_model(self, name: str, num_ctx: int, keep_alive) -> tuple[dict, float]:
+        """確保模型以指定 num_ctx 載入並標記使用中，回傳 (常駐資訊, 載入秒數)。
+
+        num_ctx 改變時重新載入；放不下時依先後卸載其他模型，單一模型超過記憶體上限即回傳 OOM。
+        """
+        size = self._model(name)
+        footprint = size + _kv_bytes(size, num_ctx)
+        if footprint > self.memory:
+            raise MockError(
+                500,
+                f"model requires more system memory ({_gib(footprint)}) than is available ({_gib(self.memory)})",
+            )
+        ttl = _parse_keep_alive(keep_alive)
+        with self.lock:
+            self._expire()
+            entry = self.loaded.get(name)
+            loader = entry is None or entry["num_ctx"] != num_ctx
+            if loader:
+                self.loaded.pop(name, None)
+                while self.loaded and (
+                    len(self.loaded) >= self.max_loaded
+                    or sum(e["size"] for e in self.loaded.values()) + footprint > self.memory
+                ):
+                    del self.loaded[next(iter(self.loaded))]
+                vram_free = self.vram - sum(e["size_vram"] for e in self.loaded.values())
+                entry = {
+                    "size": footprint,
+                    "size_vram": max(0, min(footprint, vram_free)),
+                    "num_ctx": num_ctx,
+                    "active": 0,
+                    "ready": threading.Event(),
+                    "cache": "",  # 上一個請求的 prompt + 回應（KV cache 中的內容）
+                }
+                self.stats["loads"] += 1
+            else:
+                self.loaded.pop(name)  # 移到最後（最近使用）
+            self.loaded[name] = entry
+            entry["active"] += 1
+            entry["expires"] = None if ttl is None else time.monotonic() + ttl
+            entry["ttl"] = ttl
+
+        start = time.perf_counter()
+        if loader:
+            time.sleep(self.load_delay)
+            entry["ready"].set()
+        else:
+            entry["ready"].wait()  # 其他請求正在載入同一模型
+        return entry, time.perf_counter() - start
+
+    def _release_model(self, name: str, entry: dict) -> None:
+        with self.lock:
+            entry["active"] -= 1
+            if entry["ttl"] == 0 and entry["active"] == 0 and self.loaded.get(name) is entry:
+                del self.loaded[name]
+
+    def _speed(self, entry: dict) -> float:
+        """溢出到系統記憶體時的速度比例"""
+        ratio = entry["size_vram"] / entry["size"] if entry["size"] else 1.0
+        return 1.0 if ratio >= 1 else SPILL_SPEED + (1 - SPILL_SPEED) * ratio
+
+    def _prompt_seconds(self, tokens: int, entry: dict) -> float:
+        if not self.prompt_rate:
+            return 0.0
+        return tokens / self.prompt_rate * (1 + tokens / ATTENTION_SCALE) / self._speed(entry)
+
+    def unload(self, name: str) -> None:
+        self._model(name)
+        with self.lock:
+            self.loaded.pop(name, None)
+
+    # -- API ---------------------------------------------------------------
+
+    def tags(self) -> dict:
+        return {"models": [self._describe(name, size) for name, size in self.models.items()]}
+
+    def _describe(self, name: str, size: int) -> dict:
+        return {
+            "name": name,
+            "model": name,
+            "modified_at": "2026-01-01T00:00:00Z",
+            "size": size,
+            "digest": hashlib.sha256(name.encode()).hexdigest(),
+            "details": {
+                "format": "gguf",
+                "family": "llama",
+                "families": ["llama"],
+                "parameter_size": f"{size / 0.6e9:.1f}B",  # Q4_K_M 約每個參數 0.6 bytes
+                "quantization_level": "Q4_K_M",
+            },
+        }
+
+    def ps(self) -> dict:
+        now = time.monotonic()
+        models = []
+        with self.lock:
+            self._expire()
+            for name, entry in self.loaded.items():
+                if not entry["ready"].is_set():
+                    continue
+                ttl = None if entry["expires"] is None else max(0.0, entry["expires"] - now)
+                expires_at = (
+                    datetime.now(timezone.utc) + timedelta(seconds=ttl) if ttl is not None
+                    else datetime(2318, 1, 1, tzinfo=timezone.utc)  # 永久常駐時 Ollama 回傳遙遠的未來
+                )
+                models.append({
+                    **self._describe(name, self.models[name]),
+                    "size": entry["size"],
+                    "size_vram": entry["size_vram"],
+                    "context_length": entry["num_ctx"],
+                    "expires_at": expires_at.isoformat().replace("+00:00", "Z"),
+                })
+        return {"models": models}
+
+    def show(self, req: dict) -> dict:
+        name = req.get("model") or req.get("name")
+        size = self._model(name)
+        arch = _architecture(size)
+        return {
+            "license": "mock",
+            "modelfile": f"FROM {name}",
+            "parameters": "",
+            "template": "{{ .Prompt }}",
+            "details": self._describe(name, size)["details"],
+            "model_info": {
+                "general.architecture": "llama",
+                "general.parameter_count": int(size / 0.6),
+                "llama.context_length": 131072,
+                "llama.block_count": arch["layers"],
+                "llama.embedding_length": arch["embedding"],
+                "llama.attention.head_count": arch["heads"],
+                "llama.attention.head_count_kv": arch["kv_heads"],
+            },
+            "capabilities": _capabilities(name),
+        }
+
+    def embed(self, req: dict) -> dict:
+        name = req.get("model")
+        self._model(name)
+        inputs = req.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+        options = req.get("options") or {}
+        start = time.perf_counter()
+        self._admit()
+        try:
+            entry, load = self._acquire_model(name, int(options.get("num_ctx", DEFAULT_NUM_CTX)), req.get("keep_alive"))
+            try:
+                counts = [_count_tokens(text) for text in inputs]
+                tokens = sum(counts)
+                # 每段輸入各自是獨立的序列（注意力成本不隨批次累加）
+                compute = sum(self._prompt_seconds(n, entry) for n in counts) / max(1, min(len(inputs), EMBED_BATCH_WIDTH))
+                time.sleep(EMBED_REQUEST_OVERHEAD + compute)
+                embeddings = []
+                for text in inputs:
+                    rng = random.Random(hashlib.sha256(f"{self.seed}\x00{name}\x00{text}".encode()).digest())
+                    vector = [rng.gauss(0, 1) for _ in range(EMBED_DIM)]
+                    norm = math.sqrt(sum(v * v for v in vector))
+                    embeddings.append([round(v / norm, 6) for v in vector])
+            finally:
+                self._release_model(name, entry)
+        finally:
+            self._release()
+        return {
+            "model": name,
+            "embeddings": embeddings,
+            "total_duration": int((time.perf_counter() - start) * 1e9),
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": tokens,
+        }
+
+    def generate(self, handler: "_Handler", path: str, req: dict) -> None:
+        """/api/generate 與 /api/chat：依設定等待後以串流（NDJSON）或單一 JSON 回傳合成的回應"""
+        chat = path == "/api/chat"
+        name = req.get("model")
+        self._model(name)
+        if "completion" not in _capabilities(name):
+            raise MockError(400, f'"{name}" does not support {"chat" if chat else "generate"}')
+        options = req.get("options") or {}
+        messages = req.get("messages") or []
+        images = [image for m in messages for image in m.get("images") or []] if chat else req.get("images") or []
+        if images and "vision" not in _capabilities(name):
+            raise MockError(400, "this model is missing data required for image input")
+        # 影像在文字之前：解碼（依像素數計時）後展開為佔位字串，與文字一起計入 prompt token
+        placeholders: dict[str, str] = {}
+        decode_time = 0.0
+        for image in images:
+            width, height = _image_size(image)
+            decode_time += width * height / IMAGE_DECODE_RATE
+            placeholders[image] = _image_placeholder(image, _image_tokens(width, height))
+        if chat:
+            # 以簡化的聊天模板串接：同一段對話的下一輪會以上一輪的 prompt + 回覆開頭，可命中 KV cache
+            prompt = "".join(
+                _chat_turn(
+                    m.get("role", "user"),
+                    "".join(placeholders[image] for image in m.get("images") or []) + str(m.get("content", "")),
+                )
+                for m in messages
+            )
+        else:
+            prompt = "".join(placeholders[image] for image in images) + str(req.get("prompt") or "")
+            if req.get("system"):
+                prompt = f"{req['system']}{prompt}"
+        stream = req.get("stream", True)
+        created_at = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+        base = {"model": name, "created_at": created_at}
+
+        # 空的 prompt / messages：keep_alive 為 0 時卸載模型，否則只載入模型
+        if not prompt:
+            if req.get("keep_alive") in (0, "0", "0s", "0m"):
+                self.unload(name)
+                reason = "unload"
+            else:
+                entry, _ = self._acquire_model(name, int(options.get("num_ctx", DEFAULT_NUM_CTX)), req.get("keep_alive"))
+                self._release_model(name, entry)
+                reason = "load"
+            body = {**base, "done": True, "done_reason": reason}
+            body.update({"message": {"role": "assistant", "content": ""}} if chat else {"response": ""})
+            handler.send_json(body)
+            return
+
+        # 所有亂數依固定順序取出，結果只取決於 seed 與請求內容
+        rng = self._rng(path, name, prompt, json.dumps(options, sort_keys=True))
+        fail, oom, stream_fail = rng.random(), rng.random(), rng.random()
+        num_predict = int(options.get("num_predict", -1))
+        count = num_predict if num_predict >= 0 else self.response_tokens
+        fail_at = rng.randrange(max(1, count)) if stream_fail < self.stream_error_rate else None
+
+        start = time.perf_counter()
+        with self.lock:
+            self.stats["requests"] += 1
+        self._admit()
+        try:
+            if fail < self.error_rate:
+                raise MockError(500, "mock: injected server error")
+            if oom < self.oom_rate:
+                raise MockError(500, "llama runner process has terminated: cudaMalloc failed: out of memory")
+            num_ctx = int(options.get("num_ctx", DEFAULT_NUM_CTX))
+            entry, load = self._acquire_model(name, num_ctx, req.get("keep_alive"))
+            try:
+                total = min(_count_tokens(prompt), num_ctx)
+                # 與上一個請求相同的前綴已在 KV cache 中，只評估其後的 token（至少 1 個，同 Ollama）
+                cached = min(_count_tokens(os.path.commonprefix([prompt, entry["cache"]])), total - 1)
+                prompt_time = self._prompt_seconds(total, entry) - self._prompt_seconds(max(cached, 0), entry) + decode_time
+                time.sleep(prompt_time)
+                reply = self._emit(handler, rng, base, chat, stream, count, fail_at, self._speed(entry), {
+                    "start": start,
+                    "load": load,
+                    "prompt_tokens": total - max(cached, 0),
+                    "prompt_time": prompt_time,
+                    "done_reason": "length" if num_predict >= 0 else "stop",
+                })
+                if reply is not None:
+                    entry["cache"] = prompt + (_chat_turn("assistant", reply) if chat else reply)
+            finally:
+                self._release_model(name, entry)
+        except MockError:
+            with self.lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            self._release()
+
+    def _emit(self, handler, rng, base, chat, stream, count, fail_at, speed, timing) -> str | None:
+        """依 token_rate（溢出時降速）與 jitter 排定每個 token 的送出時間並輸出，回傳回應內容（中斷時為 None）"""
+        rate = self.token_rate * speed
+        interval = 1 / rate if rate else 0.0
+        key = "message" if chat else "response"
+        # 預先編碼 chunk 的前後綴，高 token 速度下伺服器端開銷不致成為瓶頸
+        prefix = json.dumps(base, ensure_ascii=False)[:-1].encode() + (
+            b', "message": {"role": "assistant", "content": ' if chat else b', "response": '
+        )
+        suffix = b'}, "done": false}\n' if chat else b', "done": false}\n'
+        encoded = [json.dumps(word, ensure_ascii=False).encode() for word in VOCAB]
+
+        if stream:
+            handler.start_stream()
+        pieces = []
+        eval_start = due = time.perf_counter()
+        for i in range(count):
+            if i == fail_at:
+                with self.lock:
+                    self.stats["errors"] += 1
+                if not stream:
+                    raise MockError(500, "mock: injected error during generation")
+                handler.write_chunk(json.dumps({"error": "mock: injected error during generation"}).encode() + b"\n")
+                handler.end_stream()
+                return None
+            if interval:
+                due += interval * (1 + self.jitter * (2 * rng.random() - 1))
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            word = rng.randrange(len(VOCAB))
+            if stream:
+                handler.write_chunk(prefix + encoded[word] + suffix)
+            pieces.append(VOCAB[word])
+        end = time.perf_counter()
+
+        final = {
+            **base,
+            key: {"role": "assistant", "content": "".join(pieces)} if chat else "".join(pieces),
+            "done": True,
+            "done_reason": timing["done_reason"],
+            "total_duration": int((end - timing["start"]) * 1e9),
+            "load_duration": int(timing["load"] * 1e9),
+            "prompt_eval_count": timing["prompt_tokens"],
+            "prompt_eval_duration": int(timing["prompt_time"] * 1e9),
+            "eval_count": count,
+            "eval_duration": int((end - eval_start) * 1e9),
+        }
+        with self.lock:
+            self.stats["completed"] += 1
+            self.stats["tokens"] += count
+        if stream:
+            final[key] = {"role": "assistant", "content": ""} if chat else ""
+            handler.write_chunk(json.dumps(final, ensure_ascii=False).encode() + b"\n")
+            handler.end_stream()
+        else:
+            handler.send_json(final)
+        return "".join(pieces)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    mock: MockOllama
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支援 keep-alive，與真實伺服器相同
+    server_version = "MockOllama"
+    server: _Server
+
+    def setup(self):
+        super().setup()
+        # 與 Go net/http 相同關閉 Nagle，每個 token chunk 立即送出
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        if self.server.mock.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, obj: dict, status: int = 200) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _dispatch(self, action) -> None:
+        try:
+            action()
+        except MockError as e:
+            self.send_json({"error": str(e)}, e.status)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # 客戶端中途斷線
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        mock = self.server.mock
+        routes = {
+            "/": lambda: self._send_text("Ollama is running"),
+            "/api/tags": lambda: self.send_json(mock.tags()),
+            "/api/ps": lambda: self.send_json(mock.ps()),
+            "/api/version": lambda: self.send_json({"version": "0.0.0-mock"}),
+            "/mock/stats": lambda: self.send_json(mock.snapshot()),  # 模擬伺服器專用：請求與並行統計
+        }
+        route = routes.get(self.path.split("?")[0])
+        if route is None:
+            self._dispatch(lambda: self.send_json({"error": "404 page not found"}, 404))
+        else:
+            self._dispatch(route)
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            self._dispatch(lambda: self.send_json({"error": f"invalid JSON: {e}"}, 400))
+            return
+        path = self.path.split("?")[0]
+        if path in ("/api/generate", "/api/chat"):
+            self._dispatch(lambda: mock.generate(self, path, req))
+        elif path == "/api/show":
+            self._dispatch(lambda: self.send_json(mock.show(req)))
+        elif path == "/api/embed":
+            self._dispatch(lambda: self.send_json(mock.embed(req)))
+        else:
+            self._dispatch(lambda: self.send_json({"error": "404 page not found"}, 404))
+
+    def _send_text(self, text: str) -> None:
+        body = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# ---------------------------------------------------------------------------
+# 自我測試
+# ---------------------------------------------------------------------------
+
+# 自我測試使用較快的設定，完整跑完兩個工具約需數十秒
+SELFTEST_SETTINGS = {
+    "load_delay": 0.05, "token_rate": 400, "prompt_rate": 20000, "jitter": 0.2, "response_tokens": 24,
+}
+SELFTEST_MODELS = {"mock-tiny:1b": 800_000_000, "mock-small:3b": 2_000_000_000, "mock-huge:70b": 40_000_000_000}
+SELFTEST_OOM_MODEL = "mock-huge:70b"  # 超過記憶體上限，預期每次請求都回傳 OOM
+SELFTEST_TIMEOUT = 600
+
+
+class _Checks:
+    """收集自我測試的檢查結果"""
+
+    def __init__(self):
+        self.failures: list[str] = []
+
+    def check(self, ok: bool, message: str, detail: str = "") -> bool:
+        print(f"   {'✅' if ok else '❌'} {message}", flush=True)
+        if not ok:
+            self.failures.append(message)
+            if detail:
+                print("      " + detail.strip().replace("\n", "\n      "), flush=True)
+        return ok
+
+
+def _tool_env(base_url: str) -> dict:
+    return {
+        **os.environ,
+        "OLLAMA_BASE_URL": base_url,
+        "OLLAMA_SAMPLE_INTERVAL": "0.05",
+        "OLLAMA_MEMORY_BUDGET": "16G",
+        "GREETING_TIMEOUT_SECONDS": "30",
+        "PYTHONIOENCODING": "utf-8",
+    }
+
+
+def _run_tool(script: str, args: list[str], base_url: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, str(BASE_DIR / script), *args],
+        env=_tool_env(base_url),
+        cwd=BASE_DIR,
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        timeout=SELFTEST_TIMEOUT,
+    )
+
+
+def _run_benchmark(args: list[str], base_url: str, created: list[Path]) -> tuple[subprocess.CompletedProcess, dict | None]:
+    """執行 ollama-benchmark.py 並讀取新產生的 JSON 報告"""
+    chats = BASE_DIR / "chats"
+    before = set(chats.glob("benchmark_2*"))
+    # 自我測試的執行目錄結束後即刪除，不收錄至歷史索引
+    proc = _run_tool("ollama-benchmark.py", ["--auto", "--no-history", *args], base_url)
+    new = sorted(set(chats.glob("benchmark_2*")) - before)
+    created.extend(new)
+    report_file = new[-1] / "benchmark_report.json" if new else None
+    if report_file and report_file.exists():
+        with open(report_file, encoding="utf-8") as f:
+            return proc, json.load(f)
+    return proc, None
+
+
+def _load_benchmark():
+    """以模組形式載入 ollama-benchmark.py（檔名含連字號，無法直接 import），供同一行程內直接呼叫其函式"""
+    spec = importlib.util.spec_from_file_location("ollama_benchmark", BASE_DIR / "ollama-benchmark.py")
+    benchmark = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(benchmark)
+    return benchmark
+
+
+def _tail(proc: subprocess.CompletedProcess) -> str:
+    return "\n".join((proc.stdout + proc.stderr).strip().splitlines()[-15:])
+
+
+def _check_trace(checks: "_Checks", path: Path | None, models: list[str], label: str) -> None:
+    """檢查 --trace 的追蹤檔：完整的 JSON、每個請求的客戶端階段，以及落在請求區段內的伺服器端階段"""
+    try:
+        events = json.loads(path.read_text(encoding="utf-8"))["traceEvents"] if path else None
+    except (OSError, ValueError, KeyError) as e:
+        checks.check(False, f"{label}：追蹤檔為完整的 JSON", str(e))
+        return
+    if not checks.check(events is not None, f"{label}：寫出追蹤檔"):
+        return
+    spans = [e for e in events if e["ph"] == "X"]
+    names = {e["name"] for e in spans}
+    requests_by_model: dict[str, list[dict]] = {}
+    for e in spans:
+        if e["cat"] == "request":
+            requests_by_model.setdefault(e["args"]["model"], []).append(e)
+    checks.check(set(requests_by_model) >= set(models), f"{label}：每個模型都有請求區段（{len(requests_by_model)} 個模型）")
+    checks.check(
+        {"等待回應標頭", "等待首個 token", "串流解碼"} <= names and any(e["cat"] == "net" for e in spans),
+        f"{label}：包含連線建立與客戶端各階段",
+    )
+    checks.check("GET /api/ps" in names, f"{label}：包含 /api/ps 輔助請求")
+    for m in [m for m in models if m != SELFTEST_OOM_MODEL]:
+        server = [e for e in spans if e["name"] == f"伺服器 {m}"]
+        inside = all(
+            any(r["ts"] - 1e3 <= s["ts"] and s["ts"] + s["dur"] <= r["ts"] + r["dur"] + 1e3 for r in requests_by_model.get(m, []))
+            for s in server
+        )
+        checks.check(
+            bool(server) and all(s["pid"] != 1 for s in server) and inside,
+            f"{label}：{m} 的伺服器端區段（{len(server)} 個）落在對應請求內",
+        )
+    huge = requests_by_model.get(SELFTEST_OOM_MODEL, [])
+    checks.check(
+        bool(huge) and all("error" in r.get("args", {}) for r in huge), f"{label}：{SELFTEST_OOM_MODEL} 的請求區段記錄錯誤"
+    )
+
+
+def selftest(keep_reports: bool = False) -> int:
+    """以模擬伺服器端到端執行 ollama-benchmark.py 與 hi-ai.py，回傳結束碼（0 為全部通過）"""
+    checks = _Checks()
+    created: list[Path] = []
+    ok_models = [m for m in SELFTEST_MODELS if m != SELFTEST_OOM_MODEL]
+    try:
+        print("🧪 情境 1：ollama-benchmark.py 一般評測（重複量測、並行、載入剖析、記憶體排程、OOM 模型）", flush=True)
+        mock = MockOllama(SELFTEST_MODELS, num_parallel=2, **SELFTEST_SETTINGS)
+        base_url = mock.start()
+        try:
+            proc, report = _run_benchmark(
+                ["--repeat", "2", "--concurrency", "2", "--load-requests", "4",
+                 "--profile-load", "--load-cycles", "2", "--memory-aware"],
+                base_url, created,
+            )
+        finally:
+            mock.stop()
+        checks.check(proc.returncode == 0, f"結束碼為 0（實際 {proc.returncode}）", _tail(proc))
+        if checks.check(report is not None, "產生 JSON 報告", _tail(proc)):
+            models = report["models"]
+            checks.check(set(models) == set(SELFTEST_MODELS), f"報告包含所有模型：{', '.join(sorted(models))}")
+            for m in ok_models:
+                results = models.get(m, {}).get("benchmark", [])
+                checks.check(
+                    bool(results) and all(r.get("success") for r in results),
+                    f"{m}：{sum(1 for r in results if r.get('success'))}/{len(results)} 項測試成功",
+                )
+                checks.check(
+                    all(r.get("eval_tps") and r.get("ttft") is not None for r in results),
+                    f"{m}：每項結果都有伺服器端 tokens/秒 與 TTFT",
+                )
+                checks.check("load_test" in models.get(m, {}), f"{m}：包含並行負載測試結果")
+                checks.check("load_profile" in models.get(m, {}), f"{m}：包含載入剖析結果")
+            huge = models.get(SELFTEST_OOM_MODEL, {}).get("benchmark", [])
+            checks.check(
+                bool(huge) and all(not r.get("success") and ollama_client.is_oom_error(r.get("error", "")) for r in huge),
+                f"{SELFTEST_OOM_MODEL}：超過記憶體上限的模型記錄為 OOM 失敗",
+            )
+        stats = mock.snapshot()
+        checks.check(
+            stats["peak_active"] <= mock.num_parallel,
+            f"同時執行的請求數未超過並行上限（峰值 {stats['peak_active']} / {mock.num_parallel}）",
+        )
+
+        print("\n🧪 情境 2：hi-ai.py --auto 打招呼", flush=True)
+        mock = MockOllama(SELFTEST_MODELS, **SELFTEST_SETTINGS)
+        base_url = mock.start()
+        try:
+            proc = _run_tool("hi-ai.py", ["--auto"], base_url)
+        finally:
+            mock.stop()
+        checks.check(proc.returncode == 0, f"結束碼為 0（實際 {proc.returncode}）", _tail(proc))
+        checks.check("所有模型測試完成" in proc.stdout, "完成所有模型", _tail(proc))
+        for m in ok_models:
+            checks.check(f"{m}：" in proc.stdout, f"{m}：收到打招呼回覆", _tail(proc))
+        checks.check("記憶體不足 (OOM)" in proc.stdout, f"{SELFTEST_OOM_MODEL}：顯示 OOM 訊息", _tail(proc))
+
+        print("\n🧪 情境 3：錯誤注入與並行上限（num_parallel=1，錯誤率 25%、串流中斷 10%）", flush=True)
+        mock = MockOllama(
+            {"mock-tiny:1b": 800_000_000}, num_parallel=1, error_rate=0.25, stream_error_rate=0.1,
+            seed=7, **SELFTEST_SETTINGS,
+        )
+        base_url = mock.start()
+        try:
+            proc, report = _run_benchmark(["--repeat", "3", "--concurrency", "4"], base_url, created)
+        finally:
+            mock.stop()
+        checks.check(proc.returncode == 0, f"注入錯誤時評測仍正常結束（結束碼 {proc.returncode}）", _tail(proc))
+        if checks.check(report is not None, "產生 JSON 報告", _tail(proc)):
+            entry = report["models"].get("mock-tiny:1b", {})
+            runs = [run for r in entry.get("benchmark", []) for run in r.get("runs") or [r]]
+            failed = [run for run in runs if not run.get("success")]
+            checks.check(bool(failed), f"注入的錯誤被記錄為失敗（{len(failed)}/{len(runs)} 次量測）")
+            checks.check(len(failed) < len(runs), "其餘量測成功")
+            levels = entry.get("load_test", [])
+            checks.check(
+                bool(levels) and any(level.get("failed") for level in levels),
+                "並行負載測試記錄失敗請求",
+            )
+        stats = mock.snapshot()
+        checks.check(stats["peak_active"] == 1, f"同時只執行 1 個請求（峰值 {stats['peak_active']}）")
+        checks.check(stats["peak_queued"] >= 1, f"超過並行上限的請求排隊等待（佇列峰值 {stats['peak_queued']}）")
+
+        print("\n🧪 情境 4：相同 seed 的結果可重現", flush=True)
+        outcomes = []
+        for _ in range(2):
+            mock = MockOllama(SELFTEST_MODELS, error_rate=0.3, seed=42, **SELFTEST_SETTINGS)
+            base_url = mock.start()
+            try:
+                outcome = []
+                for i in range(6):
+                    resp = ollama_client.post(
+                        base_url, "/api/generate",
+                        json={"model": "mock-tiny:1b", "prompt": f"重現測試 {i % 3}", "stream": False},
+                        timeout=30,
+                    )
+                    body = resp.json()
+                    outcome.append((resp.status_code, body.get("response"), body.get("error")))
+                outcomes.append(outcome)
+            finally:
+                mock.stop()
+        statuses = [status for status, _, _ in outcomes[0]]
+        checks.check(outcomes[0] == outcomes[1], f"兩次執行的回應與錯誤完全相同（狀態碼 {statuses}）")
+
+        print("\n🧪 情境 5：歷史索引與回歸偵測（生成速度 400 → 200 → 200 tokens/秒）", flush=True)
+        run_dirs = []
+        port = _free_port()  # 歷史比較以 (伺服器, 模型) 為單位，三次執行需使用同一個位址
+        for rate in (400, 200, 200):
+            mock = MockOllama({"mock-tiny:1b": 800_000_000}, **{**SELFTEST_SETTINGS, "token_rate": rate})
+            base_url = mock.start(port=port)
+            try:
+                proc, report = _run_benchmark(["--repeat", "2"], base_url, created)
+            finally:
+                mock.stop()
+            if checks.check(report is not None, f"{rate} tokens/秒的評測產生報告", _tail(proc)):
+                run_dirs.append(created[-1])
+        if len(run_dirs) == 3:
+            with tempfile.TemporaryDirectory() as tmp, benchmark_history.HistoryStore(Path(tmp) / "history.sqlite3") as store:
+                checks.check(sum(store.ingest(d) for d in run_dirs) == 3, "三次執行都收錄至歷史索引")
+                checks.check(not store.ingest(run_dirs[0]), "報告未變更時不重複收錄")
+                slower = benchmark_history.compare_runs(store, target=run_dirs[1].name, base=run_dirs[0].name)
+                flagged = {row["metric"] for _, row in benchmark_history.regressions(slower)}
+                checks.check("eval_tps" in flagged, f"生成速度減半被判定為回歸（回歸指標：{', '.join(sorted(flagged)) or '無'}）")
+                # 量級差很多的三個測試項目都慢了 10%：合併成一組排名時會被量級差異淹沒，分層檢定應判定顯著
+                strata = [([s, s * 1.01], [s * 0.9, s * 0.91]) for s in (10, 100, 1000)]
+                _, p_value = benchmark_history.stratified_mann_whitney(strata)
+                checks.check(p_value < 0.05, f"依測試項目分層比較，不同量級的 prompt 不混在一起（p={p_value:.4f}）")
+                same = benchmark_history.compare_runs(store, target=run_dirs[2].name)
+                flagged = {row["metric"] for _, row in benchmark_history.regressions(same)}
+                checks.check(
+                    bool(same) and same[0]["base"]["run"] == run_dirs[1].name and "eval_tps" not in flagged,
+                    "相同速度的兩次執行不判定生成速度回歸（預設以前次執行為基準）",
+                )
+                trend_file = Path(tmp) / "trend.html"
+                with open(trend_file, "w", encoding="utf-8") as f:
+                    benchmark_history.write_trend_html(
+                        f, benchmark_history.trend(store), same, chartjs=benchmark_history.chartjs_tag(None)
+                    )
+                checks.check("mock-tiny:1b" in trend_file.read_text(encoding="utf-8"), "產生趨勢儀表板")
+
+        print("\n🧪 情境 6：常駐監控與 /metrics（--daemon）", flush=True)
+        mock = MockOllama(SELFTEST_MODELS, **SELFTEST_SETTINGS)
+        base_url = mock.start()
+        metrics_port = _free_port()
+        daemon = subprocess.Popen(
+            [sys.executable, str(BASE_DIR / "ollama-benchmark.py"), "--daemon", "--daemon-interval", "0.5",
+             "--metrics-listen", f"127.0.0.1:{metrics_port}"],
+            env=_tool_env(base_url), cwd=BASE_DIR, stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8",
+        )
+        metrics_url = f"http://127.0.0.1:{metrics_port}/metrics"
+        server = base_url.split("//", 1)[1]  # 指標的 server 標籤為 host:port
+        text, content_type = "", ""
+        try:
+            deadline = time.monotonic() + 30
+            # 等到至少完成兩輪探測（第二輪起模型已常駐）
+            while time.monotonic() < deadline and daemon.poll() is None:
+                try:
+                    resp = requests.get(
+                        metrics_url, headers={"Accept": "application/openmetrics-text; version=1.0.0"}, timeout=5
+                    )
+                    text, content_type = resp.text, resp.headers.get("Content-Type", "")
+                    if "ollama_probe_cycles_total 2" in text:
+                        break
+                except requests.RequestException:
+                    pass
+                time.sleep(0.2)
+            try:
+                plain = requests.get(metrics_url, timeout=5)
+            except requests.RequestException:
+                plain = None
+            daemon.send_signal(signal.SIGTERM)
+            output, _ = daemon.communicate(timeout=30)
+        finally:
+            if daemon.poll() is None:
+                daemon.kill()
+                daemon.wait()
+            mock.stop()
+        checks.check("ollama_probe_cycles_total 2" in text, "完成兩輪探測", output if daemon.returncode else text[-800:])
+        checks.check(
+            content_type.startswith("application/openmetrics-text") and text.endswith("# EOF\n"),
+            "要求 OpenMetrics 時回傳 OpenMetrics 格式（以 # EOF 結尾）",
+        )
+        checks.check(
+            plain is not None and plain.headers.get("Content-Type", "").startswith("text/plain")
+            and "# TYPE ollama_probe_requests_total counter" in plain.text,
+            "未要求時回傳 Prometheus 文字格式",
+        )
+        for m in ok_models:
+            labels = f'model="{m}",server="{server}"'
+            checks.check(
+                f"ollama_probe_latency_seconds_count{{{labels}}}" in text and f"ollama_probe_eval_tokens_per_second{{{labels}}}" in text,
+                f"{m}：延遲 histogram 與生成速度",
+            )
+        oom_labels = f'model="{SELFTEST_OOM_MODEL}",server="{server}"'
+        checks.check(f"ollama_probe_oom_total{{{oom_labels}}} 2" in text, f"{SELFTEST_OOM_MODEL}：每次探測都計入 OOM")
+        checks.check(
+            any(line.startswith("ollama_model_vram_bytes") and not line.endswith(" 0") for line in text.splitlines()),
+            "記錄已載入模型的 VRAM 佔用",
+        )
+        checks.check(daemon.returncode == 0 and "常駐監控已停止" in output, f"收到 SIGTERM 後正常結束（結束碼 {daemon.returncode}）", output[-800:])
+
+        print("\n🧪 情境 7：hi-ai.py --parallel 平行打招呼", flush=True)
+        mock = MockOllama(SELFTEST_MODELS, num_parallel=4, **SELFTEST_SETTINGS)
+        base_url = mock.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                proc = _run_tool("hi-ai.py", ["--parallel", "3", "--summary", str(Path(tmp) / "sweep")], base_url)
+            finally:
+                mock.stop()
+            checks.check(proc.returncode == 0, f"結束碼為 0（實際 {proc.returncode}）", _tail(proc))
+            summary_file = Path(tmp) / "sweep.json"
+            if checks.check(summary_file.exists() and (Path(tmp) / "sweep.csv").exists(), "寫出 JSON 與 CSV 摘要", _tail(proc)):
+                records = {r["model"]: r for r in json.loads(summary_file.read_text(encoding="utf-8"))["models"]}
+                checks.check(set(records) == set(SELFTEST_MODELS), f"摘要包含所有模型：{', '.join(sorted(records))}")
+                for m in ok_models:
+                    r = records.get(m, {})
+                    checks.check(
+                        r.get("status") == "ok" and r.get("ttft") is not None and r.get("load_time") is not None,
+                        f"{m}：成功並記錄 TTFT 與載入時間（{r.get('status')}）",
+                    )
+                checks.check(
+                    records.get(SELFTEST_OOM_MODEL, {}).get("status") == "oom", f"{SELFTEST_OOM_MODEL}：記錄為 OOM"
+                )
+        stats = mock.snapshot()
+        checks.check(stats["peak_active"] >= 2, f"多個模型同時打招呼（峰值 {stats['peak_active']}）")
+
+        print("\n🧪 情境 8：hi-ai.py --replay 多輪對話與 KV cache", flush=True)
+        mock = MockOllama(SELFTEST_MODELS, **SELFTEST_SETTINGS)
+        base_url = mock.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                proc = _run_tool("hi-ai.py", ["--replay", "--keep-alive", "10m", "--summary", str(Path(tmp) / "replay")], base_url)
+            finally:
+                mock.stop()
+            checks.check(proc.returncode == 0, f"結束碼為 0（實際 {proc.returncode}）", _tail(proc))
+            summary_file = Path(tmp) / "replay.json"
+            if checks.check(summary_file.exists() and (Path(tmp) / "replay.csv").exists(), "寫出 JSON 與 CSV 摘要", _tail(proc)):
+                rows = json.loads(summary_file.read_text(encoding="utf-8"))["models"]
+                for m in ok_models:
+                    turns = [r for r in rows if r["model"] == m and r["status"] == "ok"]
+                    checks.check(
+                        [r["messages"] for r in turns] == [2 * i + 2 for i in range(len(turns))] and len(turns) >= 3,
+                        f"{m}：{len(turns)} 輪對話，每輪送出完整歷史",
+                    )
+                    later = turns[1:]
+                    checks.check(
+                        bool(later) and all(r["prompt_eval_count"] < r["context_tokens"] / 2 and r["saved_ms"] > 0 for r in later),
+                        f"{m}：第 2 輪起命中 KV cache，只評估新增的 token 並省下評估時間",
+                    )
+                huge = [r for r in rows if r["model"] == SELFTEST_OOM_MODEL]
+                checks.check(bool(huge) and huge[0]["status"] == "oom", f"{SELFTEST_OOM_MODEL}：記錄為 OOM")
+
+        print("\n🧪 情境 9：ollama-benchmark.py --replay-log 開放迴路重播（num_parallel=1、佇列上限 3）", flush=True)
+        mock = MockOllama(SELFTEST_MODELS, num_parallel=1, max_queue=3, **SELFTEST_SETTINGS)
+        base_url = mock.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            # 0.5 秒內湧入 12 個請求（遠超過單一處理槽的服務速度），之後每 0.4 秒一個；時間以 2 倍速重播
+            log = Path(tmp) / "captured.jsonl"
+            with open(log, "w", encoding="utf-8") as f:
+                offsets = [i * 0.04 for i in range(12)] + [1.0 + i * 0.4 for i in range(4)]
+                for i, offset in enumerate(offsets):
+                    request = {"timestamp": 1_700_000_000 + offset, "model": "mock-tiny:1b", "options": {"num_predict": 16}}
+                    if i % 2:
+                        request["messages"] = [{"role": "user", "content": f"重播 {i}"}]
+                    else:
+                        request["prompt"] = f"重播 {i}"
+                    f.write(json.dumps(request, ensure_ascii=False) + "\n")
+                f.write(json.dumps({"timestamp": "2023-11-14T22:13:23Z", "model": SELFTEST_OOM_MODEL, "prompt": "OOM"}) + "\n")
+            chats = BASE_DIR / "chats"
+            before = set(chats.glob("replay_2*"))
+            try:
+                proc = _run_tool("ollama-benchmark.py", ["--replay-log", str(log), "--time-scale", "2"], base_url)
+            finally:
+                mock.stop()
+            new = sorted(set(chats.glob("replay_2*")) - before)
+            created.extend(new)
+        checks.check(proc.returncode == 0, f"結束碼為 0（實際 {proc.returncode}）", _tail(proc))
+        report_file = new[-1] / "replay_report.json" if new else None
+        if checks.check(bool(report_file) and report_file.exists(), "產生 replay_report.json", _tail(proc)):
+            report = json.loads(report_file.read_text(encoding="utf-8"))
+            overall = report["overall"]
+            checks.check(overall["requests"] == len(offsets) + 1, f"送出所有請求（{overall['requests']} 個）")
+            checks.check(
+                report["dispatch_lag"]["p99"] < 0.1,
+                f"開放迴路：請求依排定時間送出，不等待先前的回應（送出延遲 p99 {report['dispatch_lag']['p99']}s）",
+            )
+            tiny = report["models"].get("mock-tiny:1b", {})
+            checks.check(tiny.get("rejected", 0) >= 1, f"佇列滿時的 503 記錄為 rejected（{tiny.get('rejected')} 個）")
+            checks.check(tiny.get("ok", 0) >= len(offsets) // 2, f"其餘請求成功（{tiny.get('ok')} 個）")
+            queue_p90 = (tiny.get("queue_delay") or {}).get("p90") or 0
+            checks.check(queue_p90 > 0.05, f"湧入時排隊延遲增加（p90 {queue_p90}s）")
+            checks.check(report["models"].get(SELFTEST_OOM_MODEL, {}).get("oom") == 1, f"{SELFTEST_OOM_MODEL}：記錄為 OOM")
+
+        print("\n🧪 情境 10：ollama-benchmark.py --capacity SLO 容量搜尋（num_parallel=1）", flush=True)
+        mock = MockOllama(
+            {"mock-tiny:1b": SELFTEST_MODELS["mock-tiny:1b"], SELFTEST_OOM_MODEL: SELFTEST_MODELS[SELFTEST_OOM_MODEL]},
+            num_parallel=1, **SELFTEST_SETTINGS,
+        )
+        base_url = mock.start()
+        try:
+            proc, report = _run_benchmark(
+                ["--capacity", "--slo", "ttft_p95=1,error_rate=0.1", "--capacity-window", "2",
+                 "--capacity-rate", "1", "--capacity-max-rate", "32"],
+                base_url, created,
+            )
+        finally:
+            mock.stop()
+        checks.check(proc.returncode == 0, f"結束碼為 0（實際 {proc.returncode}）", _tail(proc))
+        if checks.check(report is not None, "產生 JSON 報告", _tail(proc)):
+            cap = report["models"].get("mock-tiny:1b", {}).get("capacity") or {}
+            steps = cap.get("steps") or []
+            rate, breach = cap.get("sustainable_rate") or 0, cap.get("breach_rate")
+            checks.check(
+                rate > 0 and breach is not None and rate < breach,
+                f"mock-tiny:1b：找到可持續的到達率 {rate} req/s（{breach} req/s 未達標，{len(steps)} 步）",
+            )
+            checks.check(
+                any(s["rate"] == rate and s["passed"] for s in steps) and any(s["rate"] == breach and not s["passed"] for s in steps),
+                "可持續的到達率達標、其上的到達率違反 SLO",
+            )
+            checks.check(
+                cap.get("limit") != "slo" or breach - rate <= 0.1 * breach + 1e-9,
+                f"二分搜尋收斂至 10% 以內（停止原因 {cap.get('limit')}）",
+            )
+            huge = report["models"].get(SELFTEST_OOM_MODEL, {}).get("capacity") or {}
+            checks.check(huge.get("oom") is True, f"{SELFTEST_OOM_MODEL}：容量搜尋記錄為 OOM")
+            html_file = created[-1] / "benchmark_report.html" if created else None
+            checks.check(
+                bool(html_file) and "chartCapacity" in html_file.read_text(encoding="utf-8"), "HTML 報告包含容量搜尋圖表"
+            )
+
+        print("\n🧪 情境 11：--trace 請求階段追蹤（ollama-benchmark.py 與 hi-ai.py）", flush=True)
+        mock = MockOllama(SELFTEST_MODELS, **SELFTEST_SETTINGS)
+        base_url = mock.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                proc, report = _run_benchmark(["--trace"], base_url, created)
+                hi_proc = _run_tool("hi-ai.py", ["--auto", "--trace", str(Path(tmp) / "hi_ai_trace.json")], base_url)
+            finally:
+                mock.stop()
+            checks.check(proc.returncode == 0, f"ollama-benchmark.py 結束碼為 0（實際 {proc.returncode}）", _tail(proc))
+            trace_file = created[-1] / "benchmark_trace.json" if report is not None else None
+            _check_trace(checks, trace_file, list(SELFTEST_MODELS), "ollama-benchmark.py")
+            if trace_file:
+                events = json.loads(trace_file.read_text(encoding="utf-8"))["traceEvents"]
+                checks.check(
+                    all(any(e.get("cat") == "benchmark" and e["name"] == f"模型 {m}" for e in events) for m in SELFTEST_MODELS),
+                    "ollama-benchmark.py：每個模型都有評測區段",
+                )
+            checks.check(hi_proc.returncode == 0, f"hi-ai.py 結束碼為 0（實際 {hi_proc.returncode}）", _tail(hi_proc))
+            _check_trace(checks, Path(tmp) / "hi_ai_trace.json", list(SELFTEST_MODELS), "hi-ai.py")
+
+        print("\n🧪 情境 12：ollama-benchmark.py --embed 批次大小掃描", flush=True)
+        embed_models = {
+            "mock-tiny:1b": SELFTEST_MODELS["mock-tiny:1b"], "mock-embed:335m": 700_000_000,
+            "mock-embed-huge:70b": 40_000_000_000,
+        }
+        mock = MockOllama(embed_models, num_parallel=2, **SELFTEST_SETTINGS)
+        base_url = mock.start()
+        try:
+            proc, report = _run_benchmark(
+                ["--embed", "1,8,32", "--embed-inputs", "64", "--embed-concurrency", "2"], base_url, created
+            )
+        finally:
+            mock.stop()
+        checks.check(proc.returncode == 0, f"結束碼為 0（實際 {proc.returncode}）", _tail(proc))
+        if checks.check(report is not None, "產生 JSON 報告", _tail(proc)):
+            models = report["models"]
+            emb = models.get("mock-embed:335m", {})
+            batches = (emb.get("embedding") or {}).get("batches") or []
+            checks.check(not emb.get("benchmark"), "mock-embed:335m：只支援 embedding 的模型略過生成測試")
+            checks.check(
+                [b["batch_size"] for b in batches] == [1, 8, 32]
+                and all(not b["failed"] and b["embeddings_per_sec"] > 0 and b["tokens_per_sec"] > 0 for b in batches),
+                f"mock-embed:335m：每個批次大小都成功並記錄 embeddings/秒與 tokens/秒（{len(batches)} 個）",
+            )
+            best = (emb.get("embedding") or {}).get("best_batch_size")
+            checks.check(
+                best is not None and best > 1 and emb["embedding"].get("dimensions") == EMBED_DIM,
+                f"mock-embed:335m：批次攤提請求開銷，最佳批次大小 {best}、{emb.get('embedding', {}).get('dimensions')} 維",
+            )
+            tiny = models.get("mock-tiny:1b", {})
+            checks.check(
+                (tiny.get("embedding") or {}).get("skipped") and bool(tiny.get("benchmark")),
+                "mock-tiny:1b：不支援 embedding 的模型略過 embedding 評測、照常執行生成測試",
+            )
+            checks.check(
+                (models.get("mock-embed-huge:70b", {}).get("embedding") or {}).get("oom") is True,
+                "mock-embed-huge:70b：超過記憶體上限的嵌入模型記錄為 OOM",
+            )
+            html_file = created[-1] / "benchmark_report.html" if created else None
+            checks.check(
+                bool(html_file) and "chartEmbedThroughput" in html_file.read_text(encoding="utf-8"), "HTML 報告包含 embedding 圖表"
+            )
+
+        print("\n🧪 情境 13：ollama-benchmark.py --vision 解析度掃描", flush=True)
+        vision_models = {
+            "mock-tiny:1b": SELFTEST_MODELS["mock-tiny:1b"], "mock-vision:7b": 4_500_000_000,
+            "mock-llava:7b": 4_500_000_000, "mock-llava-huge:70b": 40_000_000_000,
+        }
+        resolutions = [(224, 224), (448, 448), (896, 672)]
+        mock = MockOllama(vision_models, **SELFTEST_SETTINGS)
+        base_url = mock.start()
+        try:
+            proc, report = _run_benchmark(
+                ["--vision", ",".join(f"{w}x{h}" for w, h in resolutions), "--vision-repeat", "2"], base_url, created
+            )
+            tiny_png = base64.b64encode(
+                b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\x0dIHDR" + (8).to_bytes(4, "big") * 2 + bytes(5)
+            ).decode()
+            rejected = requests.post(
+                f"{base_url}/api/generate",
+                json={"model": "mock-tiny:1b", "prompt": "hi", "images": [tiny_png], "stream": False}, timeout=10,
+            )
+        finally:
+            mock.stop()
+        checks.check(proc.returncode == 0, f"結束碼為 0（實際 {proc.returncode}）", _tail(proc))
+        checks.check(rejected.status_code == 400, f"模擬伺服器拒絕對不具 vision 能力的模型附圖（HTTP {rejected.status_code}）")
+        if checks.check(report is not None, "產生 JSON 報告", _tail(proc)):
+            models = report["models"]
+            encodes = {}
+            for name in ("mock-vision:7b", "mock-llava:7b"):
+                vis = models.get(name, {}).get("vision") or {}
+                steps = vis.get("resolutions") or []
+                ok = [r for r in steps if r.get("status") == "ok"]
+                checks.check(
+                    [(r["width"], r["height"]) for r in ok] == resolutions,
+                    f"{name}：每個解析度都成功（{len(ok)}/{len(resolutions)}）",
+                )
+                expected = [_image_tokens(w, h) for w, h in resolutions]
+                checks.check(
+                    [r["image_tokens"] for r in ok] == expected,
+                    f"{name}：影像 tokens 依解析度增加（{[r['image_tokens'] for r in ok]}，預期 {expected}）",
+                )
+                checks.check(
+                    len(ok) == len(resolutions)
+                    and all(a["image_time"] < b["image_time"] and a["ttft"] < b["ttft"] for a, b in zip(ok, ok[1:]))
+                    and all(r["eval_tps"] and r["prompt_eval_time"] > r["image_time"] for r in ok),
+                    f"{name}：影像處理時間與 TTFT 隨解析度增加，並記錄 prompt 評估時間與生成速度",
+                )
+                encodes[name] = [r["encode_ms"] for r in ok]
+            checks.check(
+                bool(encodes["mock-vision:7b"]) and encodes["mock-vision:7b"] == encodes["mock-llava:7b"],
+                "每個解析度只編碼一次：兩個模型沿用相同的快取（編碼時間完全相同）",
+            )
+            tiny = models.get("mock-tiny:1b", {})
+            checks.check(
+                (tiny.get("vision") or {}).get("skipped") and bool(tiny.get("benchmark")),
+                "mock-tiny:1b：不具 vision 能力的模型略過 vision 評測、照常執行生成測試",
+            )
+            checks.check(
+                (models.get("mock-llava-huge:70b", {}).get("vision") or {}).get("oom") is True,
+                "mock-llava-huge:70b：記錄為 OOM",
+            )
+            html_file = created[-1] / "benchmark_report.html" if created else None
+            checks.check(
+                bool(html_file) and "chartVisionTtft" in html_file.read_text(encoding="utf-8"), "HTML 報告包含 vision 圖表"
+            )
+
+        print("\n🧪 情境 14：開放迴路請求不重試（容量搜尋，num_parallel=1、max_queue=1）", flush=True)
+        # 在同一行程呼叫 capacity_search()，伺服器端的請求數可以直接與排定的到達數比較
+        benchmark = _load_benchmark()
+        # 每個請求約 0.6 秒，第一步（2 req/s）起就會讓佇列滿載而回傳 503
+        mock = MockOllama(
+            {"mock-tiny:1b": SELFTEST_MODELS["mock-tiny:1b"]}, num_parallel=1, max_queue=1,
+            **{**SELFTEST_SETTINGS, "token_rate": 40},
+        )
+        base_url = mock.start()
+        try:
+            cap = benchmark.capacity_search(
+                "mock-tiny:1b", {"error_rate": 0.95}, window=2, start_rate=2, max_rate=8, base_url=base_url
+            )
+            stats = mock.snapshot()
+        finally:
+            mock.stop()
+        steps = cap.get("steps") or []
+        sent = sum(s["requests"] - s["dropped"] for s in steps)
+        rejected = sum(s["rejected"] for s in steps)
+        # 載入模型的 1 個請求 + 每個實際送出的到達各 1 個請求；重試會讓伺服器收到更多請求
+        checks.check(
+            bool(steps) and stats["requests"] == sent + 1,
+            f"伺服器收到的生成請求數等於到達數（{stats['requests'] - 1} / {sent}，{len(steps)} 步）",
+        )
+        checks.check(
+            stats["rejected"] > 0 and rejected == stats["rejected"],
+            f"503 拒絕全數記錄為 rejected（客戶端 {rejected} / 伺服器 {stats['rejected']}）",
+        )
+        checks.check(
+            all(s["error_rate"] >= round(s["rejected"] / s["requests"], 4) for s in steps if s["requests"]),
+            "每一步的錯誤率包含被拒絕的請求",
+        )
+
+        print("\n🧪 情境 15：起始到達率就未達標時，容量搜尋停在最低到達率", flush=True)
+        mock = MockOllama({"mock-tiny:1b": SELFTEST_MODELS["mock-tiny:1b"]}, num_parallel=1, **SELFTEST_SETTINGS)
+        base_url = mock.start()
+        try:
+            # 不可能達成的 TTFT 門檻：每一步都未達標，只會一路往下二分
+            cap = benchmark.capacity_search(
+                "mock-tiny:1b", {"ttft_p95": 0.00001}, window=1, start_rate=8, max_rate=64, base_url=base_url
+            )
+        finally:
+            mock.stop()
+        rates = [s["rate"] for s in cap.get("steps") or []]
+        checks.check(
+            cap.get("limit") == "below_min_rate" and cap.get("sustainable_rate") == 0,
+            f"停止原因為 below_min_rate（{cap.get('limit')}）",
+        )
+        checks.check(
+            rates == [8, 4, 2, 1] and cap.get("min_rate") == 1,
+            f"往下搜尋到起始到達率的 1/8 即停止（{rates}）",
+        )
+    finally:
+        ollama_client.close_all()
+        if keep_reports:
+            for run_dir in created:
+                print(f"📁 保留報告：{run_dir}", flush=True)
+        else:
+            for run_dir in created:
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+    print(flush=True)
+    if checks.failures:
+        print(f"❌ 自我測試失敗 {len(checks.failures)} 項", flush=True)
+        return 1
+    print("✅ 自我測試全部通過", flush=True)
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Harness 開銷量測
+# ---------------------------------------------------------------------------
+
+HARNESS_RATES = [1_000, 10_000, 100_000, 0]  # 伺服器 token 速度（0 為不限速）
+HARNESS_REPEAT = 3
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_subprocess(rate: float, tokens: int) -> tuple[subprocess.Popen, str]:
+    """以獨立行程啟動模擬伺服器，讓客戶端量得的 CPU 時間不包含伺服器"""
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "--port", str(port), "--token-rate", str(rate),
+         "--load-delay", "0", "--prompt-rate", "0", "--jitter", "0", "--response-tokens", str(tokens)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            ollama_client.version(base_url, timeout=1)
+            return proc, base_url
+        except requests.RequestException:
+            if time.monotonic() > deadline or proc.poll() is not None:
+                proc.kill()
+                raise RuntimeError("模擬伺服器無法啟動") from None
+            time.sleep(0.05)
+
+
+def _pad(text: str, width: int) -> str:
+    """靠右對齊（全形字元以兩格計算）"""
+    shown = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+    return " " * max(0, width - shown) + text
+
+
+def bench_harness(tokens: int = 2000) -> int:
+    """量測 ollama_generate() 在高 token 速度下的客戶端開銷：每個 token 的 CPU 時間、
+    客戶端量得的解碼速度與伺服器端速度的差距，並比較開啟資源取樣器時的額外成本。"""
+    benchmark = _load_benchmark()
+    model = next(iter(DEFAULT_MODELS))
+
+    print(f"🔬 Harness 開銷：每次生成 {tokens} tokens，各量測 {HARNESS_REPEAT} 次取中位數\n", flush=True)
+    columns = [("伺服器速度", 10), ("取樣器", 6), ("伺服器 tok/s", 12), ("客戶端 tok/s", 12),
+               ("差距", 7), ("CPU/token", 10), ("額外延遲", 9)]
+    print("  ".join(_pad(name, width) for name, width in columns), flush=True)
+    print("-" * (sum(width for _, width in columns) + 2 * (len(columns) - 1)), flush=True)
+    summary: dict[float, tuple[float, float]] = {}  # 伺服器速度 → (客戶端 tok/s, CPU/token)，不含取樣器
+    for rate in HARNESS_RATES:
+        proc, base_url = _start_subprocess(rate, tokens)
+        try:
+            benchmark.ollama_generate(model, "warmup", base_url=base_url)  # 載入模型並建立 keep-alive 連線
+            for interval in (0, 0.1):
+                rows = []
+                for _ in range(HARNESS_REPEAT):
+                    sampler = resource_monitor.ResourceSampler(base_url, model, interval) if interval else None
+                    # 伺服器在另一個行程，process_time() 只包含客戶端（含取樣器執行緒）的 CPU 時間
+                    cpu = time.process_time()
+                    result = benchmark.ollama_generate(model, "harness", base_url=base_url, sampler=sampler)
+                    cpu = time.process_time() - cpu
+                    rows.append((result["eval_tps"], result["decode_tps"], cpu / result["eval_count"], result["overhead"]))
+                server_tps, client_tps, cpu_token, overhead = (statistics.median(col) for col in zip(*rows))
+                if not interval:
+                    summary[rate] = (client_tps, cpu_token)
+                cells = [
+                    f"{rate:,}" if rate else "不限速",
+                    "開" if interval else "關",
+                    f"{server_tps:,.0f}",
+                    f"{client_tps:,.0f}",
+                    f"{(client_tps - server_tps) / server_tps * 100:+.1f}%",
+                    f"{cpu_token * 1e6:.1f}µs",
+                    f"{overhead * 1000:.1f}ms",
+                ]
+                print("  ".join(_pad(cell, width) for cell, (_, width) in zip(cells, columns)), flush=True)
+        finally:
+            proc.terminate()
+            proc.wait()
+            ollama_client.close_all()
+
+    # 不限速時伺服器輸出比客戶端處理得快，客戶端量得的速度即為單一串流的量測上限
+    ceiling, steady_cpu = summary[0]
+    print(
+        f"\n📐 高速串流下客戶端每個 token 約耗 {steady_cpu * 1e6:.1f}µs CPU；"
+        f"單一串流最多可量得約 {ceiling:,.0f} tokens/秒，超過此速度的伺服器會被客戶端低估",
+        flush=True,
+    )
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="本機模擬 Ollama 伺服器（測試與 harness 開銷量測用）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+範例：
+  python mock_ollama.py                                   # 於 127.0.0.1:11435 啟動
+  python mock_ollama.py --token-rate 30 --jitter 0.3 --num-parallel 2
+  python mock_ollama.py --error-rate 0.1 --oom-rate 0.05  # 注入錯誤與 OOM
+  python mock_ollama.py --memory 8G --vram 4G             # 記憶體上限 8G，超過 4G 的部分溢出並降速
+  python mock_ollama.py --models mock-a:1b=1G mock-b:7b=4.5G nomic-embed:latest=300M
+  python mock_ollama.py --selftest                        # 端到端測試兩個工具
+  python mock_ollama.py --bench-harness                   # 量測客戶端開銷
+        """,
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="監聽位址，預設 127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"監聽埠號，預設 {DEFAULT_PORT}")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        metavar="NAME=SIZE",
+        help="提供的模型與檔案大小（如 mock-a:1b=1G）；名稱含 embed 者為嵌入模型，含 vision / llava 者具 vision 能力",
+    )
+    parser.add_argument("--load-delay", type=float, default=0.5, metavar="SECONDS", help="模型載入延遲，預設 0.5")
+    parser.add_argument("--token-rate", type=float, default=50, metavar="TPS", help="生成 tokens/秒（0 為不限速），預設 50")
+    parser.add_argument("--prompt-rate", type=float, default=1000, metavar="TPS", help="prompt 處理 tokens/秒（0 為不等待），預設 1000")
+    parser.add_argument("--jitter", type=float, default=0.1, metavar="RATIO", help="每個 token 間隔的隨機變動比例，預設 0.1")
+    parser.add_argument("--response-tokens", type=int, default=128, metavar="N", help="未指定 num_predict 時的回應 token 數，預設 128")
+    parser.add_argument("--error-rate", type=float, default=0.0, metavar="P", help="回傳 HTTP 500 的機率")
+    parser.add_argument("--stream-error-rate", type=float, default=0.0, metavar="P", help="生成途中於串流送出錯誤的機率")
+    parser.add_argument("--oom-rate", type=float, default=0.0, metavar="P", help="回傳 OOM 錯誤的機率")
+    parser.add_argument("--num-parallel", type=int, default=1, metavar="N", help="同時處理的請求數（同 OLLAMA_NUM_PARALLEL），預設 1")
+    parser.add_argument("--max-queue", type=int, default=512, metavar="N", help="排隊請求上限，超過時回傳 503（同 OLLAMA_MAX_QUEUE），預設 512")
+    parser.add_argument("--max-loaded", type=int, default=3, metavar="N", help="同時常駐的模型數上限，預設 3")
+    parser.add_argument("--memory", type=model_scheduler.parse_size, default=16 * 1024 ** 3, metavar="SIZE", help="記憶體上限，預設 16G")
+    parser.add_argument("--vram", type=model_scheduler.parse_size, metavar="SIZE", help="VRAM 大小，超過的部分溢出至系統記憶體並降速（預設與 --memory 相同）")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子，預設 0")
+    parser.add_argument("--verbose", action="store_true", help="印出每個請求的存取紀錄")
+    parser.add_argument("--selftest", action="store_true", help="以模擬伺服器端到端測試 ollama-benchmark.py 與 hi-ai.py")
+    parser.add_argument("--keep-reports", action="store_true", help="自我測試後保留產生的評測報告目錄")
+    parser.add_argument("--bench-harness", action="store_true", help="量測客戶端在高 token 速度下每個 token 的開銷")
+    parser.add_argument("--harness-tokens", type=int, default=2000, metavar="N", help="harness 量測每次生成的 token 數，預設 2000")
+    args = parser.parse_args()
+
+    if args.selftest:
+        raise SystemExit(selftest(keep_reports=args.keep_reports))
+    if args.bench_harness:
+        raise SystemExit(bench_harness(args.harness_tokens))
+
+    models = None
+    if args.models:
+        models = {}
+        for spec in args.models:
+            name, sep, size = spec.rpartition("=")
+            if not sep or not name:
+                parser.error(f"模型格式應為 NAME=SIZE：{spec}")
+            try:
+                models[name] = model_scheduler.parse_size(size)
+            except ValueError as e:
+                parser.error(str(e))
+    for name in ("error_rate", "stream_error_rate", "oom_rate", "jitter"):
+        if not 0 <= getattr(args, name) <= 1:
+            parser.error(f"--{name.replace('_', '-')} 必須介於 0 與 1 之間")
+    if args.num_parallel < 1 or args.max_loaded < 1:
+        parser.error("--num-parallel 與 --max-loaded 至少為 1")
+
+    mock = MockOllama(
+        models,
+        load_delay=args.load_delay,
+        token_rate=args.token_rate,
+        prompt_rate=args.prompt_rate,
+        jitter=args.jitter,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        stream_error_rate=args.stream_error_rate,
+        oom_rate=args.oom_rate,
+        num_parallel=args.num_parallel,
+        max_queue=args.max_queue,
+        max_loaded=args.max_loaded,
+        memory=args.memory,
+        vram=args.vram,
+        seed=args.seed,
+        verbose=args.verbose,
+    )
+    print(f"🧪 模擬 Ollama 伺服器：http://{args.host}:{args.port}", flush=True)
+    print(f"   模型：{', '.join(mock.models)}", flush=True)
+    print(
+        f"   生成 {args.token_rate or '不限'} tokens/秒（抖動 ±{args.jitter:.0%}），prompt {args.prompt_rate or '不限'} tokens/秒，"
+        f"載入 {args.load_delay}s，並行 {args.num_parallel}，記憶體 {_gib(mock.memory)}",
+        flush=True,
+    )
+    try:
+        mock.serve_forever(args.host, args.port)
+    except KeyboardInterrupt:
+        print("\n⏹  已停止", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""ollama-benchmark.py 與 hi-ai.py 共用的記憶體感知模型排程。
+
+依模型大小（/api/tags 的檔案大小，加上由 /api/show 架構資訊估算的 KV cache）與目前
+已載入的模型（/api/ps）規劃執行順序：已在記憶體中的模型先執行，其餘由小到大排列，
+讓小模型可以同時常駐；只有在下一個模型放不下時才卸載已完成的模型。
+並與「每個模型前先卸載全部」的逐一卸載順序比較，估算可省下的載入時間。
+
+可透過環境變數（或 .env）調整：
+- OLLAMA_MEMORY_BUDGET：可用於載入模型的記憶體上限（如 24G），未設定時本機伺服器讀取 /proc/meminfo
+- OLLAMA_MAX_LOADED_MODELS：同時常駐的模型數上限（預設 3，與 Ollama 伺服器預設相同）
+- OLLAMA_LOAD_BANDWIDTH：估算載入時間用的載入頻寬（bytes/秒，預設 1.5e9）
+"""
+
+import os
+
+import requests
+
+import ollama_client
+
+# 無法由 /api/show 估算 KV cache 時，以檔案大小乘上此倍率估算記憶體佔用
+FOOTPRINT_FACTOR = 1.2
+# 估算 KV cache 時使用的 context 長度（Ollama 預設值，可由 OLLAMA_CONTEXT_LENGTH 覆寫）
+DEFAULT_NUM_CTX = 4096
+# 本機自動偵測記憶體上限時保留給系統的比例
+MEMORY_RESERVE_RATIO = 0.1
+
+_SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+# ---------------------------------------------------------------------------
+# 記憶體上限與模型佔用估算
+# ---------------------------------------------------------------------------
+
+def parse_size(text: str) -> int:
+    """將 "24G"、"512MB"、"1.5T" 或純數字（bytes）轉為位元組數"""
+    value = text.strip().upper().removesuffix("IB").removesuffix("B")
+    unit = value[-1] if value and value[-1] in _SIZE_UNITS else ""
+    number = value[: -1] if unit else value
+    try:
+        size = float(number) * _SIZE_UNITS[unit]
+    except ValueError:
+        raise ValueError(f"無法解析的大小：{text}") from None
+    if size <= 0:
+        raise ValueError(f"大小必須大於 0：{text}")
+    return int(size)
+
+
+def detect_memory_budget(base_url: str) -> int | None:
+    """可用於載入模型的記憶體上限：優先使用 OLLAMA_MEMORY_BUDGET，
+    本機伺服器則以 /proc/meminfo 的 MemTotal 扣除保留比例估算；遠端且未設定時回傳 None。
+    獨立顯示卡的 VRAM 無法由 API 取得，請以 OLLAMA_MEMORY_BUDGET 明確指定。"""
+    configured = os.getenv("OLLAMA_MEMORY_BUDGET")
+    if configured:
+        return parse_size(configured)
+    if not ollama_client.is_local(base_url):
+        return None
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(int(line.split()[1]) * 1024 * (1 - MEMORY_RESERVE_RATIO))
+    except OSError:
+        pass
+    return None
+
+
+def _kv_cache_bytes(model_info: dict, num_ctx: int) -> int | None:
+    """由 /api/show 的 model_info 估算 f16 KV cache 大小：
+    2（K、V）× 層數 × context 長度 × KV head 數 × 每個 head 的維度 × 2 bytes"""
+    arch = model_info.get("general.architecture")
+    if not arch:
+        return None
+    layers = model_info.get(f"{arch}.block_count")
+    embedding = model_info.get(f"{arch}.embedding_length")
+    heads = model_info.get(f"{arch}.attention.head_count")
+    kv_heads = model_info.get(f"{arch}.attention.head_count_kv") or heads
+    if not (layers and embedding and heads and kv_heads):
+        return None
+    if isinstance(kv_heads, list):  # 部分架構逐層列出 KV head 數
+        kv_heads = max(kv_heads)
+    head_dim = model_info.get(f"{arch}.attention.key_length") or embedding // heads
+    return int(2 * layers * num_ctx * kv_heads * head_dim * 2)
+
+
+def estimate_footprint(base_url: str, model: str, size: int) -> int:
+    """估算模型載入後的記憶體佔用：檔案大小 + KV cache（無法估算時改用 FOOTPRINT_FACTOR）"""
+    num_ctx = int(os.getenv("OLLAMA_CONTEXT_LENGTH", DEFAULT_NUM_CTX))
+    try:
+        kv = _kv_cache_bytes(ollama_client.show(base_url, model).get("model_info") or {}, num_ctx)
+    except requests.RequestException:
+        kv = None
+    return size + kv if kv is not None else int(size * FOOTPRINT_FACTOR)
+
+
+def _max_loaded(budget: int | None) -> int:
+    # 無法得知記憶體上限時保守地一次只常駐一個模型（等同原本的逐一卸載）
+    return int(os.getenv("OLLAMA_MAX_LOADED_MODELS", "3")) if budget else 1
+
+
+def _load_bandwidth() -> float:
+    return float(os.getenv("OLLAMA_LOAD_BANDWIDTH", "1.5e9"))
+
+
+# ---------------------------------------------------------------------------
+# 排程規劃
+# ---------------------------------------------------------------------------
+
+def plan_schedule(
+    models: list[str],
+    footprints: dict[str, int],
+    *,
+    budget: int | None,
+    resident: dict[str, int],
+    max_loaded: int,
+    load_bandwidth: float,
+) -> dict:
+    """規劃模型執行順序並模擬常駐狀態。
+
+    resident 為目前已載入的模型與其實際佔用。已常駐的受測模型排在最前面（不需載入），
+    其餘依估算佔用由小到大排列；每一步只在放不下（超過 budget 或 max_loaded）時，
+    依序卸載已完成的模型、再卸載非受測模型。回傳的 steps 含每一步預期的載入與卸載，
+    並與逐一卸載（每個模型前先卸載全部、依原順序執行）比較載入次數與估算載入時間。
+    """
+    targets = set(models)
+    first = [m for m in models if m in resident]
+    rest = sorted((m for m in models if m not in resident), key=lambda m: footprints[m])
+    order = first + rest
+
+    loaded = dict(resident)  # 依載入先後排列，越早載入越先被卸載
+    done: list[str] = []
+    steps = []
+    for model in order:
+        need = footprints[model]
+        evict: list[str] = []
+        if model not in loaded:
+            candidates = [m for m in done if m in loaded] + [m for m in loaded if m not in targets]
+
+            def fits() -> bool:
+                used = sum(loaded.values())
+                return (budget is None or used + need <= budget) and len(loaded) < max_loaded
+
+            while not fits() and candidates:
+                victim = candidates.pop(0)
+                loaded.pop(victim)
+                evict.append(victim)
+            loaded[model] = need
+        steps.append({
+            "model": model,
+            "footprint": need,
+            "load": model not in resident,
+            "evict": evict,
+            "oversize": budget is not None and need > budget,
+        })
+        done.append(model)
+
+    loads = [s for s in steps if s["load"]]
+    est_load_time = sum(s["footprint"] for s in loads) / load_bandwidth
+    naive_load_time = sum(footprints[m] for m in models) / load_bandwidth
+    return {
+        "budget": budget,
+        "max_loaded": max_loaded,
+        "load_bandwidth": load_bandwidth,
+        "order": order,
+        "steps": steps,
+        "loads": len(loads),
+        "naive_loads": len(models),
+        "est_load_time": round(est_load_time, 2),
+        "naive_est_load_time": round(naive_load_time, 2),
+        "est_saved": round(naive_load_time - est_load_time, 2),
+    }
+
+
+def build_plan(base_url: str, models: list[str], budget: int | None = None) -> dict:
+    """向伺服器取得模型大小與目前常駐狀態後規劃排程；budget 未指定時自動偵測"""
+    if budget is None:
+        budget = detect_memory_budget(base_url)
+    sizes = {m["name"]: m.get("size", 0) for m in ollama_client.list_models(base_url)}
+    resident = {m.get("name", ""): m.get("size", 0) for m in ollama_client.list_running(base_url)}
+    footprints = {
+        # 已常駐的模型使用 /api/ps 回報的實際佔用
+        m: resident[m] if m in resident else estimate_footprint(base_url, m, sizes.get(m, 0))
+        for m in models
+    }
+    return plan_schedule(
+        models,
+        footprints,
+        budget=budget,
+        resident=resident,
+        max_loaded=_max_loaded(budget),
+        load_bandwidth=_load_bandwidth(),
+    )
+
+
+# ---------------------------------------------------------------------------
+# 執行
+# ---------------------------------------------------------------------------
+
+def make_room(base_url: str, plan: dict, index: int, log=print, busy: dict[str, int] | None = None) -> list[str]:
+    """執行第 index 步之前依 /api/ps 的實際常駐狀態騰出記憶體，回傳卸載的模型。
+
+    實際佔用可能與估算不同（或 Ollama 已自行卸載模型），因此不直接套用規劃中的 evict，
+    而是以目前常駐的模型重新判斷：依序卸載已完成的受測模型、非受測模型，直到放得下為止。
+    busy 為平行執行中的其他模型與其佔用：一律計入（可能仍在載入、尚未出現在 /api/ps），且不會被卸載。
+    """
+    step = plan["steps"][index]
+    model = step["model"]
+    running = ollama_client.list_running(base_url)
+    loaded = {**(busy or {}), **{m.get("name", ""): m.get("size", 0) for m in running}}
+    if model in loaded:
+        return []
+
+    order = plan["order"]
+    done = order[:index]
+    pending = set(order[index:])
+    candidates = [m for m in done if m in loaded] + [m for m in loaded if m not in order]
+    candidates += [m for m in loaded if m in pending]  # 最後才卸載之後才會用到的受測模型
+    candidates = [m for m in candidates if m not in (busy or {})]
+    budget = plan["budget"]
+
+    evicted = []
+    while candidates and (
+        len(loaded) >= plan["max_loaded"]
+        or (budget is not None and sum(loaded.values()) + step["footprint"] > budget)
+    ):
+        victim = candidates.pop(0)
+        log(f"🧹 卸載 {victim}（{ollama_client.format_bytes(loaded[victim])}）以騰出記憶體給 {model}", flush=True)
+        try:
+            ollama_client.unload(base_url, victim)
+        except requests.RequestException as e:
+            log(f"   ⚠️  卸載 {victim} 失敗：{e}", flush=True)
+            continue
+        loaded.pop(victim)
+        evicted.append(victim)
+    return evicted
+
+
+def summarize_measured(plan: dict, load_times: dict[str, float]) -> dict:
+    """以實測載入時間（伺服器端 load_duration）比較排程與逐一卸載的總載入時間。
+
+    逐一卸載時每個模型都要載入一次：有實測值的模型使用實測值，排程中沒有載入
+    （已常駐）的模型則以實測的平均載入頻寬換算估計。"""
+    measured = {m: load_times.get(m, 0.0) for m in plan["order"]}
+    footprints = {s["model"]: s["footprint"] for s in plan["steps"]}
+    loaded = [m for m, t in measured.items() if t > 0]
+    load_time = sum(measured.values())
+    bandwidth = (
+        sum(footprints[m] for m in loaded) / sum(measured[m] for m in loaded) if loaded
+        else plan["load_bandwidth"]
+    )
+    naive = sum(t if t > 0 else footprints[m] / bandwidth for m, t in measured.items())
+    return {
+        "load_time": round(load_time, 2),
+        "bandwidth": round(bandwidth),
+        "naive_load_time": round(naive, 2),
+        "saved": round(naive - load_time, 2),
+    }
+
+
+def format_plan(plan: dict) -> str:
+    """排程摘要（印出用）"""
+    budget = ollama_client.format_bytes(plan["budget"]) if plan["budget"] else "未知（一次只常駐一個模型）"
+    lines = [f"🧠 記憶體感知排程：上限 {budget}，最多同時常駐 {plan['max_loaded']} 個模型"]
+    for i, step in enumerate(plan["steps"], 1):
+        action = "已在記憶體中" if not step["load"] else "載入"
+        if step["evict"]:
+            action += f"（先卸載 {', '.join(step['evict'])}）"
+        warn = " ⚠️ 超過記憶體上限" if step["oversize"] else ""
+        lines.append(f"   {i}. {step['model']}（約 {ollama_client.format_bytes(step['footprint'])}）：{action}{warn}")
+    lines.append(
+        f"   載入 {plan['loads']} 次（逐一卸載需 {plan['naive_loads']} 次），"
+        f"預估載入 {plan['est_load_time']}s，較逐一卸載節省約 {plan['est_saved']}s"
+    )
+    return "\n".join(lines)
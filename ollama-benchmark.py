@@ -1,29 +1,48 @@
 import argparse
+import base64
+import hashlib
 import html
+import itertools
 import json
 import os
+import queue
+import random
+import shutil
+import signal
+import sqlite3
+import statistics
+import threading
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, TextIO
 
 import requests
 
+import benchmark_history
+import metrics_exporter
+import model_scheduler
+import ollama_client
+import perf_trace
+import resource_monitor
+
 # 載入 .env 設定
-def _load_env():
-    """載入 .env 檔案的環境變數"""
-    env_file = Path(__file__).resolve().parent / ".env"
-    if env_file.exists():
-        with open(env_file, encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#") and "=" in line:
-                    key, value = line.split("=", 1)
-                    os.environ.setdefault(key.strip(), value.strip())
+ollama_client.load_env()
+
+def _parse_server_list(spec: str) -> list[str]:
+    """解析以逗號分隔的伺服器 URL 清單（去除尾端斜線與重複項目，保留順序）"""
+    servers = [u.strip().rstrip("/") for u in spec.split(",") if u.strip()]
+    if not servers:
+        raise argparse.ArgumentTypeError("至少需要一個伺服器 URL")
+    return list(dict.fromkeys(servers))
 
-_load_env()
 
 # 從環境變數讀取設定，提供預設值
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# OLLAMA_BASE_URL 可用逗號分隔多台伺服器，第一台為單機模式下的預設伺服器
+OLLAMA_SERVERS = _parse_server_list(os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"))
+OLLAMA_BASE_URL = OLLAMA_SERVERS[0]
 CHATS_DIR = Path(__file__).resolve().parent / "chats"
 
 BENCHMARK_PROMPTS = [
@@ -59,63 +78,1119 @@ CHART_COLORS = [
 
 CHART_BORDERS = [c.replace("0.8", "1") for c in CHART_COLORS]
 
+# 詳細回覆的側載資料檔：目錄名稱、每個資料檔的筆數、頁面上每頁顯示的筆數
+DETAILS_DIR = "benchmark_details"
+DETAILS_PAGE_SIZE = 50
+DETAILS_PER_VIEW = 20
+
+# 載入剖析用的短 prompt：只需取得第一個 token，限制輸出長度以縮短每次循環
+LOAD_PROFILE_PROMPT = "你好"
+LOAD_PROFILE_OPTIONS = {"num_predict": 8}
+
+# 重複測試的統計設定
+STAT_METRICS = ["latency", "ttft", "eval_tps", "prompt_tps", "overhead"]
+BOOTSTRAP_RESAMPLES = 1000
+CV_UNSTABLE_THRESHOLD = 0.15  # 變異係數超過此值即標記為不穩定
+
+# 上下文長度掃描（--context-sweep）：合成 prompt 的目標 token 數與每步的生成長度
+CONTEXT_SWEEP_SIZES = [64, 256, 1024, 4096, 8192, 16384, 32768]
+CONTEXT_SWEEP_NUM_PREDICT = 16
+CONTEXT_SWEEP_MIN_CTX = 2048
+COLLAPSE_RATIO = 0.5  # prompt 處理速度低於先前最佳值的此比例即標記為效能崩落
+SWEEP_FILLER = [
+    "第 {i} 段：倉儲系統每天清晨彙整前一日的出貨紀錄，並依地區與品項分類後寄送給各區負責人。",
+    "第 {i} 段：若同一筆訂單在二十四小時內被修改超過三次，系統會自動標記並通知客服人員覆核。",
+    "第 {i} 段：Section {i} notes that the cache layer keeps recent lookups in memory for ten minutes.",
+    "第 {i} 段：會議決議下一季將資料庫升級到新版本，並在升級前完成完整備份與還原演練。",
+]
+SWEEP_INSTRUCTION = "\n\n請用一句話總結以上內容。"
+
+# 執行參數調校（--tune）：未指定參數時的預設網格、每次量測的 prompt 長度與生成長度
+TUNE_DEFAULT_GRID = {"num_batch": [128, 256, 512], "num_ctx": [2048, 4096, 8192]}
+TUNE_PROMPT_TOKENS = 512
+TUNE_NUM_PREDICT = 64
+TUNE_ETA = 2  # successive halving 每輪保留 1/ETA 的設定，存活設定的量測次數乘以 ETA
+TUNE_MAX_REQUESTS = 8  # 每輪每個設定的量測次數上限
+
+# 結果快取（跨執行保存，--reuse-cached 時沿用未變更模型的結果）
+CACHE_FILE = CHATS_DIR / "benchmark_cache.sqlite3"
+CACHE_TTL_HOURS = 168
+CACHE_MAX_ENTRIES = 2000
+
+# 常駐監控（--daemon）：每輪探測的 prompt 與生成長度、預設間隔與抖動比例、/metrics 監聽位址
+DAEMON_PROBE_PROMPT = "你好，請以繁體中文簡單自我介紹。"
+DAEMON_PROBE_OPTIONS = {"num_predict": 32}
+DAEMON_INTERVAL = 300
+DAEMON_JITTER = 0.1
+METRICS_LISTEN = "127.0.0.1:9877"
+# 指標的 histogram 分桶（秒）
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TTFT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LOAD_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# 開放迴路流量重播（--replay-log）：讀取逾時秒數、客戶端在途請求上限（超過即丟棄）、進度輸出間隔
+REPLAY_TIMEOUT = 120
+REPLAY_MAX_INFLIGHT = 256
+REPLAY_PROGRESS_INTERVAL = 5
+REPLAY_STATUSES = ("ok", "timeout", "rejected", "dropped", "oom", "error")
+
+# SLO 容量搜尋（--capacity）：預設 SLO、每步的持續秒數、起始與最高到達率（請求/秒）、
+# 二分搜尋的相對精度與最多步數；請求沿用 BENCHMARK_PROMPTS，生成長度上限為 CAPACITY_NUM_PREDICT
+CAPACITY_SLO = "ttft_p95=2"
+CAPACITY_WINDOW = 30
+CAPACITY_START_RATE = 0.5
+CAPACITY_MAX_RATE = 64
+CAPACITY_PRECISION = 0.1  # 未達標與達標的到達率相差不到此比例即停止
+CAPACITY_MAX_STEPS = 12
+CAPACITY_MIN_RATE_DIVISOR = 8  # 第一步就未達標時，預設最多往下搜尋到起始到達率的 1/8
+CAPACITY_MIN_REQUESTS = 10  # 低到達率時延長該步，至少送出這麼多請求，百分位數才有意義
+CAPACITY_NUM_PREDICT = 256
+CAPACITY_SEED = 0
+SLO_METRICS = ("ttft", "latency", "queue_delay")
+
+# Embedding 評測（--embed）：預設批次大小、每個批次大小送出的輸入數與同時在途的批次數
+EMBED_BATCH_SIZES = [1, 8, 32, 128]
+EMBED_INPUTS = 256
+EMBED_CONCURRENCY = 1
+EMBED_TIMEOUT = 300
+
+# Vision 評測（--vision）：測試圖的解析度（寬 × 高，像素）、每個解析度的量測次數、提示、生成長度與 num_ctx
+VISION_RESOLUTIONS = [(224, 224), (448, 448), (896, 896), (1344, 1344)]
+VISION_REPEAT = 3
+VISION_PROMPT = "請用一句話描述這張圖片。"
+VISION_NUM_PREDICT = 32
+VISION_NUM_CTX = 8192
+
+# 外部題庫（--suite）：每行可直接指定的生成選項，會併入 options 傳給 Ollama
+SUITE_OPTION_KEYS = ("num_predict", "temperature", "seed", "top_p", "top_k", "num_ctx")
+UNTAGGED = "(未分類)"
+
 # ---------------------------------------------------------------------------
 # Ollama API
 # ---------------------------------------------------------------------------
 
-def get_available_models() -> list[str]:
-    resp = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
-    return [m["name"] for m in data.get("models", [])]
+def get_available_models(base_url: str = OLLAMA_BASE_URL) -> list[str]:
+    return [m["name"] for m in ollama_client.list_models(base_url)]
 
 
-def ollama_generate(model: str, prompt: str) -> dict:
-    start = time.time()
-    resp = requests.post(
-        f"{OLLAMA_BASE_URL}/api/generate",
-        json={"model": model, "prompt": prompt, "stream": False},
-        timeout=600,
-    )
-    latency = round(time.time() - start, 3)
-    resp.raise_for_status()
-    text = resp.json().get("response", "")
-    return {"response": text, "latency": latency, "length": len(text)}
+def get_model_digests(base_url: str = OLLAMA_BASE_URL) -> dict[str, str]:
+    """取得每個模型的 digest（透過 /api/tags），模型重新下載或更新後會改變"""
+    return {m["name"]: m.get("digest", "") for m in ollama_client.list_models(base_url)}
+
+
+class OllamaError(Exception):
+    """Ollama API 回傳的錯誤"""
+
+
+def get_running_models(base_url: str = OLLAMA_BASE_URL) -> list[dict]:
+    """取得目前已載入記憶體的模型清單（透過 /api/ps）"""
+    return ollama_client.list_running(base_url)
+
+
+def unload_model(model_name: str, base_url: str = OLLAMA_BASE_URL) -> bool:
+    """卸載指定模型（/api/chat + keep_alive: 0），釋放其佔用的記憶體。回傳是否成功。"""
+    try:
+        ollama_client.unload(base_url, model_name)
+        return True
+    except requests.RequestException as e:
+        print(f"  ⚠️  卸載 {model_name} 失敗：{e}")
+        return False
+
+
+def _find_running(model: str, running: list[dict]) -> dict | None:
+    """在 /api/ps 回傳的清單中找出指定模型"""
+    for m in running:
+        if m.get("name") == model or m.get("model") == model:
+            return m
+    return None
+
+
+def ollama_generate(
+    model: str,
+    prompt: str,
+    options: dict | None = None,
+    *,
+    system: str | None = None,
+    messages: list[dict] | None = None,
+    images: list[str] | None = None,
+    base_url: str = OLLAMA_BASE_URL,
+    sampler: resource_monitor.ResourceSampler | None = None,
+    timeout: float = 600,
+    retry: bool = True,
+) -> dict:
+    """以 streaming 模式呼叫 /api/generate，逐一記錄每個 chunk 的到達時間，
+    藉此把首個 token 延遲（TTFT）與解碼速度分開量測。options 與 system 會原樣傳給 Ollama。
+    指定 messages 時改送 /api/chat（prompt 與 system 不使用），計時方式相同。
+    images 為 base64 編碼的圖片（/api/generate 的 images 欄位，需為具 vision 能力的模型）。
+    請求經由共用的 keep-alive 連線池送出，connect_time 記錄本次建立新連線的耗時。
+    指定 sampler 時於請求期間背景取樣資源使用量，時間序列放在 resources 欄位。
+    timeout 為讀取逾時：連續這麼多秒沒有收到任何資料（含排隊等待）即拋出 requests.Timeout。
+    retry=False 時連線失敗與 502/503/504 不重試（開放迴路量測使用）。"""
+    chat = messages is not None
+    payload: dict = {"model": model, "messages": messages} if chat else {"model": model, "prompt": prompt}
+    payload["stream"] = True
+    if options:
+        payload["options"] = options
+    if system and not chat:
+        payload["system"] = system
+    if images and not chat:
+        payload["images"] = images
+    pieces: list[str] = []
+    token_times: list[float] = []
+    final: dict = {}
+    endpoint = "/api/chat" if chat else "/api/generate"
+    trace = perf_trace.request(f"POST {endpoint}", base_url, model)
+    start = time.perf_counter()
+    if sampler:
+        sampler.start(start, token_times)
+    with trace:
+        try:
+            resp = ollama_client.post(
+                base_url,
+                endpoint,
+                json=payload,
+                stream=True,
+                timeout=(10, timeout),  # (連線逾時, 讀取逾時—兩次資料之間的最大等待)
+                retry=retry,
+            )
+            with resp:  # 串流中途拋出例外時也關閉回應，連線不會佔住連線池
+                trace.headers()
+                connection = ollama_client.connection_stats()
+                if resp.status_code >= 400:
+                    # Ollama 的錯誤原因（如 OOM）在 JSON 回應體中，raise_for_status() 的訊息不包含
+                    try:
+                        message = resp.json().get("error")
+                    except ValueError:
+                        message = None
+                    if message:
+                        raise OllamaError(message)
+                resp.raise_for_status()
+
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    received = time.perf_counter()
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise OllamaError(chunk["error"])
+                    token = (chunk.get("message") or {}).get("content", "") if chat else chunk.get("response", "")
+                    if token:
+                        token_times.append(received)
+                        pieces.append(token)
+                    if chunk.get("done"):
+                        # 不提前 break：讀完整個串流，連線才會歸還 keep-alive 連線池
+                        final = chunk
+                    trace.chunk(received, chunk, bool(token))
+        finally:
+            latency = round(time.perf_counter() - start, 3)
+            resources = sampler.stop() if sampler else None
+
+    text = "".join(pieces)
+    result = {
+        "response": text,
+        "latency": latency,
+        "length": len(text),
+        **_server_metrics(final, latency),
+        **_token_timing(start, token_times),
+        **connection,
+    }
+    if resources:
+        result["resources"] = resources
+    return result
+
+
+def _server_metrics(final: dict, latency: float) -> dict:
+    """由 Ollama 最後一個 chunk 的計時欄位（單位：奈秒）推導伺服器端吞吐量。
+    tokens/秒以伺服器實際計數為準，不受各模型 tokenizer 或語言差異影響。"""
+    ns = 1e9
+    prompt_eval_count = final.get("prompt_eval_count", 0)
+    prompt_eval_duration = final.get("prompt_eval_duration", 0)
+    eval_count = final.get("eval_count", 0)
+    eval_duration = final.get("eval_duration", 0)
+    total_duration = final.get("total_duration", 0)
+    return {
+        "prompt_eval_count": prompt_eval_count,
+        "eval_count": eval_count,
+        "prompt_tps": round(prompt_eval_count / (prompt_eval_duration / ns), 2) if prompt_eval_duration else None,
+        "eval_tps": round(eval_count / (eval_duration / ns), 2) if eval_duration else None,
+        "load_time": round(final.get("load_duration", 0) / ns, 3),
+        "prompt_eval_time": round(prompt_eval_duration / ns, 3),
+        "eval_time": round(eval_duration / ns, 3),
+        "server_time": round(total_duration / ns, 3) if total_duration else None,
+        # 客戶端延遲扣除伺服器總處理時間，即網路傳輸與客戶端解析等開銷
+        "overhead": round(latency - total_duration / ns, 3) if total_duration else None,
+    }
+
+
+def _token_timing(start: float, token_times: list[float]) -> dict:
+    """由每個 token chunk 的到達時間計算 TTFT、inter-token 延遲分佈與解碼速度"""
+    if not token_times:
+        return {"ttft": None, "itl_mean_ms": None, "itl_p95_ms": None, "itl_max_ms": None, "decode_tps": None}
+
+    gaps_ms = [(b - a) * 1000 for a, b in zip(token_times, token_times[1:])]
+    decode_time = token_times[-1] - token_times[0]
+    return {
+        "ttft": round(token_times[0] - start, 3),
+        "itl_mean_ms": round(sum(gaps_ms) / len(gaps_ms), 2) if gaps_ms else None,
+        "itl_p95_ms": _percentile(gaps_ms, 95),
+        "itl_max_ms": round(max(gaps_ms), 2) if gaps_ms else None,
+        "decode_tps": round(len(gaps_ms) / decode_time, 2) if decode_time > 0 else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 外部題庫
+# ---------------------------------------------------------------------------
+
+def iter_suite(path: Path) -> Iterator[dict]:
+    """逐行讀取 JSONL 題庫並產生測試項目，不會一次把整個檔案載入記憶體。
+
+    每行為一個 JSON 物件：prompt 為必要欄位；name 預設為「#行號」，需在題庫內唯一；
+    system 為系統提示；options 為 Ollama 生成選項，SUITE_OPTION_KEYS 中的欄位也可直接寫在頂層；
+    tags 為字串或字串列表，報告依標籤彙整。空白行與 # 開頭的註解行會略過。
+    name 重複時拋出 ValueError（續跑與結果快取都以 name 辨識測試項目）。
+    """
+    seen: dict[str, int] = {}
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{lineno} 不是有效的 JSON：{e}") from None
+            if not isinstance(raw, dict) or not isinstance(raw.get("prompt"), str):
+                raise ValueError(f"{path}:{lineno} 缺少字串欄位 prompt")
+
+            options = dict(raw.get("options") or {})
+            options.update({k: raw[k] for k in SUITE_OPTION_KEYS if k in raw})
+            tags = raw.get("tags") or []
+            item = {"name": str(raw.get("name") or f"#{lineno}"), "prompt": raw["prompt"]}
+            if item["name"] in seen:
+                raise ValueError(f"{path}:{lineno} name「{item['name']}」與第 {seen[item['name']]} 行重複")
+            seen[item["name"]] = lineno
+            if raw.get("system"):
+                item["system"] = raw["system"]
+            if options:
+                item["options"] = options
+            item["tags"] = [tags] if isinstance(tags, str) else [str(t) for t in tags]
+            yield item
 
 
 # ---------------------------------------------------------------------------
 # 評測執行
 # ---------------------------------------------------------------------------
 
-def run_benchmark_for_model(model: str) -> list[dict]:
+def run_benchmark_for_model(
+    model: str,
+    warmup: int = 0,
+    repeat: int = 1,
+    *,
+    base_url: str = OLLAMA_BASE_URL,
+    items: Iterable[dict] | None = None,
+    on_result: Callable[[dict, dict], None] | None = None,
+    sample_interval: float = 0,
+) -> list[dict]:
+    """依序執行測試項目（預設為 BENCHMARK_PROMPTS，續跑或題庫模式由呼叫端傳入 items）。
+    指定 on_result 時每項完成即以 (item, result) 呼叫（寫入結果日誌），結果不再累積於回傳值，
+    大型題庫也不會佔用記憶體；未指定時回傳所有結果。"""
     print("=" * 70)
     print(f"🏁 Benchmark 開始：{model}")
     print("=" * 70)
 
     results: list[dict] = []
-    for item in BENCHMARK_PROMPTS:
-        print(f"▶ 測試項目：{item['name']}")
+    with perf_trace.span(f"模型 {model}", cat="benchmark", model=model, server=base_url):
+        for item in BENCHMARK_PROMPTS if items is None else items:
+            print(f"▶ 測試項目：{item['name']}")
+            result = run_test(
+                model, item, warmup=warmup, repeat=repeat, base_url=base_url, sample_interval=sample_interval
+            )
+            if on_result:
+                on_result(item, result)
+            else:
+                results.append(result)
+    return results
+
+
+def run_test(
+    model: str,
+    item: dict,
+    *,
+    warmup: int = 0,
+    repeat: int = 1,
+    base_url: str = OLLAMA_BASE_URL,
+    verbose: bool = True,
+    sample_interval: float = 0,
+) -> dict:
+    """執行單一測試項目：先執行 warmup 次（結果捨棄），再量測 repeat 次並彙整統計。
+    verbose=False 時不印出逐次結果（多伺服器平行執行時由排程器統一輸出）。
+    sample_interval > 0 時每次量測都以背景執行緒取樣資源使用量（失敗的量測也會保留）。"""
+    with perf_trace.span(
+        f"{item['name']}（{model}）", cat="benchmark", model=model, test=item["name"], warmup=warmup, repeat=repeat,
+    ):
+        log = print if verbose else (lambda *a, **k: None)
+        for i in range(warmup):
+            try:
+                ollama_generate(
+                    model, item["prompt"], item.get("options"), system=item.get("system"), base_url=base_url
+                )
+                log(f"  🔥 暖身 {i + 1}/{warmup} 完成（結果不列入統計）")
+            except Exception as e:
+                log(f"  🔥 暖身 {i + 1}/{warmup} 失敗：{e}")
+
+        runs: list[dict] = []
+        response = ""
+        for i in range(repeat):
+            prefix = f"  [{i + 1}/{repeat}]" if repeat > 1 else " "
+            sampler = resource_monitor.ResourceSampler(base_url, model, sample_interval) if sample_interval > 0 else None
+            try:
+                result = ollama_generate(
+                    model, item["prompt"], item.get("options"),
+                    system=item.get("system"), base_url=base_url, sampler=sampler,
+                )
+            except Exception as e:
+                log(f"{prefix} ❌ 失敗：{e}")
+                run = {"success": False, "error": str(e)}
+                if sampler:
+                    run["resources"] = sampler.stop()
+                runs.append(run)
+                continue
+            log(
+                f"{prefix} ⏱ {result['latency']}s | ⚡ TTFT {result['ttft']}s | "
+                f"🔤 生成 {result['eval_tps']} tok/s | 📥 prompt {result['prompt_tps']} tok/s | "
+                f"📦 載入 {result['load_time']}s | 🌐 開銷 {result['overhead']}s"
+            )
+            if result.get("resources", {}).get("spilled"):
+                log(f"{prefix} ⚠️  取樣期間模型部分位於系統記憶體（VRAM 佔比最低 {result['resources']['min_vram_ratio'] * 100:.0f}%）")
+            response = result.pop("response")
+            runs.append({**result, "success": True})
+
+        entry = _summarize_runs(item, runs, response)
+        if repeat > 1 and entry["success"]:
+            lat = entry["stats"]["latency"]
+            log(
+                f"  📊 延遲 平均 {lat['mean']}s ± {lat['stdev']} | 中位數 {lat['median']}s | "
+                f"95% CI [{lat['ci_low']}, {lat['ci_high']}]"
+                + (" | ⚠️  變異過大，數據不穩定" if entry["unstable"] else "")
+            )
+        return entry
+
+
+def _summarize_runs(item: dict, runs: list[dict], response: str) -> dict:
+    """將同一測試項目的多次量測彙整為單一結果：
+    各數值欄位取平均作為代表值，STAT_METRICS 另附完整統計摘要，原始量測保留於 runs。"""
+    ok_runs = [r for r in runs if r["success"]]
+    entry: dict = {
+        "test": item["name"],
+        "prompt": item["prompt"],
+        "response": response,
+    }
+    if item.get("tags"):
+        entry["tags"] = item["tags"]
+    if not ok_runs:
+        entry.update({
+            "latency": None,
+            "length": 0,
+            "eval_count": 0,
+            "eval_tps": None,
+            "prompt_tps": None,
+            "load_time": None,
+            "overhead": None,
+            "ttft": None,
+            "decode_tps": None,
+            "success": False,
+            "error": runs[-1]["error"] if runs else "未執行",
+        })
+        entry["runs"] = runs
+        return entry
+
+    numeric_keys = dict.fromkeys(
+        key for r in ok_runs for key, value in r.items()
+        if key != "success" and isinstance(value, (int, float)) and not isinstance(value, bool)
+    )
+    for key in numeric_keys:
+        values = [r[key] for r in ok_runs if r.get(key) is not None]
+        if all(isinstance(v, int) for v in values):
+            entry[key] = round(sum(values) / len(values))
+        else:
+            entry[key] = round(sum(values) / len(values), 3)
+
+    entry["stats"] = {
+        metric: _describe([r[metric] for r in ok_runs if r.get(metric) is not None])
+        for metric in STAT_METRICS
+    }
+    # 僅以主要指標判定整體是否不穩定；毫秒級的開銷與 TTFT 本身變異就大，只在各自統計中標記
+    entry["unstable"] = any(
+        entry["stats"][metric] and entry["stats"][metric]["unstable"]
+        for metric in ("latency", "eval_tps")
+    )
+    if any(r.get("resources", {}).get("spilled") for r in ok_runs):
+        entry["spilled"] = True
+    entry["success"] = True
+    entry["runs"] = runs
+    if len(ok_runs) < len(runs):
+        entry["failed_runs"] = len(runs) - len(ok_runs)
+    return entry
+
+
+def _describe(values: list[float]) -> dict | None:
+    """計算平均、中位數、標準差、最小/最大值、平均值的 bootstrap 95% 信賴區間與變異係數"""
+    if not values:
+        return None
+    mean = statistics.fmean(values)
+    stdev = statistics.stdev(values) if len(values) > 1 else 0.0
+    ci_low, ci_high = _bootstrap_ci(values)
+    cv = stdev / mean if mean else None
+    return {
+        "n": len(values),
+        "mean": round(mean, 3),
+        "median": round(statistics.median(values), 3),
+        "stdev": round(stdev, 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3),
+        "ci_low": round(ci_low, 3),
+        "ci_high": round(ci_high, 3),
+        "cv": round(cv, 3) if cv is not None else None,
+        "unstable": cv is not None and cv > CV_UNSTABLE_THRESHOLD,
+    }
+
+
+def _bootstrap_ci(values: list[float], confidence: float = 0.95) -> tuple[float, float]:
+    """以 bootstrap 重抽樣估計平均值的信賴區間（固定亂數種子，結果可重現）"""
+    if len(values) < 2:
+        return values[0], values[0]
+    rng = random.Random(0)
+    n = len(values)
+    means = sorted(
+        sum(rng.choices(values, k=n)) / n
+        for _ in range(BOOTSTRAP_RESAMPLES)
+    )
+    alpha = (1 - confidence) / 2
+    return means[int(alpha * (len(means) - 1))], means[int((1 - alpha) * (len(means) - 1))]
+
+
+def _percentile(values: list[float], pct: float) -> float | None:
+    """以線性內插計算百分位數（pct 介於 0~100），空列表回傳 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return round(ordered[low] + (ordered[high] - ordered[low]) * (rank - low), 3)
+
+
+def _parse_concurrency_levels(spec: str) -> list[int]:
+    """解析 --concurrency 參數。
+    逗號分隔時直接使用各並行數；單一數值 N 時展開為 1, 2, 4, … , N 以繪製吞吐量曲線。"""
+    levels = sorted({int(v) for v in spec.split(",") if v.strip()})
+    if not levels or levels[0] < 1:
+        raise argparse.ArgumentTypeError("並行數必須為正整數")
+    if len(levels) == 1:
+        n = levels[0]
+        levels = [1]
+        while levels[-1] * 2 < n:
+            levels.append(levels[-1] * 2)
+        if levels[-1] != n:
+            levels.append(n)
+    return levels
+
+
+def run_load_test(
+    model: str,
+    concurrency: int,
+    total_requests: int,
+    *,
+    base_url: str = OLLAMA_BASE_URL,
+) -> dict:
+    """以 concurrency 個並行請求對模型持續施壓（執行緒池維持 N 個請求在途），
+    共送出 total_requests 個請求，回傳該並行數下的彙總指標。"""
+    prompts = [
+        BENCHMARK_PROMPTS[i % len(BENCHMARK_PROMPTS)]["prompt"]
+        for i in range(total_requests)
+    ]
+    latencies: list[float] = []
+    output_tokens = 0
+    failed = 0
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(ollama_generate, model, p, base_url=base_url) for p in prompts]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception:
+                failed += 1
+                continue
+            latencies.append(result["latency"])
+            output_tokens += result["eval_count"]
+    duration = time.time() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "success": len(latencies),
+        "failed": failed,
+        "duration": round(duration, 3),
+        "requests_per_sec": round(len(latencies) / duration, 3) if duration > 0 else 0,
+        "output_tokens_per_sec": round(output_tokens / duration, 3) if duration > 0 else 0,
+        "latency_p50": _percentile(latencies, 50),
+        "latency_p90": _percentile(latencies, 90),
+        "latency_p99": _percentile(latencies, 99),
+    }
+
+
+def run_load_tests_for_model(
+    model: str,
+    levels: list[int],
+    requests_per_level: int | None,
+    *,
+    base_url: str = OLLAMA_BASE_URL,
+    label: str | None = None,
+) -> list[dict]:
+    """依序以各並行數執行負載測試。label 為輸出時顯示的模型名稱（多伺服器時含伺服器）。"""
+    print(f"🚀 並行負載測試：{label or model}（並行數 {', '.join(map(str, levels))}）")
+    results: list[dict] = []
+    for level in levels:
+        total = requests_per_level or max(level * 4, len(BENCHMARK_PROMPTS))
+        result = run_load_test(model, level, total, base_url=base_url)
+        print(
+            f"  ▶ {label or model} 並行 {level:>3}：{result['requests_per_sec']} req/s | "
+            f"{result['output_tokens_per_sec']} tok/s | "
+            f"p50 {result['latency_p50']}s / p90 {result['latency_p90']}s / p99 {result['latency_p99']}s"
+            + (f" | ❌ {result['failed']} 失敗" if result["failed"] else "")
+        )
+        results.append(result)
+    return results
+
+
+def _wait_until_unloaded(model: str, timeout: float = 30, base_url: str = OLLAMA_BASE_URL) -> bool:
+    """輪詢 /api/ps 直到模型不在執行清單中，確保下一次請求為冷啟動"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
         try:
-            result = ollama_generate(model, item["prompt"])
-            print(f"  ⏱ {result['latency']}s | 📏 {result['length']} chars")
-            results.append({
-                "test": item["name"],
-                "prompt": item["prompt"],
-                **result,
-                "success": True,
-            })
+            if _find_running(model, get_running_models(base_url)) is None:
+                return True
+        except requests.RequestException:
+            return False
+        time.sleep(0.2)
+    return False
+
+
+def profile_model_load(
+    model: str,
+    cycles: int,
+    *,
+    base_url: str = OLLAMA_BASE_URL,
+    label: str | None = None,
+) -> dict:
+    """模型載入剖析：重複「卸載 → 首次請求（冷啟動）→ 再次請求（熱啟動）」循環，
+    分開記錄冷載入時間與熱啟動 TTFT，並由 /api/ps 取得模型大小與 VRAM/RAM 分佈計算載入頻寬。"""
+    label = label or model
+    print(f"🧊 載入剖析：{label}（{cycles} 次循環）")
+    records: list[dict] = []
+    for i in range(cycles):
+        unload_model(model, base_url)
+        if not _wait_until_unloaded(model, base_url=base_url):
+            print(f"  ⚠️  {label} [{i + 1}/{cycles}] 模型未能在時限內卸載，本次結果可能不是冷啟動")
+        try:
+            cold = ollama_generate(model, LOAD_PROFILE_PROMPT, options=LOAD_PROFILE_OPTIONS, base_url=base_url)
+            ps_entry = _find_running(model, get_running_models(base_url)) or {}
+            warm = ollama_generate(model, LOAD_PROFILE_PROMPT, options=LOAD_PROFILE_OPTIONS, base_url=base_url)
         except Exception as e:
-            print(f"  ❌ 失敗：{e}")
-            results.append({
-                "test": item["name"],
-                "prompt": item["prompt"],
-                "response": "",
-                "latency": None,
-                "length": 0,
-                "success": False,
-                "error": str(e),
-            })
-    return results
+            print(f"  ❌ {label} [{i + 1}/{cycles}] 失敗：{e}")
+            records.append({"cycle": i + 1, "success": False, "error": str(e)})
+            continue
+
+        size = ps_entry.get("size", 0)
+        size_vram = ps_entry.get("size_vram", 0)
+        load_time = cold["load_time"]
+        record = {
+            "cycle": i + 1,
+            "cold_load_time": load_time,
+            "cold_ttft": cold["ttft"],
+            "cold_latency": cold["latency"],
+            "warm_load_time": warm["load_time"],
+            "warm_ttft": warm["ttft"],
+            "warm_latency": warm["latency"],
+            "size": size,
+            "size_vram": size_vram,
+            "size_ram": max(size - size_vram, 0),
+            "load_bandwidth": round(size / load_time) if load_time else None,
+            "success": True,
+        }
+        bandwidth = (
+            f"{ollama_client.format_bytes(record['load_bandwidth'])}/s" if record["load_bandwidth"] else "N/A"
+        )
+        print(
+            f"  {label} [{i + 1}/{cycles}] 冷載入 {load_time}s | 冷 TTFT {cold['ttft']}s | "
+            f"熱 TTFT {warm['ttft']}s | 載入頻寬 {bandwidth}"
+        )
+        records.append(record)
+
+    ok = [r for r in records if r["success"]]
+    profile: dict = {"cycles": records}
+    if ok:
+        last = ok[-1]
+        profile.update({
+            "size": last["size"],
+            "size_vram": last["size_vram"],
+            "size_ram": last["size_ram"],
+            "stats": {
+                metric: _describe([r[metric] for r in ok if r[metric] is not None])
+                for metric in ("cold_load_time", "cold_ttft", "warm_ttft", "load_bandwidth")
+            },
+        })
+    return profile
+
+
+# ---------------------------------------------------------------------------
+# 上下文長度掃描
+# ---------------------------------------------------------------------------
+
+def _parse_sweep_sizes(spec: str) -> list[int]:
+    """解析以逗號分隔的 prompt token 數（如 64,1024,30000），由小到大排列"""
+    try:
+        sizes = sorted({int(v) for v in spec.split(",") if v.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError("token 數必須為正整數") from None
+    if not sizes or sizes[0] < 1:
+        raise argparse.ArgumentTypeError("token 數必須為正整數")
+    return sizes
+
+
+def _synthetic_prompt(tokens: int, chars_per_token: float, tag: str) -> str:
+    """產生約 tokens 個 token 的合成 prompt。開頭的 tag 每步不同，
+    避免 Ollama 沿用上一步的 prompt 前綴快取而高估處理速度。"""
+    target_chars = int(tokens * chars_per_token)
+    parts = [f"（掃描 {tag}）以下是一份內部紀錄：\n"]
+    length = len(parts[0])
+    i = 0
+    while length < target_chars:
+        sentence = SWEEP_FILLER[i % len(SWEEP_FILLER)].format(i=i + 1)
+        parts.append(sentence)
+        length += len(sentence)
+        i += 1
+    return "".join(parts) + SWEEP_INSTRUCTION
+
+
+def _context_num_ctx(tokens: int) -> int:
+    """容納 prompt（預留 15% 估算誤差）與輸出的最小 2 的冪次 context 長度"""
+    needed = int(tokens * 1.15) + CONTEXT_SWEEP_NUM_PREDICT
+    num_ctx = CONTEXT_SWEEP_MIN_CTX
+    while num_ctx < needed:
+        num_ctx *= 2
+    return num_ctx
+
+
+def _model_context_length(model: str, base_url: str) -> int | None:
+    """由 /api/show 的 model_info 取得模型訓練時的最大 context 長度"""
+    try:
+        info = ollama_client.show(base_url, model).get("model_info") or {}
+    except requests.RequestException:
+        return None
+    arch = info.get("general.architecture")
+    return info.get(f"{arch}.context_length") if arch else None
+
+
+def _fit_quadratic(xs: list[float], ys: list[float]) -> dict | None:
+    """以最小平方法擬合 y = c0 + c1·x + c2·x²（注意力計算使長 prompt 的成本呈二次成長），
+    回傳係數與 R²；少於 3 個點時無法擬合。"""
+    if len(xs) < 3:
+        return None
+    # 正規方程式 (XᵀX)c = Xᵀy，以高斯消去法求解 3×3 線性系統
+    powers = [sum(x ** k for x in xs) for k in range(5)]
+    matrix = [[powers[i + j] for j in range(3)] + [sum(y * x ** i for x, y in zip(xs, ys))] for i in range(3)]
+    for col in range(3):
+        pivot = max(range(col, 3), key=lambda row: abs(matrix[row][col]))
+        if abs(matrix[pivot][col]) < 1e-12:
+            return None
+        matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+        for row in range(3):
+            if row != col:
+                factor = matrix[row][col] / matrix[col][col]
+                matrix[row] = [a - factor * b for a, b in zip(matrix[row], matrix[col])]
+    coeffs = [matrix[i][3] / matrix[i][i] for i in range(3)]
+    mean_y = statistics.fmean(ys)
+    ss_tot = sum((y - mean_y) ** 2 for y in ys)
+    ss_res = sum((y - (coeffs[0] + coeffs[1] * x + coeffs[2] * x * x)) ** 2 for x, y in zip(xs, ys))
+    return {
+        "c0": coeffs[0],
+        "c1": coeffs[1],
+        "c2": coeffs[2],
+        "r2": round(1 - ss_res / ss_tot, 4) if ss_tot else None,
+    }
+
+
+def context_sweep(
+    model: str,
+    sizes: list[int],
+    *,
+    base_url: str = OLLAMA_BASE_URL,
+    label: str | None = None,
+) -> dict:
+    """上下文長度掃描：以長度遞增的合成 prompt 搭配足以容納的 num_ctx，量測每一步的
+    prompt 處理速度、TTFT 與 /api/ps 記憶體佔用，並擬合 prompt 處理時間與 TTFT 的成長曲線。
+    prompt 處理速度低於先前最佳值 COLLAPSE_RATIO 倍，或 VRAM 佔比比先前下降（KV cache 放不下而溢出至系統記憶體）
+    時標記為效能崩落；
+    請求失敗（OOM 或其他錯誤）即停止，更長的 prompt 不會成功。"""
+    label = label or model
+    max_context = _model_context_length(model, base_url)
+    print(
+        f"📏 上下文長度掃描：{label}（prompt {', '.join(map(str, sizes))} tokens"
+        + (f"，模型上限 {max_context}" if max_context else "") + "）"
+    )
+    nonce = f"{random.getrandbits(32):08x}"
+    chars_per_token = 2.0  # 第一步後依伺服器回報的 prompt token 數校正
+    steps: list[dict] = []
+    best_tps = 0.0
+    best_vram_ratio = 0.0
+    collapse_at = oom_at = None
+    for i, target in enumerate(sizes):
+        num_ctx = _context_num_ctx(target)
+        step: dict = {"target_tokens": target, "num_ctx": num_ctx}
+        if max_context and target + CONTEXT_SWEEP_NUM_PREDICT > max_context:
+            print(f"  ⏭ {label} {target} tokens：超過模型 context 上限 {max_context}，略過")
+            steps.append({**step, "status": "skipped"})
+            continue
+        if max_context:
+            step["num_ctx"] = num_ctx = min(num_ctx, max_context)
+        prompt = _synthetic_prompt(target, chars_per_token, f"{nonce}-{i}")
+        options = {"num_ctx": num_ctx, "num_predict": CONTEXT_SWEEP_NUM_PREDICT}
+        try:
+            # 先以相同 num_ctx 送出短請求：num_ctx 改變時 Ollama 會重新載入模型，
+            # 載入時間另外記錄，不混入量測請求的 TTFT
+            preload = ollama_generate(model, LOAD_PROFILE_PROMPT, {"num_ctx": num_ctx, "num_predict": 1}, base_url=base_url)
+            result = ollama_generate(model, prompt, options, base_url=base_url)
+            ps_entry = _find_running(model, get_running_models(base_url)) or {}
+        except Exception as e:
+            oom = ollama_client.is_oom_error(str(e))
+            status = "oom" if oom else "error"
+            if oom and oom_at is None:
+                oom_at = target
+            print(f"  {'💥' if oom else '❌'} {label} {target} tokens（num_ctx {num_ctx}）失敗：{e}")
+            steps.append({**step, "status": status, "error": str(e)})
+            break
+
+        if result["prompt_eval_count"]:
+            chars_per_token = (len(prompt) - len(SWEEP_INSTRUCTION)) / result["prompt_eval_count"]
+        size = ps_entry.get("size", 0)
+        size_vram = ps_entry.get("size_vram", 0)
+        prompt_tps = result["prompt_tps"]
+        vram_ratio = size_vram / size if size else None
+        spilled = vram_ratio is not None and vram_ratio < best_vram_ratio * resource_monitor.SPILL_THRESHOLD
+        collapsed = (prompt_tps is not None and prompt_tps < best_tps * COLLAPSE_RATIO) or spilled
+        if prompt_tps:
+            best_tps = max(best_tps, prompt_tps)
+        if vram_ratio is not None:
+            best_vram_ratio = max(best_vram_ratio, vram_ratio)
+        if collapsed and collapse_at is None:
+            collapse_at = result["prompt_eval_count"] or target
+        step.update({
+            "prompt_tokens": result["prompt_eval_count"],
+            "prompt_tps": prompt_tps,
+            "prompt_eval_time": result["prompt_eval_time"],
+            "ttft": result["ttft"],
+            "latency": result["latency"],
+            "load_time": preload["load_time"],
+            "size": size,
+            "size_vram": size_vram,
+            "status": "collapse" if collapsed else "ok",
+        })
+        print(
+            f"  {'📉' if collapsed else '✅'} {label} {result['prompt_eval_count']} tokens（num_ctx {num_ctx}）："
+            f"📥 prompt {prompt_tps} tok/s | ⚡ TTFT {result['ttft']}s | 📦 載入 {preload['load_time']}s | "
+            f"💾 {ollama_client.format_bytes(size)}（VRAM {ollama_client.format_bytes(size_vram)}）"
+            + ("｜⚠️  效能崩落" if collapsed else "")
+        )
+        steps.append(step)
+
+    measured = [s for s in steps if s["status"] in ("ok", "collapse") and s["prompt_tokens"]]
+    with_ttft = [s for s in measured if s["ttft"] is not None]
+    fit = {
+        "prompt_eval_time": _fit_quadratic(
+            [s["prompt_tokens"] for s in measured], [s["prompt_eval_time"] for s in measured]
+        ),
+        "ttft": _fit_quadratic([s["prompt_tokens"] for s in with_ttft], [s["ttft"] for s in with_ttft]),
+    }
+    return {
+        "max_context": max_context,
+        "steps": steps,
+        "fit": fit,
+        "collapse_at": collapse_at,
+        "oom_at": oom_at,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 執行參數調校
+# ---------------------------------------------------------------------------
+
+def _parse_tune_param(spec: str) -> tuple[str, list[int | float]]:
+    """解析 NAME=V1,V2,...（如 num_thread=4,8,16）為 Ollama 選項名稱與候選值"""
+    name, sep, values = spec.partition("=")
+    name = name.strip()
+    if not sep or not name.isidentifier():
+        raise argparse.ArgumentTypeError(f"格式應為 NAME=V1,V2,...：{spec}")
+    parsed: list[int | float] = []
+    for v in values.split(","):
+        v = v.strip()
+        if not v:
+            continue
+        try:
+            parsed.append(int(v))
+        except ValueError:
+            try:
+                parsed.append(float(v))
+            except ValueError:
+                raise argparse.ArgumentTypeError(f"{name} 的候選值必須為數字：{v}") from None
+    if not parsed:
+        raise argparse.ArgumentTypeError(f"{name} 至少需要一個候選值")
+    return name, list(dict.fromkeys(parsed))
+
+
+def _tune_grid(params: list[tuple[str, list]]) -> dict[str, list]:
+    """--tune 參數轉為網格；未指定任何參數時使用 TUNE_DEFAULT_GRID"""
+    return dict(params) if params else dict(TUNE_DEFAULT_GRID)
+
+
+def _options_label(options: dict) -> str:
+    return ", ".join(f"{k}={v}" for k, v in options.items()) or "預設"
+
+
+def tune_options(
+    model: str,
+    grid: dict[str, list],
+    *,
+    base_url: str = OLLAMA_BASE_URL,
+    label: str | None = None,
+) -> dict:
+    """執行參數調校：以 successive halving 搜尋網格中生成速度最快的 Ollama 選項組合。
+
+    候選為網格的笛卡兒積再加上「預設」（不傳 options）作為比較基準。每輪對存活的設定各量測
+    數次（同一設定連續送出，避免選項改變造成模型反覆重新載入），依累計的伺服器端生成速度
+    （eval_tps）排序，只保留前 1/TUNE_ETA 進入下一輪、量測次數乘以 TUNE_ETA（上限 TUNE_MAX_REQUESTS），
+    直到剩下一個設定。
+    請求失敗（如 num_gpu 過高或 num_ctx 過大造成 OOM）的設定直接淘汰。"""
+    label = label or model
+    names = list(grid)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    candidates.append({})
+    print(
+        f"🎛 參數調校：{label}（{' × '.join(f'{k} {len(v)}' for k, v in grid.items())}"
+        f"，共 {len(candidates)} 組含預設）"
+    )
+    configs = [{"options": c, "eval_tps": [], "prompt_tps": [], "ttft": [], "eliminated_in": None} for c in candidates]
+    nonce = f"{random.getrandbits(32):08x}"
+    counter = itertools.count()
+    alive = list(range(len(configs)))
+    rounds: list[dict] = []
+    requests_per_config = 1
+    round_no = 0
+    while True:
+        round_no += 1
+        for idx in alive:
+            config = configs[idx]
+            options = {**config["options"], "num_predict": TUNE_NUM_PREDICT}
+            for _ in range(requests_per_config):
+                # 每次 prompt 開頭不同，避免 prompt 前綴快取讓後續請求略過 prompt 處理
+                prompt = _synthetic_prompt(TUNE_PROMPT_TOKENS, 2.0, f"{nonce}-{next(counter)}")
+                try:
+                    result = ollama_generate(model, prompt, options, base_url=base_url)
+                except Exception as e:
+                    config["error"] = str(e)
+                    config["oom"] = ollama_client.is_oom_error(str(e))
+                    break
+                if result["eval_tps"] is not None:
+                    config["eval_tps"].append(result["eval_tps"])
+                if result["prompt_tps"] is not None:
+                    config["prompt_tps"].append(result["prompt_tps"])
+                if result["ttft"] is not None:
+                    config["ttft"].append(result["ttft"])
+
+        def score(idx: int) -> float:
+            config = configs[idx]
+            return 0.0 if config.get("error") or not config["eval_tps"] else statistics.fmean(config["eval_tps"])
+
+        ranked = sorted(alive, key=score, reverse=True)
+        survivors = [idx for idx in ranked if not configs[idx].get("error") and configs[idx]["eval_tps"]]
+        keep = survivors[: max(1, -(-len(alive) // TUNE_ETA))]
+        rounds.append({
+            "round": round_no,
+            "requests_per_config": requests_per_config,
+            "configs": len(alive),
+            "kept": len(keep),
+        })
+        for idx in alive:
+            if idx not in keep:
+                configs[idx]["eliminated_in"] = round_no
+        leader = configs[keep[0]] if keep else None
+        print(
+            f"  第 {round_no} 輪：{len(alive)} 組 × {requests_per_config} 次 → 保留 {len(keep)} 組"
+            + (f"｜領先 {_options_label(leader['options'])}（{score(keep[0]):.2f} tok/s）" if leader else "")
+        )
+        alive = keep
+        if len(alive) <= 1:
+            break
+        requests_per_config = min(requests_per_config * TUNE_ETA, TUNE_MAX_REQUESTS)
+
+    summaries = []
+    for config in configs:
+        summary = {
+            "options": config["options"],
+            "eval_tps": round(statistics.fmean(config["eval_tps"]), 2) if config["eval_tps"] else None,
+            "prompt_tps": round(statistics.fmean(config["prompt_tps"]), 2) if config["prompt_tps"] else None,
+            "ttft": round(statistics.fmean(config["ttft"]), 3) if config["ttft"] else None,
+            "runs": len(config["eval_tps"]),
+            "eliminated_in": config["eliminated_in"],
+        }
+        if config.get("error"):
+            summary["error"] = config["error"]
+            summary["oom"] = config["oom"]
+        summaries.append(summary)
+
+    best = summaries[alive[0]] if alive else None
+    default = summaries[-1]
+    if best:
+        gain = (
+            f"，較預設 {best['eval_tps'] / default['eval_tps'] - 1:+.1%}"
+            if default["eval_tps"] and best["options"] else ""
+        )
+        print(f"  🏆 {label} 最佳設定：{_options_label(best['options'])}（{best['eval_tps']} tok/s{gain}）")
+    else:
+        print(f"  ❌ {label} 所有設定皆失敗")
+    return {
+        "grid": grid,
+        "metric": "eval_tps",
+        "rounds": rounds,
+        "configs": summaries,
+        "best": best,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 多伺服器排程
+# ---------------------------------------------------------------------------
+
+def _model_label(model: str, server: str, multi_server: bool) -> str:
+    """報告中的模型鍵值：單機時為模型名稱，多伺服器時附加伺服器簡稱"""
+    return f"{model} @ {ollama_client.server_name(server)}" if multi_server else model
+
+
+def _interleave(iterables: list[Iterable]) -> Iterator:
+    """輪流從多個可迭代物件取值（round-robin），讓各伺服器的工作交錯進入排程"""
+    iterators = [iter(it) for it in iterables]
+    while iterators:
+        for it in list(iterators):
+            try:
+                yield next(it)
+            except StopIteration:
+                iterators.remove(it)
+
+
+class FleetScheduler:
+    """多伺服器工作排程器。
+
+    每台伺服器各有一個工作佇列與 concurrency 個工作執行緒，(server, model, test) 工作
+    依原屬伺服器分派並平行執行。工作失敗時改派到其他同樣提供該模型、且尚未嘗試過的
+    伺服器重試；結果仍記錄在原屬伺服器下，並以 executed_on / attempts 標註實際執行位置。
+    run() 以 generator 形式在工作完成時逐筆回傳結果；讀取工作時發生的例外（例如題庫格式錯誤）
+    會在已分派的工作完成、工作執行緒結束後由 run() 重新拋出。
+    """
+
+    def __init__(
+        self,
+        server_models: dict[str, list[str]],
+        run_job: Callable[[str, str, dict], dict],
+        concurrency: int = 1,
+    ):
+        self.server_models = server_models
+        self.run_job = run_job
+        self.concurrency = concurrency
+        self._queues: dict[str, queue.Queue] = {s: queue.Queue() for s in server_models}
+        self._results: queue.Queue = queue.Queue()
+        # 限制已分派但尚未完成的工作數，避免大量工作一次塞進佇列
+        self._pending = threading.BoundedSemaphore(max(64, len(server_models) * concurrency * 8))
+
+    def run(self, jobs: Iterable[tuple[str, str, dict]]) -> Iterator[tuple[str, str, dict, dict]]:
+        """執行所有 (server, model, item) 工作，逐筆回傳 (server, model, item, result)"""
+        workers = [
+            threading.Thread(target=self._worker, args=(server,), daemon=True)
+            for server in self._queues
+            for _ in range(self.concurrency)
+        ]
+        for w in workers:
+            w.start()
+        threading.Thread(target=self._dispatch, args=(jobs,), daemon=True).start()
+
+        total: int | None = None
+        error: Exception | None = None
+        finished = 0
+        while total is None or finished < total:
+            kind, payload = self._results.get()
+            if kind == "dispatched":
+                total, error = payload
+                continue
+            finished += 1
+            self._pending.release()
+            yield payload
+
+        for q in self._queues.values():
+            for _ in range(self.concurrency):
+                q.put(None)
+        for w in workers:
+            w.join()
+        if error is not None:
+            raise error
+
+    def _dispatch(self, jobs: Iterable[tuple[str, str, dict]]) -> None:
+        count = 0
+        error = None
+        try:
+            for server, model, item in jobs:
+                self._pending.acquire()
+                self._queues[server].put({
+                    "server": server, "model": model, "item": item, "tried": [], "attempts": [],
+                })
+                count += 1
+        except Exception as e:
+            error = e
+        finally:
+            # 一律回報已分派的工作數，否則 run() 會一直等待結果，工作執行緒也收不到結束訊號
+            self._results.put(("dispatched", (count, error)))
+
+    def _worker(self, server: str) -> None:
+        while True:
+            job = self._queues[server].get()
+            if job is None:
+                return
+            try:
+                result = self.run_job(server, job["model"], job["item"])
+            except Exception as e:  # run_job 應自行處理錯誤，此處僅為保險
+                result = {"test": job["item"]["name"], "prompt": job["item"]["prompt"],
+                          "success": False, "error": str(e)}
+            job["tried"].append(server)
+
+            if not result.get("success"):
+                fallback = self._pick_fallback(job)
+                if fallback:
+                    job["attempts"].append({"server": server, "error": result.get("error")})
+                    self._queues[fallback].put(job)
+                    continue
+
+            if job["attempts"]:
+                result["executed_on"] = server
+                result["attempts"] = job["attempts"]
+            self._results.put(("result", (job["server"], job["model"], job["item"], result)))
+
+    def _pick_fallback(self, job: dict) -> str | None:
+        """挑選提供同一模型、尚未嘗試過且佇列最短的伺服器"""
+        candidates = [
+            s for s, models in self.server_models.items()
+            if job["model"] in models and s not in job["tried"]
+        ]
+        return min(candidates, key=lambda s: self._queues[s].qsize()) if candidates else None
 
 
 def interactive_chat(model: str) -> None:
@@ -128,21 +1203,1400 @@ def interactive_chat(model: str) -> None:
         print(f"{model}：\n{reply['response']}\n")
 
 
+# ---------------------------------------------------------------------------
+# 常駐監控（--daemon）
+# ---------------------------------------------------------------------------
+
+class ProbeMetrics:
+    """常駐監控匯出的指標，以 model / server（host:port）為標籤"""
+
+    def __init__(self):
+        r = self.registry = metrics_exporter.MetricsRegistry()
+        labels = ("model", "server")
+        self.latency = r.histogram("ollama_probe_latency_seconds", "探測請求的端到端延遲", labels, LATENCY_BUCKETS)
+        self.ttft = r.histogram("ollama_probe_ttft_seconds", "探測請求的首個 token 延遲（TTFT）", labels, TTFT_BUCKETS)
+        self.load = r.histogram(
+            "ollama_probe_load_seconds", "伺服器端模型載入時間（load_duration，模型已常駐時為 0）", labels, LOAD_BUCKETS
+        )
+        self.eval_tps = r.gauge("ollama_probe_eval_tokens_per_second", "最近一次探測的伺服器端生成速度", labels)
+        self.prompt_tps = r.gauge("ollama_probe_prompt_tokens_per_second", "最近一次探測的伺服器端 prompt 處理速度", labels)
+        self.requests = r.counter("ollama_probe_requests", "送出的探測請求數", labels)
+        self.errors = r.counter("ollama_probe_errors", "失敗的探測請求數（含 OOM）", labels)
+        self.oom = r.counter("ollama_probe_oom", "因記憶體不足（OOM）失敗的探測請求數", labels)
+        self.last_success = r.gauge("ollama_probe_last_success_timestamp_seconds", "最近一次探測成功的時間（Unix 秒）", labels)
+        self.vram = r.gauge("ollama_model_vram_bytes", "已載入模型在 VRAM 中的大小（/api/ps size_vram，未載入為 0）", labels)
+        self.size = r.gauge("ollama_model_size_bytes", "已載入模型的總佔用（/api/ps size，未載入為 0）", labels)
+        self.up = r.gauge("ollama_server_up", "最近一輪能否連線伺服器（1 / 0）", ("server",))
+        self.cycles = r.counter("ollama_probe_cycles", "完成的探測輪數")
+        self.cycle_duration = r.gauge("ollama_probe_cycle_duration_seconds", "最近一輪探測花費的時間")
+        self.last_cycle = r.gauge("ollama_probe_last_cycle_timestamp_seconds", "最近一輪探測完成的時間（Unix 秒）")
+
+
+def _probe_model(model: str, server: str, metrics: ProbeMetrics) -> str:
+    """對單一模型送出一次探測請求並更新指標，回傳主控台摘要"""
+    labels = {"model": model, "server": ollama_client.server_name(server)}
+    metrics.requests.inc(**labels)
+    try:
+        result = ollama_generate(model, DAEMON_PROBE_PROMPT, DAEMON_PROBE_OPTIONS, base_url=server)
+    except (requests.RequestException, OllamaError, ValueError) as e:
+        metrics.errors.inc(**labels)
+        oom = ollama_client.is_oom_error(str(e))
+        if oom:
+            metrics.oom.inc(**labels)
+        return f"{'💥 OOM' if oom else '❌ 失敗'}：{e}"
+    metrics.latency.observe(result["latency"], **labels)
+    if result["ttft"] is not None:
+        metrics.ttft.observe(result["ttft"], **labels)
+    metrics.load.observe(result["load_time"], **labels)
+    if result["eval_tps"] is not None:
+        metrics.eval_tps.set(result["eval_tps"], **labels)
+    if result["prompt_tps"] is not None:
+        metrics.prompt_tps.set(result["prompt_tps"], **labels)
+    metrics.last_success.set(round(time.time(), 3), **labels)
+    return (
+        f"⏱ {result['latency']}s | ⚡ TTFT {result['ttft']}s | 🔤 {result['eval_tps'] or 'N/A'} tok/s"
+        f" | 📦 載入 {result['load_time']}s"
+    )
+
+
+def _update_residency(server: str, models: list[str], metrics: ProbeMetrics) -> None:
+    """以 /api/ps 更新各模型的 VRAM / 記憶體佔用，未載入的模型設為 0"""
+    running = get_running_models(base_url=server)
+    for model in models:
+        info = _find_running(model, running) or {}
+        labels = {"model": model, "server": ollama_client.server_name(server)}
+        metrics.vram.set(info.get("size_vram", 0), **labels)
+        metrics.size.set(info.get("size", 0), **labels)
+
+
+def _probe_server(server: str, only: set[str] | None, metrics: ProbeMetrics) -> None:
+    """依序探測一台伺服器上的模型（每輪重新取得模型清單，新安裝的模型自動納入）"""
+    try:
+        models = get_available_models(base_url=server)
+    except requests.RequestException as e:
+        metrics.up.set(0, server=ollama_client.server_name(server))
+        print(f"⚠️  無法連線 {server}：{e}", flush=True)
+        return
+    metrics.up.set(1, server=ollama_client.server_name(server))
+    if only:
+        models = [m for m in models if m in only]
+    for model in models:
+        summary = _probe_model(model, server, metrics)
+        print(f"   {model} @ {ollama_client.server_name(server)}：{summary}", flush=True)
+        try:
+            _update_residency(server, models, metrics)
+        except requests.RequestException:
+            pass
+
+
+def run_daemon(
+    servers: list[str], metrics: ProbeMetrics, stop: threading.Event, *,
+    interval: float = DAEMON_INTERVAL, jitter: float = DAEMON_JITTER, only: set[str] | None = None,
+) -> None:
+    """常駐執行輕量探測，直到 stop 被設定。
+
+    每輪對所有伺服器平行（各伺服器內依序）探測每個模型一次，兩輪開始時間相隔 interval 秒並加上
+    ±jitter 比例的隨機抖動，第一輪前也隨機延遲，避免多個 daemon 或整點排程同時對伺服器施壓。
+    """
+    stop.wait(random.uniform(0, interval * jitter))
+    while not stop.is_set():
+        started = time.monotonic()
+        print(f"🔁 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 開始探測", flush=True)
+        with ThreadPoolExecutor(max_workers=len(servers)) as pool:
+            list(pool.map(lambda server: _probe_server(server, only, metrics), servers))
+        elapsed = time.monotonic() - started
+        metrics.cycles.inc()
+        metrics.cycle_duration.set(round(elapsed, 3))
+        metrics.last_cycle.set(round(time.time(), 3))
+        delay = max(0.0, interval * random.uniform(1 - jitter, 1 + jitter) - elapsed)
+        print(f"💤 本輪 {elapsed:.1f}s，{delay:.0f}s 後進行下一輪", flush=True)
+        stop.wait(delay)
+
+
+def start_daemon(servers: list[str], listen: tuple[str, int], **kwargs) -> None:
+    """啟動 /metrics 端點並常駐探測，直到 Ctrl+C 或 SIGTERM"""
+    metrics = ProbeMetrics()
+    try:
+        exporter = metrics_exporter.MetricsServer(metrics.registry, *listen)
+    except OSError as e:
+        print(f"❌ 無法監聽 {listen[0]}:{listen[1]}：{e}")
+        raise SystemExit(1)
+    exporter.start()
+    stop = threading.Event()
+    # systemd / docker stop 送出 SIGTERM；與 Ctrl+C 相同，等目前的探測請求結束後離開
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    host, port = exporter.address
+    print(f"📡 常駐監控：{', '.join(servers)}")
+    print(f"   指標：http://{host}:{port}/metrics（間隔 {kwargs.get('interval', DAEMON_INTERVAL)}s ± {kwargs.get('jitter', DAEMON_JITTER):.0%}）")
+    try:
+        run_daemon(servers, metrics, stop, **kwargs)
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        exporter.stop()
+    print("👋 常駐監控已停止")
+
+
+# ---------------------------------------------------------------------------
+# 開放迴路流量重播（--replay-log）
+# ---------------------------------------------------------------------------
+
+def _log_timestamp(value, where: str) -> float:
+    """請求日誌的時間：Unix 秒數或 ISO 8601 字串"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"{where} 的 timestamp 應為 Unix 秒數或 ISO 8601 字串")
+
+
+def iter_request_log(path: Path) -> Iterator[tuple[float, dict]]:
+    """逐行讀取擷取的請求日誌，產生 (距第一筆的秒數, 請求)，不會一次把整個檔案載入記憶體。
+
+    每行為一個 JSON 物件：timestamp、model 與 prompt 或 messages 為必要欄位，options、system 選填。
+    空白行與 # 開頭的註解行會略過。
+    """
+    first = None
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            where = f"{path}:{lineno}"
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{where} 不是有效的 JSON：{e}") from None
+            if not isinstance(raw, dict) or not isinstance(raw.get("model"), str):
+                raise ValueError(f"{where} 缺少字串欄位 model")
+            if not isinstance(raw.get("prompt"), str) and not isinstance(raw.get("messages"), list):
+                raise ValueError(f"{where} 需有字串欄位 prompt 或列表欄位 messages")
+            ts = _log_timestamp(raw.get("timestamp"), where)
+            first = ts if first is None else first
+            request = {"line": lineno, "model": raw["model"]}
+            for key in ("prompt", "messages", "options", "system"):
+                if raw.get(key):
+                    request[key] = raw[key]
+            yield ts - first, request
+
+
+def _classify_failure(error: Exception) -> str:
+    """重播請求失敗的分類：timeout、rejected（503 server busy）、oom 或 error"""
+    message = str(error)
+    # 等待回應標頭時逾時，urllib3 會包成 MaxRetryError，requests 拋出的是 ConnectionError 而非 Timeout
+    if isinstance(error, requests.Timeout) or "read timed out" in message.lower():
+        return "timeout"
+    response = getattr(error, "response", None)
+    if "server busy" in message.lower() or (response is not None and response.status_code == 503):
+        return "rejected"  # 伺服器佇列已滿（OLLAMA_MAX_QUEUE）
+    return "oom" if ollama_client.is_oom_error(message) else "error"
+
+
+def run_open_loop(
+    arrivals: Iterable[tuple[float, dict]],
+    *,
+    base_url: str = OLLAMA_BASE_URL,
+    max_inflight: int = REPLAY_MAX_INFLIGHT,
+    timeout: float = REPLAY_TIMEOUT,
+    on_result: Callable[[dict], None] | None = None,
+) -> list[dict]:
+    """開放迴路送出請求：每個請求在其到達時間（距開始的秒數）以獨立執行緒送出，不等待先前的請求完成，
+    回應變慢時後續請求照常送出並在伺服器端排隊，量到的延遲因而包含排隊時間（封閉迴路測試看不到）。
+
+    arrivals 可為 generator，依序取用。在途請求已達 max_inflight 時新請求直接記為 dropped，
+    避免客戶端無限制地建立執行緒。回傳每個請求的記錄（依送出順序），on_result 於每筆完成時呼叫。
+
+    請求一律經由不重試的 Session 送出：伺服器回傳 503（佇列已滿）時直接記為 rejected。重試會讓送到伺服器的
+    請求多於排定的到達數、把退避時間算進延遲，並掩蓋真正的拒絕與錯誤比例。
+    """
+    results: list[dict] = []
+    lock = threading.Lock()
+    inflight = threading.Semaphore(max_inflight)
+    threads: list[threading.Thread] = []
+
+    def finish(record: dict) -> None:
+        if on_result:
+            on_result(record)
+
+    def send(record: dict, request: dict) -> None:
+        try:
+            result = ollama_generate(
+                request["model"], request.get("prompt", ""), request.get("options"),
+                system=request.get("system"), messages=request.get("messages"),
+                base_url=base_url, timeout=timeout, retry=False,
+            )
+        except (requests.RequestException, OllamaError, ValueError) as e:
+            record.update(status=_classify_failure(e), error=str(e))
+        else:
+            ttft = result["ttft"]
+            record.update(
+                status="ok",
+                latency=result["latency"],
+                ttft=ttft,
+                load_time=result["load_time"],
+                prompt_eval_time=result["prompt_eval_time"],
+                eval_count=result["eval_count"],
+                eval_tps=result["eval_tps"],
+                # 首個 token 前不屬於載入與 prompt 評估的時間：主要是等待伺服器的處理槽（排隊）
+                queue_delay=round(max(0.0, ttft - result["load_time"] - result["prompt_eval_time"]), 3)
+                if ttft is not None else None,
+            )
+        finally:
+            inflight.release()
+        finish(record)
+
+    start = time.perf_counter()
+    for index, (offset, request) in enumerate(arrivals):
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent = time.perf_counter() - start
+        record = {
+            "index": index,
+            "line": request.get("line"),
+            "model": request["model"],
+            "scheduled": round(offset, 3),
+            "sent": round(sent, 3),
+            # 送出時間落後排定時間的秒數；持續增加代表客戶端本身跟不上重播速度
+            "lag": round(sent - offset, 3),
+        }
+        with lock:
+            results.append(record)
+        if not inflight.acquire(blocking=False):
+            record.update(status="dropped", error=f"在途請求已達上限 {max_inflight}")
+            finish(record)
+            continue
+        thread = threading.Thread(target=send, args=(record, request), daemon=True)
+        thread.start()
+        threads.append(thread)
+        threads = [t for t in threads if t.is_alive()] if len(threads) > 2 * max_inflight else threads
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize_replay(records: list[dict], duration: float) -> dict:
+    """依模型彙整重播結果：各狀態數量與比例、延遲 / TTFT / 排隊延遲分佈與吞吐量"""
+    by_model: dict[str, list[dict]] = {}
+    for r in records:
+        by_model.setdefault(r["model"], []).append(r)
+
+    def stats(rows: list[dict]) -> dict:
+        ok = [r for r in rows if r.get("status") == "ok"]
+        counts = {status: sum(1 for r in rows if r.get("status") == status) for status in REPLAY_STATUSES}
+        summary = {"requests": len(rows), **counts}
+        summary["drop_rate"] = round((counts["rejected"] + counts["dropped"]) / len(rows), 4) if rows else 0
+        summary["timeout_rate"] = round(counts["timeout"] / len(rows), 4) if rows else 0
+        summary["error_rate"] = round((len(rows) - counts["ok"]) / len(rows), 4) if rows else 0
+        for key in ("latency", "ttft", "queue_delay"):
+            values = [r[key] for r in ok if r.get(key) is not None]
+            summary[key] = {f"p{p}": _percentile(values, p) for p in (50, 90, 99)}
+            summary[key]["max"] = round(max(values), 3) if values else None
+        summary["requests_per_sec"] = round(len(ok) / duration, 3) if duration > 0 else 0
+        summary["output_tokens_per_sec"] = round(sum(r.get("eval_count", 0) for r in ok) / duration, 3) if duration > 0 else 0
+        return summary
+
+    lags = [r["lag"] for r in records]
+    return {
+        "duration": round(duration, 3),
+        "dispatch_lag": {"p50": _percentile(lags, 50), "p99": _percentile(lags, 99), "max": round(max(lags), 3) if lags else None},
+        "overall": stats(records),
+        "models": {model: stats(rows) for model, rows in sorted(by_model.items())},
+    }
+
+
+def _print_replay_summary(summary: dict) -> None:
+    def dist(d: dict) -> str:
+        return f"p50 {d['p50']}s / p90 {d['p90']}s / p99 {d['p99']}s"
+
+    for name, s in [*summary["models"].items(), ("（全部）", summary["overall"])]:
+        failed = {k: s[k] for k in REPLAY_STATUSES if k != "ok" and s[k]}
+        print(
+            f"  ▶ {name}：{s['ok']}/{s['requests']} 成功 | {s['requests_per_sec']} req/s | "
+            f"延遲 {dist(s['latency'])} | 排隊 {dist(s['queue_delay'])} | TTFT p99 {s['ttft']['p99']}s"
+            + (f" | ❌ {'、'.join(f'{k} {v}' for k, v in failed.items())}" if failed else "")
+            + f" | 丟棄率 {s['drop_rate']:.1%}、逾時率 {s['timeout_rate']:.1%}"
+        )
+
+
+def run_replay(
+    path: Path, *, server: str, time_scale: float, max_inflight: int, timeout: float, trace: bool = False,
+) -> Path:
+    """以開放迴路重播請求日誌，結果寫入 chats/replay_<時間>/，回傳執行目錄"""
+    run_dir = CHATS_DIR / f"replay_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    ollama_client.ensure_pool_size(max_inflight)
+
+    lock = threading.Lock()
+    done = {status: 0 for status in REPLAY_STATUSES}
+    results_file = open(run_dir / "replay_results.jsonl", "w", encoding="utf-8")
+
+    def on_result(record: dict) -> None:
+        with lock:
+            done[record["status"]] += 1
+            results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    stop = threading.Event()
+
+    def progress() -> None:
+        started = time.perf_counter()
+        while not stop.wait(REPLAY_PROGRESS_INTERVAL):
+            with lock:
+                finished = sum(done.values())
+                line = "、".join(f"{k} {v}" for k, v in done.items() if v)
+            print(f"   ⏱ {time.perf_counter() - started:.0f}s：已完成 {finished}（{line or '尚無'}）", flush=True)
+
+    arrivals = ((offset / time_scale, request) for offset, request in iter_request_log(path))
+    if trace:
+        perf_trace.start(run_dir / "replay_trace.json", tool="ollama-benchmark.py --replay-log", log=str(path), server=server)
+    print(f"🔁 開放迴路重播 {path}（{time_scale:g} 倍速，在途上限 {max_inflight}，讀取逾時 {timeout:g}s）→ {server}", flush=True)
+    reporter = threading.Thread(target=progress, daemon=True)
+    reporter.start()
+    start = time.perf_counter()
+    try:
+        records = run_open_loop(arrivals, base_url=server, max_inflight=max_inflight, timeout=timeout, on_result=on_result)
+    finally:
+        stop.set()
+        results_file.close()
+        trace_file = perf_trace.stop()
+    duration = time.perf_counter() - start
+
+    summary = summarize_replay(records, duration)
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "log": str(path),
+        "server": server,
+        "time_scale": time_scale,
+        "max_inflight": max_inflight,
+        "timeout": timeout,
+        **summary,
+    }
+    with open(run_dir / "replay_report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📊 重播結果（{len(records)} 個請求，{duration:.1f}s；送出延遲 p99 {summary['dispatch_lag']['p99']}s）", flush=True)
+    _print_replay_summary(summary)
+    print(f"\n📁 結果：{run_dir}/replay_report.json、replay_results.jsonl", flush=True)
+    if trace_file:
+        print(f"🔍 請求追蹤：{trace_file}（以 https://ui.perfetto.dev 開啟）", flush=True)
+    return run_dir
+
+
+# ---------------------------------------------------------------------------
+# SLO 容量搜尋（--capacity）
+# ---------------------------------------------------------------------------
+
+def _parse_slo(spec: str) -> dict[str, float]:
+    """解析 --slo（如 ttft_p95=2,latency_p99=30,error_rate=0.01）。
+    指標為 ttft / latency / queue_delay 加上 _pNN 百分位數（秒），或 error_rate（0 ~ 1）。"""
+    slo: dict[str, float] = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition("=")
+        name = name.strip()
+        metric, _, pct = name.rpartition("_p")
+        valid = name == "error_rate" or (metric in SLO_METRICS and pct.isdigit() and 0 < int(pct) < 100)
+        if not sep or not valid:
+            raise argparse.ArgumentTypeError(
+                f"SLO 應為 {'/'.join(SLO_METRICS)}_pNN=秒數 或 error_rate=比例：{part.strip()}"
+            )
+        try:
+            slo[name] = float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"{name} 的門檻必須為數字：{value}") from None
+        if slo[name] <= 0:
+            raise argparse.ArgumentTypeError(f"{name} 的門檻必須大於 0")
+    if not slo:
+        raise argparse.ArgumentTypeError("至少需要一個 SLO 條件")
+    return slo
+
+
+def _slo_label(slo: dict[str, float]) -> str:
+    return "、".join(f"{k} ≤ {v:g}" + ("" if k == "error_rate" else "s") for k, v in slo.items())
+
+
+def _poisson_arrivals(model: str, rate: float, window: float, seed: int) -> Iterator[tuple[float, dict]]:
+    """到達率為 rate（請求/秒）的 Poisson 過程：間隔為指數分佈，產生 window 秒內的 (秒數, 請求)，
+    不足 CAPACITY_MIN_REQUESTS 個時繼續產生到足夠為止"""
+    rng = random.Random(seed)
+    offset = rng.expovariate(rate)
+    index = 0
+    while offset < window or index < CAPACITY_MIN_REQUESTS:
+        item = BENCHMARK_PROMPTS[index % len(BENCHMARK_PROMPTS)]
+        yield offset, {
+            "model": model,
+            "prompt": item["prompt"],
+            "options": {"num_predict": CAPACITY_NUM_PREDICT, **(item.get("options") or {})},
+            "system": item.get("system"),
+        }
+        index += 1
+        offset += rng.expovariate(rate)
+
+
+def _slo_values(records: list[dict], slo: dict[str, float]) -> dict[str, float | None]:
+    """各 SLO 指標的實測值：百分位數只計成功的請求，error_rate 為非成功請求的比例"""
+    ok = [r for r in records if r.get("status") == "ok"]
+    values: dict[str, float | None] = {}
+    for name in slo:
+        if name == "error_rate":
+            values[name] = round((len(records) - len(ok)) / len(records), 4) if records else None
+        else:
+            metric, _, pct = name.rpartition("_p")
+            values[name] = _percentile([r[metric] for r in ok if r.get(metric) is not None], int(pct))
+    return values
+
+
+def capacity_search(
+    model: str,
+    slo: dict[str, float],
+    *,
+    window: float = CAPACITY_WINDOW,
+    start_rate: float = CAPACITY_START_RATE,
+    max_rate: float = CAPACITY_MAX_RATE,
+    min_rate: float | None = None,
+    base_url: str = OLLAMA_BASE_URL,
+    label: str | None = None,
+) -> dict:
+    """SLO 容量搜尋：找出模型在符合 SLO 下可持續的最大到達率（請求/秒）。
+
+    每一步以 Poisson 到達的開放迴路流量（run_open_loop）持續 window 秒（至少 CAPACITY_MIN_REQUESTS 個請求），
+    並等待所有請求結束。
+    先由 start_rate 起逐步加倍，直到違反 SLO 或超過 max_rate；之後在最後達標與第一個未達標的
+    到達率之間二分搜尋，兩者相差不到 CAPACITY_PRECISION 或達 CAPACITY_MAX_STEPS 步即停止。
+    請求全部失敗時百分位數沒有值，視為未達標；第一步就未達標時往下二分，但不低於 min_rate
+    （預設 start_rate / CAPACITY_MIN_RATE_DIVISOR）：低到達率的每一步至少要 CAPACITY_MIN_REQUESTS / rate 秒，
+    一路減半到步數上限會耗上數小時。到 min_rate 仍未達標時 limit 為 below_min_rate。"""
+    label = label or model
+    min_rate = min_rate or start_rate / CAPACITY_MIN_RATE_DIVISOR
+    print(f"📐 SLO 容量搜尋：{label}（{_slo_label(slo)}，每步 {window:g}s）")
+    try:
+        # 先載入模型，避免第一步量到冷載入
+        ollama_generate(model, LOAD_PROFILE_PROMPT, LOAD_PROFILE_OPTIONS, base_url=base_url)
+    except (requests.RequestException, OllamaError, ValueError) as e:
+        print(f"  ❌ {label} 無法載入：{e}")
+        return {"slo": slo, "window": window, "steps": [], "error": str(e), "oom": ollama_client.is_oom_error(str(e))}
+
+    steps: list[dict] = []
+
+    def measure(rate: float) -> bool:
+        rate = round(rate, 3)
+        arrivals = _poisson_arrivals(model, rate, window, CAPACITY_SEED + len(steps))
+        records = run_open_loop(arrivals, base_url=base_url, timeout=REPLAY_TIMEOUT)
+        duration = max(window, *(r["scheduled"] for r in records))
+        overall = summarize_replay(records, duration)["overall"]
+        values = _slo_values(records, slo)
+        violations = [name for name, limit in slo.items() if values[name] is None or values[name] > limit]
+        passed = not violations
+        steps.append({
+            "rate": rate,
+            "duration": round(duration, 3),
+            "requests": overall["requests"],
+            "ok": overall["ok"],
+            "rejected": overall["rejected"],
+            "dropped": overall["dropped"],
+            "error_rate": overall["error_rate"],
+            "achieved_rps": overall["requests_per_sec"],
+            "output_tokens_per_sec": overall["output_tokens_per_sec"],
+            "latency": overall["latency"],
+            "ttft": overall["ttft"],
+            "queue_delay": overall["queue_delay"],
+            "slo_values": values,
+            "violations": violations,
+            "passed": passed,
+        })
+        detail = "、".join(f"{k} {v}" for k, v in values.items())
+        print(
+            f"  ▶ {label} {rate:g} req/s：{overall['ok']}/{overall['requests']} 成功 | "
+            f"{overall['requests_per_sec']} req/s | {detail} | " + ("✅ 達標" if passed else f"❌ 超過 {', '.join(violations)}")
+        )
+        return passed
+
+    lo, hi = 0.0, None
+    below_min = False
+    rate = start_rate
+    while rate <= max_rate and len(steps) < CAPACITY_MAX_STEPS:
+        if not measure(rate):
+            hi = rate
+            break
+        lo = rate
+        rate *= 2
+    while hi is not None and hi - lo > CAPACITY_PRECISION * hi and len(steps) < CAPACITY_MAX_STEPS:
+        mid = (lo + hi) / 2
+        if mid < min_rate:  # 只會發生在從未達標（lo 為 0）時
+            below_min = True
+            break
+        if measure(mid):
+            lo = round(mid, 3)
+        else:
+            hi = round(mid, 3)
+
+    best = max((s for s in steps if s["passed"]), key=lambda s: s["rate"], default=None)
+    if hi is None:
+        limit = "max_rate"
+    elif below_min:
+        limit = "below_min_rate"
+    elif hi - lo > CAPACITY_PRECISION * hi:
+        limit = "max_steps"
+    else:
+        limit = "slo"
+    if best:
+        note = "（已達 --capacity-max-rate，實際容量可能更高）" if limit == "max_rate" else ""
+        print(f"  🏁 {label} 可持續 {best['rate']:g} req/s（{best['output_tokens_per_sec']} tok/s）{note}")
+    else:
+        note = "（已達 --capacity-min-rate）" if limit == "below_min_rate" else ""
+        print(f"  ❌ {label} 在 {min(s['rate'] for s in steps):g} req/s 下仍無法達標{note}")
+    return {
+        "slo": slo,
+        "window": window,
+        "steps": steps,
+        "sustainable_rate": best["rate"] if best else 0,
+        "breach_rate": hi,
+        "min_rate": round(min_rate, 3),
+        "limit": limit,
+        "best": best,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Embedding 評測（--embed）
+# ---------------------------------------------------------------------------
+
+def _parse_batch_sizes(spec: str) -> list[int]:
+    """解析以逗號分隔的批次大小（如 1,16,64），由小到大排列"""
+    try:
+        sizes = sorted({int(v) for v in spec.split(",") if v.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError("批次大小必須為正整數") from None
+    if not sizes or sizes[0] < 1:
+        raise argparse.ArgumentTypeError("批次大小必須為正整數")
+    return sizes
+
+
+def model_capabilities(model: str, base_url: str = OLLAMA_BASE_URL) -> set[str] | None:
+    """由 /api/show 的 capabilities 取得模型能力（completion、embedding、vision 等），無法查詢時回傳 None。
+    舊版 Ollama 沒有 capabilities 欄位：model_info 含 pooling_type（BERT 類嵌入模型）時視為 embedding，否則為 completion。"""
+    try:
+        info = ollama_client.show(base_url, model)
+    except requests.RequestException:
+        return None
+    if "capabilities" in info:
+        return set(info["capabilities"] or [])
+    model_info = info.get("model_info") or {}
+    return {"embedding"} if any(key.endswith(".pooling_type") for key in model_info) else {"completion"}
+
+
+def _embed_inputs(count: int) -> list[str]:
+    """count 段長短不一（1 ~ 3 句）且內容各不相同的合成文件，模擬 RAG 索引時切好的文字段落"""
+    return [
+        f"文件 {i + 1}：" + "".join(
+            SWEEP_FILLER[(i + k) % len(SWEEP_FILLER)].format(i=i + k + 1) for k in range(1 + i % 3)
+        )
+        for i in range(count)
+    ]
+
+
+def ollama_embed(model: str, inputs: list[str], *, base_url: str = OLLAMA_BASE_URL, timeout: float = EMBED_TIMEOUT) -> dict:
+    """以 /api/embed 一次送出一批輸入，回傳客戶端延遲、向量數與維度，以及伺服器回報的 token 數與計時"""
+    start = time.perf_counter()
+    with perf_trace.span("POST /api/embed", cat="request", model=model, server=base_url, inputs=len(inputs)):
+        resp = ollama_client.post(base_url, "/api/embed", json={"model": model, "input": inputs}, timeout=(10, timeout))
+        if resp.status_code >= 400:
+            try:
+                message = resp.json().get("error")
+            except ValueError:
+                message = None
+            if message:
+                raise OllamaError(message)
+        resp.raise_for_status()
+        body = resp.json()
+    latency = time.perf_counter() - start
+    embeddings = body.get("embeddings") or []
+    if len(embeddings) != len(inputs):
+        raise OllamaError(f"回傳 {len(embeddings)} 個向量，預期 {len(inputs)} 個")
+    return {
+        "latency": round(latency, 4),
+        "embeddings": len(embeddings),
+        "dimensions": len(embeddings[0]) if embeddings else 0,
+        "tokens": body.get("prompt_eval_count", 0),
+        "load_time": round(body.get("load_duration", 0) / 1e9, 3),
+        "server_time": round(body.get("total_duration", 0) / 1e9, 4),
+    }
+
+
+def embed_benchmark(
+    model: str,
+    batch_sizes: list[int],
+    *,
+    inputs: int = EMBED_INPUTS,
+    concurrency: int = EMBED_CONCURRENCY,
+    base_url: str = OLLAMA_BASE_URL,
+    label: str | None = None,
+) -> dict:
+    """Embedding 吞吐量評測：對每個批次大小，把同一組 inputs 段合成文件切成批次，最多 concurrency 個批次同時送出，
+    量測 embeddings/秒、tokens/秒與每批延遲的分佈，並找出吞吐量最高的批次大小。
+
+    先以 /api/show 確認模型具 embedding 能力（不支援時回傳 skipped），再送一個單筆請求載入模型，
+    避免第一個批次大小量到冷載入。"""
+    label = label or model
+    capabilities = model_capabilities(model, base_url)
+    if capabilities is not None and "embedding" not in capabilities:
+        return {"skipped": "模型不支援 embedding", "capabilities": sorted(capabilities)}
+    print(f"🧬 Embedding 評測：{label}（{inputs} 段輸入，批次 {', '.join(map(str, batch_sizes))}，並行 {concurrency}）")
+    texts = _embed_inputs(inputs)
+    try:
+        warm = ollama_embed(model, texts[:1], base_url=base_url)
+    except (requests.RequestException, OllamaError, ValueError) as e:
+        print(f"  ❌ {label} 無法載入：{e}")
+        return {"batches": [], "error": str(e), "oom": ollama_client.is_oom_error(str(e))}
+
+    results: list[dict] = []
+    for size in batch_sizes:
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+        records: list[dict] = []
+        errors: list[str] = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(ollama_embed, model, batch, base_url=base_url) for batch in batches]
+            for future in as_completed(futures):
+                try:
+                    records.append(future.result())
+                except (requests.RequestException, OllamaError, ValueError) as e:
+                    errors.append(str(e))
+        wall = time.perf_counter() - start
+        latencies = [r["latency"] for r in records]
+        embedded = sum(r["embeddings"] for r in records)
+        result = {
+            "batch_size": size,
+            "requests": len(batches),
+            "failed": len(errors),
+            "duration": round(wall, 3),
+            "embeddings_per_sec": round(embedded / wall, 2) if wall > 0 else 0,
+            "tokens_per_sec": round(sum(r["tokens"] for r in records) / wall, 1) if wall > 0 else 0,
+            "latency_mean": round(statistics.fmean(latencies), 4) if latencies else None,
+            **{f"latency_p{p}": _percentile(latencies, p) for p in (50, 90, 99)},
+            "latency_per_input_ms": round(sum(latencies) / embedded * 1e3, 3) if embedded else None,
+        }
+        if errors:
+            result["error"] = errors[0]
+            result["oom"] = any(ollama_client.is_oom_error(e) for e in errors)
+        results.append(result)
+        status = f"❌ 失敗 {len(errors)}/{len(batches)}：{errors[0]}" if errors else f"✅ {len(batches)} 批"
+        print(
+            f"  ▶ {label} 批次 {size}：{result['embeddings_per_sec']} embeddings/s | {result['tokens_per_sec']} tok/s | "
+            f"每批 p50 {result['latency_p50']}s / p90 {result['latency_p90']}s | {status}"
+        )
+
+    # 最佳批次大小只考慮全部成功的批次大小，部分失敗時吞吐量不具代表性
+    best = max((r for r in results if not r["failed"]), key=lambda r: r["embeddings_per_sec"], default=None)
+    if best:
+        print(f"  🏁 {label} 最佳批次大小 {best['batch_size']}（{best['embeddings_per_sec']} embeddings/s）")
+    return {
+        "inputs": inputs,
+        "concurrency": concurrency,
+        "dimensions": warm["dimensions"],
+        "batches": results,
+        "best_batch_size": best["batch_size"] if best else None,
+        "best": best,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Vision 評測（--vision）
+# ---------------------------------------------------------------------------
+
+def _parse_resolutions(spec: str) -> list[tuple[int, int]]:
+    """解析以逗號分隔的解析度（如 448,1280x720；單一數字為正方形），依像素數由小到大排列"""
+    sizes = set()
+    for item in spec.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        width, _, height = item.partition("x")
+        try:
+            size = (int(width), int(height or width))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"無法解析解析度：{item}（格式為 N 或 WxH）") from None
+        if min(size) < 1:
+            raise argparse.ArgumentTypeError(f"解析度必須為正整數：{item}")
+        sizes.add(size)
+    if not sizes:
+        raise argparse.ArgumentTypeError("至少需要一個解析度")
+    return sorted(sizes, key=lambda wh: (wh[0] * wh[1], wh))
+
+
+def _png_bytes(width: int, height: int) -> bytes:
+    """合成的 RGB PNG 測試圖，只使用標準函式庫。內容為固定種子的雜訊紋理（每個通道 64 階），
+    壓縮後的大小接近同解析度照片的 PNG，傳輸與解碼的成本才有代表性（純色或漸層圖幾乎不佔空間）"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return len(data).to_bytes(4, "big") + kind + data + zlib.crc32(kind + data).to_bytes(4, "big")
+
+    stride = width * 3
+    levels = bytes(96 + (b & 0x3F) for b in range(256))
+    pixels = random.Random(f"{width}x{height}").randbytes(stride * height).translate(levels)
+    # 每列開頭的 0 為 PNG 的 filter type（None）
+    rows = [b"\x00" + pixels[y * stride:(y + 1) * stride] for y in range(height)]
+    header = width.to_bytes(4, "big") + height.to_bytes(4, "big") + bytes([8, 2, 0, 0, 0])  # 8 bit RGB
+    return (
+        b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(b"".join(rows), 6)) + chunk(b"IEND", b"")
+    )
+
+
+# 編碼後的測試圖：每個解析度只產生與 base64 編碼一次，所有模型、伺服器與重複量測共用
+_vision_images: dict[tuple[int, int], dict] = {}
+_vision_images_lock = threading.Lock()
+
+
+def vision_image(width: int, height: int) -> dict:
+    """取得 width × height 測試圖的 base64 編碼（第一次呼叫時產生並快取）。
+    encode_ms 為客戶端把圖檔編碼成 base64 的時間，只發生一次，之後的請求直接沿用快取的字串"""
+    key = (width, height)
+    with _vision_images_lock:
+        image = _vision_images.get(key)
+        if image is None:
+            png = _png_bytes(width, height)
+            start = time.perf_counter()
+            encoded = base64.b64encode(png).decode("ascii")
+            image = _vision_images[key] = {
+                "width": width,
+                "height": height,
+                "image_bytes": len(png),
+                "payload_bytes": len(encoded),
+                "encode_ms": round((time.perf_counter() - start) * 1e3, 3),
+                "base64": encoded,
+            }
+    return image
+
+
+def vision_benchmark(
+    model: str,
+    resolutions: list[tuple[int, int]],
+    *,
+    repeat: int = VISION_REPEAT,
+    base_url: str = OLLAMA_BASE_URL,
+    label: str | None = None,
+) -> dict:
+    """Vision 評測：對每個解析度附上一張測試圖送出 VISION_PROMPT，量測 repeat 次取中位數，
+    報告 prompt 評估時間、TTFT 與 tokens/秒；另以不附圖的相同請求為基準，兩者 prompt 評估的
+    token 數與時間差即影像佔用的 token 數與伺服器端的影像處理（解碼、縮放與視覺編碼）時間。
+
+    先以 /api/show 確認模型具 vision 能力（不支援時回傳 skipped）。每次請求的 system 提示為不同的 8 位數字標記，
+    影像之前的前綴每次都不同，Ollama 無法沿用 KV cache 中上一次的影像。
+    請求失敗（OOM 或其他錯誤）即停止，更大的影像不會成功。"""
+    label = label or model
+    capabilities = model_capabilities(model, base_url)
+    if capabilities is not None and "vision" not in capabilities:
+        return {"skipped": "模型不支援影像輸入", "capabilities": sorted(capabilities)}
+    print(
+        f"👁️  Vision 評測：{label}（解析度 {', '.join(f'{w}×{h}' for w, h in resolutions)}，每個解析度 {repeat} 次）"
+    )
+    options = {"num_ctx": VISION_NUM_CTX, "num_predict": VISION_NUM_PREDICT}
+
+    def measure(images: list[str] | None) -> dict:
+        # system 為隨機標記：與上一個請求沒有共同前綴，每次都完整評估文字與影像。
+        # 標記固定為 8 位十進位數字：各家 tokenizer 對數字都是逐位或固定每 3 位切分，token 數不隨內容改變
+        # （十六進位字串的字母與數字混合，BPE 切出的 token 數會不同），附圖與不附圖的文字 token 數才會相同
+        runs = [
+            ollama_generate(
+                model, VISION_PROMPT, options, system=f"{random.randrange(10 ** 8):08d}", images=images, base_url=base_url
+            )
+            for _ in range(repeat)
+        ]
+
+        def median(key: str) -> float | None:
+            values = [r[key] for r in runs if r[key] is not None]
+            if not values:
+                return None
+            return round(statistics.median(values)) if key == "prompt_eval_count" else round(statistics.median(values), 3)
+
+        return {key: median(key) for key in ("prompt_eval_count", "prompt_eval_time", "prompt_tps", "ttft", "eval_tps", "latency")}
+
+    try:
+        # 先以相同 num_ctx 載入模型，載入時間不混入第一個解析度的 TTFT
+        ollama_generate(model, LOAD_PROFILE_PROMPT, {"num_ctx": VISION_NUM_CTX, "num_predict": 1}, base_url=base_url)
+        baseline = measure(None)
+    except Exception as e:
+        print(f"  ❌ {label} 無法載入：{e}")
+        return {"resolutions": [], "error": str(e), "oom": ollama_client.is_oom_error(str(e))}
+    print(
+        f"  ▶ {label} 不附圖：📥 prompt {baseline['prompt_eval_count']} tokens / {baseline['prompt_eval_time']}s | "
+        f"⚡ TTFT {baseline['ttft']}s"
+    )
+
+    steps: list[dict] = []
+    for width, height in resolutions:
+        image = vision_image(width, height)
+        step: dict = {key: value for key, value in image.items() if key != "base64"}
+        try:
+            result = measure([image["base64"]])
+        except Exception as e:
+            oom = ollama_client.is_oom_error(str(e))
+            print(f"  {'💥' if oom else '❌'} {label} {width}×{height} 失敗：{e}")
+            steps.append({**step, "status": "oom" if oom else "error", "error": str(e)})
+            break
+        image_tokens = image_time = None
+        if result["prompt_eval_count"] is not None and baseline["prompt_eval_count"] is not None:
+            image_tokens = max(0, int(result["prompt_eval_count"] - baseline["prompt_eval_count"]))
+        if result["prompt_eval_time"] is not None and baseline["prompt_eval_time"] is not None:
+            image_time = round(max(0.0, result["prompt_eval_time"] - baseline["prompt_eval_time"]), 3)
+        step.update({
+            "prompt_tokens": result["prompt_eval_count"],
+            "image_tokens": image_tokens,
+            "image_time": image_time,
+            "prompt_eval_time": result["prompt_eval_time"],
+            "prompt_tps": result["prompt_tps"],
+            "ttft": result["ttft"],
+            "eval_tps": result["eval_tps"],
+            "latency": result["latency"],
+            "status": "ok",
+        })
+        steps.append(step)
+        print(
+            f"  ✅ {label} {width}×{height}（{ollama_client.format_bytes(image['image_bytes'])}，編碼 {image['encode_ms']} ms）："
+            f"🖼 {image_tokens} 影像 tokens / 處理 {image_time}s | 📥 prompt {result['prompt_eval_time']}s | "
+            f"⚡ TTFT {result['ttft']}s | 🔤 生成 {result['eval_tps']} tok/s"
+        )
+    return {
+        "repeat": repeat,
+        "num_ctx": VISION_NUM_CTX,
+        "baseline": baseline,
+        "resolutions": steps,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 結果日誌（中斷後續跑）
+# ---------------------------------------------------------------------------
+
+JOURNAL_FILE = "benchmark_journal.jsonl"
+TRACE_FILE = "benchmark_trace.json"
+
+
+class ResultJournal:
+    """執行目錄中的 append-only JSONL 日誌：每項結果完成即寫入並 fsync，
+    程式中斷、當機或伺服器 OOM 時已完成的測試不會遺失，可用 --resume 續跑。
+
+    記錄類型：
+    - meta：報告標頭（generated_at、servers、warmup、repeat），每個日誌一筆
+    - model：偵測到的模型，保留報告中的模型順序
+    - result：單一 (模型, 測試項目) 的結果
+    - section：模型的選用項目結果（load_profile、load_test、context_sweep、tuning、capacity、embedding、vision）
+    - schedule：單一伺服器的記憶體感知排程與實測載入時間（--memory-aware）
+    - server：伺服器的 Ollama 版本與各模型 digest（歷史比較用，續跑時以最後一筆為準）
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._repair()
+
+    def _repair(self) -> None:
+        """截掉寫入途中中斷所留下的不完整最後一行，避免下一筆記錄接在殘行之後"""
+        if not self.path.exists():
+            return
+        data = self.path.read_bytes()
+        if data and not data.endswith(b"\n"):
+            with open(self.path, "r+b") as f:
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def records(self) -> Iterator[dict]:
+        """逐筆讀取日誌記錄（generator，大型題庫的日誌也不會一次載入記憶體）"""
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def record_model(self, label: str, server: str, model: str) -> None:
+        self.append({"type": "model", "label": label, "server": server, "model": model})
+
+    def record_result(self, label: str, server: str, model: str, result: dict) -> None:
+        self.append({"type": "result", "label": label, "server": server, "model": model, "result": result})
+
+    def record_server(self, server: str, context: dict) -> None:
+        self.append({"type": "server", "server": server, **context})
+
+    def record_schedule(self, server: str, data: dict) -> None:
+        self.append({"type": "schedule", "server": server, "data": data})
+
+    def record_section(self, label: str, server: str, model: str, section: str, data) -> None:
+        self.append({
+            "type": "section", "label": label, "server": server, "model": model,
+            "section": section, "data": data,
+        })
+
+
+def _report_from_journal(records: Iterable[dict]) -> dict:
+    """由日誌記錄重建報告。
+
+    一般模式下每個模型的 benchmark 為逐項結果；題庫模式（meta 含 suite）改以 _TagAggregator
+    依標籤彙整，benchmark 為各標籤的摘要，另於 suite_summary 記錄整體 prompt 數與成功數。
+    """
+    records = iter(records)
+    meta = next(records, None)
+    if meta is None or meta["type"] != "meta":
+        raise ValueError("日誌中找不到 meta 記錄")
+    report = {k: v for k, v in meta.items() if k != "type"}
+    report["models"] = {}
+    by_tag = "suite" in report
+    aggregators: dict[str, _TagAggregator] = {}
+    for r in records:
+        if r["type"] == "schedule":
+            report.setdefault("schedule", {})[r["server"]] = r["data"]
+        elif r["type"] == "server":
+            report.setdefault("server_info", {})[r["server"]] = {"version": r["version"], "digests": r["digests"]}
+        if r["type"] not in ("model", "result", "section"):
+            continue
+        entry = report["models"].setdefault(
+            r["label"], {"server": r["server"], "model": r["model"], "benchmark": []}
+        )
+        if r["type"] == "result":
+            if by_tag:
+                aggregators.setdefault(r["label"], _TagAggregator()).add(r["result"])
+            else:
+                entry["benchmark"].append(r["result"])
+        elif r["type"] == "section":
+            entry[r["section"]] = r["data"]
+    for label, entry in report["models"].items():
+        if by_tag:
+            aggregator = aggregators.get(label, _TagAggregator())
+            entry["benchmark"] = aggregator.summaries()
+            entry["suite_summary"] = aggregator.totals()
+        else:
+            _sort_benchmark(entry)
+    return report
+
+
+def _done_tests(records: Iterable[dict]) -> dict[str, set[str]]:
+    """日誌中已有結果的測試名稱：{模型鍵值: {測試名稱, ...}}，續跑時略過"""
+    done: dict[str, set[str]] = {}
+    for r in records:
+        if r["type"] == "result":
+            done.setdefault(r["label"], set()).add(r["result"]["test"])
+    return done
+
+
+class _TagAggregator:
+    """題庫模式下依標籤累計單一模型的結果。
+
+    只保留數值欄位的總和與 STAT_METRICS 的數值序列，不保留回覆內容，
+    數萬個 prompt 的題庫也能以少量記憶體彙整。同一 prompt 有多個標籤時分別計入各標籤。
+    """
+
+    def __init__(self):
+        self._tags: dict[str, dict] = {}
+        self._prompts = 0
+        self._succeeded = 0
+        self._eval_count = 0
+
+    def add(self, result: dict) -> None:
+        self._prompts += 1
+        if result.get("success"):
+            self._succeeded += 1
+            self._eval_count += result.get("eval_count") or 0
+        for tag in result.get("tags") or [UNTAGGED]:
+            acc = self._tags.setdefault(tag, {
+                "prompts": 0, "failed": 0, "unstable": 0, "sums": {}, "counts": {},
+                "values": {metric: [] for metric in STAT_METRICS},
+            })
+            acc["prompts"] += 1
+            if not result.get("success"):
+                acc["failed"] += 1
+                continue
+            acc["unstable"] += bool(result.get("unstable"))
+            for key, value in result.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    acc["sums"][key] = acc["sums"].get(key, 0) + value
+                    acc["counts"][key] = acc["counts"].get(key, 0) + 1
+            for metric in STAT_METRICS:
+                if result.get(metric) is not None:
+                    acc["values"][metric].append(result[metric])
+
+    def summaries(self) -> list[dict]:
+        """各標籤的摘要，欄位與 _summarize_runs() 的結果相同（數值為各 prompt 的平均）"""
+        summaries = []
+        for tag in sorted(self._tags):
+            acc = self._tags[tag]
+            succeeded = acc["prompts"] - acc["failed"]
+            entry: dict = {
+                "test": tag,
+                "prompt": f"標籤 {tag}：{acc['prompts']} 個 prompt",
+                "response": "",
+                "prompts": acc["prompts"],
+                "failed_prompts": acc["failed"],
+                "unstable_prompts": acc["unstable"],
+                "success": succeeded > 0,
+            }
+            for key, total in acc["sums"].items():
+                entry[key] = round(total / acc["counts"][key], 3)
+            entry["stats"] = {metric: _describe(values) for metric, values in acc["values"].items()}
+            summaries.append(entry)
+        return summaries
+
+    def totals(self) -> dict:
+        return {"prompts": self._prompts, "succeeded": self._succeeded, "eval_count": self._eval_count}
+
+
+def _sort_benchmark(entry: dict) -> None:
+    """依 BENCHMARK_PROMPTS 順序排列測試結果（平行執行或續跑時完成順序不固定）"""
+    order = {p["name"]: i for i, p in enumerate(BENCHMARK_PROMPTS)}
+    entry["benchmark"].sort(key=lambda b: order.get(b["test"], len(order)))
+
+
+# ---------------------------------------------------------------------------
+# 結果快取
+# ---------------------------------------------------------------------------
+
+class ResultCache:
+    """以 SQLite 保存的跨執行結果快取。
+
+    鍵值涵蓋 (伺服器, 模型 digest, prompt 雜湊, 生成選項, 量測設定, Ollama 版本)，
+    任一項改變即視為未命中。超過 TTL 的項目失效，總數超過上限時依最近使用時間（LRU）淘汰。
+    """
+
+    def __init__(self, path: Path, ttl_hours: float = CACHE_TTL_HOURS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl_hours * 3600
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                server TEXT NOT NULL,
+                model TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                test TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                result TEXT NOT NULL
+            )"""
+        )
+        self._evict()
+
+    @staticmethod
+    def key(server: str, digest: str, version: str, item: dict, warmup: int, repeat: int) -> str:
+        payload = {
+            "server": server,
+            "digest": digest,
+            "version": version,
+            "prompt_sha256": hashlib.sha256(item["prompt"].encode("utf-8")).hexdigest(),
+            "system": item.get("system"),
+            "options": item.get("options") or {},
+            "warmup": warmup,
+            "repeat": repeat,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        """取得未過期的快取結果並更新最近使用時間，未命中時回傳 None"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM results WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+        result = json.loads(row[0])
+        result["cached_at"] = datetime.fromtimestamp(row[1]).strftime("%Y-%m-%d %H:%M:%S")
+        return result
+
+    def put(self, key: str, server: str, model: str, digest: str, result: dict) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, server, model, digest, result["test"], now, now, json.dumps(result, ensure_ascii=False)),
+            )
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl,))
+            self._conn.execute(
+                """DELETE FROM results WHERE key NOT IN (
+                    SELECT key FROM results ORDER BY last_used DESC LIMIT ?
+                )""",
+                (self.max_entries,),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _cache_context(server: str) -> dict:
+    """快取鍵值所需的伺服器資訊：Ollama 版本與各模型 digest"""
+    try:
+        version = ollama_client.version(server)
+    except requests.RequestException:
+        version = "unknown"
+    return {"version": version, "digests": get_model_digests(base_url=server)}
+
+
 # ---------------------------------------------------------------------------
 # HTML 報告生成
 # ---------------------------------------------------------------------------
 
-def _build_html_report(report: dict) -> str:
-    """根據評測報告 dict 產生自包含的 HTML 分析頁面（含 Chart.js 互動圖表）"""
+def _resource_chart_data(b: dict) -> dict | None:
+    """取出測試項目最後一次有取樣的量測，轉為圖表用的時間序列（記憶體單位 GB）。
+    tps 為相鄰兩次取樣之間收到的 token 數換算的生成速度，與資源變化對齊。"""
+    series = next(
+        (r["resources"] for r in reversed(b.get("runs") or []) if (r.get("resources") or {}).get("samples")),
+        None,
+    )
+    if not series:
+        return None
+    samples = series["samples"]
+    gb = 1024 ** 3
+
+    def _gb(value: int | None) -> float | None:
+        return round(value / gb, 3) if value is not None else None
+
+    tps: list[float | None] = [None]
+    for prev, cur in zip(samples, samples[1:]):
+        dt = cur["t"] - prev["t"]
+        tps.append(round((cur["tokens"] - prev["tokens"]) / dt, 2) if dt > 0 else None)
+    return {
+        "ttft": b.get("ttft"),
+        "t": [s["t"] for s in samples],
+        "vram": [_gb(s.get("vram")) for s in samples],
+        "ram": [_gb(s["size"] - s["vram"]) if "size" in s else None for s in samples],
+        "rss": [_gb(s.get("rss")) for s in samples],
+        "mem_used": [_gb(s.get("mem_used")) for s in samples],
+        "cpu": [s.get("cpu") for s in samples],
+        "tps": tps,
+    }
+
+
+def _sweep_chart_data(sweep: dict) -> dict:
+    """上下文長度掃描轉為圖表資料：量測點帶有狀態（s），失敗的步驟畫在 y = 0；
+    另依擬合係數在量測範圍內取對數等距點繪製擬合曲線。"""
+    gb = 1024 ** 3
+    tps: list[dict] = []
+    ttft: list[dict] = []
+    memory: list[dict] = []
+    for step in sweep["steps"]:
+        status = step["status"]
+        if status in ("oom", "error"):
+            tps.append({"x": step["target_tokens"], "y": 0, "s": status})
+        elif status != "skipped":
+            x = step["prompt_tokens"] or step["target_tokens"]
+            tps.append({"x": x, "y": step["prompt_tps"], "s": status})
+            ttft.append({"x": x, "y": step["ttft"], "s": status})
+            memory.append({"x": step["num_ctx"], "y": round(step["size"] / gb, 3), "vram": round(step["size_vram"] / gb, 3), "s": status})
+
+    xs = [p["x"] for p in ttft]
+    fit_tps: list[dict] = []
+    fit_ttft: list[dict] = []
+    if len(xs) >= 2:
+        lo, hi = min(xs), max(xs)
+        grid = [lo * (hi / lo) ** (i / 23) for i in range(24)]
+        eval_fit = sweep["fit"].get("prompt_eval_time")
+        ttft_fit = sweep["fit"].get("ttft")
+        for x in grid:
+            if eval_fit:
+                seconds = eval_fit["c0"] + eval_fit["c1"] * x + eval_fit["c2"] * x * x
+                if seconds > 0:
+                    fit_tps.append({"x": round(x), "y": round(x / seconds, 2)})
+            if ttft_fit:
+                seconds = ttft_fit["c0"] + ttft_fit["c1"] * x + ttft_fit["c2"] * x * x
+                if seconds > 0:
+                    fit_ttft.append({"x": round(x), "y": round(seconds, 4)})
+    return {"tps": tps, "ttft": ttft, "memory": memory, "fit_tps": fit_tps, "fit_ttft": fit_ttft}
+
+
+def _tuning_heatmap_html(tuning: dict) -> str:
+    """參數調校結果轉為熱圖表格：候選值最多的兩個參數作為欄與列，其餘參數取該格中最快的設定；
+    顏色深淺依生成速度，★ 為最佳設定，被淘汰的設定標示淘汰輪次。"""
+    grid = tuning["grid"]
+    axes = sorted(grid, key=lambda k: len(grid[k]), reverse=True)
+    x_key = axes[0]
+    y_key = axes[1] if len(axes) > 1 else None
+    rows = grid[y_key] if y_key else [None]
+    cells: dict[tuple, dict] = {}
+    for config in tuning["configs"]:
+        options = config["options"]
+        if not options:
+            continue  # 預設設定不在網格上，另於摘要中比較
+        key = (options[x_key], options[y_key] if y_key else None)
+        current = cells.get(key)
+        if current is None or (config["eval_tps"] or 0) > (current["eval_tps"] or 0):
+            cells[key] = config
+    values = [c["eval_tps"] for c in cells.values() if c["eval_tps"]]
+    lo, hi = (min(values), max(values)) if values else (0, 0)
+    best = tuning.get("best") or {}
+
+    header = "".join(f"<th>{html.escape(x_key)}={v}</th>" for v in grid[x_key])
+    body = ""
+    for y in rows:
+        body += f"<tr><th>{html.escape(y_key)}={y}</th>" if y_key else "<tr><th>tokens/秒</th>"
+        for x in grid[x_key]:
+            config = cells.get((x, y))
+            if config is None:
+                body += "<td>—</td>"
+                continue
+            if config.get("error"):
+                body += f'<td title="{html.escape(config["error"])}">{"💥 OOM" if config.get("oom") else "❌ 失敗"}</td>'
+                continue
+            tps = config["eval_tps"]
+            alpha = 0.15 + 0.85 * ((tps - lo) / (hi - lo) if hi > lo else 1)
+            star = " ★" if config["options"] == best.get("options") else ""
+            out = f'<br><small>第 {config["eliminated_in"]} 輪淘汰</small>' if config["eliminated_in"] else ""
+            body += (
+                f'<td style="background: rgba(59, 130, 246, {alpha:.2f})" '
+                f'title="{html.escape(_options_label(config["options"]))}｜{config["runs"]} 次量測">'
+                f"{tps}{star}{out}</td>"
+            )
+        body += "</tr>"
+    return f'<table class="heatmap"><thead><tr><th></th>{header}</tr></thead><tbody>{body}</tbody></table>'
+
+
+def _detail_records(report: dict) -> Iterator[tuple[dict, dict]]:
+    """依模型順序產生每個測試項目的（索引, 詳細內容）。
+
+    索引為摘要列（已跳脫的標頭 HTML 與搜尋用欄位），全部寫入 index.js；詳細內容為完整
+    prompt、回覆與資源時間序列，分頁寫入 page_NNNN.js，展開時才載入。
+    """
+    for model, entry in report["models"].items():
+        for b in entry["benchmark"]:
+            status = "✅" if b.get("success") else "❌"
+            lat = f'{b["latency"]}s' if b.get("latency") is not None else "N/A"
+            ttft = f'{b["ttft"]}s' if b.get("ttft") is not None else "N/A"
+            itl = (
+                f'ITL 平均 {b["itl_mean_ms"]}ms / p95 {b["itl_p95_ms"]}ms / 最大 {b["itl_max_ms"]}ms'
+                if b.get("itl_mean_ms") is not None else "ITL N/A"
+            )
+            stats_html = ""
+            lat_stats = (b.get("stats") or {}).get("latency")
+            if lat_stats and lat_stats["n"] > 1:
+                stats_html = (
+                    f'<div class="prompt">📊 n={lat_stats["n"]} | 延遲 平均 {lat_stats["mean"]}s / '
+                    f'中位數 {lat_stats["median"]}s / σ {lat_stats["stdev"]} / '
+                    f'範圍 [{lat_stats["min"]}, {lat_stats["max"]}] / '
+                    f'95% CI [{lat_stats["ci_low"]}, {lat_stats["ci_high"]}] / CV {lat_stats["cv"]}'
+                    + (' | <span class="warn">⚠️ 變異過大，數據不穩定</span>' if b.get("unstable") else "")
+                    + "</div>"
+                )
+            if "prompts" in b:
+                # 題庫模式的標籤摘要：不逐題列出回覆
+                stats_html += (
+                    f'<div class="prompt">🏷 {b["prompts"]} 個 prompt｜失敗 {b["failed_prompts"]}'
+                    + (f'｜<span class="warn">⚠️ {b["unstable_prompts"]} 個不穩定</span>' if b.get("unstable_prompts") else "")
+                    + "</div>"
+                )
+            if b.get("error"):
+                stats_html += f'<div class="prompt warn">⚠️ {html.escape(b["error"])}</div>'
+            cached_badge = (
+                f' <span class="cached">💾 快取（{html.escape(b.get("cached_at", ""))}）</span>'
+                if b.get("cached") else ""
+            )
+            spill_badge = ' <span class="warn">⚠️ 溢出至系統記憶體</span>' if b.get("spilled") else ""
+            header_html = f"""<div class="test-header">
+                <span class="test-name">{status} {html.escape(b['test'])}{cached_badge}{spill_badge}</span>
+                <span class="test-stats">⏱ {lat} | ⚡ TTFT {ttft} | 🔤 生成 {b.get('eval_tps') or 'N/A'} tok/s | 📥 prompt {b.get('prompt_tps') or 'N/A'} tok/s | 📦 載入 {b.get('load_time') if b.get('load_time') is not None else 'N/A'}s | 🌐 開銷 {b.get('overhead') if b.get('overhead') is not None else 'N/A'}s | 📏 {b.get('eval_count', 0)} tokens / {b.get('length', 0)} chars</span>
+              </div>
+              <div class="prompt">📶 {itl}</div>{stats_html}"""
+
+            detail: dict = {}
+            if "prompts" not in b:
+                detail.update(prompt=b.get("prompt", ""), response=b.get("response", ""))
+            chart_data = _resource_chart_data(b)
+            if chart_data:
+                detail["resources"] = chart_data
+            index = {
+                "model": model,
+                "test": b["test"],
+                "ok": bool(b.get("success")),
+                "prompt": (b.get("prompt") or "")[:200],
+                "error": (b.get("error") or "")[:200],
+                "html": header_html,
+                "detail": bool(detail),
+            }
+            yield index, detail
+
+
+def _write_details(run_dir: Path, report: dict) -> int:
+    """將詳細回覆寫成 run_dir/DETAILS_DIR 下的側載資料檔，回傳筆數。
+
+    檔案為 JSONP（呼叫 BENCHMARK_DETAILS.index / page 的腳本），以 <script> 載入，
+    直接以 file:// 開啟報告時也能使用（瀏覽器禁止 file:// 下的 fetch）。
+    """
+    details_dir = run_dir / DETAILS_DIR
+    shutil.rmtree(details_dir, ignore_errors=True)
+    details_dir.mkdir(parents=True)
+
+    def _write_page(number: int, items: list[dict]) -> None:
+        with open(details_dir / f"page_{number:04d}.js", "w", encoding="utf-8") as page:
+            page.write(f"BENCHMARK_DETAILS.page({number}, ")
+            json.dump(items, page, ensure_ascii=False)
+            page.write(");\n")
+
+    count = 0
+    items: list[dict] = []
+    with open(details_dir / "index.js", "w", encoding="utf-8") as index_file:
+        index_file.write("BENCHMARK_DETAILS.index([\n")
+        for index, detail in _detail_records(report):
+            if count:
+                index_file.write(",\n")
+            json.dump(index, index_file, ensure_ascii=False)
+            items.append(detail)
+            count += 1
+            if len(items) == DETAILS_PAGE_SIZE:
+                _write_page((count - 1) // DETAILS_PAGE_SIZE, items)
+                items = []
+        index_file.write("\n]);\n")
+    if items:
+        _write_page((count - 1) // DETAILS_PAGE_SIZE, items)
+    return count
+
+
+def _write_html_report(f: TextIO, report: dict, *, chartjs: str, details: int) -> None:
+    """根據評測報告 dict 將 HTML 分析頁面（含 Chart.js 互動圖表）逐段寫入 f。
+
+    各區塊以 generator 逐列產生並直接寫入檔案，不在記憶體中組合整份頁面；完整回覆與資源
+    時間序列另由 _write_details() 寫入側載資料檔，頁面只內嵌 details 筆數，於捲動到詳細區時才載入。
+    chartjs 為 benchmark_history.chartjs_tag() 產生的 <script> 標籤。
+    """
 
     models = list(report["models"].keys())
-    test_names = [p["name"] for p in BENCHMARK_PROMPTS]
+    # 測試項目（題庫模式下為標籤）依各模型結果中首次出現的順序排列
+    test_names = list(dict.fromkeys(
+        b["test"] for entry in report["models"].values() for b in entry["benchmark"]
+    ))
     timestamp = report["generated_at"]
+    suite = report.get("suite")
+    test_axis = "標籤" if suite else "測試項目"
+    subtitle_suite = (
+        f' ｜ 題庫：{html.escape(suite["path"])}（{suite["prompts"]} 個 prompt，依標籤彙整）' if suite else ""
+    )
 
     # ---- 資料準備 ----
     # latency_data[test_name] = [model1_latency, model2_latency, ...]
     latency_data: dict[str, list[float | None]] = {t: [] for t in test_names}
-    length_data: dict[str, list[int]] = {t: [] for t in test_names}
+    eval_tps_data: dict[str, list[float | None]] = {t: [] for t in test_names}
+    ttft_data: dict[str, list[float | None]] = {t: [] for t in test_names}
+    # 重複量測時的誤差線（bootstrap 95% 信賴區間）：{metric: {test_name: [[low, high] | None, ...]}}
+    error_bars: dict[str, dict[str, list]] = {
+        metric: {t: [] for t in test_names} for metric in ("latency", "eval_tps", "ttft")
+    }
+
+    def _ci(b: dict, metric: str) -> list[float] | None:
+        st = (b.get("stats") or {}).get(metric)
+        return [st["ci_low"], st["ci_high"]] if st and st["n"] > 1 else None
 
     for model in models:
         benchmarks = report["models"][model]["benchmark"]
@@ -150,64 +2604,583 @@ def _build_html_report(report: dict) -> str:
         for t in test_names:
             b = test_map.get(t, {})
             latency_data[t].append(b.get("latency"))
-            length_data[t].append(b.get("length", 0))
+            eval_tps_data[t].append(b.get("eval_tps"))
+            ttft_data[t].append(b.get("ttft"))
+            for metric in error_bars:
+                error_bars[metric][t].append(_ci(b, metric))
+
+    # 各模型平均延遲 & 總生成 tokens
+    avg_latencies: list[float] = []
+    total_eval_counts: list[int] = []
+    for i, model in enumerate(models):
+        lats = [latency_data[t][i] for t in test_names if latency_data[t][i] is not None]
+        avg_latencies.append(round(sum(lats) / len(lats), 3) if lats else 0)
+        suite_summary = report["models"][model].get("suite_summary")
+        total_eval_counts.append(
+            suite_summary["eval_count"] if suite_summary
+            else sum(b.get("eval_count", 0) for b in report["models"][model]["benchmark"])
+        )
+
+    # 各模型平均伺服器端吞吐量 / 延遲組成 / TTFT / 解碼速度 / inter-token 延遲 p95
+    def _model_avg(model: str, key: str) -> float | None:
+        values = [b[key] for b in report["models"][model]["benchmark"] if b.get(key) is not None]
+        return round(sum(values) / len(values), 3) if values else None
+
+    avg_eval_tps = [_model_avg(m, "eval_tps") for m in models]
+    avg_prompt_tps = [_model_avg(m, "prompt_tps") for m in models]
+    avg_load_times = [_model_avg(m, "load_time") for m in models]
+    avg_overheads = [_model_avg(m, "overhead") for m in models]
+    latency_breakdown = {
+        key: [_model_avg(m, key) for m in models]
+        for key in ("load_time", "prompt_eval_time", "eval_time", "connect_time", "overhead")
+    }
+    # overhead 已包含連線建立時間，堆疊圖中扣除以免重複計算
+    latency_breakdown["overhead"] = [
+        round(max(o - (c or 0), 0), 3) if o is not None else None
+        for o, c in zip(latency_breakdown["overhead"], latency_breakdown["connect_time"])
+    ]
+    avg_connect_times = latency_breakdown["connect_time"]
+    # 各模型所有量測合併後的平均值信賴區間（用於平均值圖表的誤差線）
+    def _model_ci(model: str, metric: str) -> list[float] | None:
+        values = [
+            r[metric]
+            for b in report["models"][model]["benchmark"]
+            for r in b.get("runs", [])
+            if r.get("success") and r.get(metric) is not None
+        ]
+        return list(map(lambda v: round(v, 3), _bootstrap_ci(values))) if len(values) > 1 else None
+
+    model_error_bars = {
+        metric: [_model_ci(m, metric) for m in models]
+        for metric in ("latency", "eval_tps", "prompt_tps")
+    }
+    avg_ttfts = [_model_avg(m, "ttft") for m in models]
+    avg_decode_tps = [_model_avg(m, "decode_tps") for m in models]
+    avg_itl_p95 = [_model_avg(m, "itl_p95_ms") for m in models]
+
+    # 簡短模型名稱（用於圖表標籤；多伺服器時保留伺服器簡稱）
+    def _short_name(label: str) -> str:
+        name, _, server = label.partition(" @ ")
+        name = name.split(":")[0]
+        return f"{name} @ {server}" if server else name
+
+    short_names = [_short_name(m) for m in models]
+
+    # 顏色
+    colors = [CHART_COLORS[i % len(CHART_COLORS)] for i in range(len(models))]
+    borders = [CHART_BORDERS[i % len(CHART_BORDERS)] for i in range(len(models))]
+
+    # ---- 並行負載測試（吞吐量 vs 並行數）----
+    load_tests = {m: report["models"][m].get("load_test", []) for m in models}
+    has_load_test = any(load_tests.values())
+    concurrency_levels = sorted({r["concurrency"] for rs in load_tests.values() for r in rs})
+    load_tps: list[list[float | None]] = []
+    load_p90: list[list[float | None]] = []
+    for model in models:
+        level_map = {r["concurrency"]: r for r in load_tests[model]}
+        load_tps.append([level_map.get(c, {}).get("output_tokens_per_sec") for c in concurrency_levels])
+        load_p90.append([level_map.get(c, {}).get("latency_p90") for c in concurrency_levels])
+
+    def load_test_section() -> Iterator[str]:
+        if not has_load_test:
+            return
+        yield """
+<!-- 並行負載測試 -->
+<div class="grid">
+  <div class="card card-full">
+    <h2>🚀 並行負載測試</h2>
+    <table>
+      <thead><tr><th>模型</th><th>並行數</th><th>請求/秒</th><th>輸出 tokens/秒</th><th>延遲 p50 / p90 / p99</th><th>成功率</th></tr></thead>
+      <tbody>"""
+        for model in models:
+            for r in load_tests[model]:
+                yield f"""
+        <tr>
+          <td>{html.escape(model)}</td>
+          <td>{r['concurrency']}</td>
+          <td>{r['requests_per_sec']}</td>
+          <td>{r['output_tokens_per_sec']}</td>
+          <td>{r['latency_p50']}s / {r['latency_p90']}s / {r['latency_p99']}s</td>
+          <td>{r['success']}/{r['requests']}</td>
+        </tr>"""
+        yield """</tbody>
+    </table>
+  </div>
+
+  <div class="card">
+    <h2>📈 吞吐量 vs 並行數（輸出 tokens/秒）</h2>
+    <canvas id="chartLoadThroughput"></canvas>
+  </div>
+
+  <div class="card">
+    <h2>⏱ p90 延遲 vs 並行數（秒）</h2>
+    <canvas id="chartLoadLatency"></canvas>
+  </div>
+</div>
+"""
+
+    # ---- SLO 容量搜尋（可持續到達率）----
+    capacities = {m: report["models"][m].get("capacity") for m in models}
+    # 每個模型以第一個 SLO 條件繪製「指標 vs 到達率」，達標與未達標的點分開標示
+    capacity_chart: list[dict | None] = []
+    for model in models:
+        cap = capacities[model]
+        if not cap or not cap.get("steps"):
+            capacity_chart.append(None)
+            continue
+        key = next(iter(cap["slo"]))
+        capacity_chart.append({
+            "metric": key,
+            "limit": cap["slo"][key],
+            "points": [
+                {"x": step["rate"], "y": step["slo_values"].get(key), "s": "ok" if step["passed"] else "fail"}
+                for step in sorted(cap["steps"], key=lambda step: step["rate"])
+            ],
+        })
+
+    def capacity_section() -> Iterator[str]:
+        if not any(capacities.values()):
+            return
+        limits = {
+            "slo": "", "max_rate": "（已達最高到達率）", "max_steps": "（已達步數上限）",
+            "below_min_rate": "（最低到達率仍未達標）",
+        }
+        yield """
+<!-- SLO 容量搜尋 -->
+<div class="grid">
+  <div class="card card-full">
+    <h2>📐 SLO 容量搜尋</h2>
+    <table>
+      <thead><tr><th>模型</th><th>SLO</th><th>可持續請求/秒</th><th>輸出 tokens/秒</th><th>該到達率的實測值</th><th>未達標的到達率</th><th>步數</th></tr></thead>
+      <tbody>"""
+        for model in models:
+            cap = capacities[model]
+            if not cap:
+                continue
+            if cap.get("error"):
+                reason = "記憶體不足 (OOM)" if cap.get("oom") else html.escape(cap["error"])
+                yield f"""
+        <tr><td>{html.escape(model)}</td><td>{html.escape(_slo_label(cap['slo']))}</td><td colspan="5" class="warn">❌ {reason}</td></tr>"""
+                continue
+            best = cap.get("best") or {}
+            values = "、".join(f"{k} {v}" for k, v in (best.get("slo_values") or {}).items()) or "-"
+            yield f"""
+        <tr>
+          <td>{html.escape(model)}</td>
+          <td>{html.escape(_slo_label(cap['slo']))}</td>
+          <td><strong>{cap['sustainable_rate']:g}</strong>{limits.get(cap['limit'], '')}</td>
+          <td>{best.get('output_tokens_per_sec', '-')}</td>
+          <td>{values}</td>
+          <td>{cap['breach_rate'] if cap['breach_rate'] is not None else '-'}</td>
+          <td>{len(cap['steps'])} × {cap['window']:g}s</td>
+        </tr>"""
+        yield """</tbody>
+    </table>
+  </div>
+
+  <div class="card card-full">
+    <h2>📈 SLO 指標 vs 到達率</h2>
+    <p class="note">Poisson 到達的開放迴路流量；實心點為達標、× 為未達標，虛線為 SLO 門檻（每個模型以第一個 SLO 條件繪製）</p>
+    <canvas id="chartCapacity"></canvas>
+  </div>
+</div>
+"""
+
+    # ---- Embedding 評測（批次大小 vs 吞吐量）----
+    # 不支援 embedding 而略過的模型不列出
+    embeddings = {
+        m: report["models"][m]["embedding"] for m in models
+        if report["models"][m].get("embedding") and not report["models"][m]["embedding"].get("skipped")
+    }
+    embed_sizes = sorted({b["batch_size"] for e in embeddings.values() for b in e["batches"]})
+    embed_rate: list[list[float | None]] = []
+    embed_p90: list[list[float | None]] = []
+    for model in models:
+        size_map = {b["batch_size"]: b for b in (embeddings.get(model) or {}).get("batches", []) if not b["failed"]}
+        embed_rate.append([size_map.get(n, {}).get("embeddings_per_sec") for n in embed_sizes])
+        embed_p90.append([size_map.get(n, {}).get("latency_p90") for n in embed_sizes])
+
+    def embedding_section() -> Iterator[str]:
+        if not embeddings:
+            return
+        yield """
+<!-- Embedding 評測 -->
+<div class="grid">
+  <div class="card card-full">
+    <h2>🧬 Embedding 評測</h2>
+    <p class="note">同一組合成文件依批次大小切分後以 /api/embed 送出；★ 為 embeddings/秒最高的批次大小</p>
+    <table>
+      <thead><tr><th>模型</th><th>批次大小</th><th>embeddings/秒</th><th>tokens/秒</th><th>每批延遲 p50 / p90 / p99</th><th>每段延遲</th><th>成功批次</th></tr></thead>
+      <tbody>"""
+        for model, emb in embeddings.items():
+            if emb.get("error"):
+                reason = "記憶體不足 (OOM)" if emb.get("oom") else html.escape(emb["error"])
+                yield f"""
+        <tr><td>{html.escape(model)}</td><td colspan="6" class="warn">❌ {reason}</td></tr>"""
+                continue
+            for b in emb["batches"]:
+                star = " ★" if b["batch_size"] == emb["best_batch_size"] else ""
+                failed = f' <span class="warn">（失敗 {b["failed"]}）</span>' if b["failed"] else ""
+                yield f"""
+        <tr>
+          <td>{html.escape(model)}（{emb['dimensions']} 維，並行 {emb['concurrency']}）</td>
+          <td>{b['batch_size']}{star}</td>
+          <td>{b['embeddings_per_sec']}</td>
+          <td>{b['tokens_per_sec']}</td>
+          <td>{b['latency_p50']}s / {b['latency_p90']}s / {b['latency_p99']}s</td>
+          <td>{b['latency_per_input_ms'] if b['latency_per_input_ms'] is not None else '-'} ms</td>
+          <td>{b['requests'] - b['failed']}/{b['requests']}{failed}</td>
+        </tr>"""
+        yield """</tbody>
+    </table>
+  </div>
+
+  <div class="card">
+    <h2>📈 Embedding 吞吐量 vs 批次大小（embeddings/秒）</h2>
+    <canvas id="chartEmbedThroughput"></canvas>
+  </div>
+
+  <div class="card">
+    <h2>⏱ 每批 p90 延遲 vs 批次大小（秒）</h2>
+    <canvas id="chartEmbedLatency"></canvas>
+  </div>
+</div>
+"""
+
+    # ---- Vision 評測（解析度 vs 影像處理時間 / TTFT）----
+    # 不支援影像輸入而略過的模型不列出
+    visions = {
+        m: report["models"][m]["vision"] for m in models
+        if report["models"][m].get("vision") and not report["models"][m]["vision"].get("skipped")
+    }
+    vision_sizes = sorted(
+        {(r["width"], r["height"]) for v in visions.values() for r in v["resolutions"]}, key=lambda wh: (wh[0] * wh[1], wh)
+    )
+    vision_labels = [f"{w}×{h}" for w, h in vision_sizes]
+    vision_ttft: list[list[float | None]] = []
+    vision_image_time: list[list[float | None]] = []
+    for model in models:
+        size_map = {
+            (r["width"], r["height"]): r for r in (visions.get(model) or {}).get("resolutions", []) if r["status"] == "ok"
+        }
+        vision_ttft.append([size_map.get(wh, {}).get("ttft") for wh in vision_sizes])
+        vision_image_time.append([size_map.get(wh, {}).get("image_time") for wh in vision_sizes])
+
+    def vision_section() -> Iterator[str]:
+        if not visions:
+            return
+        yield """
+<!-- Vision 評測 -->
+<div class="grid">
+  <div class="card card-full">
+    <h2>👁️ Vision 評測</h2>
+    <p class="note">每個解析度附上一張合成測試圖（base64 只編碼一次並快取），數值為多次量測的中位數；影像 tokens 與影像處理時間為與不附圖的相同請求相比，prompt 評估增加的 token 數與時間</p>
+    <table>
+      <thead><tr><th>模型</th><th>解析度</th><th>圖檔 / 傳輸大小</th><th>客戶端編碼</th><th>影像 tokens</th><th>影像處理</th><th>prompt 評估</th><th>TTFT</th><th>生成 tokens/秒</th></tr></thead>
+      <tbody>"""
+        for model, vis in visions.items():
+            if vis.get("error"):
+                reason = "記憶體不足 (OOM)" if vis.get("oom") else html.escape(vis["error"])
+                yield f"""
+        <tr><td>{html.escape(model)}</td><td colspan="8" class="warn">❌ {reason}</td></tr>"""
+                continue
+            base = vis["baseline"]
+            yield f"""
+        <tr>
+          <td>{html.escape(model)}</td>
+          <td>不附圖</td>
+          <td>-</td>
+          <td>-</td>
+          <td>-</td>
+          <td>-</td>
+          <td>{base['prompt_eval_time']}s（{base['prompt_eval_count']} tokens）</td>
+          <td>{base['ttft']}s</td>
+          <td>{base['eval_tps'] if base['eval_tps'] is not None else '-'}</td>
+        </tr>"""
+            for r in vis["resolutions"]:
+                size = f"{ollama_client.format_bytes(r['image_bytes'])} / {ollama_client.format_bytes(r['payload_bytes'])}"
+                if r["status"] != "ok":
+                    reason = "記憶體不足 (OOM)" if r["status"] == "oom" else html.escape(r.get("error", ""))
+                    yield f"""
+        <tr><td>{html.escape(model)}</td><td>{r['width']}×{r['height']}</td><td>{size}</td><td colspan="6" class="warn">❌ {reason}</td></tr>"""
+                    continue
+                yield f"""
+        <tr>
+          <td>{html.escape(model)}</td>
+          <td>{r['width']}×{r['height']}</td>
+          <td>{size}</td>
+          <td>{r['encode_ms']} ms</td>
+          <td>{r['image_tokens'] if r['image_tokens'] is not None else '-'}</td>
+          <td>{r['image_time'] if r['image_time'] is not None else '-'}s</td>
+          <td>{r['prompt_eval_time']}s（{r['prompt_tokens']} tokens）</td>
+          <td>{r['ttft']}s</td>
+          <td>{r['eval_tps'] if r['eval_tps'] is not None else '-'}</td>
+        </tr>"""
+        yield """</tbody>
+    </table>
+  </div>
+
+  <div class="card">
+    <h2>🖼 影像處理時間 vs 解析度（秒）</h2>
+    <canvas id="chartVisionImageTime"></canvas>
+  </div>
+
+  <div class="card">
+    <h2>⚡ TTFT vs 解析度（秒）</h2>
+    <canvas id="chartVisionTtft"></canvas>
+  </div>
+</div>
+"""
+
+    # ---- 模型載入剖析（冷載入 vs 熱啟動）----
+    load_profiles = {m: report["models"][m].get("load_profile") for m in models}
+    profile_chart: dict[str, list] = {"cold_load_time": [], "cold_ttft": [], "warm_ttft": [], "load_bandwidth_gbps": []}
+    profile_error_bars: dict[str, list] = {"cold_load_time": [], "cold_ttft": [], "warm_ttft": []}
+    for model in models:
+        st = (load_profiles[model] or {}).get("stats") or {}
+        for metric in profile_error_bars:
+            m_st = st.get(metric)
+            profile_chart[metric].append(m_st["mean"] if m_st else None)
+            profile_error_bars[metric].append([m_st["ci_low"], m_st["ci_high"]] if m_st and m_st["n"] > 1 else None)
+        bw = st.get("load_bandwidth")
+        profile_chart["load_bandwidth_gbps"].append(round(bw["mean"] / 1e9, 3) if bw else None)
+
+    def load_profile_section() -> Iterator[str]:
+        if not any(load_profiles.values()):
+            return
+        yield """
+<!-- 模型載入剖析 -->
+<div class="grid">
+  <div class="card card-full">
+    <h2>🧊 模型載入剖析（冷載入 vs 熱啟動）</h2>
+    <table>
+      <thead><tr><th>模型</th><th>載入後大小</th><th>VRAM / 系統記憶體</th><th>冷載入時間</th><th>冷啟動 TTFT</th><th>熱啟動 TTFT</th><th>載入頻寬</th><th>成功循環</th></tr></thead>
+      <tbody>"""
+        for model in models:
+            profile = load_profiles[model]
+            if not profile:
+                continue
+            st = profile.get("stats") or {}
+
+            def _mean(metric: str, unit: str = "s") -> str:
+                return f"{st[metric]['mean']}{unit}" if st.get(metric) else "N/A"
+
+            size = profile.get("size", 0)
+            vram_pct = f"{profile['size_vram'] / size * 100:.0f}%" if size else "N/A"
+            bw = st.get("load_bandwidth")
+            ok_cycles = sum(1 for c in profile["cycles"] if c["success"])
+            yield f"""
+        <tr>
+          <td>{html.escape(model)}</td>
+          <td>{ollama_client.format_bytes(size) if size else "N/A"}</td>
+          <td>{ollama_client.format_bytes(profile.get("size_vram", 0))} ({vram_pct}) / {ollama_client.format_bytes(profile.get("size_ram", 0))}</td>
+          <td>{_mean("cold_load_time")}</td>
+          <td>{_mean("cold_ttft")}</td>
+          <td>{_mean("warm_ttft")}</td>
+          <td>{f"{ollama_client.format_bytes(bw['mean'])}/s" if bw else "N/A"}</td>
+          <td>{ok_cycles}/{len(profile["cycles"])}</td>
+        </tr>"""
+        yield """</tbody>
+    </table>
+  </div>
+
+  <div class="card">
+    <h2>🧊 冷載入 vs 熱啟動延遲（秒）</h2>
+    <canvas id="chartLoadProfile"></canvas>
+  </div>
+
+  <div class="card">
+    <h2>💾 有效載入頻寬（GB/秒）</h2>
+    <canvas id="chartLoadBandwidth"></canvas>
+  </div>
+</div>
+"""
+
+    # ---- 上下文長度掃描 ----
+    sweeps = {m: report["models"][m].get("context_sweep") for m in models}
+    sweep_chart = [_sweep_chart_data(sweeps[m]) if sweeps[m] else None for m in models]
+    def context_sweep_section() -> Iterator[str]:
+        if not any(sweeps.values()):
+            return
+        status_labels = {"ok": "✅", "collapse": "📉 效能崩落", "oom": "💥 OOM", "error": "❌ 失敗", "skipped": "⏭ 超過上限"}
+        yield """
+<!-- 上下文長度掃描 -->
+<div class="grid">
+  <div class="card card-full">
+    <h2>📏 上下文長度掃描</h2>"""
+        for model in models:
+            sweep = sweeps[model]
+            if not sweep:
+                continue
+            eval_fit = sweep["fit"].get("prompt_eval_time")
+            fit_text = (
+                f'prompt 處理時間 ≈ {eval_fit["c0"]:.3g} + {eval_fit["c1"]:.3g}·n + {eval_fit["c2"]:.3g}·n² 秒'
+                f'（R² {eval_fit["r2"]}）' if eval_fit else "量測點不足，未擬合"
+            )
+            yield (
+                f'\n    <p class="note"><strong>{html.escape(model)}</strong>：{fit_text}'
+                + (f'｜📉 {sweep["collapse_at"]} tokens 起效能崩落' if sweep["collapse_at"] else "")
+                + (f'｜💥 {sweep["oom_at"]} tokens 時 OOM' if sweep["oom_at"] else "")
+                + (f'｜模型 context 上限 {sweep["max_context"]}' if sweep["max_context"] else "")
+                + "</p>"
+            )
+        yield """
+    <table>
+      <thead><tr><th>模型</th><th>prompt tokens（目標 → 實際）</th><th>num_ctx</th><th>Prompt tokens/秒</th><th>TTFT</th><th>載入時間</th><th>記憶體佔用</th><th>狀態</th></tr></thead>
+      <tbody>"""
+        for model in models:
+            sweep = sweeps[model]
+            if not sweep:
+                continue
+            for step in sweep["steps"]:
+                measured = step["status"] in ("ok", "collapse")
+                memory = (
+                    f'{ollama_client.format_bytes(step["size"])}（VRAM {ollama_client.format_bytes(step["size_vram"])}）'
+                    if measured and step["size"] else "N/A"
+                )
+                status = status_labels[step["status"]]
+                if step.get("error"):
+                    status += f'：{html.escape(step["error"][:120])}'
+                yield f"""
+        <tr>
+          <td>{html.escape(model)}</td>
+          <td>{step["target_tokens"]}{f' → {step["prompt_tokens"]}' if measured else ""}</td>
+          <td>{step["num_ctx"]}</td>
+          <td>{step["prompt_tps"] if measured and step["prompt_tps"] is not None else "N/A"}</td>
+          <td>{f'{step["ttft"]}s' if measured and step["ttft"] is not None else "N/A"}</td>
+          <td>{f'{step["load_time"]}s' if measured else "N/A"}</td>
+          <td>{memory}</td>
+          <td>{status}</td>
+        </tr>"""
+        yield """</tbody>
+    </table>
+  </div>
+
+  <div class="card">
+    <h2>📥 Prompt 處理速度 vs prompt 長度（虛線為擬合）</h2>
+    <canvas id="chartSweepTps"></canvas>
+  </div>
 
-    # 各模型平均延遲 & 總回應長度
-    avg_latencies: list[float] = []
-    total_lengths: list[int] = []
-    for i, model in enumerate(models):
-        lats = [latency_data[t][i] for t in test_names if latency_data[t][i] is not None]
-        avg_latencies.append(round(sum(lats) / len(lats), 3) if lats else 0)
-        total_lengths.append(sum(length_data[t][i] for t in test_names))
+  <div class="card">
+    <h2>⚡ TTFT vs prompt 長度（秒，虛線為擬合）</h2>
+    <canvas id="chartSweepTtft"></canvas>
+  </div>
 
-    # 簡短模型名稱（用於圖表標籤）
-    short_names = [m.split(":")[0] if ":" in m else m for m in models]
+  <div class="card card-full">
+    <h2>💾 模型記憶體佔用 vs num_ctx（GB，虛線為 VRAM）</h2>
+    <canvas id="chartSweepMemory"></canvas>
+  </div>
+</div>
+"""
 
-    # 顏色
-    colors = [CHART_COLORS[i % len(CHART_COLORS)] for i in range(len(models))]
-    borders = [CHART_BORDERS[i % len(CHART_BORDERS)] for i in range(len(models))]
+    # ---- 執行參數調校 ----
+    tunings = {m: report["models"][m].get("tuning") for m in models}
 
-    # ---- 模型詳細回覆 HTML ----
-    details_html = ""
-    for model in models:
-        benchmarks = report["models"][model]["benchmark"]
-        details_html += f'<div class="model-detail"><h3>{html.escape(model)}</h3>'
-        for b in benchmarks:
-            status = "✅" if b.get("success") else "❌"
-            lat = f'{b["latency"]}s' if b.get("latency") is not None else "N/A"
-            details_html += f"""
-            <div class="test-card">
-              <div class="test-header">
-                <span class="test-name">{status} {html.escape(b['test'])}</span>
-                <span class="test-stats">⏱ {lat} | 📏 {b.get('length', 0)} chars</span>
-              </div>
-              <div class="prompt">💬 {html.escape(b['prompt'])}</div>
-              <details><summary>展開回覆</summary>
-                <pre class="response">{html.escape(b.get('response', '') or '(無回覆)')}</pre>
-              </details>
-            </div>"""
-        details_html += "</div>"
+    def tuning_section() -> Iterator[str]:
+        if not any(tunings.values()):
+            return
+        yield """
+<!-- 執行參數調校 -->
+<div class="grid">"""
+        for model in models:
+            tuning = tunings[model]
+            if not tuning:
+                continue
+            best = tuning.get("best")
+            default = next((c for c in tuning["configs"] if not c["options"]), None)
+            if best:
+                gain = (
+                    f"，較預設（{default['eval_tps']} tok/s）{best['eval_tps'] / default['eval_tps'] - 1:+.1%}"
+                    if default and default["eval_tps"] and best["options"] else ""
+                )
+                best_text = (
+                    f"🏆 最佳設定 <strong>{html.escape(_options_label(best['options']))}</strong>："
+                    f"生成 {best['eval_tps']} tok/s｜prompt {best['prompt_tps']} tok/s｜TTFT {best['ttft']}s"
+                    f"（{best['runs']} 次量測{gain}）"
+                )
+            else:
+                best_text = '<span class="warn">❌ 所有設定皆失敗</span>'
+            rounds_text = " → ".join(
+                f"{r['configs']} 組 × {r['requests_per_config']} 次" for r in tuning["rounds"]
+            )
+            others = [k for k in sorted(tuning["grid"], key=lambda k: len(tuning["grid"][k]), reverse=True)[2:]]
+            others_text = f"；{', '.join(others)} 取每格中最快的設定" if others else ""
+            yield f"""
+  <div class="card card-full">
+    <h2>🎛 執行參數調校：{html.escape(model)}</h2>
+    <p class="note">{best_text}<br>successive halving：{rounds_text}｜格內為伺服器端生成速度（tokens/秒）{others_text}</p>
+    {_tuning_heatmap_html(tuning)}
+  </div>"""
+        yield """
+</div>
+"""
+
+    # ---- 記憶體感知排程 ----
+    def schedule_section() -> Iterator[str]:
+        for server, plan in (report.get("schedule") or {}).items():
+            measured = plan.get("measured") or {}
+            budget = ollama_client.format_bytes(plan["budget"]) if plan["budget"] else "未知（一次只常駐一個模型）"
+            yield f"""
+<div class="grid">
+  <div class="card card-full">
+    <h2>🧠 記憶體感知排程{f"（{html.escape(ollama_client.server_name(server))}）" if len(report["servers"]) > 1 else ""}</h2>
+    <p class="note">記憶體上限 {budget}｜最多同時常駐 {plan["max_loaded"]} 個模型｜
+      載入 {plan["loads"]} 次（逐一卸載需 {plan["naive_loads"]} 次）｜
+      實測載入 {measured.get("load_time", "N/A")}s，逐一卸載估計 {measured.get("naive_load_time", "N/A")}s，
+      節省 {measured.get("saved", "N/A")}s</p>
+    <table>
+      <thead><tr><th>順序</th><th>模型</th><th>估算佔用</th><th>動作</th><th>預計先卸載</th></tr></thead>
+      <tbody>"""
+            for i, step in enumerate(plan["steps"], 1):
+                action = "載入" if step["load"] else "已在記憶體中"
+                warn = ' <span class="warn">⚠️ 超過記憶體上限</span>' if step["oversize"] else ""
+                yield f"""
+        <tr>
+          <td>{i}</td>
+          <td>{html.escape(step["model"])}{warn}</td>
+          <td>{ollama_client.format_bytes(step["footprint"])}</td>
+          <td>{action}</td>
+          <td>{html.escape(", ".join(step["evict"])) or "—"}</td>
+        </tr>"""
+            yield """</tbody>
+    </table>
+  </div>
+</div>
+"""
 
     # ---- 摘要表格 ----
-    summary_rows = ""
-    for i, model in enumerate(models):
-        benchmarks = report["models"][model]["benchmark"]
-        success_count = sum(1 for b in benchmarks if b.get("success"))
-        summary_rows += f"""
+    def summary_rows() -> Iterator[str]:
+        for i, model in enumerate(models):
+            benchmarks = report["models"][model]["benchmark"]
+            suite_summary = report["models"][model].get("suite_summary")
+            success_rate = (
+                f'{suite_summary["succeeded"]}/{suite_summary["prompts"]}' if suite_summary
+                else f'{sum(1 for b in benchmarks if b.get("success"))}/{len(test_names)}'
+            )
+            unstable_count = sum(1 for b in benchmarks if b.get("unstable"))
+            unstable_badge = f' <span class="warn">⚠️ {unstable_count} 項不穩定</span>' if unstable_count else ""
+            yield f"""
         <tr>
-          <td>{html.escape(model)}</td>
+          <td>{html.escape(model)}{unstable_badge}</td>
           <td>{avg_latencies[i]}s</td>
-          <td>{total_lengths[i]}</td>
-          <td>{success_count}/{len(test_names)}</td>
+          <td>{avg_ttfts[i] if avg_ttfts[i] is not None else "N/A"}s</td>
+          <td>{avg_eval_tps[i] if avg_eval_tps[i] is not None else "N/A"}</td>
+          <td>{avg_prompt_tps[i] if avg_prompt_tps[i] is not None else "N/A"}</td>
+          <td>{avg_load_times[i] if avg_load_times[i] is not None else "N/A"}s</td>
+          <td>{avg_overheads[i] if avg_overheads[i] is not None else "N/A"}s</td>
+          <td>{avg_connect_times[i] if avg_connect_times[i] is not None else "N/A"}s</td>
+          <td>{avg_itl_p95[i] if avg_itl_p95[i] is not None else "N/A"}ms</td>
+          <td>{total_eval_counts[i]}</td>
+          <td>{success_rate}</td>
         </tr>"""
 
-    return f"""<!DOCTYPE html>
+    f.write(f"""<!DOCTYPE html>
 <html lang="zh-Hant">
 <head>
 <meta charset="UTF-8">
 <meta name="viewport" content="width=device-width, initial-scale=1.0">
 <title>Ollama Benchmark 分析報告 - {timestamp}</title>
-<script src="https://cdn.jsdelivr.net/npm/chart.js@4"></script>
+{chartjs}
 <style>
   :root {{
     --bg: #0f1117; --surface: #1a1d27; --border: #2a2d3a;
@@ -246,6 +3219,11 @@ def _build_html_report(report: dict) -> str:
   .test-name {{ font-weight: 600; }}
   .test-stats {{ color: var(--muted); font-size: .85rem; }}
   .prompt {{ color: var(--muted); font-size: .9rem; margin-bottom: .5rem; }}
+  .warn {{ color: #f59e0b; font-weight: 600; }}
+  .note {{ color: var(--muted); font-size: 0.9rem; margin-bottom: 1rem; }}
+  .cached {{ color: #64748b; font-size: 0.8rem; font-weight: 400; }}
+  .heatmap td, .heatmap th {{ text-align: center; }}
+  .heatmap td small {{ color: var(--muted); }}
   details summary {{
     cursor: pointer; color: var(--accent); font-size: .9rem;
     padding: .3rem 0; user-select: none;
@@ -255,20 +3233,35 @@ def _build_html_report(report: dict) -> str:
     background: var(--bg); padding: 1rem; border-radius: 8px;
     margin-top: .5rem; max-height: 400px; overflow-y: auto; line-height: 1.5;
   }}
+  .toolbar {{ display: flex; flex-wrap: wrap; gap: .8rem; align-items: center; margin-bottom: 1rem; }}
+  .toolbar input[type=search], .toolbar select {{
+    background: var(--bg); color: var(--text); border: 1px solid var(--border);
+    border-radius: 6px; padding: .4rem .6rem; font-size: .9rem;
+  }}
+  .toolbar input[type=search] {{ flex: 1; min-width: 220px; }}
+  .pager {{ display: flex; gap: .8rem; align-items: center; justify-content: center; margin-top: 1rem; }}
+  .pager button {{
+    background: var(--surface); color: var(--accent); border: 1px solid var(--border);
+    border-radius: 6px; padding: .3rem .8rem; cursor: pointer;
+  }}
+  .pager button:disabled {{ color: var(--muted); cursor: default; }}
 </style>
 </head>
 <body>
 
 <h1>Ollama Benchmark 分析報告</h1>
-<p class="subtitle">測試時間：{timestamp}</p>
+<p class="subtitle">測試時間：{timestamp}{subtitle_suite}</p>
+<p id="chartjsMissing" class="warn" style="text-align:center;margin-bottom:2rem;" hidden>⚠️ 無法載入 Chart.js，圖表不會顯示；離線環境請以 --chartjs 指定本機的 Chart.js 檔案內嵌至報告</p>
 
 <!-- 摘要表格 -->
 <div class="grid">
   <div class="card card-full">
     <h2>📋 模型總覽</h2>
     <table>
-      <thead><tr><th>模型</th><th>平均延遲</th><th>總回應長度</th><th>成功率</th></tr></thead>
-      <tbody>{summary_rows}</tbody>
+      <thead><tr><th>模型</th><th>平均延遲</th><th>平均 TTFT</th><th>生成 tokens/秒</th><th>Prompt tokens/秒</th><th>平均載入時間</th><th>網路/客戶端開銷</th><th>連線建立</th><th>ITL p95</th><th>總生成 tokens</th><th>成功率</th></tr></thead>
+      <tbody>""")
+    f.writelines(summary_rows())
+    f.write(f"""</tbody>
     </table>
   </div>
 
@@ -278,29 +3271,71 @@ def _build_html_report(report: dict) -> str:
     <canvas id="chartAvgLatency"></canvas>
   </div>
 
-  <!-- 總回應長度比較 -->
+  <!-- 生成速度比較 -->
   <div class="card">
-    <h2>📏 總回應長度（字元）</h2>
-    <canvas id="chartTotalLength"></canvas>
+    <h2>🔤 平均生成速度（伺服器端 tokens/秒）</h2>
+    <canvas id="chartEvalTps"></canvas>
   </div>
 
   <!-- 各測試項目延遲 -->
   <div class="card">
-    <h2>⏱ 各測試項目延遲比較（秒）</h2>
+    <h2>⏱ 各{test_axis}延遲比較（秒）</h2>
     <canvas id="chartLatencyByTest"></canvas>
   </div>
 
-  <!-- 各測試項目回應長度 -->
+  <!-- 各測試項目生成速度 -->
+  <div class="card">
+    <h2>🔤 各{test_axis}生成速度比較（tokens/秒）</h2>
+    <canvas id="chartEvalTpsByTest"></canvas>
+  </div>
+
+  <!-- 延遲組成 -->
+  <div class="card">
+    <h2>🧩 平均延遲組成（秒）</h2>
+    <canvas id="chartLatencyBreakdown"></canvas>
+  </div>
+
+  <!-- Prompt 處理速度 -->
+  <div class="card">
+    <h2>📥 平均 Prompt 處理速度（tokens/秒）</h2>
+    <canvas id="chartPromptTps"></canvas>
+  </div>
+
+  <!-- 各測試項目 TTFT -->
   <div class="card">
-    <h2>📏 各測試項目回應長度比較（字元）</h2>
-    <canvas id="chartLengthByTest"></canvas>
+    <h2>⚡ 各{test_axis}首個 token 延遲 TTFT（秒）</h2>
+    <canvas id="chartTtftByTest"></canvas>
+  </div>
+
+  <!-- 解碼速度 -->
+  <div class="card">
+    <h2>🔤 平均解碼速度（tokens/秒）</h2>
+    <canvas id="chartDecodeSpeed"></canvas>
   </div>
 </div>
 
-<!-- 模型詳細回覆 -->
-<div class="card card-full" style="margin-bottom:2rem;">
-  <h2>💬 各模型詳細回覆</h2>
-  {details_html}
+""")
+    for section in (
+        load_test_section, capacity_section, embedding_section, vision_section, load_profile_section,
+        context_sweep_section, tuning_section, schedule_section,
+    ):
+        f.writelines(section())
+
+    model_options = "".join(f'<option value="{html.escape(m)}">{html.escape(m)}</option>' for m in models)
+    f.write(f"""
+<!-- 模型詳細回覆：內容在 {DETAILS_DIR}/ 的側載資料檔，捲動到此區塊時才載入 -->
+<div class="card card-full" style="margin-bottom:2rem;" id="details">
+  <h2>💬 各模型詳細回覆（{details} 筆）</h2>
+  <div class="toolbar">
+    <input type="search" id="detailSearch" placeholder="搜尋模型、{test_axis}、prompt 或錯誤訊息…">
+    <select id="detailModel"><option value="">全部模型</option>{model_options}</select>
+    <label class="note" style="margin:0;"><input type="checkbox" id="detailFailed"> 只顯示失敗</label>
+    <span id="detailCount" class="note" style="margin:0;"></span>
+  </div>
+  <div id="detailList"><p class="note">捲動到此處時載入…</p></div>
+  <div class="pager">
+    <button id="detailPrev">‹ 上一頁</button><span id="detailPage" class="note" style="margin:0;"></span><button id="detailNext">下一頁 ›</button>
+  </div>
 </div>
 
 <script>
@@ -310,13 +3345,218 @@ const TESTS = {json.dumps(test_names, ensure_ascii=False)};
 const COLORS = {json.dumps(colors)};
 const BORDERS = {json.dumps(borders)};
 const AVG_LATENCIES = {json.dumps(avg_latencies)};
-const TOTAL_LENGTHS = {json.dumps(total_lengths)};
+const AVG_EVAL_TPS = {json.dumps(avg_eval_tps)};
+const AVG_PROMPT_TPS = {json.dumps(avg_prompt_tps)};
+const LATENCY_BREAKDOWN = {json.dumps(latency_breakdown)};
 const LATENCY_DATA = {json.dumps(latency_data, ensure_ascii=False)};
-const LENGTH_DATA = {json.dumps(length_data, ensure_ascii=False)};
+const EVAL_TPS_DATA = {json.dumps(eval_tps_data, ensure_ascii=False)};
+const ERROR_BARS = {json.dumps(error_bars, ensure_ascii=False)};
+const MODEL_ERROR_BARS = {json.dumps(model_error_bars)};
+const TTFT_DATA = {json.dumps(ttft_data, ensure_ascii=False)};
+const AVG_DECODE_TPS = {json.dumps(avg_decode_tps)};
+const LOAD_PROFILE = {json.dumps(profile_chart)};
+const LOAD_PROFILE_ERROR_BARS = {json.dumps(profile_error_bars)};
+const CONTEXT_SWEEP = {json.dumps(sweep_chart)};
+const CONCURRENCY_LEVELS = {json.dumps(concurrency_levels)};
+const LOAD_TPS = {json.dumps(load_tps)};
+const LOAD_P90 = {json.dumps(load_p90)};
+const CAPACITY = {json.dumps(capacity_chart)};
+const EMBED_BATCH_SIZES = {json.dumps(embed_sizes)};
+const EMBED_RATE = {json.dumps(embed_rate)};
+const EMBED_P90 = {json.dumps(embed_p90)};
+const VISION_RESOLUTIONS = {json.dumps(vision_labels, ensure_ascii=False)};
+const VISION_TTFT = {json.dumps(vision_ttft)};
+const VISION_IMAGE_TIME = {json.dumps(vision_image_time)};
+const DETAILS_SRC = {json.dumps(DETAILS_DIR)};
+const DETAILS_TOTAL = {details};
+const DETAILS_PAGE_SIZE = {DETAILS_PAGE_SIZE};
+const DETAILS_PER_VIEW = {DETAILS_PER_VIEW};
+
+// 詳細回覆：側載資料檔以 JSONP（<script>）載入，file:// 開啟時也能使用；
+// index.js 為每筆的摘要（搜尋、分頁用），page_NNNN.js 為完整回覆與資源時間序列，展開時才載入
+const esc = v => String(v ?? '').replace(/[&<>"']/g, c => ({{ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' }})[c]);
+const BENCHMARK_DETAILS = {{
+  rows: null, pages: {{}}, waiting: {{}},
+  index(rows) {{ this.rows = rows; renderDetails(); }},
+  page(n, items) {{
+    this.pages[n] = items;
+    (this.waiting[n] || []).forEach(resolve => resolve(items));
+    delete this.waiting[n];
+  }}
+}};
+function loadScript(src) {{
+  const el = document.createElement('script');
+  el.src = src;
+  el.onerror = () => {{
+    document.getElementById('detailList').innerHTML = `<p class="warn">無法載入 ${{esc(src)}}，請確認與報告位於同一目錄</p>`;
+  }};
+  document.head.appendChild(el);
+}}
+function loadDetailPage(n) {{
+  const D = BENCHMARK_DETAILS;
+  if (D.pages[n]) return Promise.resolve(D.pages[n]);
+  if (!D.waiting[n]) {{
+    D.waiting[n] = [];
+    loadScript(`${{DETAILS_SRC}}/page_${{String(n).padStart(4, '0')}}.js`);
+  }}
+  return new Promise(resolve => D.waiting[n].push(resolve));
+}}
+
+let detailView = 0;
+function filteredDetails() {{
+  const q = document.getElementById('detailSearch').value.trim().toLowerCase();
+  const model = document.getElementById('detailModel').value;
+  const failedOnly = document.getElementById('detailFailed').checked;
+  return BENCHMARK_DETAILS.rows
+    .map((r, i) => [r, i])
+    .filter(([r]) => (!model || r.model === model) && (!failedOnly || !r.ok)
+      && (!q || [r.model, r.test, r.prompt, r.error].join('\\n').toLowerCase().includes(q)));
+}}
+function renderDetails() {{
+  if (!BENCHMARK_DETAILS.rows) return;
+  const rows = filteredDetails();
+  const views = Math.max(1, Math.ceil(rows.length / DETAILS_PER_VIEW));
+  detailView = Math.min(detailView, views - 1);
+  // 同一模型的連續結果歸在同一個標題下
+  const groups = [];
+  for (const [r, i] of rows.slice(detailView * DETAILS_PER_VIEW, (detailView + 1) * DETAILS_PER_VIEW)) {{
+    if (!groups.length || groups[groups.length - 1].model !== r.model) groups.push({{ model: r.model, cards: [] }});
+    const body = r.detail ? `<details data-detail="${{i}}"><summary>展開回覆</summary><div class="prompt">載入中…</div></details>` : '';
+    groups[groups.length - 1].cards.push(`<div class="test-card">${{r.html}}${{body}}</div>`);
+  }}
+  document.getElementById('detailList').innerHTML = groups
+    .map(g => `<div class="model-detail"><h3>${{esc(g.model)}}</h3>${{g.cards.join('')}}</div>`)
+    .join('') || '<p class="note">沒有符合條件的結果</p>';
+  document.getElementById('detailCount').textContent = `符合 ${{rows.length}} / ${{DETAILS_TOTAL}} 筆`;
+  document.getElementById('detailPage').textContent = `第 ${{detailView + 1}} / ${{views}} 頁`;
+  document.getElementById('detailPrev').disabled = detailView === 0;
+  document.getElementById('detailNext').disabled = detailView >= views - 1;
+}}
+function showDetail(el) {{
+  const i = +el.dataset.detail;
+  loadDetailPage(Math.floor(i / DETAILS_PAGE_SIZE)).then(items => {{
+    const d = items[i % DETAILS_PAGE_SIZE];
+    let out = d.prompt !== undefined
+      ? `<div class="prompt">💬 ${{esc(d.prompt)}}</div><pre class="response">${{esc(d.response || '(無回覆)')}}</pre>`
+      : '';
+    if (d.resources) out += `<div class="prompt">📈 資源使用時間序列（${{d.resources.t.length}} 次取樣）</div><canvas></canvas>`;
+    el.querySelector('div').outerHTML = `<div>${{out}}</div>`;
+    if (d.resources && typeof Chart !== 'undefined') drawResources(el.querySelector('canvas'), d.resources);
+  }});
+}}
+(() => {{
+  const list = document.getElementById('detailList');
+  // toggle 事件不會冒泡，改在捕獲階段處理；每筆只在第一次展開時載入
+  list.addEventListener('toggle', e => {{
+    const el = e.target;
+    if (el.dataset && el.dataset.detail !== undefined && el.open && !el.dataset.loaded) {{
+      el.dataset.loaded = '1';
+      showDetail(el);
+    }}
+  }}, true);
+  const rerender = () => {{ detailView = 0; renderDetails(); }};
+  document.getElementById('detailSearch').addEventListener('input', rerender);
+  document.getElementById('detailModel').addEventListener('change', rerender);
+  document.getElementById('detailFailed').addEventListener('change', rerender);
+  document.getElementById('detailPrev').addEventListener('click', () => {{ detailView--; renderDetails(); }});
+  document.getElementById('detailNext').addEventListener('click', () => {{ detailView++; renderDetails(); }});
+  const section = document.getElementById('details');
+  const start = () => loadScript(`${{DETAILS_SRC}}/index.js`);
+  if (!DETAILS_TOTAL) {{
+    list.innerHTML = '<p class="note">沒有測試結果</p>';
+  }} else if ('IntersectionObserver' in window) {{
+    const observer = new IntersectionObserver(entries => {{
+      if (entries.some(e => e.isIntersecting)) {{ observer.disconnect(); start(); }}
+    }}, {{ rootMargin: '400px' }});
+    observer.observe(section);
+  }} else {{
+    start();
+  }}
+}})();
+
+// 資源使用時間序列：記憶體（GB）、生成速度與 CPU 使用率共用時間軸
+function drawResources(canvas, s) {{
+  const points = key => s.t.map((t, i) => ({{ x: t, y: s[key][i] }}));
+  const lines = [
+    ['vram', 'VRAM 中的模型（GB）', 'y', false],
+    ['ram', '系統記憶體中的模型（GB）', 'y', false],
+    ['rss', 'Ollama RSS（GB）', 'y', false],
+    ['mem_used', '系統記憶體使用量（GB）', 'y', true],
+    ['tps', '生成速度（tokens/秒）', 'yTps', false],
+    ['cpu', 'CPU 使用率（%）', 'yCpu', false]
+  ].filter(([key]) => s[key].some(v => v !== null));
+  const datasets = lines.map(([key, label, axis, hidden], i) => ({{
+    label, data: points(key), yAxisID: axis, hidden,
+    borderColor: BORDERS[i % BORDERS.length], backgroundColor: COLORS[i % COLORS.length],
+    spanGaps: true, tension: 0.2, pointRadius: 2
+  }}));
+  if (s.ttft !== null) {{
+    // 首個 token 到達時間的垂直參考線
+    const peak = Math.max(1, ...s.tps.filter(v => v !== null));
+    datasets.push({{
+      label: '首個 token', yAxisID: 'yTps', borderDash: [6, 4], pointRadius: 0,
+      borderColor: '#94a3b8', data: [{{ x: s.ttft, y: 0 }}, {{ x: s.ttft, y: peak }}]
+    }});
+  }}
+  new Chart(canvas, {{
+    type: 'line',
+    data: {{ datasets }},
+    options: {{
+      responsive: true,
+      interaction: {{ mode: 'nearest', axis: 'x', intersect: false }},
+      plugins: {{ legend: {{ position: 'bottom' }} }},
+      scales: {{
+        x: {{ type: 'linear', beginAtZero: true, title: {{ display: true, text: '請求開始後秒數' }} }},
+        y: {{ beginAtZero: true, title: {{ display: true, text: 'GB' }} }},
+        yTps: {{ beginAtZero: true, position: 'right', title: {{ display: true, text: 'tokens/秒' }}, grid: {{ drawOnChartArea: false }} }},
+        yCpu: {{
+          beginAtZero: true, max: 100, position: 'right', display: s.cpu.some(v => v !== null),
+          title: {{ display: true, text: 'CPU %' }}, grid: {{ drawOnChartArea: false }}
+        }}
+      }}
+    }}
+  }});
+}}
+</script>
+
+<script>
+// 離線且未內嵌 Chart.js 時只顯示提示，詳細回覆仍可瀏覽
+if (typeof Chart === 'undefined') {{
+  document.getElementById('chartjsMissing').hidden = false;
+  throw new Error('Chart.js 未載入');
+}}
 
 Chart.defaults.color = '#8b8fa3';
 Chart.defaults.borderColor = '#2a2d3a';
 
+// 誤差線外掛：dataset.errorBars[i] = [low, high]，於長條中央畫出信賴區間
+Chart.register({{
+  id: 'errorBars',
+  afterDatasetsDraw(chart) {{
+    const ctx = chart.ctx;
+    chart.data.datasets.forEach((ds, di) => {{
+      if (!ds.errorBars || !chart.isDatasetVisible(di)) return;
+      const meta = chart.getDatasetMeta(di);
+      const yScale = chart.scales[meta.yAxisID];
+      meta.data.forEach((bar, i) => {{
+        const eb = ds.errorBars[i];
+        if (!eb) return;
+        const top = yScale.getPixelForValue(eb[1]);
+        const bottom = yScale.getPixelForValue(eb[0]);
+        ctx.save();
+        ctx.strokeStyle = '#e4e6eb';
+        ctx.lineWidth = 1.5;
+        ctx.beginPath();
+        ctx.moveTo(bar.x, top); ctx.lineTo(bar.x, bottom);
+        ctx.moveTo(bar.x - 4, top); ctx.lineTo(bar.x + 4, top);
+        ctx.moveTo(bar.x - 4, bottom); ctx.lineTo(bar.x + 4, bottom);
+        ctx.stroke();
+        ctx.restore();
+      }});
+    }});
+  }}
+}});
+
 // 平均延遲
 new Chart(document.getElementById('chartAvgLatency'), {{
   type: 'bar',
@@ -325,6 +3565,7 @@ new Chart(document.getElementById('chartAvgLatency'), {{
     datasets: [{{
       label: '平均延遲（秒）',
       data: AVG_LATENCIES,
+      errorBars: MODEL_ERROR_BARS.latency,
       backgroundColor: COLORS,
       borderColor: BORDERS,
       borderWidth: 1
@@ -337,14 +3578,15 @@ new Chart(document.getElementById('chartAvgLatency'), {{
   }}
 }});
 
-// 總回應長度
-new Chart(document.getElementById('chartTotalLength'), {{
+// 平均生成速度
+new Chart(document.getElementById('chartEvalTps'), {{
   type: 'bar',
   data: {{
     labels: MODELS,
     datasets: [{{
-      label: '總回應長度（字元）',
-      data: TOTAL_LENGTHS,
+      label: '生成速度（tokens/秒）',
+      data: AVG_EVAL_TPS,
+      errorBars: MODEL_ERROR_BARS.eval_tps,
       backgroundColor: COLORS,
       borderColor: BORDERS,
       borderWidth: 1
@@ -353,7 +3595,7 @@ new Chart(document.getElementById('chartTotalLength'), {{
   options: {{
     responsive: true,
     plugins: {{ legend: {{ display: false }} }},
-    scales: {{ y: {{ beginAtZero: true, title: {{ display: true, text: '字元' }} }} }}
+    scales: {{ y: {{ beginAtZero: true, title: {{ display: true, text: 'tokens/秒' }} }} }}
   }}
 }});
 
@@ -365,6 +3607,7 @@ new Chart(document.getElementById('chartLatencyByTest'), {{
     datasets: MODELS.map((m, i) => ({{
       label: m,
       data: TESTS.map(t => LATENCY_DATA[t][i] ?? 0),
+      errorBars: TESTS.map(t => ERROR_BARS.latency[t][i]),
       backgroundColor: COLORS[i],
       borderColor: BORDERS[i],
       borderWidth: 1
@@ -377,14 +3620,15 @@ new Chart(document.getElementById('chartLatencyByTest'), {{
   }}
 }});
 
-// 各測試回應長度
-new Chart(document.getElementById('chartLengthByTest'), {{
+// 各測試生成速度
+new Chart(document.getElementById('chartEvalTpsByTest'), {{
   type: 'bar',
   data: {{
     labels: TESTS,
     datasets: MODELS.map((m, i) => ({{
       label: m,
-      data: TESTS.map(t => LENGTH_DATA[t][i]),
+      data: TESTS.map(t => EVAL_TPS_DATA[t][i] ?? 0),
+      errorBars: TESTS.map(t => ERROR_BARS.eval_tps[t][i]),
       backgroundColor: COLORS[i],
       borderColor: BORDERS[i],
       borderWidth: 1
@@ -393,19 +3637,430 @@ new Chart(document.getElementById('chartLengthByTest'), {{
   options: {{
     responsive: true,
     plugins: {{ legend: {{ position: 'bottom' }} }},
-    scales: {{ y: {{ beginAtZero: true, title: {{ display: true, text: '字元' }} }} }}
+    scales: {{ y: {{ beginAtZero: true, title: {{ display: true, text: 'tokens/秒' }} }} }}
   }}
 }});
+
+// 延遲組成（堆疊長條圖）：載入 / prompt 評估 / 生成 / 網路與客戶端開銷
+const BREAKDOWN_LABELS = {{
+  load_time: '模型載入', prompt_eval_time: 'Prompt 評估', eval_time: '生成',
+  connect_time: '連線建立（TCP/TLS）', overhead: '傳輸/客戶端開銷'
+}};
+new Chart(document.getElementById('chartLatencyBreakdown'), {{
+  type: 'bar',
+  data: {{
+    labels: MODELS,
+    datasets: Object.keys(BREAKDOWN_LABELS).map((key, i) => ({{
+      label: BREAKDOWN_LABELS[key],
+      data: LATENCY_BREAKDOWN[key].map(v => v ?? 0),
+      backgroundColor: COLORS[i % COLORS.length],
+      borderColor: BORDERS[i % BORDERS.length],
+      borderWidth: 1
+    }}))
+  }},
+  options: {{
+    responsive: true,
+    plugins: {{ legend: {{ position: 'bottom' }} }},
+    scales: {{
+      x: {{ stacked: true }},
+      y: {{ stacked: true, beginAtZero: true, title: {{ display: true, text: '秒' }} }}
+    }}
+  }}
+}});
+
+// 平均 Prompt 處理速度
+new Chart(document.getElementById('chartPromptTps'), {{
+  type: 'bar',
+  data: {{
+    labels: MODELS,
+    datasets: [{{
+      label: 'Prompt 處理速度（tokens/秒）',
+      data: AVG_PROMPT_TPS,
+      errorBars: MODEL_ERROR_BARS.prompt_tps,
+      backgroundColor: COLORS,
+      borderColor: BORDERS,
+      borderWidth: 1
+    }}]
+  }},
+  options: {{
+    responsive: true,
+    plugins: {{ legend: {{ display: false }} }},
+    scales: {{ y: {{ beginAtZero: true, title: {{ display: true, text: 'tokens/秒' }} }} }}
+  }}
+}});
+
+// 各測試 TTFT
+new Chart(document.getElementById('chartTtftByTest'), {{
+  type: 'bar',
+  data: {{
+    labels: TESTS,
+    datasets: MODELS.map((m, i) => ({{
+      label: m,
+      data: TESTS.map(t => TTFT_DATA[t][i] ?? 0),
+      errorBars: TESTS.map(t => ERROR_BARS.ttft[t][i]),
+      backgroundColor: COLORS[i],
+      borderColor: BORDERS[i],
+      borderWidth: 1
+    }}))
+  }},
+  options: {{
+    responsive: true,
+    plugins: {{ legend: {{ position: 'bottom' }} }},
+    scales: {{ y: {{ beginAtZero: true, title: {{ display: true, text: '秒' }} }} }}
+  }}
+}});
+
+// 平均解碼速度
+new Chart(document.getElementById('chartDecodeSpeed'), {{
+  type: 'bar',
+  data: {{
+    labels: MODELS,
+    datasets: [{{
+      label: '解碼速度（tokens/秒）',
+      data: AVG_DECODE_TPS,
+      backgroundColor: COLORS,
+      borderColor: BORDERS,
+      borderWidth: 1
+    }}]
+  }},
+  options: {{
+    responsive: true,
+    plugins: {{ legend: {{ display: false }} }},
+    scales: {{ y: {{ beginAtZero: true, title: {{ display: true, text: 'tokens/秒' }} }} }}
+  }}
+}});
+
+// 吞吐量 / 延遲 vs 並行數、批次大小或解析度（折線圖，每個有資料的模型一條曲線）
+function levelChart(id, levels, series, xTitle, unit) {{
+  const el = document.getElementById(id);
+  if (!el) return;
+  new Chart(el, {{
+    type: 'line',
+    data: {{
+      labels: levels,
+      datasets: MODELS.map((m, i) => ({{
+        label: m,
+        data: series[i],
+        backgroundColor: COLORS[i],
+        borderColor: BORDERS[i],
+        spanGaps: true,
+        tension: 0.2
+      }})).filter(d => d.data.some(v => v != null))
+    }},
+    options: {{
+      responsive: true,
+      plugins: {{ legend: {{ position: 'bottom' }} }},
+      scales: {{
+        x: {{ title: {{ display: true, text: xTitle }} }},
+        y: {{ beginAtZero: true, title: {{ display: true, text: unit }} }}
+      }}
+    }}
+  }});
+}}
+levelChart('chartLoadThroughput', CONCURRENCY_LEVELS, LOAD_TPS, '並行數', 'tokens/秒');
+levelChart('chartLoadLatency', CONCURRENCY_LEVELS, LOAD_P90, '並行數', '秒');
+levelChart('chartEmbedThroughput', EMBED_BATCH_SIZES, EMBED_RATE, '批次大小', 'embeddings/秒');
+levelChart('chartEmbedLatency', EMBED_BATCH_SIZES, EMBED_P90, '批次大小', '秒');
+levelChart('chartVisionImageTime', VISION_RESOLUTIONS, VISION_IMAGE_TIME, '解析度', '秒');
+levelChart('chartVisionTtft', VISION_RESOLUTIONS, VISION_TTFT, '解析度', '秒');
+
+// SLO 容量搜尋：每一步的 SLO 指標（× 為未達標）與門檻
+(() => {{
+  const el = document.getElementById('chartCapacity');
+  if (!el) return;
+  const datasets = [];
+  CAPACITY.forEach((cap, i) => {{
+    if (!cap) return;
+    datasets.push({{
+      label: MODELS[i] + '（' + cap.metric + '）',
+      data: cap.points,
+      borderColor: BORDERS[i % BORDERS.length],
+      backgroundColor: COLORS[i % COLORS.length],
+      pointStyle: ctx => ctx.raw?.s === 'fail' ? 'crossRot' : 'circle',
+      pointRadius: ctx => ctx.raw?.s === 'fail' ? 8 : 4,
+      spanGaps: true,
+      borderWidth: 2
+    }});
+    const xs = cap.points.map(p => p.x);
+    datasets.push({{
+      label: MODELS[i] + '（門檻 ' + cap.limit + '）',
+      data: [{{ x: Math.min(...xs), y: cap.limit }}, {{ x: Math.max(...xs), y: cap.limit }}],
+      borderColor: BORDERS[i % BORDERS.length],
+      borderDash: [6, 4],
+      borderWidth: 1,
+      pointRadius: 0
+    }});
+  }});
+  new Chart(el, {{
+    type: 'line',
+    data: {{ datasets }},
+    options: {{
+      responsive: true,
+      plugins: {{
+        legend: {{ position: 'bottom' }},
+        tooltip: {{ callbacks: {{ afterLabel: ctx => ctx.raw?.s === 'fail' ? '❌ 未達標' : (ctx.raw?.s ? '✅ 達標' : '') }} }}
+      }},
+      scales: {{
+        x: {{ type: 'linear', title: {{ display: true, text: '到達率（請求/秒）' }} }},
+        y: {{ beginAtZero: true }}
+      }}
+    }}
+  }});
+}})();
+
+// 上下文長度掃描：量測點（📉 效能崩落為三角形、💥 OOM / 失敗為 ×）與擬合曲線
+function sweepChart(id, key, fitKey, unit, logY) {{
+  const el = document.getElementById(id);
+  if (!el) return;
+  const datasets = [];
+  CONTEXT_SWEEP.forEach((sweep, i) => {{
+    if (!sweep) return;
+    datasets.push({{
+      label: MODELS[i],
+      data: sweep[key],
+      borderColor: BORDERS[i % BORDERS.length],
+      backgroundColor: COLORS[i % COLORS.length],
+      pointStyle: ctx => ({{ collapse: 'triangle', oom: 'crossRot', error: 'crossRot' }})[ctx.raw?.s] || 'circle',
+      pointRadius: ctx => ctx.raw?.s && ctx.raw.s !== 'ok' ? 8 : 3,
+      borderWidth: 2
+    }});
+    if (fitKey && sweep[fitKey].length) {{
+      datasets.push({{
+        label: MODELS[i] + '（擬合）',
+        data: sweep[fitKey],
+        borderColor: BORDERS[i % BORDERS.length],
+        borderDash: [6, 4],
+        borderWidth: 1,
+        pointRadius: 0
+      }});
+    }}
+    if (key === 'memory') {{
+      datasets.push({{
+        label: MODELS[i] + '（VRAM）',
+        data: sweep.memory.map(p => ({{ x: p.x, y: p.vram }})),
+        borderColor: BORDERS[i % BORDERS.length],
+        borderDash: [6, 4],
+        borderWidth: 1,
+        pointRadius: 2
+      }});
+    }}
+  }});
+  new Chart(el, {{
+    type: 'line',
+    data: {{ datasets }},
+    options: {{
+      responsive: true,
+      plugins: {{
+        legend: {{ position: 'bottom' }},
+        tooltip: {{ callbacks: {{ afterLabel: ctx => ({{ collapse: '📉 效能崩落', oom: '💥 OOM', error: '❌ 失敗' }})[ctx.raw?.s] || '' }} }}
+      }},
+      scales: {{
+        x: {{ type: 'logarithmic', title: {{ display: true, text: key === 'memory' ? 'num_ctx' : 'prompt tokens' }} }},
+        y: logY
+          ? {{ type: 'logarithmic', title: {{ display: true, text: unit }} }}
+          : {{ beginAtZero: true, title: {{ display: true, text: unit }} }}
+      }}
+    }}
+  }});
+}}
+sweepChart('chartSweepTps', 'tps', 'fit_tps', 'tokens/秒', false);
+sweepChart('chartSweepTtft', 'ttft', 'fit_ttft', '秒', true);
+sweepChart('chartSweepMemory', 'memory', null, 'GB', false);
+
+// 冷載入 vs 熱啟動（分組長條圖）與載入頻寬
+if (document.getElementById('chartLoadProfile')) {{
+  const PROFILE_LABELS = {{ cold_load_time: '冷載入時間', cold_ttft: '冷啟動 TTFT', warm_ttft: '熱啟動 TTFT' }};
+  new Chart(document.getElementById('chartLoadProfile'), {{
+    type: 'bar',
+    data: {{
+      labels: MODELS,
+      datasets: Object.keys(PROFILE_LABELS).map((key, i) => ({{
+        label: PROFILE_LABELS[key],
+        data: LOAD_PROFILE[key].map(v => v ?? 0),
+        errorBars: LOAD_PROFILE_ERROR_BARS[key],
+        backgroundColor: COLORS[i % COLORS.length],
+        borderColor: BORDERS[i % BORDERS.length],
+        borderWidth: 1
+      }}))
+    }},
+    options: {{
+      responsive: true,
+      plugins: {{ legend: {{ position: 'bottom' }} }},
+      scales: {{ y: {{ beginAtZero: true, title: {{ display: true, text: '秒' }} }} }}
+    }}
+  }});
+  new Chart(document.getElementById('chartLoadBandwidth'), {{
+    type: 'bar',
+    data: {{
+      labels: MODELS,
+      datasets: [{{
+        label: '載入頻寬（GB/秒）',
+        data: LOAD_PROFILE.load_bandwidth_gbps,
+        backgroundColor: COLORS,
+        borderColor: BORDERS,
+        borderWidth: 1
+      }}]
+    }},
+    options: {{
+      responsive: true,
+      plugins: {{ legend: {{ display: false }} }},
+      scales: {{ y: {{ beginAtZero: true, title: {{ display: true, text: 'GB/秒' }} }} }}
+    }}
+  }});
+}}
 </script>
 
 </body>
-</html>"""
+</html>
+""")
+
 
 
 # ---------------------------------------------------------------------------
 # 主流程
 # ---------------------------------------------------------------------------
 
+def _pending_tests(prompts: Iterable[dict], done: set[str]) -> Iterator[dict]:
+    """尚未記錄結果的測試項目（續跑或沿用快取時略過已完成者）"""
+    return (item for item in prompts if item["name"] not in done)
+
+
+def _pending_sections(args: argparse.Namespace, entry: dict) -> list[str]:
+    """本次要求但報告中尚未有結果的選用項目"""
+    wanted = []
+    if args.profile_load:
+        wanted.append("load_profile")
+    if args.concurrency:
+        wanted.append("load_test")
+    if args.context_sweep:
+        wanted.append("context_sweep")
+    if args.tune is not None:
+        wanted.append("tuning")
+    if args.capacity:
+        wanted.append("capacity")
+    if args.embed:
+        wanted.append("embedding")
+    if args.vision:
+        wanted.append("vision")
+    return [section for section in wanted if section not in entry]
+
+
+def _run_model_extras(
+    args: argparse.Namespace,
+    model: str,
+    server: str,
+    label: str,
+    entry: dict,
+    journal: ResultJournal,
+) -> None:
+    """執行一般測試以外的選用項目（載入剖析、並行負載測試、上下文長度掃描、參數調校、SLO 容量搜尋、embedding 評測、
+    vision 評測），
+    結果寫入報告的模型項目與日誌"""
+    for section in _pending_sections(args, entry):
+        with perf_trace.span(f"{section}（{label}）", cat="benchmark", model=model, server=server):
+            if section == "load_profile":
+                data = profile_model_load(model, args.load_cycles, base_url=server, label=label)
+            elif section == "context_sweep":
+                data = context_sweep(model, args.context_sweep, base_url=server, label=label)
+            elif section == "tuning":
+                data = tune_options(model, _tune_grid(args.tune), base_url=server, label=label)
+            elif section == "capacity":
+                data = capacity_search(
+                    model, args.slo, window=args.capacity_window, start_rate=args.capacity_rate,
+                    max_rate=args.capacity_max_rate, min_rate=args.capacity_min_rate, base_url=server, label=label,
+                )
+            elif section == "embedding":
+                data = embed_benchmark(
+                    model, args.embed, inputs=args.embed_inputs, concurrency=args.embed_concurrency,
+                    base_url=server, label=label,
+                )
+            elif section == "vision":
+                data = vision_benchmark(model, args.vision, repeat=args.vision_repeat, base_url=server, label=label)
+            else:
+                data = run_load_tests_for_model(
+                    model, args.concurrency, args.load_requests, base_url=server, label=label
+                )
+        entry[section] = data
+        journal.record_section(label, server, model, section, data)
+
+
+def _run_fleet(
+    args: argparse.Namespace,
+    server_models: dict[str, list[str]],
+    report: dict,
+    multi_server: bool,
+    journal: ResultJournal,
+    prompts: Callable[[str], Iterable[dict]],
+    done_tests: dict[str, set[str]],
+    total: int,
+    on_result: Callable[[str, str, str, dict, dict], None],
+) -> None:
+    """多伺服器模式：以 FleetScheduler 平行執行所有 (server, model, test) 工作，
+    之後各伺服器平行執行選用項目（同一伺服器內依序執行，避免互相干擾）。
+    工作以 generator 逐項產生，大型題庫不會一次展開；prompts(label) 為該模型的測試項目，total 為待執行的工作數（進度顯示用）。"""
+    def run_job(server: str, model: str, item: dict) -> dict:
+        return run_test(
+            model, item, warmup=args.warmup, repeat=args.repeat, base_url=server, verbose=False,
+            sample_interval=args.sample_interval,
+        )
+
+    def server_jobs(server: str) -> Iterator[tuple[str, str, dict]]:
+        for model in server_models[server]:
+            label = _model_label(model, server, multi_server)
+            for item in _pending_tests(prompts(label), done_tests.get(label, set())):
+                yield server, model, item
+
+    jobs = _interleave([server_jobs(server) for server in server_models])
+    print(f"🌐 平行排程：{len(server_models)} 台伺服器、共 {total} 項工作（每台並行 {args.server_concurrency}）")
+
+    scheduler = FleetScheduler(server_models, run_job, concurrency=args.server_concurrency)
+    for done, (server, model, item, result) in enumerate(scheduler.run(jobs), 1):
+        label = _model_label(model, server, multi_server)
+        on_result(label, server, model, item, result)
+        retried = f"（改由 {ollama_client.server_name(result['executed_on'])} 執行）" if result.get("executed_on") else ""
+        if result["success"]:
+            print(
+                f"  [{done}/{total}] ✅ {label} / {item['name']}{retried} ⏱ {result['latency']}s | "
+                f"🔤 生成 {result['eval_tps']} tok/s"
+            )
+        else:
+            print(f"  [{done}/{total}] ❌ {label} / {item['name']}{retried}：{result.get('error')}")
+
+    if (
+        args.profile_load or args.concurrency or args.context_sweep or args.tune is not None or args.capacity
+        or args.embed or args.vision
+    ):
+        def run_server_extras(server: str) -> None:
+            for model in server_models[server]:
+                label = _model_label(model, server, multi_server)
+                _run_model_extras(args, model, server, label, report["models"][label], journal)
+
+        with ThreadPoolExecutor(max_workers=len(server_models)) as pool:
+            list(pool.map(run_server_extras, server_models))
+    print()
+
+
+def _check_history(run_dir: Path) -> None:
+    """收錄至歷史索引（含尚未收錄的舊執行目錄），並與每個模型的前次執行比較、印出顯著退步"""
+    try:
+        with benchmark_history.HistoryStore(default_server=OLLAMA_BASE_URL) as history:
+            history.ingest_all(CHATS_DIR)
+            comparisons = benchmark_history.compare_runs(history, target=run_dir.name)
+    except (sqlite3.Error, OSError, ValueError, KeyError) as e:
+        print(f"⚠️  無法更新歷史索引：{e}")
+        return
+    if not comparisons:
+        return
+    found = list(benchmark_history.regressions(comparisons))
+    if not found:
+        print(f"   🗃 與前次執行相比：{len(comparisons)} 個模型皆無顯著退步")
+        return
+    print(f"\n📉 與前次執行相比偵測到 {len(found)} 項顯著退步（分層 Mann-Whitney U，p < {benchmark_history.DEFAULT_ALPHA}）：")
+    for comparison, row in found:
+        print(f"   - {benchmark_history.format_regression(comparison, row)}")
+    print("   詳細比較：python benchmark_history.py compare；趨勢圖：python benchmark_history.py trend")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Ollama 模型基準測試工具",
@@ -414,6 +4069,23 @@ def main():
 範例：
   python ollama-benchmark.py           # 正常模式，每個模型後詢問是否互動
   python ollama-benchmark.py --auto    # 自動模式，跳過所有互動確認
+  python ollama-benchmark.py --auto --warmup 1 --repeat 5   # 暖身 1 次後量測 5 次並統計
+  python ollama-benchmark.py --auto --concurrency 8   # 另以並行 1/2/4/8 執行負載測試
+  python ollama-benchmark.py --auto --profile-load    # 另剖析冷載入 vs 熱啟動延遲
+  python ollama-benchmark.py --auto --context-sweep   # 另掃描 64 ~ 32768 tokens 的 prompt 長度與 num_ctx
+  python ollama-benchmark.py --auto --tune num_thread=8,16 num_batch=256,512   # 另搜尋最快的選項組合
+  python ollama-benchmark.py --auto --capacity --slo ttft_p95=2,error_rate=0.01   # 找出符合 SLO 的最大請求/秒
+  python ollama-benchmark.py --auto --embed 1,16,64 --embed-concurrency 4   # 另評測 embedding 模型的批次吞吐量
+  python ollama-benchmark.py --auto --vision 448,896,1920x1080   # 另評測 vision 模型在各解析度的影像處理與 TTFT
+  python ollama-benchmark.py --auto --servers http://gpu1:11434,http://gpu2:11434   # 多伺服器平行評測
+  python ollama-benchmark.py --auto --resume chats/benchmark_20250101_120000   # 續跑中斷的評測
+  python ollama-benchmark.py --auto --reuse-cached   # 只重新測試 digest 有變更的模型
+  python ollama-benchmark.py --auto --suite prompts.jsonl   # 以外部 JSONL 題庫評測，報告依標籤彙整
+  python ollama-benchmark.py --auto --memory-aware --memory-budget 24G   # 依記憶體上限安排模型順序
+  python ollama-benchmark.py --auto --sample-interval 0.2   # 每 0.2 秒取樣 VRAM/RAM/CPU 使用量
+  python benchmark_history.py compare   # 與前次執行比較；python benchmark_history.py trend 產生趨勢圖
+  python ollama-benchmark.py --daemon --metrics-listen :9877   # 常駐探測，供 Prometheus 抓取 /metrics
+  python ollama-benchmark.py --replay-log captured.jsonl --time-scale 2   # 以兩倍速開放迴路重播擷取的請求
         """,
     )
     parser.add_argument(
@@ -421,52 +4093,611 @@ def main():
         action="store_true",
         help="自動模式：跳過互動確認，自動完成所有模型評測",
     )
+    parser.add_argument(
+        "--servers",
+        type=_parse_server_list,
+        metavar="URL[,URL...]",
+        help="以逗號分隔的多台 Ollama 伺服器，平行排程評測（預設取自 OLLAMA_BASE_URL）",
+    )
+    parser.add_argument(
+        "--server-concurrency",
+        type=int,
+        default=1,
+        metavar="N",
+        help="每台伺服器同時執行的工作數上限，預設 1",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=0,
+        metavar="K",
+        help="每個測試項目正式量測前的暖身次數（結果捨棄），預設 0",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        metavar="N",
+        help="每個測試項目的量測次數，N > 1 時報告平均、中位數、標準差與信賴區間，預設 1",
+    )
+    parser.add_argument(
+        "--profile-load",
+        action="store_true",
+        help="模型載入剖析：重複卸載→首次請求，分開報告冷載入與熱啟動延遲",
+    )
+    parser.add_argument(
+        "--load-cycles",
+        type=int,
+        default=3,
+        metavar="N",
+        help="載入剖析的循環次數，預設 3",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=_parse_concurrency_levels,
+        metavar="N",
+        help="並行負載測試：N 展開為 1,2,4,…,N，或以逗號指定各並行數（如 1,4,16）",
+    )
+    parser.add_argument(
+        "--load-requests",
+        type=int,
+        metavar="COUNT",
+        help="每個並行數送出的請求總數（預設為並行數 × 4）",
+    )
+    parser.add_argument(
+        "--context-sweep",
+        type=_parse_sweep_sizes,
+        nargs="?",
+        const=CONTEXT_SWEEP_SIZES,
+        metavar="TOKENS",
+        help=(
+            "上下文長度掃描：以長度遞增的合成 prompt 搭配對應的 num_ctx，量測 prompt 處理速度、TTFT 與記憶體，"
+            f"標記效能崩落與 OOM；可用逗號指定 prompt token 數（預設 {','.join(map(str, CONTEXT_SWEEP_SIZES))}）"
+        ),
+    )
+    parser.add_argument(
+        "--tune",
+        type=_parse_tune_param,
+        nargs="*",
+        metavar="NAME=V1,V2",
+        help=(
+            "執行參數調校：以 successive halving 搜尋生成速度最快的 Ollama 選項組合（如 num_thread=8,16 num_gpu=20,99）；"
+            "未指定參數時為 " + " ".join(f"{k}={','.join(map(str, v))}" for k, v in TUNE_DEFAULT_GRID.items())
+        ),
+    )
+    parser.add_argument(
+        "--capacity",
+        action="store_true",
+        help="SLO 容量搜尋：以逐步加倍再二分搜尋的 Poisson 到達率施壓，找出每個模型符合 --slo 的最大可持續請求/秒",
+    )
+    parser.add_argument(
+        "--slo",
+        type=_parse_slo,
+        default=_parse_slo(CAPACITY_SLO),
+        metavar="METRIC=LIMIT[,...]",
+        help=(
+            "容量搜尋的 SLO：ttft / latency / queue_delay 加上 _pNN 的秒數上限，或 error_rate 比例上限，"
+            f"以逗號分隔（如 ttft_p95=2,error_rate=0.01），預設 {CAPACITY_SLO}"
+        ),
+    )
+    parser.add_argument(
+        "--capacity-window",
+        type=float,
+        default=CAPACITY_WINDOW,
+        metavar="SECONDS",
+        help=f"容量搜尋每個到達率持續送出請求的秒數，預設 {CAPACITY_WINDOW}",
+    )
+    parser.add_argument(
+        "--capacity-rate",
+        type=float,
+        default=CAPACITY_START_RATE,
+        metavar="RPS",
+        help=f"容量搜尋的起始到達率（請求/秒），預設 {CAPACITY_START_RATE}",
+    )
+    parser.add_argument(
+        "--capacity-max-rate",
+        type=float,
+        default=CAPACITY_MAX_RATE,
+        metavar="RPS",
+        help=f"容量搜尋的最高到達率，預設 {CAPACITY_MAX_RATE}",
+    )
+    parser.add_argument(
+        "--capacity-min-rate",
+        type=float,
+        metavar="RPS",
+        help=f"起始到達率就未達標時往下搜尋的最低到達率，預設為 --capacity-rate 的 1/{CAPACITY_MIN_RATE_DIVISOR}",
+    )
+    parser.add_argument(
+        "--embed",
+        type=_parse_batch_sizes,
+        nargs="?",
+        const=EMBED_BATCH_SIZES,
+        metavar="BATCH_SIZES",
+        help=(
+            "Embedding 評測：對具 embedding 能力的模型（/api/show 的 capabilities）以 /api/embed 分批送出合成文件，"
+            "報告各批次大小的 embeddings/秒、tokens/秒與每批延遲；只支援 embedding 的模型略過生成測試。"
+            f"可用逗號指定批次大小（預設 {','.join(map(str, EMBED_BATCH_SIZES))}）"
+        ),
+    )
+    parser.add_argument(
+        "--embed-inputs",
+        type=int,
+        default=EMBED_INPUTS,
+        metavar="N",
+        help=f"Embedding 評測每個批次大小送出的輸入段數，預設 {EMBED_INPUTS}",
+    )
+    parser.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=EMBED_CONCURRENCY,
+        metavar="N",
+        help=f"Embedding 評測同時在途的批次數，預設 {EMBED_CONCURRENCY}",
+    )
+    parser.add_argument(
+        "--vision",
+        type=_parse_resolutions,
+        nargs="?",
+        const=VISION_RESOLUTIONS,
+        metavar="RESOLUTIONS",
+        help=(
+            "Vision 評測：對具 vision 能力的模型附上不同解析度的合成測試圖（每張只編碼一次並快取），"
+            "報告各解析度的影像 tokens、影像處理時間、prompt 評估時間、TTFT 與 tokens/秒。"
+            f"可用逗號指定解析度，N 為正方形、WxH 為長方形（預設 {','.join(str(w) for w, _ in VISION_RESOLUTIONS)}）"
+        ),
+    )
+    parser.add_argument(
+        "--vision-repeat",
+        type=int,
+        default=VISION_REPEAT,
+        metavar="N",
+        help=f"Vision 評測每個解析度的量測次數（取中位數），預設 {VISION_REPEAT}",
+    )
+    parser.add_argument(
+        "--resume",
+        type=Path,
+        metavar="RUN_DIR",
+        help="從中斷的執行目錄續跑：略過日誌中已完成的 (模型, 測試) 並重建 JSON/HTML 報告",
+    )
+    parser.add_argument(
+        "--reuse-cached",
+        action="store_true",
+        help="沿用結果快取：模型 digest、prompt、選項與 Ollama 版本皆未變更的測試直接取用快取結果",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=CACHE_TTL_HOURS,
+        metavar="HOURS",
+        help=f"快取結果的有效時數，預設 {CACHE_TTL_HOURS}（7 天）",
+    )
+    parser.add_argument(
+        "--suite",
+        type=Path,
+        metavar="PATH",
+        help="以 JSONL 題庫取代內建測試項目（逐行讀取，支援每題的生成選項、system 與標籤），報告依標籤彙整",
+    )
+    parser.add_argument(
+        "--memory-aware",
+        action="store_true",
+        help="記憶體感知排程：依模型大小安排順序，讓小模型同時常駐，放不下時才卸載已完成的模型",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=model_scheduler.parse_size,
+        metavar="SIZE",
+        help="記憶體感知排程的記憶體上限（如 24G；預設取自 OLLAMA_MEMORY_BUDGET，本機伺服器讀取 /proc/meminfo）",
+    )
+    parser.add_argument(
+        "--sample-interval",
+        type=float,
+        default=resource_monitor.default_interval(),
+        metavar="SECONDS",
+        help="生成期間背景取樣資源使用量（/api/ps，本機另讀 /proc）的間隔秒數，0 為停用；"
+        "預設取自 OLLAMA_SAMPLE_INTERVAL（未設定時停用，取樣本身會佔用 CPU 並增加伺服器請求，可能影響量測）",
+    )
+    parser.add_argument(
+        "--chartjs",
+        default=os.getenv("BENCHMARK_CHARTJS"),
+        metavar="PATH|URL",
+        help="HTML 報告使用的 Chart.js：本機檔案會內嵌至報告供離線檢視，URL 則直接引用；預設取自 BENCHMARK_CHARTJS，未設定時使用 CDN",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="記錄每個請求的階段（連線、等待回應、伺服器載入 / prompt 評估 / 生成、客戶端解析）為 Chrome trace JSON"
+        f"（執行目錄的 {TRACE_FILE}），可用 Perfetto 開啟",
+    )
+    parser.add_argument(
+        "--no-history",
+        action="store_true",
+        help="不收錄至歷史索引（chats/benchmark_history.sqlite3），也不與前次執行比較",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="常駐監控：定期以短 prompt 探測每個模型，並於 --metrics-listen 提供 Prometheus / OpenMetrics 的 /metrics",
+    )
+    parser.add_argument(
+        "--daemon-interval",
+        type=float,
+        default=float(os.getenv("BENCHMARK_DAEMON_INTERVAL", DAEMON_INTERVAL)),
+        metavar="SECONDS",
+        help=f"常駐監控每輪探測的間隔秒數，預設取自 BENCHMARK_DAEMON_INTERVAL（{DAEMON_INTERVAL}）",
+    )
+    parser.add_argument(
+        "--daemon-jitter",
+        type=float,
+        default=DAEMON_JITTER,
+        metavar="RATIO",
+        help=f"探測間隔的隨機抖動比例（0 ~ 1），避免多個監控同時發送請求，預設 {DAEMON_JITTER}",
+    )
+    parser.add_argument(
+        "--daemon-models",
+        type=lambda spec: {m.strip() for m in spec.split(",") if m.strip()},
+        metavar="NAME[,NAME...]",
+        help="常駐監控只探測這些模型（預設為伺服器上的所有模型）",
+    )
+    parser.add_argument(
+        "--metrics-listen",
+        default=os.getenv("BENCHMARK_METRICS_LISTEN", METRICS_LISTEN),
+        metavar="HOST:PORT",
+        help=f"/metrics 的監聽位址（:PORT 表示所有介面），預設取自 BENCHMARK_METRICS_LISTEN（{METRICS_LISTEN}）",
+    )
+    parser.add_argument(
+        "--replay-log",
+        type=Path,
+        metavar="PATH",
+        help="開放迴路重播擷取的請求日誌（JSONL：timestamp、model、prompt 或 messages、options），"
+        "依原始間隔送出，報告各模型的延遲分佈、排隊延遲與丟棄 / 逾時比例",
+    )
+    parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=1.0,
+        metavar="X",
+        help="重播速度倍率：請求間隔除以 X（2 為兩倍速、0.5 為半速），預設 1",
+    )
+    parser.add_argument(
+        "--replay-timeout",
+        type=float,
+        default=REPLAY_TIMEOUT,
+        metavar="SECONDS",
+        help=f"重播請求的讀取逾時秒數（含排隊等待），超過記為 timeout，預設 {REPLAY_TIMEOUT}",
+    )
+    parser.add_argument(
+        "--replay-max-inflight",
+        type=int,
+        default=REPLAY_MAX_INFLIGHT,
+        metavar="N",
+        help=f"客戶端同時在途的請求上限，超過時新請求記為 dropped，預設 {REPLAY_MAX_INFLIGHT}",
+    )
     args = parser.parse_args()
+    if args.memory_budget:
+        args.memory_aware = True
+    if args.warmup < 0 or args.repeat < 1:
+        parser.error("--warmup 不可為負數，--repeat 至少為 1")
+    if args.load_cycles < 1:
+        parser.error("--load-cycles 至少為 1")
+    if args.load_requests is not None and args.load_requests < 1:
+        parser.error("--load-requests 至少為 1")
+    if args.server_concurrency < 1:
+        parser.error("--server-concurrency 至少為 1")
+    if args.cache_ttl <= 0:
+        parser.error("--cache-ttl 必須大於 0")
+    if args.sample_interval < 0:
+        parser.error("--sample-interval 不可為負數")
+    if args.capacity_window <= 0 or not 0 < args.capacity_rate <= args.capacity_max_rate:
+        parser.error("--capacity-window 必須大於 0，且 0 < --capacity-rate ≤ --capacity-max-rate")
+    if args.capacity_min_rate is not None and not 0 < args.capacity_min_rate <= args.capacity_rate:
+        parser.error("--capacity-min-rate 必須大於 0 且不超過 --capacity-rate")
+    if args.embed_inputs < 1 or args.embed_concurrency < 1:
+        parser.error("--embed-inputs 與 --embed-concurrency 至少為 1")
+    if args.vision_repeat < 1:
+        parser.error("--vision-repeat 至少為 1")
+    try:
+        # 先讀取 Chart.js，避免評測跑完才發現檔案不存在
+        chartjs_tag = benchmark_history.chartjs_tag(args.chartjs)
+    except (OSError, UnicodeDecodeError) as e:
+        parser.error(f"無法讀取 --chartjs 指定的檔案：{e}")
+    if args.daemon:
+        if args.resume:
+            parser.error("--daemon 不可與 --resume 同時使用")
+        if args.trace:
+            parser.error("--trace 不適用於 --daemon（常駐執行沒有結束的執行目錄）")
+        if args.daemon_interval <= 0:
+            parser.error("--daemon-interval 必須大於 0")
+        if not 0 <= args.daemon_jitter < 1:
+            parser.error("--daemon-jitter 必須介於 0 與 1 之間")
+        try:
+            listen = metrics_exporter.parse_listen(args.metrics_listen)
+        except ValueError as e:
+            parser.error(f"--metrics-listen {e}")
+    if args.replay_log:
+        if args.daemon or args.resume:
+            parser.error("--replay-log 不可與 --daemon 或 --resume 同時使用")
+        if args.time_scale <= 0 or args.replay_timeout <= 0:
+            parser.error("--time-scale 與 --replay-timeout 必須大於 0")
+        if args.replay_max_inflight < 1:
+            parser.error("--replay-max-inflight 至少為 1")
+        try:
+            # 先完整讀過一次（逐行、不保留內容），格式錯誤在送出任何請求前回報
+            replay_count = sum(1 for _ in iter_request_log(args.replay_log))
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            parser.error(f"無法讀取 --replay-log：{e}")
+        if not replay_count:
+            parser.error(f"{args.replay_log} 沒有任何請求")
 
-    models = get_available_models()
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # 連線池需容納同時在途的請求數（資源取樣每個請求另佔一條連線），否則多出的連線用完即丟、失去 keep-alive 效果
+    in_flight = args.server_concurrency * (2 if args.sample_interval > 0 else 1)
+    # 容量搜尋為開放迴路，在途請求數隨到達率與延遲而定，以最高到達率 × 4 秒的延遲粗估，上限為 REPLAY_MAX_INFLIGHT
+    capacity_inflight = min(REPLAY_MAX_INFLIGHT, int(args.capacity_max_rate * 4)) if args.capacity else 0
+    embed_inflight = args.embed_concurrency if args.embed else 0
+    ollama_client.ensure_pool_size(max([in_flight, capacity_inflight, embed_inflight, *(args.concurrency or [])]))
 
-    report: dict = {
-        "generated_at": timestamp,
-        "models": {},
-    }
+    if args.daemon:
+        start_daemon(
+            args.servers or OLLAMA_SERVERS, listen,
+            interval=args.daemon_interval, jitter=args.daemon_jitter, only=args.daemon_models,
+        )
+        return
+
+    if args.replay_log:
+        servers = args.servers or OLLAMA_SERVERS
+        if len(servers) > 1:
+            print(f"⚠️  流量重播只使用第一台伺服器：{servers[0]}")
+        run_replay(
+            args.replay_log, server=servers[0], time_scale=args.time_scale,
+            max_inflight=args.replay_max_inflight, timeout=args.replay_timeout, trace=args.trace,
+        )
+        return
+
+    if args.resume:
+        run_dir = args.resume
+        journal = ResultJournal(run_dir / JOURNAL_FILE)
+        try:
+            report = _report_from_journal(journal.records())
+            done_tests = _done_tests(journal.records())
+        except (OSError, ValueError, json.JSONDecodeError) as e:
+            parser.error(f"無法讀取結果日誌 {journal.path}：{e}")
+        servers = report["servers"]
+        if args.servers and args.servers != servers:
+            print(f"⚠️  續跑沿用原執行的伺服器：{', '.join(servers)}")
+        suite = Path(report["suite"]["path"]) if "suite" in report else None
+        if args.suite and args.suite != suite:
+            print(f"⚠️  續跑沿用原執行的題庫：{suite or '內建測試項目'}")
+        print(f"♻️  續跑 {run_dir}：已記錄 {sum(len(d) for d in done_tests.values())} 項結果")
+        # 同一份報告的統計需一致，續跑沿用原執行的暖身 / 量測次數
+        args.warmup, args.repeat = report["warmup"], report["repeat"]
+        print(f"ℹ️  沿用原執行設定：--warmup {args.warmup} --repeat {args.repeat}")
+    else:
+        servers = args.servers or OLLAMA_SERVERS
+        suite = args.suite
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        header = {
+            "generated_at": timestamp,
+            "servers": servers,
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+        }
+        if suite:
+            try:
+                # 先完整掃過一次：提早發現格式錯誤，並取得 prompt 數量
+                header["suite"] = {"path": str(suite), "prompts": sum(1 for _ in iter_suite(suite))}
+            except (OSError, ValueError) as e:
+                parser.error(f"無法讀取題庫：{e}")
+        report = {**header, "models": {}}
+        done_tests = {}
+        # 一開始就建立執行目錄與日誌，每項結果完成即寫入
+        run_dir = CHATS_DIR / f"benchmark_{timestamp}"
+        run_dir.mkdir(parents=True, exist_ok=True)
+        journal = ResultJournal(run_dir / JOURNAL_FILE)
+        journal.append({"type": "meta", **header})
+    multi_server = len(servers) > 1
+    if args.trace:
+        trace_file = run_dir / TRACE_FILE
+        if trace_file.exists():  # 續跑時保留前次執行的追蹤檔
+            trace_file = run_dir / f"benchmark_trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        perf_trace.start(trace_file, tool="ollama-benchmark.py", run=run_dir.name, servers=servers)
+
+    # 測試項目來源：每次呼叫都重新逐行讀取題庫，不把整個題庫保留在記憶體中
+    if suite:
+        prompt_count = report["suite"]["prompts"]
+        print(f"📚 題庫：{suite}（{prompt_count} 個 prompt，報告依標籤彙整）")
+
+        def prompts() -> Iterable[dict]:
+            return iter_suite(suite)
+    else:
+        prompt_count = len(BENCHMARK_PROMPTS)
 
-    print("📦 偵測到模型：")
-    for m in models:
-        print(f" - {m}")
+        def prompts() -> Iterable[dict]:
+            return BENCHMARK_PROMPTS
+
+    server_models: dict[str, list[str]] = {}
+    for server in servers:
+        try:
+            server_models[server] = get_available_models(base_url=server)
+        except requests.RequestException as e:
+            if not multi_server:
+                raise
+            print(f"⚠️  無法連線 {server}，略過此伺服器：{e}")
+    if not server_models and not report["models"]:
+        print("⚠️  沒有可連線的 Ollama 伺服器")
+        perf_trace.stop()
+        return
+
+    for server, models in server_models.items():
+        print(f"📦 偵測到模型{f'（{server}）' if multi_server else ''}：")
+        for m in models:
+            print(f" - {m}")
+            label = _model_label(m, server, multi_server)
+            if label not in report["models"]:
+                report["models"][label] = {"server": server, "model": m, "benchmark": []}
+                journal.record_model(label, server, m)
     print()
 
+    # --embed：只支援 embedding 的模型無法執行生成測試（/api/generate 回傳 400），只執行 embedding 評測
+    embed_only: set[str] = set()
+    if args.embed:
+        for server, models in server_models.items():
+            for m in models:
+                capabilities = model_capabilities(m, server)
+                if capabilities and "embedding" in capabilities and "completion" not in capabilities:
+                    embed_only.add(_model_label(m, server, multi_server))
+        if embed_only:
+            print(f"🧬 只支援 embedding，略過生成測試：{', '.join(sorted(embed_only))}\n")
+
+    def model_prompts(label: str) -> Iterable[dict]:
+        return () if label in embed_only else prompts()
+
+    def has_work(label: str) -> bool:
+        """尚有未完成的測試項目或選用項目（續跑時已全部完成的模型不需排程）"""
+        pending = next(_pending_tests(model_prompts(label), done_tests.get(label, set())), None)
+        return pending is not None or bool(_pending_sections(args, report["models"][label]))
+
+    # 結果快取：每項成功的結果都寫入快取；--reuse-cached 時先沿用快取中未變更模型的結果
+    cache = ResultCache(CACHE_FILE, ttl_hours=args.cache_ttl)
+    contexts = {server: _cache_context(server) for server in server_models}
+    for server, context in contexts.items():
+        journal.record_server(server, context)
+    load_times: dict[tuple[str, str], float] = {}
+
+    def cache_key(server: str, model: str, item: dict) -> str | None:
+        digest = contexts[server]["digests"].get(model)
+        if not digest:
+            return None
+        return ResultCache.key(server, digest, contexts[server]["version"], item, args.warmup, args.repeat)
+
+    def record_result(label: str, server: str, model: str, item: dict, result: dict) -> None:
+        journal.record_result(label, server, model, result)
+        done_tests.setdefault(label, set()).add(result["test"])
+        # 改派其他伺服器時，載入時間與快取都屬於實際執行的伺服器（結果本身仍記錄在原屬伺服器下）
+        executed = result.get("executed_on") or server
+        # 記錄本次實測的載入時間（重複量測時只有第一次會載入，取最大值）
+        load = max((r.get("load_time") or 0 for r in result.get("runs") or [result]), default=0)
+        key = (executed, model)
+        load_times[key] = max(load_times.get(key, 0.0), load)
+        key = cache_key(executed, model, item)
+        if key and result.get("success") and not result.get("cached"):
+            cache.put(key, executed, model, contexts[executed]["digests"][model], result)
+
+    if args.reuse_cached:
+        hits = 0
+        for label, entry in report["models"].items():
+            server, model = entry["server"], entry["model"]
+            if server not in contexts:
+                continue
+            done = done_tests.setdefault(label, set())
+            for item in _pending_tests(prompts(), done):
+                key = cache_key(server, model, item)
+                cached = cache.get(key) if key else None
+                if cached is None:
+                    continue
+                cached["cached"] = True
+                journal.record_result(label, server, model, cached)
+                done.add(item["name"])
+                hits += 1
+        print(f"💾 快取命中 {hits} 項（digest、prompt 與設定皆未變更），僅重新測試其餘項目\n")
+
+    # 記憶體感知排程：依模型佔用重新排列執行順序，放不下時才卸載已完成的模型
+    schedules: dict[str, dict] = {}
+    if args.memory_aware:
+        for server, models in server_models.items():
+            todo = [m for m in models if has_work(_model_label(m, server, multi_server))]
+            if not todo:
+                continue
+            try:
+                plan = model_scheduler.build_plan(server, todo, budget=args.memory_budget)
+            except requests.RequestException as e:
+                print(f"⚠️  無法規劃 {server} 的記憶體排程，維持原順序：{e}")
+                continue
+            print(model_scheduler.format_plan(plan) + "\n")
+            schedules[server] = plan
+            server_models[server] = plan["order"] + [m for m in models if m not in plan["order"]]
+
     if args.auto:
         print("🤖 自動模式：將跳過所有互動確認\n")
 
-    for model in models:
-        benchmark_results = run_benchmark_for_model(model)
-        report["models"][model] = {"benchmark": benchmark_results}
-
-        if not args.auto:
-            choice = input("\n是否要與此模型互動？(y/N)： ").strip().lower()
-            if choice == "y":
-                interactive_chat(model)
+    try:
+        if multi_server or args.server_concurrency > 1:
+            if not args.auto:
+                print("ℹ️  多伺服器 / 平行排程模式不提供逐模型互動聊天\n")
+            total = sum(
+                prompt_count - len(done_tests.get(label, ()))
+                for server, models in server_models.items()
+                for label in (_model_label(m, server, multi_server) for m in models)
+                if label not in embed_only
+            )
+            _run_fleet(
+                args, server_models, report, multi_server, journal,
+                model_prompts, done_tests, total, record_result,
+            )
         else:
-            print()  # 自動模式下，模型間加空行
+            server = servers[0]
+            for model in server_models.get(server, []):
+                entry = report["models"][model]
+                pending = _pending_tests(model_prompts(model), done_tests.get(model, set()))
+                first = next(pending, None)
+                if first is None and not _pending_sections(args, entry):
+                    continue  # 續跑時已全部完成的模型
+                plan = schedules.get(server)
+                if plan and model in plan["order"]:
+                    try:
+                        model_scheduler.make_room(server, plan, plan["order"].index(model))
+                    except requests.RequestException as e:
+                        print(f"⚠️  無法確認記憶體狀態：{e}")
+                if first is not None:
+                    run_benchmark_for_model(
+                        model,
+                        warmup=args.warmup,
+                        repeat=args.repeat,
+                        base_url=server,
+                        items=itertools.chain([first], pending),
+                        sample_interval=args.sample_interval,
+                        on_result=lambda item, r, m=model: record_result(m, server, m, item, r),
+                    )
+                _run_model_extras(args, model, server, model, entry, journal)
 
-    # 建立時間戳記目錄
-    run_dir = CHATS_DIR / f"benchmark_{timestamp}"
-    run_dir.mkdir(parents=True, exist_ok=True)
+                if not args.auto:
+                    choice = input("\n是否要與此模型互動？(y/N)： ").strip().lower()
+                    if choice == "y":
+                        interactive_chat(model)
+                else:
+                    print()  # 自動模式下，模型間加空行
+    except KeyboardInterrupt:
+        print(f"\n⏹  已中斷，已完成的結果保存在 {journal.path}")
+        print(f"   可用 --resume {run_dir} 繼續")
+        raise SystemExit(130)
+    finally:
+        cache.close()
+        trace_file = perf_trace.stop()
+        for server, plan in schedules.items():
+            measured = {m: t for (s, m), t in load_times.items() if s == server}
+            journal.record_schedule(server, {**plan, "measured": model_scheduler.summarize_measured(plan, measured)})
+
+    # 由日誌重建報告：續跑時與前次結果合併，且輸出內容與日誌一致；題庫模式依標籤彙整
+    report = _report_from_journal(journal.records())
 
     # 輸出 JSON 報告
     json_file = run_dir / "benchmark_report.json"
     with open(json_file, "w", encoding="utf-8") as f:
         json.dump(report, f, ensure_ascii=False, indent=2)
 
-    # 輸出 HTML 分析報告（含圖表）
+    # 輸出 HTML 分析報告（含圖表）；詳細回覆另存側載資料檔，開啟頁面時不需一次載入
+    details = _write_details(run_dir, report)
     html_file = run_dir / "benchmark_report.html"
     with open(html_file, "w", encoding="utf-8") as f:
-        f.write(_build_html_report(report))
+        _write_html_report(f, report, chartjs=chartjs_tag, details=details)
 
     print(f"\n✅ Benchmark 完成！報告已輸出至：{run_dir}")
     print(f"   📄 JSON 報告：{json_file.name}")
     print(f"   📊 分析圖表：{html_file.name}")
+    print(f"   🗂 詳細回覆：{DETAILS_DIR}/（{details} 筆，展開時載入）")
+    print(f"   🧾 結果日誌：{journal.path.name}")
+    if trace_file:
+        print(f"   🔍 請求追蹤：{trace_file.name}（以 https://ui.perfetto.dev 開啟）")
+
+    if not args.no_history:
+        _check_history(run_dir)
 
 
 if __name__ == "__main__":
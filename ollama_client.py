@@ -0,0 +1,280 @@
+"""ollama-benchmark.py 與 hi-ai.py 共用的 Ollama HTTP 客戶端。
+
+每個伺服器位址共用一個 requests.Session，透過連線池維持 keep-alive 連線，
+避免每次請求都重新進行 TCP（以及遠端 HTTPS 的 TLS）交握；連線失敗時依指數退避重試，
+GET 另在伺服器回傳 502/503/504 時重試。POST（生成、聊天、embedding）不因狀態碼重送：
+Ollama 佇列已滿時回傳 503，重送會掩蓋拒絕並把退避時間算進延遲。開放迴路的量測另用
+完全不重試的 Session（見 request() 的 retry）。另外會量測每次請求中「建立新連線」所花的
+時間，讓報告能區分網路交握開銷與實際推理時間。啟用 perf_trace 追蹤時，連線建立與
+/api/tags、/api/ps、/api/show、卸載等輔助請求也會記錄為區段。
+
+可透過環境變數（或 .env）調整：
+- OLLAMA_POOL_SIZE：每個伺服器的連線池大小（預設 16）
+- OLLAMA_MAX_RETRIES：連線失敗（與 GET 的 502、503、504）的重試次數（預設 2，0 為不重試）
+- OLLAMA_RETRY_BACKOFF：重試的指數退避基準秒數（預設 0.5）
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+import perf_trace
+
+# 用於比對 Ollama 回傳的 OOM / 記憶體相關錯誤訊息
+OOM_KEYWORDS = [
+    "out of memory", "oom", "not enough memory",
+    "failed to load", "insufficient memory",
+    "cuda out of memory", "memory", "alloc",
+]
+
+_sessions: dict[tuple[str, bool], requests.Session] = {}
+_sessions_lock = threading.Lock()
+_overrides: dict[str, int | float] = {}
+
+# 每個執行緒各自記錄最近一次請求的連線建立統計（requests 在呼叫端執行緒送出請求）
+_timing = threading.local()
+
+
+# ---------------------------------------------------------------------------
+# 連線建立計時
+# ---------------------------------------------------------------------------
+
+class _TimedConnectionMixin:
+    """在 connect() 前後計時；HTTPS 連線的 connect() 同時包含 TLS 交握。
+    啟用追蹤時另記錄 DNS 解析 + TCP 連線（_new_conn）的區段，HTTPS 連線兩者的差即 TLS 交握。"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            perf_trace.add_span("DNS 解析 + TCP 連線", start, time.perf_counter(), cat="net", args={"host": self.host})
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            end = time.perf_counter()
+            _timing.connect_time = getattr(_timing, "connect_time", 0.0) + end - start
+            _timing.new_connections = getattr(_timing, "new_connections", 0) + 1
+            perf_trace.add_span("建立連線", start, end, cat="net", args={"host": self.host, "port": self.port})
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """讓連線池改用會計時的連線類別"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Session 管理
+# ---------------------------------------------------------------------------
+
+def load_env() -> None:
+    """載入專案目錄下 .env 檔案的環境變數（不覆寫已設定的變數）。
+    各工具在讀取 OLLAMA_BASE_URL 等設定前呼叫；本模組的設定在建立 Session 時才讀取，不受匯入順序影響"""
+    env_file = Path(__file__).resolve().parent / ".env"
+    if env_file.exists():
+        with open(env_file, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    key, value = line.split("=", 1)
+                    os.environ.setdefault(key.strip(), value.strip())
+
+
+def _setting(name: str, env: str, default: str, cast):
+    if name in _overrides:
+        return _overrides[name]
+    return cast(os.getenv(env, default))
+
+
+def configure(*, pool_size: int | None = None, max_retries: int | None = None,
+              retry_backoff: float | None = None) -> None:
+    """覆寫連線池設定（優先於環境變數），已建立的 Session 會被關閉並於下次使用時重建"""
+    for name, value in (("pool_size", pool_size), ("max_retries", max_retries),
+                        ("retry_backoff", retry_backoff)):
+        if value is not None:
+            _overrides[name] = value
+    close_all()
+
+
+def ensure_pool_size(size: int) -> None:
+    """確保連線池至少可容納 size 條連線（例如並行負載測試的並行數）"""
+    if size > _setting("pool_size", "OLLAMA_POOL_SIZE", "16", int):
+        configure(pool_size=size)
+
+
+def _new_session(retry: bool = True) -> requests.Session:
+    pool_size = _setting("pool_size", "OLLAMA_POOL_SIZE", "16", int)
+    max_retries = _setting("max_retries", "OLLAMA_MAX_RETRIES", "2", int) if retry else 0
+    backoff = _setting("retry_backoff", "OLLAMA_RETRY_BACKOFF", "0.5", float)
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,  # 已送達伺服器的生成請求不重送，避免重複計算負載
+        status=max_retries,
+        status_forcelist=(502, 503, 504),
+        # 狀態碼重試只限 GET：POST 收到 503（佇列已滿）時直接回傳，拒絕才會反映在結果中。
+        # 連線失敗的重試不受此限制（請求尚未送達伺服器）
+        allowed_methods=frozenset({"GET"}),
+        backoff_factor=backoff,
+        raise_on_status=False,  # 重試用盡後回傳最後的回應，交由 raise_for_status() 處理
+    )
+    adapter = _TimedAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(base_url: str, *, retry: bool = True) -> requests.Session:
+    """取得指定伺服器共用的 keep-alive Session（執行緒安全，首次使用時建立）。
+    retry=False 時為同一伺服器另一個不重試的 Session，不影響其他請求的重試設定"""
+    key = (base_url, retry)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _new_session(retry)
+        return session
+
+
+def server_name(url: str) -> str:
+    """伺服器簡稱（host:port），用於報告標籤與輸出"""
+    return urlparse(url).netloc or url
+
+
+def is_local(base_url: str) -> bool:
+    """伺服器是否在本機（可直接讀取 /proc 取得記憶體與行程資訊）"""
+    return urlparse(base_url).hostname in ("localhost", "127.0.0.1", "::1")
+
+
+def close_all() -> None:
+    """關閉所有 Session 與其連線池"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+# ---------------------------------------------------------------------------
+# 請求
+# ---------------------------------------------------------------------------
+
+def request(method: str, base_url: str, path: str, *, retry: bool = True, **kwargs) -> requests.Response:
+    """透過共用 Session 送出請求；本執行緒的連線建立統計會先歸零，可由 connection_stats() 取得。
+    retry=False 時連線失敗與 502/503/504 都不重試，每次呼叫恰好對應一個送到伺服器的請求
+    （開放迴路量測需要：重試會讓實際送出的請求多於排定的到達數，並把退避時間算進延遲）"""
+    _timing.connect_time = 0.0
+    _timing.new_connections = 0
+    return get_session(base_url, retry=retry).request(method, f"{base_url}{path}", **kwargs)
+
+
+def get(base_url: str, path: str, **kwargs) -> requests.Response:
+    return request("GET", base_url, path, **kwargs)
+
+
+def post(base_url: str, path: str, **kwargs) -> requests.Response:
+    return request("POST", base_url, path, **kwargs)
+
+
+def is_oom_error(error_msg: str) -> bool:
+    """判斷錯誤訊息是否與 OOM / 記憶體不足相關"""
+    lower = error_msg.lower()
+    return any(kw in lower for kw in OOM_KEYWORDS)
+
+
+def format_bytes(n: int) -> str:
+    """將位元組數格式化為人類可讀的字串"""
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(n) < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} PB"
+
+
+def connection_stats() -> dict:
+    """本執行緒最近一次請求的連線統計：
+    connect_time 為建立新連線（TCP + TLS）花費的秒數，沿用 keep-alive 連線時為 0。"""
+    return {
+        "connect_time": round(getattr(_timing, "connect_time", 0.0), 4),
+        "new_connection": getattr(_timing, "new_connections", 0) > 0,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 常用 API
+# ---------------------------------------------------------------------------
+
+def list_models(base_url: str, timeout: float = 30) -> list[dict]:
+    """GET /api/tags：伺服器上已安裝的模型（含 name、size、digest 等欄位）"""
+    with perf_trace.span("GET /api/tags", cat="api", server=base_url):
+        resp = get(base_url, "/api/tags", timeout=timeout)
+        resp.raise_for_status()
+        return resp.json().get("models", [])
+
+
+def list_running(base_url: str, timeout: float = 10) -> list[dict]:
+    """GET /api/ps：目前已載入記憶體的模型（含 size、size_vram 等欄位）"""
+    with perf_trace.span("GET /api/ps", cat="api", server=base_url):
+        resp = get(base_url, "/api/ps", timeout=timeout)
+        resp.raise_for_status()
+        return resp.json().get("models", [])
+
+
+def unload(base_url: str, model: str, timeout: float = 60) -> None:
+    """以 /api/chat + keep_alive: 0 卸載模型，失敗時拋出 requests.RequestException"""
+    with perf_trace.span("卸載模型", cat="api", server=base_url, model=model):
+        resp = post(
+            base_url,
+            "/api/chat",
+            json={"model": model, "messages": [], "keep_alive": 0},
+            timeout=timeout,
+        )
+        resp.raise_for_status()
+
+
+def version(base_url: str, timeout: float = 10) -> str:
+    """GET /api/version：Ollama 伺服器版本字串"""
+    with perf_trace.span("GET /api/version", cat="api", server=base_url):
+        resp = get(base_url, "/api/version", timeout=timeout)
+        resp.raise_for_status()
+        return resp.json().get("version", "")
+
+
+def show(base_url: str, model: str, timeout: float = 30) -> dict:
+    """POST /api/show：模型詳細資訊（details、model_info、capabilities 等）"""
+    with perf_trace.span("POST /api/show", cat="api", server=base_url, model=model):
+        resp = post(base_url, "/api/show", json={"model": model}, timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
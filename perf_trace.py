@@ -0,0 +1,264 @@
+"""請求階段追蹤，輸出 Chrome trace-event JSON（ollama-benchmark.py --trace、hi-ai.py --trace 使用）。
+
+啟用後，每個生成請求在客戶端執行緒的軌道上記錄整體時間與各階段（連線建立、等待回應標頭、
+等待首個 token、串流解碼，客戶端解析 chunk 的累計時間放在參數中），並依最後一個 chunk 的
+伺服器計時欄位（load_duration、prompt_eval_duration、eval_duration、total_duration）在對應
+伺服器的軌道上還原載入、prompt 評估與生成的時間區段；/api/ps、卸載等輔助請求與評測的
+模型 / 測試項目也各有區段。輸出檔可直接以 https://ui.perfetto.dev 或 chrome://tracing 開啟。
+
+事件逐筆寫入檔案（不保留在記憶體中），大型題庫的追蹤檔也不會佔用大量記憶體。
+未啟用時所有函式都是空操作，不影響量測。
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+from urllib.parse import urlparse
+
+CLIENT_PID = 1
+
+
+class Tracer:
+    """把 trace event 逐筆寫入 JSON 檔；時間以建立時的 perf_counter() 為原點，單位為微秒"""
+
+    def __init__(self, path: Path, metadata: dict | None = None):
+        self.path = Path(path)
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._threads: dict[int, tuple[int, str]] = {}
+        self._named: set[tuple[int, int]] = set()
+        self._servers: dict[str, int] = {}
+        self._first = True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        other = {"started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **(metadata or {})}
+        self._file.write(
+            '{"displayTimeUnit": "ms", "otherData": ' + json.dumps(other, ensure_ascii=False) + ', "traceEvents": [\n'
+        )
+        self._write({"ph": "M", "name": "process_name", "pid": CLIENT_PID, "tid": 0, "args": {"name": "客戶端"}})
+        self._write({"ph": "M", "name": "process_sort_index", "pid": CLIENT_PID, "tid": 0, "args": {"sort_index": 0}})
+
+    def _write(self, event: dict) -> None:
+        # 呼叫端需持有 self._lock（建構時除外）
+        self._file.write(("" if self._first else ",\n") + json.dumps(event, ensure_ascii=False))
+        self._first = False
+
+    def _tid(self, pid: int = CLIENT_PID) -> int:
+        """目前執行緒的軌道編號（依首次出現順序）；每個 (行程, 軌道) 首次出現時寫入執行緒名稱"""
+        ident = threading.get_ident()
+        if ident not in self._threads:
+            self._threads[ident] = (len(self._threads) + 1, threading.current_thread().name)
+        tid, name = self._threads[ident]
+        if (pid, tid) not in self._named:
+            self._named.add((pid, tid))
+            self._write({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": name}})
+        return tid
+
+    def _server_pid(self, server: str) -> int:
+        """伺服器的行程編號：伺服器端區段與發出請求的客戶端執行緒使用相同的 tid，上下對齊"""
+        pid = self._servers.get(server)
+        if pid is None:
+            pid = self._servers[server] = CLIENT_PID + len(self._servers) + 1
+            parsed = urlparse(server)
+            name = f"Ollama {parsed.hostname}:{parsed.port}" if parsed.port else f"Ollama {parsed.hostname or server}"
+            self._write({"ph": "M", "name": "process_name", "pid": pid, "tid": 0, "args": {"name": name}})
+            self._write({"ph": "M", "name": "process_sort_index", "pid": pid, "tid": 0, "args": {"sort_index": pid}})
+        return pid
+
+    def _us(self, t: float) -> float:
+        return round((t - self.origin) * 1e6, 1)
+
+    def span(self, name: str, start: float, end: float, *, cat: str, args: dict | None = None,
+             server: str | None = None) -> None:
+        """記錄一個完整區段（start / end 為 perf_counter() 值）；指定 server 時放在該伺服器的軌道"""
+        event = {"ph": "X", "name": name, "cat": cat, "ts": self._us(start), "dur": round(max(0.0, end - start) * 1e6, 1)}
+        if args:
+            event["args"] = args
+        with self._lock:
+            if self._file.closed:
+                return
+            event["pid"] = self._server_pid(server) if server else CLIENT_PID
+            event["tid"] = self._tid(event["pid"])
+            self._write(event)
+
+    def instant(self, name: str, *, cat: str, args: dict | None = None) -> None:
+        event = {"ph": "i", "s": "t", "name": name, "cat": cat, "ts": self._us(time.perf_counter())}
+        if args:
+            event["args"] = args
+        with self._lock:
+            if self._file.closed:
+                return
+            event["pid"] = CLIENT_PID
+            event["tid"] = self._tid()
+            self._write(event)
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.write("\n]}\n")
+                self._file.close()
+
+
+# ---------------------------------------------------------------------------
+# 模組層級的追蹤器（同一行程只有一個，未啟用時所有操作為空操作）
+# ---------------------------------------------------------------------------
+
+_tracer: Tracer | None = None
+
+
+def start(path: Path, **metadata) -> Tracer:
+    """開始追蹤並寫入 path；已啟用時先結束前一個"""
+    global _tracer
+    stop()
+    _tracer = Tracer(path, metadata)
+    return _tracer
+
+
+def stop() -> Path | None:
+    """結束追蹤並補上 JSON 結尾，回傳追蹤檔路徑（未啟用時為 None）"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    tracer.close()
+    return tracer.path
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def add_span(name: str, start: float, end: float, *, cat: str, args: dict | None = None,
+             server: str | None = None) -> None:
+    """以 perf_counter() 時間記錄區段（例如連線建立已由呼叫端計時）"""
+    if _tracer is not None:
+        _tracer.span(name, start, end, cat=cat, args=args, server=server)
+
+
+def instant(name: str, *, cat: str, **args) -> None:
+    if _tracer is not None:
+        _tracer.instant(name, cat=cat, args=args or None)
+
+
+@contextmanager
+def span(name: str, *, cat: str, **args) -> Iterator[dict]:
+    """以 with 包住一段程式並記錄為區段；產生的 dict 可在區段內補充參數，發生例外時記錄 error"""
+    if _tracer is None:
+        yield args
+        return
+    start = time.perf_counter()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = str(e) or type(e).__name__
+        raise
+    finally:
+        add_span(name, start, time.perf_counter(), cat=cat, args=args)
+
+
+# ---------------------------------------------------------------------------
+# 串流生成請求
+# ---------------------------------------------------------------------------
+
+class RequestTrace:
+    """一個串流生成請求（/api/generate、/api/chat）的階段追蹤，以 with 包住整個請求。
+
+    呼叫端於收到回應標頭時呼叫 headers()，每讀完一行 chunk 呼叫 chunk()；
+    結束時依客戶端時間點與最後一個 chunk 的伺服器計時欄位寫出各階段區段。"""
+
+    def __init__(self, name: str, server: str, model: str, **args):
+        self.name = name
+        self.server = server
+        self.args = {"model": model, "server": server, **args}
+        self.start = time.perf_counter()
+        self.headers_at: float | None = None
+        self.first_token_at: float | None = None
+        self.last_chunk_at: float | None = None
+        self.parse_time = 0.0
+        self.chunks = 0
+        self.final: dict = {}
+
+    def __enter__(self) -> "RequestTrace":
+        return self
+
+    def headers(self) -> None:
+        self.headers_at = time.perf_counter()
+
+    def chunk(self, received: float, chunk: dict, token: bool) -> None:
+        """received 為 iter_lines() 交回這一行的時間：之後到此處的時間即客戶端解析與處理的開銷"""
+        self.parse_time += time.perf_counter() - received
+        self.chunks += 1
+        self.last_chunk_at = received
+        if token and self.first_token_at is None:
+            self.first_token_at = received
+        if chunk.get("done"):
+            self.final = chunk
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if _tracer is None:
+            return
+        end = time.perf_counter()
+        args = {**self.args, "chunks": self.chunks, "client_parse_ms": round(self.parse_time * 1e3, 3)}
+        if exc is not None:
+            args["error"] = str(exc) or exc_type.__name__
+        for key in ("prompt_eval_count", "eval_count"):
+            if key in self.final:
+                args[key] = self.final[key]
+        add_span(self.name, self.start, end, cat="request", args=args)
+        if self.headers_at is not None:
+            add_span("等待回應標頭", self.start, self.headers_at, cat="client")
+            if self.first_token_at is not None:
+                add_span("等待首個 token", self.headers_at, self.first_token_at, cat="client")
+                add_span("串流解碼", self.first_token_at, self.last_chunk_at or end, cat="client")
+        self._server_spans()
+
+    def _server_spans(self) -> None:
+        """以最後一個 chunk 的到達時間為伺服器結束時間，往前還原伺服器端各階段（奈秒 → 秒）"""
+        final = self.final
+        total = final.get("total_duration", 0) / 1e9
+        if not total or self.last_chunk_at is None:
+            return
+        end = self.last_chunk_at
+        begin = end - total
+        load = final.get("load_duration", 0) / 1e9
+        prompt_eval = final.get("prompt_eval_duration", 0) / 1e9
+        decode = final.get("eval_duration", 0) / 1e9
+        server = self.server
+        add_span(f"伺服器 {self.args['model']}", begin, end, cat="server", server=server,
+                 args={"total_duration_ms": round(total * 1e3, 3)})
+        if load:
+            add_span("排隊與載入（load_duration）", begin, begin + load, cat="server", server=server)
+        if prompt_eval:
+            add_span("prompt 評估", begin + load, begin + load + prompt_eval, cat="server", server=server,
+                     args={"prompt_eval_count": final.get("prompt_eval_count", 0)})
+        if decode:
+            add_span("生成", end - decode, end, cat="server", server=server,
+                     args={"eval_count": final.get("eval_count", 0)})
+
+
+class _NullRequestTrace:
+    """未啟用追蹤時的空操作版本"""
+
+    def __enter__(self) -> "_NullRequestTrace":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    def headers(self) -> None:
+        pass
+
+    def chunk(self, received: float, chunk: dict, token: bool) -> None:
+        pass
+
+
+_NULL_REQUEST = _NullRequestTrace()
+
+
+def request(name: str, server: str, model: str, **args) -> RequestTrace | _NullRequestTrace:
+    """建立串流生成請求的追蹤（未啟用時回傳空操作物件）"""
+    return RequestTrace(name, server, model, **args) if _tracer is not None else _NULL_REQUEST
+
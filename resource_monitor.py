@@ -0,0 +1,203 @@
+"""ollama-benchmark.py 與 hi-ai.py 共用的背景資源取樣器。
+
+在每次生成請求期間以背景執行緒定期取樣：透過 /api/ps 取得模型的總佔用與 VRAM 佔用；
+伺服器在本機時另讀取 /proc/stat（系統 CPU 使用率）、/proc/meminfo（系統記憶體使用量）
+與 Ollama 行程（含模型 runner）的 RSS。取樣時間以請求開始為零點，並記錄當下已收到的
+token 數，讓報告能把資源變化與 token 產生速度對齊，看出模型何時溢出到系統記憶體而變慢。
+
+可透過環境變數（或 .env）調整：
+- OLLAMA_SAMPLE_INTERVAL：取樣間隔秒數（預設 0 即停用；取樣會額外佔用 CPU 並對伺服器發出 /api/ps，
+  可能干擾量測結果，需要時再開啟）
+"""
+
+import os
+import threading
+import time
+
+import requests
+
+import ollama_client
+
+# /api/ps 單次查詢的逾時秒數（取樣失敗只略過該次，不影響生成請求）
+PS_TIMEOUT = 5
+# VRAM 佔比低於此值即視為部分模型位於系統記憶體
+SPILL_THRESHOLD = 0.95
+
+
+def default_interval() -> float:
+    """OLLAMA_SAMPLE_INTERVAL 設定的取樣間隔（秒），未設定或 0 表示停用"""
+    return max(0.0, float(os.getenv("OLLAMA_SAMPLE_INTERVAL", "0")))
+
+
+# ---------------------------------------------------------------------------
+# 本機資源讀取（/proc）
+# ---------------------------------------------------------------------------
+
+def _read_cpu_times() -> tuple[int, int] | None:
+    """/proc/stat 第一行的 (忙碌, 總計) jiffies"""
+    try:
+        with open("/proc/stat", encoding="utf-8") as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+    total = sum(fields[:8])  # guest 已計入 user，不重複加總
+    return total - idle, total
+
+
+def _read_meminfo() -> dict[str, int]:
+    """/proc/meminfo 的 MemTotal 與 MemAvailable（bytes）"""
+    info: dict[str, int] = {}
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("MemTotal", "MemAvailable"):
+                    info[key] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError):
+        pass
+    return info
+
+
+def _ollama_rss() -> int | None:
+    """所有 Ollama 行程（伺服器與模型 runner）的 RSS 總和；找不到行程時回傳 None"""
+    total = 0
+    found = False
+    try:
+        entries = os.scandir("/proc")
+    except OSError:
+        return None
+    with entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/comm", encoding="utf-8") as f:
+                    if not f.read().startswith("ollama"):
+                        continue
+                with open(f"/proc/{entry.name}/status", encoding="utf-8") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1]) * 1024
+                            found = True
+                            break
+            except (OSError, ValueError):
+                continue  # 行程已結束或無權限讀取
+    return total if found else None
+
+
+# ---------------------------------------------------------------------------
+# 取樣器
+# ---------------------------------------------------------------------------
+
+class ResourceSampler:
+    """單次請求的背景資源取樣器。
+
+    呼叫端在送出請求時以 start(origin, token_times) 啟動：origin 為請求開始的
+    time.perf_counter()，token_times 為持續累積的 token 到達時間列表（取樣時只讀取長度）。
+    請求結束（或失敗）後呼叫 stop() 取得時間序列。
+    """
+
+    def __init__(self, base_url: str, model: str, interval: float):
+        self.base_url = base_url
+        self.model = model
+        self.interval = interval
+        self.local = ollama_client.is_local(base_url)
+        self.samples: list[dict] = []
+        self._origin = 0.0
+        self._token_times: list[float] = []
+        self._cpu_prev: tuple[int, int] | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, origin: float, token_times: list[float]) -> None:
+        self._origin = origin
+        self._token_times = token_times
+        self._thread = threading.Thread(target=self._run, name=f"sampler-{self.model}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict:
+        """停止取樣並回傳時間序列與摘要（可重複呼叫）"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.series()
+
+    def _run(self) -> None:
+        while True:
+            self._sample()
+            if self._stop.wait(self.interval):
+                break
+        self._sample()  # 結束時再取一次，讓時間序列涵蓋整個請求
+
+    def _sample(self) -> None:
+        sample: dict = {
+            "t": round(time.perf_counter() - self._origin, 3),
+            "tokens": len(self._token_times),
+        }
+        try:
+            for m in ollama_client.list_running(self.base_url, timeout=PS_TIMEOUT):
+                if m.get("name") == self.model or m.get("model") == self.model:
+                    sample["size"] = m.get("size", 0)
+                    sample["vram"] = m.get("size_vram", 0)
+                    break
+        except requests.RequestException:
+            pass
+        if self.local:
+            # CPU 使用率為與上一次取樣之間的平均值，第一次取樣只作為基準
+            cpu = _read_cpu_times()
+            if cpu and self._cpu_prev and cpu[1] > self._cpu_prev[1]:
+                sample["cpu"] = round((cpu[0] - self._cpu_prev[0]) / (cpu[1] - self._cpu_prev[1]) * 100, 1)
+            self._cpu_prev = cpu
+            mem = _read_meminfo()
+            if "MemTotal" in mem and "MemAvailable" in mem:
+                sample["mem_used"] = mem["MemTotal"] - mem["MemAvailable"]
+            rss = _ollama_rss()
+            if rss is not None:
+                sample["rss"] = rss
+        self.samples.append(sample)
+
+    def series(self) -> dict:
+        """時間序列與摘要：spilled 表示取樣期間模型曾部分位於系統記憶體
+        （完全在 CPU 上執行、從未使用 VRAM 的模型不算溢出）"""
+        samples = list(self.samples)
+        loaded = [s for s in samples if s.get("size")]
+        ratios = [s["vram"] / s["size"] for s in loaded]
+        data: dict = {
+            "interval": self.interval,
+            "local": self.local,
+            "samples": samples,
+            "spilled": bool(ratios) and max(ratios) > 0 and min(ratios) < SPILL_THRESHOLD,
+            "min_vram_ratio": round(min(ratios), 3) if ratios else None,
+        }
+        if self.local:
+            data["mem_total"] = _read_meminfo().get("MemTotal")
+            cpu = [s["cpu"] for s in samples if "cpu" in s]
+            rss = [s["rss"] for s in samples if "rss" in s]
+            data["peak_cpu"] = max(cpu) if cpu else None
+            data["peak_rss"] = max(rss) if rss else None
+        return data
+
+
+def describe(series: dict) -> str:
+    """將時間序列摘要為一行文字（逾時診斷用）"""
+    samples = series.get("samples") or []
+    parts = [f"資源取樣 {len(samples)} 次（每 {series['interval']} 秒）"]
+    loaded = [s for s in samples if s.get("size")]
+    if loaded:
+        first, last = loaded[0], loaded[-1]
+        parts.append(
+            f"VRAM 佔比 {first['vram'] / first['size'] * 100:.0f}% → {last['vram'] / last['size'] * 100:.0f}%"
+        )
+    else:
+        parts.append("取樣期間模型未出現在 /api/ps")
+    if series.get("spilled"):
+        parts.append("⚠️  曾溢出至系統記憶體")
+    if series.get("peak_rss"):
+        parts.append(f"Ollama RSS 峰值 {ollama_client.format_bytes(series['peak_rss'])}")
+    if series.get("peak_cpu") is not None:
+        parts.append(f"CPU 峰值 {series['peak_cpu']}%")
+    tokens = samples[-1]["tokens"] if samples else 0
+    parts.append(f"已收到 {tokens} 個 token")
+    return "，".join(parts)